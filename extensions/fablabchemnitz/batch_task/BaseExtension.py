@@ -7,14 +7,15 @@ import os
 import sys
 import re
 import argparse
-from shutil import copy2
-# from subprocess import Popen, PIPE
+import atexit
+import tempfile
+from subprocess import Popen, PIPE, STDOUT, TimeoutExpired
 # import time
 # from lxml import etree
 
 # local library
 import inkex
-from inkex.command import inkscape
+from inkex.command import inkscape, which, CommandNotFound, INKSCAPE_EXECUTABLE_NAME
 from inkex.elements import _selected as selection
 
 MIN_PYTHON_VERSION = (3, 6)  # Mainly for f-strings
@@ -23,6 +24,68 @@ if (sys.version_info.major, sys.version_info.minor) < (3, 6):
     sys.exit(1)
 
 
+class InkscapeShell:
+    """Persistent 'inkscape --shell' process.
+
+    Starting Inkscape takes much longer than running a few actions, so one
+    process is kept alive and reused for every batch of actions. Each line
+    written to the shell is a ';' separated list of actions; the shell prints
+    its prompt when the line is done, which is used to wait for the result."""
+
+    PROMPT = b"> "
+
+    def __init__(self, executable=None):
+        self.executable = executable or which(INKSCAPE_EXECUTABLE_NAME)
+        self.process = None
+
+    def start(self):
+        """Start the shell (if it is not already running)"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.process = Popen([self.executable, "--shell"], stdin=PIPE, stdout=PIPE, stderr=STDOUT, bufsize=0)
+        self._read_until_prompt()  # welcome message
+
+    def _read_until_prompt(self) -> str:
+        """Output of the shell up to the next prompt"""
+        output = b""
+        while not (output == self.PROMPT or output.endswith(b"\n" + self.PROMPT)):
+            chunk = os.read(self.process.stdout.fileno(), 65536)
+            if not chunk:
+                raise EOFError(f"Inkscape shell exited with code {self.process.wait()}: {output.decode(errors='replace')}")
+            output += chunk
+        return output[:-len(self.PROMPT)].decode(errors='replace')
+
+    def run(self, actions: list) -> str:
+        """Run a list of actions as one line, returns the output of Inkscape"""
+        self.start()
+        self.process.stdin.write((";".join(actions) + "\n").encode())
+        self.process.stdin.flush()
+        return self._read_until_prompt()
+
+    def close(self):
+        """Quit the shell"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(b"quit\n")
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+_shell = None
+
+def inkscape_shell() -> InkscapeShell:
+    """Shell session shared by all extensions of this process"""
+    global _shell
+    if _shell is None:
+        _shell = InkscapeShell()
+        atexit.register(_shell.close)
+    return _shell
+
+
 class BaseExtension(inkex.Effect):
     """Custom class that makes creation of extensions easier.
 
@@ -56,6 +119,8 @@ class BaseExtension(inkex.Effect):
             args_adder(self.arg_parser)
             self.args_adder = args_adder
 
+        self.actions_queue = []  # actions waiting for the next flush
+
 
 
 
@@ -136,38 +201,76 @@ class BaseExtension(inkex.Effect):
         return output
 
 
-    def effect(self):
-        """Main entry point to process current document. Not to be called externally."""
+    # maximal number of actions sent to the shell in one line
+    batch_size = 200
 
-        actions_list = self.custom_effect(self)
-        if actions_list is None or actions_list == []:
-            self.msg("No actions received. Perhaps you are calling inkex object methods?")
-        elif isinstance(actions_list, list):
-            tempfile = self.options.input_file + "-BaseExtension.svg"
-            copy2(self.options.input_file, tempfile)
-            actions_list.append("export-type:svg")
-            actions_list.append("export-filename:{}".format(tempfile))
-            actions_list.append("export-do")
-            actions = ";".join(actions_list)
-            #inkex.utils.debug(actions)
-            cli_output = inkscape(tempfile, actions=actions)
+    def queue(self, actions):
+        """Add actions (str or list[str]) to be run on the document by the next flush.
+        Returns self, so that calls can be chained."""
+        if isinstance(actions, str):
+            actions = [actions]
+        self.actions_queue.extend(actions)
+        return self
+
+    def flush(self):
+        """Run the queued actions on the current document in the shared Inkscape
+        shell and replace the document with the result.
+
+        The document is written directly from memory to a temp file (no copy of
+        the input file), which is opened by the shell. The actions are sent in
+        batches of batch_size and the result is exported to the same file."""
+
+        actions, self.actions_queue = self.actions_queue, []
+        if not actions:
+            return
+        with tempfile.NamedTemporaryFile(suffix="-BaseExtension.svg", delete=False) as document_file:
+            self.document.write(document_file)
+            tempfile_name = document_file.name
+        try:
+            cli_output = self.run_actions(tempfile_name, actions)
             if len(cli_output) > 0:
                 self.msg("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
                 self.msg(cli_output)
-            # replace current document with content of temp copy file
-            self.document = inkex.load_svg(tempfile)
+            # replace current document with the result
+            self.document = inkex.load_svg(tempfile_name)
             # update self.svg
             self.svg = self.document.getroot()
+        finally:
+            # Clean up tempfile
+            try:
+                os.remove(tempfile_name)
+            except Exception:  # pylint: disable=broad-except
+                pass
 
+    def run_actions(self, filename, actions) -> str:
+        """Open a file, run the actions on it and save the result to the same file"""
 
-        # Clean up tempfile
+        export = ["export-type:svg", f"export-filename:{filename}", "export-do"]
         try:
-            os.remove(tempfile)
-        except Exception:  # pylint: disable=broad-except
-            pass
+            shell = inkscape_shell()
+            output = [shell.run([f"file-open:{filename}"])]
+            for start in range(0, len(actions), self.batch_size):
+                output.append(shell.run(actions[start:start + self.batch_size]))
+            output.append(shell.run(export + ["file-close"]))
+            return "".join(output).strip()
+        except (OSError, EOFError, CommandNotFound):
+            # no usable shell, run Inkscape once for this file
+            return inkscape(filename, actions=";".join(actions + export))
+
+    def effect(self):
+        """Main entry point to process current document. Not to be called externally."""
+
+        actions_list = self.custom_effect(self)
+        if isinstance(actions_list, list):
+            self.queue(actions_list)
+        if not self.actions_queue:
+            self.msg("No actions received. Perhaps you are calling inkex object methods?")
+        else:
+            self.flush()
 
     def call(self, child, ext_options):
-        """Used to call an extension from another extension"""
+        """Used to call an extension from another extension. The returned actions
+        can be run by queue(...).flush(), several calls can be queued and run at once"""
 
         old_options = self.options
 
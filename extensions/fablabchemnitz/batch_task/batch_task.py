@@ -3,7 +3,7 @@ import os
 import sys
 import re
 import subprocess
-from BaseExtension import BaseExtension
+from BaseExtension import BaseExtension, inkscape_shell
 from argparse import ArgumentParser
 
 """If syntax error occurs here, change inkscape interpreter to python3"""
@@ -25,8 +25,13 @@ def custom_effect(self: BaseExtension):
     proc = subprocess.run("inkscape --verb-list | grep -oP '^.+?(?=:)'", shell=True, capture_output=True)
     valid_actions_and_verbs = proc.stdout.decode().splitlines()
 
-    proc = subprocess.run("inkscape --action-list | grep -oP '^.+?(?= *:)'", shell=True, capture_output=True)
-    valid_actions_and_verbs += proc.stdout.decode().splitlines()
+    try:
+        # the shell is reused to run the actions afterwards
+        action_list = inkscape_shell().run(["action-list"])
+        valid_actions_and_verbs += re.findall(r'^(.+?)(?= *:)', action_list, re.MULTILINE)
+    except (OSError, EOFError):
+        proc = subprocess.run("inkscape --action-list | grep -oP '^.+?(?= *:)'", shell=True, capture_output=True)
+        valid_actions_and_verbs += proc.stdout.decode().splitlines()
 
     self.options.dry_run = self.options.dry_run == 'true'
 
@@ -13,15 +13,79 @@ License: GNU GPL v3
 
 """
 import boxes
+import boxes.generators
 import inkex
 import sys
 import subprocess
 import os
+import contextlib
+import hashlib
+import json
+from functools import lru_cache
 from lxml import etree
 import tempfile
 import argparse
 import xml.etree.ElementTree as ET
 
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "boxes.py-cache")
+CACHE_SIZE = 256 #max. number of cached outputs, the least recently used ones are removed
+
+@lru_cache(maxsize=None)
+def generators_by_name():
+    """ boxes.py generator classes by their lower case name, like boxes_main.py looks them up """
+    return {name.split('.')[-1].lower(): generator for name, generator in boxes.generators.getAllBoxGenerators().items()}
+
+def render_box(generator, args, box_file):
+    """ run a boxes.py generator in this process and return the SVG data """
+    box = generators_by_name()[generator.lower()]()
+    box.parseArgs(args + ["--output=" + box_file])
+    #anything printed by the generator must not end up in the SVG Inkscape reads from stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        box.open()
+        box.render()
+        data = box.close()
+    if data is None: #older boxes.py versions write the output file on close
+        with open(box_file, 'rb') as stream:
+            data = stream.read()
+        os.remove(box_file)
+        return data
+    return data.getvalue()
+
+def cache_file(generator, args):
+    """ cache file for the output of a generator with the given arguments and boxes.py installation """
+    version = [getattr(boxes, "__version__", ""), os.path.getmtime(boxes.__file__)]
+    key = json.dumps([generator.lower(), args, boxes.__file__, version])
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".svg")
+
+def cached_box(generator, args, box_file):
+    """ SVG data of a generator run, identical parameter sets are taken from the cache """
+    cacheFile = cache_file(generator, args)
+    try:
+        with open(cacheFile, 'rb') as stream:
+            data = stream.read()
+        os.utime(cacheFile) #mark as recently used
+        return data
+    except OSError:
+        pass
+    data = render_box(generator, args, box_file)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        #write to a temp file first, other processes may read the cache at the same time
+        fd, tempFile = tempfile.mkstemp(suffix=".tmp", dir=CACHE_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(data)
+            os.replace(tempFile, cacheFile)
+        except OSError:
+            os.remove(tempFile)
+            raise
+        cached = sorted((os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith(".svg")), key=os.path.getmtime)
+        for oldFile in cached[:-CACHE_SIZE]:
+            os.remove(oldFile)
+    except OSError:
+        pass #caching is optional
+    return data
+
 class boxesPyWrapper(inkex.GenerateExtension):
 
     def add_arguments(self, pars):
@@ -33,11 +97,47 @@ class boxesPyWrapper(inkex.GenerateExtension):
                 if key != "--id": #ignore duplicate id arg, which will throw error if an element is selected
                     pars.add_argument(key, default=key)
 
+    def boxesArgs(self):
+        """ generator name and the command line arguments for boxes.py, built from the options """
+        generator = None
+        args = []
+        for arg in vars(self.options):
+            if arg in ("output", "ids", "selected_nodes", "input_file", "tab"):
+                continue
+            value = str(getattr(self.options, arg))
+            #fix behaviour of "original" arg which does not correctly gets interpreted if set to false
+            if arg == "original" and value == "false":
+                continue
+            if arg == "generator":
+                generator = value
+            else:
+                args += ["--" + arg, value]
+        return generator, args
+
     def generate(self):
         box_file = os.path.join(tempfile.gettempdir(), "box.svg")
         if os.path.exists(box_file):
             os.remove(box_file) #remove previously generated box file at the beginning
 
+        generator, args = self.boxesArgs()
+        if generator is not None and generator.lower() in generators_by_name():
+            try:
+                data = cached_box(generator, args, box_file)
+            except Exception as e:
+                inkex.utils.debug("boxes.py generator {} failed: {}".format(generator, e))
+                sys.exit(1)
+        else: #generator unknown to the boxes.py module available here, try the external interpreter
+            data = self.generateSubprocess(generator, args, box_file)
+
+        # write the generated SVG into Inkscape's canvas
+        doc = etree.fromstring(data, parser=etree.XMLParser(huge_tree=True))
+        group = inkex.Group(id="boxes.py")
+        for element in doc:
+            group.append(element)
+        return group
+
+    def generateSubprocess(self, generator, args, box_file):
+        """ run boxes_main.py with a separate python interpreter and return the SVG data """
         boxes_dir = os.path.join(os.path.dirname(boxes.__file__), 'scripts')
         boxes_executable = 'boxes_main.py'
                 
@@ -69,23 +169,10 @@ class boxesPyWrapper(inkex.GenerateExtension):
             PYTHONBIN = customPythonInterpreter
                                           
         cmd = PYTHONBIN + ' ' + os.path.join(boxes_dir, boxes_executable) #the boxes python file (without .py ending) - we add python at the beginning to support Windows too    
-        for arg in vars(self.options):
-            if arg not in ("output", "ids", "selected_nodes"):
-                #inkex.utils.debug(str(arg) + " = " + str(getattr(self.options, arg)))
-                #fix behaviour of "original" arg which does not correctly gets interpreted if set to false
-                if arg == "original" and str(getattr(self.options, arg)) == "false":
-                    continue
-                if arg in ("input_file", "tab"):
-                    continue
-                else:
-                    cmd += ' --' + arg + ' "' + str(getattr(self.options, arg)) + '"'
-                    #cmd += ' --' + arg + '="' + str(getattr(self.options, arg)) + '"'
+        cmd += ' "' + str(generator) + '"'
+        for key, value in zip(args[::2], args[1::2]):
+            cmd += ' ' + key + ' "' + value + '"'
         cmd += " --output=" + box_file + " "
-        cmd = cmd.replace("{} --generator".format(boxes_executable), boxes_executable)
-        
-        # run boxes with the parameters provided
-        #with os.popen(cmd, "r") as boxes:
-        #    result = boxes.read()
         
         try:
             proc = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -99,23 +186,16 @@ class boxesPyWrapper(inkex.GenerateExtension):
         
         # check output existence
         try:
-            stream = open(box_file, 'r')
+            stream = open(box_file, 'rb')
         except FileNotFoundError as e:
             inkex.utils.debug("There was no " + box_file + " output generated. Cannot continue. Command was:")
             inkex.utils.debug(str(cmd))
             sys.exit(1)
-            
-        # write the generated SVG into Inkscape's canvas
-        p = etree.XMLParser(huge_tree=True)
-        doc = etree.parse(stream, parser=etree.XMLParser(huge_tree=True))
+        data = stream.read()
         stream.close()
         if os.path.exists(box_file):
             os.remove(box_file) #remove previously generated box file at the end too      
-            
-        group = inkex.Group(id="boxes.py")
-        for element in doc.getroot():
-            group.append(element)
-        return group
+        return data
         
 if __name__ == '__main__':
     boxesPyWrapper().run()
\ No newline at end of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+"""
+Extension for Inkscape 1.2
+
+boxes.py parameter sweep: renders one boxes.py generator for a family of parameter
+sets (rows of a CSV file and/or a grid of values) in a process pool. Each variant
+is written into its own layer or its own SVG file as soon as it is done. The summary
+lists the part area and the cut length of every variant and their totals.
+
+Grid syntax: "x=100,150,200; thickness=3,4" (all combinations of the given values)
+CSV syntax: a header row with parameter names, then one parameter set per row
+
+Author: Mario Voigt / FabLab Chemnitz
+Mail: mario.voigt@stadtfabrikanten.org
+License: GNU GPL v3
+
+"""
+import csv
+import itertools
+import os
+import shlex
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import numpy as np
+import inkex
+from lxml import etree
+from boxes_proxy import cached_box, generators_by_name
+sys.path.append("../path_intersections")
+from bezier_flattening import flatten_path
+
+def parse_grid(grid):
+    """ list of parameter dicts for all combinations of a grid like "x=100,150; thickness=3,4" """
+    names = []
+    values = []
+    for part in grid.split(";"):
+        if part.strip() == "":
+            continue
+        if "=" not in part:
+            raise ValueError("Invalid grid entry '{}', expected name=value1,value2,...".format(part.strip()))
+        name, valueList = part.split("=", 1)
+        names.append(name.strip().lstrip("-"))
+        values.append([value.strip() for value in valueList.split(",") if value.strip() != ""])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def read_csv(filename):
+    """ list of parameter dicts, one per row of a CSV file with a header row """
+    with open(filename, newline="") as csvFile:
+        return [{name.strip().lstrip("-"): value.strip() for name, value in row.items() if name and value is not None and value.strip() != ""}
+                for row in csv.DictReader(csvFile)]
+
+def contains(polygon, point):
+    """ even-odd test if a closed (n, 2) polygon contains a point """
+    x, y = point
+    start, end = polygon[:-1], polygon[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing = ((start[:, 1] > y) != (end[:, 1] > y)) & \
+                   (x < (end[:, 0] - start[:, 0]) * (y - start[:, 1]) / (end[:, 1] - start[:, 1]) + start[:, 0])
+    return np.count_nonzero(crossing) % 2 == 1
+
+def measure(data, tolerance=0.01):
+    """
+    part area (mm²) and cut length (mm) of a boxes.py SVG output. Closed contours nested
+    in an odd number of other contours are holes, their area is subtracted
+    """
+    svg = inkex.load_svg(BytesIO(data)).getroot()
+    tolerance = svg.unittouu("{}mm".format(tolerance))
+    length = 0.0
+    polygons = []
+    for element in svg.descendants().filter(inkex.PathElement):
+        for points in flatten_path(element.path, element.composed_transform(), tolerance):
+            length += np.hypot(*np.diff(points, axis=0).T).sum()
+            if len(points) > 3 and np.hypot(*(points[-1] - points[0])) <= tolerance:
+                polygons.append(points)
+    lower = [polygon.min(axis=0) for polygon in polygons]
+    upper = [polygon.max(axis=0) for polygon in polygons]
+    area = 0.0
+    for i, polygon in enumerate(polygons):
+        x, y = polygon[:, 0], polygon[:, 1]
+        polygonArea = abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+        depth = sum(1 for j, other in enumerate(polygons) if j != i
+                    and (lower[j] <= lower[i]).all() and (upper[i] <= upper[j]).all()
+                    and contains(other, polygon[0]))
+        area += polygonArea if depth % 2 == 0 else -polygonArea
+    mm = svg.unittouu("1mm")
+    return area / mm ** 2, length / mm
+
+def sweep_worker(generator, args):
+    """ render one parameter set (in a pool process) and measure it """
+    box_file = os.path.join(tempfile.gettempdir(), "box_sweep_{}.svg".format(os.getpid()))
+    data = cached_box(generator, args, box_file)
+    area, length = measure(data)
+    return data, area, length
+
+class boxesPySweep(inkex.EffectExtension):
+
+    def add_arguments(self, pars):
+        pars.add_argument("--tab")
+        pars.add_argument("--generator", default="", help="Name of the boxes.py generator, e.g. 'abox'")
+        pars.add_argument("--arguments", default="", help="Common boxes.py arguments, e.g. '--x=100 --outside=true'")
+        pars.add_argument("--csv_file", default="", help="CSV file with one parameter set per row")
+        pars.add_argument("--grid", default="", help="Grid of parameter values, e.g. 'x=100,150; thickness=3,4'")
+        pars.add_argument("--output_mode", default="layers", help="Put each variant into its own layer (layers) or file (files)")
+        pars.add_argument("--output_dir", default="", help="Directory for the files")
+        pars.add_argument("--processes", type=int, default=0, help="Number of processes (0 = number of CPUs)")
+
+    def parameterSets(self):
+        """ parameter dicts of all variants: each CSV row combined with each grid point """
+        rows = [{}]
+        if self.options.csv_file:
+            rows = read_csv(self.options.csv_file)
+        gridPoints = parse_grid(self.options.grid)
+        return [dict(row, **point) for row in rows for point in gridPoints]
+
+    def effect(self):
+        generator = self.options.generator.strip()
+        if generator.lower() not in generators_by_name():
+            inkex.utils.debug("Unknown boxes.py generator '{}'.".format(generator))
+            sys.exit(1)
+        if self.options.output_mode == "files" and not os.path.isdir(self.options.output_dir):
+            inkex.utils.debug("Output directory '{}' does not exist.".format(self.options.output_dir))
+            sys.exit(1)
+        try:
+            parameterSets = self.parameterSets()
+        except (OSError, ValueError) as e:
+            inkex.utils.debug("Cannot read the parameter sets: {}".format(e))
+            sys.exit(1)
+
+        baseArgs = shlex.split(self.options.arguments)
+        argsList = []
+        for parameters in parameterSets:
+            args = list(baseArgs)
+            for name, value in parameters.items():
+                args += ["--" + name, value] #later arguments override the common ones
+            argsList.append(args)
+
+        processes = self.options.processes if self.options.processes > 0 else None
+        try:
+            if len(argsList) == 1 or processes == 1:
+                results = map(sweep_worker, itertools.repeat(generator), argsList)
+                self.writeResults(generator, parameterSets, results)
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    results = executor.map(sweep_worker, itertools.repeat(generator), argsList)
+                    self.writeResults(generator, parameterSets, results)
+        except Exception as e:
+            inkex.utils.debug("boxes.py generator {} failed: {}".format(generator, e))
+            sys.exit(1)
+
+    def writeResults(self, generator, parameterSets, results):
+        """ write each variant as soon as it is available, then print the summary """
+        totalArea = 0.0
+        totalLength = 0.0
+        for i, (parameters, (data, area, length)) in enumerate(zip(parameterSets, results)):
+            label = "{} {}".format(generator, " ".join("{}={}".format(name, value) for name, value in parameters.items())).strip()
+            if self.options.output_mode == "files":
+                filename = os.path.join(self.options.output_dir, "{}_{:03d}.svg".format(generator, i + 1))
+                with open(filename, "wb") as svgFile:
+                    svgFile.write(data)
+                label += " -> " + filename
+            else:
+                layer = self.svg.add(inkex.Layer.new(label))
+                if i > 0:
+                    layer.style["display"] = "none" #variants are drawn at the same place, only show the first one
+                doc = etree.fromstring(data, parser=etree.XMLParser(huge_tree=True))
+                for element in doc:
+                    layer.append(element)
+            inkex.utils.debug("{}: part area {:0.1f} mm², cut length {:0.1f} mm".format(label, area, length))
+            totalArea += area
+            totalLength += length
+        inkex.utils.debug("Total ({} variants): part area {:0.1f} mm², cut length {:0.1f} mm".format(len(parameterSets), totalArea, totalLength))
+
+if __name__ == '__main__':
+    boxesPySweep().run()
@@ -21,6 +21,7 @@
 #        Workaround for cubicsuperpath.parsePath/formatPath limitation.
 #        Started python3 compatibility.
 # 2020-05-27 vi, V0.7 -- Upgrade to Inkscape 1.0. Write debug info to inkex debug dialog.
+#        Chaining looks up near ends in a fixed radius hash instead of scanning all segments.
 
 from __future__ import print_function
 
@@ -34,6 +35,8 @@ import re
 import inkex
 from inkex.paths import CubicSuperPath, Path
 from optparse import SUPPRESS_HELP
+sys.path.append("../purge_duplicate_path_segments")
+from fixed_radius_search import FixedRadiusSearch
 
 class ChainPaths(inkex.EffectExtension):
 
@@ -49,6 +52,10 @@ class ChainPaths(inkex.EffectExtension):
         self.segments_done = {}
         self.min_missed_distance_sq = None
         self.chained_count = 0
+        self.end_index = None
+        self.indexed_ends = {}
+        self.segment_numbers = {}
+        self.progress_step = 0
 
         self.arg_parser.add_argument('-V', '--version', type=inkex.Boolean, default=False, help = 'Just print version number ("' + __version__ + '") and exit.')
         self.arg_parser.add_argument('-s', '--snap_ends', type=inkex.Boolean, default=True, help='snap end-points together when connecting')
@@ -56,6 +63,7 @@ class ChainPaths(inkex.EffectExtension):
         self.arg_parser.add_argument('-l', '--limit', type=int, default=2000, help='Maximum items to process')
         self.arg_parser.add_argument('-u', '--units', default="mm", help="measurement unit for epsilon")
         self.arg_parser.add_argument('-e', '--chain_epsilon', type=float, default=0.01, help="Max. distance to connect [mm]")
+        self.arg_parser.add_argument('-p', '--progress', type=inkex.Boolean, default=False, help='Report chaining progress')
         self.arg_parser.add_argument('-d', '--debug', type=inkex.Boolean, default=False, help='Debug')
 
     def version(self):
@@ -113,6 +121,41 @@ class ChainPaths(inkex.EffectExtension):
         self.chained_count += 1
         return seg
 
+    def index_segments(self, segments):
+        """ hash the ends of all segments. Requires self.eps_sq """
+        self.end_index = FixedRadiusSearch(math.sqrt(self.eps_sq))
+        self.indexed_ends = {}
+        self.segment_numbers = {}
+        for i, seg in enumerate(segments):
+            ends = (tuple(seg['end1']), tuple(seg['end2']))
+            self.end_index.add(ends[0], (i, 1))
+            self.end_index.add(ends[1], (i, 2))
+            self.indexed_ends[i] = ends
+            self.segment_numbers[(seg['id'], seg['n'])] = i
+
+    def unindex_segment(self, so, i):
+        ends = self.indexed_ends.pop(i, None)
+        if ends is None:
+            return
+        self.end_index.remove(ends[0], (i, 1))
+        self.end_index.remove(ends[1], (i, 2))
+        if so.progress:
+            total = len(self.segment_numbers)
+            step = (total - len(self.indexed_ends)) * 10 // total
+            if step > self.progress_step:
+                self.progress_step = step
+                inkex.utils.debug("chained {}/{} segments".format(total - len(self.indexed_ends), total))
+
+    def first_near_segment(self, end1, end2):
+        """ lowest numbered segment not yet chained, with an end near end1 or end2. None if there is none """
+        first = None
+        r = math.sqrt(self.eps_sq) * (1 + 1e-9)
+        for end in (end1, end2):
+            for dist, p, (i, n) in self.end_index.radius(end, r):
+                if (first is None or i < first) and self.near_ends(end, p):
+                    first = i
+        return first
+
     def near_ends(self, end1, end2):
         """ requires self.eps_sq to be the square of the near distance """
         dx = end1[0] - end2[0]
@@ -196,6 +239,7 @@ class ChainPaths(inkex.EffectExtension):
             if so.debug: inkex.utils.debug("{}, {}, {}, {}".format(s['id'], s['n'], s['end1'], s['end2']))
 
         # chain the segments
+        self.index_segments(segments)
         obsoleted = 0
         remaining = 0
 
@@ -209,14 +253,16 @@ class ChainPaths(inkex.EffectExtension):
             for chain in path_d:
                 cur_idx += 1
                 if not self.is_segment_done(id, cur_idx):
-                    # quadratic algorithm: we check both ends of the current segment.
+                    # we check both ends of the current segment.
                     # If one of them is near another known end from the segments list, we
                     # chain this segment to the current segment and remove it from the
-                    # list,
+                    # list. The ends are looked up in the hash, if several segments are near
+                    # the one first in the list is taken.
                     # end1-end1 or end2-end2: The new segment is reversed.
                     # end1-end2: The new segment is prepended to the current segment.
                     # end2-end1: The new segment is appended to the current segment.
                     self.set_segment_done(so, id, cur_idx, "output") # do not cross with ourselves.
+                    self.unindex_segment(so, self.segment_numbers.get((id, cur_idx)))
                     end1 = [chain[ 0][1][0], chain[ 0][1][1]]
                     end2 = [chain[-1][1][0], chain[-1][1][1]]
 
@@ -225,12 +271,10 @@ class ChainPaths(inkex.EffectExtension):
                         chain.pop()
                         end2 = [chain[-1][1][0], chain[-1][1][1]]
 
-                    segments_idx = 0
-                    while segments_idx < len(segments):
+                    segments_idx = self.first_near_segment(end1, end2)
+                    while segments_idx is not None:
                         seg = segments[segments_idx]
-                        if self.is_segment_done(seg['id'], seg['n']):
-                            segments_idx += 1
-                            continue
+                        self.unindex_segment(so, segments_idx)
 
                         if (self.near_ends(end1, seg['end1']) or
                                 self.near_ends(end2, seg['end2'])):
@@ -243,18 +287,14 @@ class ChainPaths(inkex.EffectExtension):
                             self.set_segment_done(so, seg['id'], seg['n'], 'prepended to {} {}'.format(id, cur_idx))
                             chain = self.link_segments(seg['seg'], chain)
                             end1 = [chain[0][1][0], chain[0][1][1]]
-                            segments_idx = 0 # this chain changed. re-visit all candidate
-                            continue
-
-                        if self.near_ends(end2, seg['end1']):
+                        elif self.near_ends(end2, seg['end1']):
                             # append seg to chain
                             self.set_segment_done(so, seg['id'], seg['n'], 'appended to {} {}'.format(id, cur_idx))
                             chain = self.link_segments(chain, seg['seg'])
                             end2 = [chain[-1][1][0], chain[-1][1][1]]
-                            segments_idx = 0 # this chain changed. re-visit all candidate
-                            continue
 
-                        segments_idx += 1
+                        # this chain changed. re-visit all candidates
+                        segments_idx = self.first_near_segment(end1, end2)
 
                     # Now all joinable segments are joined.
                     # Finally, we can check, if the resulting path is a closed path:
@@ -61,6 +61,8 @@ License: GNU GPL v3
 import sys
 import os
 import copy
+import time
+import numpy as np
 from lxml import etree
 import poly_point_isect
 from poly_point_isect import isect_segments
@@ -68,7 +70,7 @@ import inkex
 from inkex import transforms, bezier, PathElement, Color, Circle
 from inkex.bezier import csplength
 from inkex.paths import Path, CubicSuperPath
-from shapely.geometry import LineString, Point, MultiPoint
+from shapely.geometry import LineString, Point, MultiPoint, GeometryCollection
 from shapely.ops import snap, split
 
 idPrefixSubSplit = "subsplit"
@@ -257,15 +259,20 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         
         trimLineStyle = {'stroke': str(self.options.color_trimmed), 'fill': 'none', 'stroke-width': self.options.strokewidth}
            
-        linesWithSnappedIntersectionPoints = snap(ls, globalIntersectionPoints, self.options.snap_tolerance)
+        if self.intersectionIndex is not None: #batched mode: only use the intersection points around this line
+            globalIntersectionPoints = self.intersection_points_near(ls)
+
         trimGroupParentId = subSplitLineArray[subSplitIndex].attrib['originalPathId']
         trimGroupId = '{}-{}-{}'.format(idPrefixTrimming, idPrefixSubSplit, trimGroupParentId)
-        trimGroupParent = self.svg.getElementById(trimGroupParentId)
-        trimGroup = self.find_group(trimGroupId)
+        trimGroup = self.trimGroups.get(trimGroupId)
+        if trimGroup is None:
+            trimGroup = self.find_group(trimGroupId)
 
         if trimGroup is None:
+            trimGroupParent = self.svg.getElementById(trimGroupParentId)
             trimGroup = trimGroupParent.getparent().add(inkex.Group(id=trimGroupId))
             trimGroup.transform = -subSplitLineArray[subSplitIndex].composed_transform()
+        self.trimGroups[trimGroupId] = trimGroup
           
         #apply isBezier and original path id information to group (required for bezier splitting the original path at the end)
         trimGroup.attrib['originalPathIsBezier'] = subSplitLineArray[subSplitIndex].attrib['originalPathIsBezier']
@@ -273,7 +280,11 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         trimGroup.attrib['originalPathId'] = subSplitLineArray[subSplitIndex].attrib['originalPathId']
 
         #split all lines against all other lines using the intersection points
-        trimLines = split(linesWithSnappedIntersectionPoints, globalIntersectionPoints)
+        if len(globalIntersectionPoints.geoms) > 0:
+            linesWithSnappedIntersectionPoints = snap(ls, globalIntersectionPoints, self.options.snap_tolerance)
+            trimLines = split(linesWithSnappedIntersectionPoints, globalIntersectionPoints)
+        else: #nothing to snap to or to split at
+            trimLines = GeometryCollection([ls])
 
         splitAt = [] #if the sub split line was split by an intersecting line we receive two trim lines with same assigned original path id!
         prevLine = None
@@ -314,6 +325,85 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         return trimGroup
 
 
+    def index_intersection_points(self, points):
+        ''' sort the global intersection points by x to look them up by bounding box (batched mode) '''
+        pointArray = np.array(points, dtype=np.float64).reshape(-1, 2)
+        order = np.argsort(pointArray[:, 0], kind='stable')
+        self.intersectionIndex = (pointArray, order, pointArray[order, 0])
+
+
+    def intersection_points_near(self, ls):
+        ''' the global intersection points within snap tolerance of the bounding box of ls, in their original order '''
+        pointArray, order, xSorted = self.intersectionIndex
+        tol = self.options.snap_tolerance
+        minx, miny, maxx, maxy = ls.bounds
+        candidates = order[np.searchsorted(xSorted, minx - tol, 'left'):np.searchsorted(xSorted, maxx + tol, 'right')]
+        y = pointArray[candidates, 1]
+        candidates = np.sort(candidates[(y >= miny - tol) & (y <= maxy + tol)])
+        return MultiPoint([tuple(p) for p in pointArray[candidates].tolist()])
+
+
+    def overlapping_groups(self, segmentArray, groups):
+        '''
+        bounding box broad phase for the sweep. Returns a boolean array telling for each group (index into
+        the unique values of groups) if its bounding box overlaps the box of any other group, and the group index of each segment
+        '''
+        groupIds, inverse = np.unique(groups, return_inverse=True)
+        xs = segmentArray[:, :, 0]
+        ys = segmentArray[:, :, 1]
+        boxes = np.empty((len(groupIds), 4))
+        boxes[:, 0:2] = np.inf
+        boxes[:, 2:4] = -np.inf
+        np.minimum.at(boxes[:, 0], inverse, xs.min(axis=1))
+        np.minimum.at(boxes[:, 1], inverse, ys.min(axis=1))
+        np.maximum.at(boxes[:, 2], inverse, xs.max(axis=1))
+        np.maximum.at(boxes[:, 3], inverse, ys.max(axis=1))
+        order = np.argsort(boxes[:, 0], kind='stable')
+        sortedBoxes = boxes[order]
+        overlaps = np.zeros(len(groupIds), dtype=bool)
+        for i in range(len(order)):
+            #boxes following box i in x order which start before its right edge
+            end = np.searchsorted(sortedBoxes[:, 0], sortedBoxes[i, 2], 'right')
+            others = sortedBoxes[i + 1:end]
+            hit = (others[:, 1] <= sortedBoxes[i, 3]) & (others[:, 3] >= sortedBoxes[i, 1])
+            if hit.any():
+                overlaps[order[i]] = True
+                overlaps[order[i + 1:end][hit]] = True
+        return overlaps, inverse
+
+
+    def isect_segments_batched(self, segmentArray, groups):
+        '''
+        find the global intersection points using Bentley-Ottmann (batched mode).
+        segmentArray is a float64 array of shape (n, 2, 2), groups holds the original path id of each segment.
+        Paths which do not overlap any other path by bounding box can only intersect themselves. We sweep
+        them one by one and all other paths together in a single run.
+        '''
+        if len(segmentArray) == 0:
+            return []
+        overlaps, inverse = self.overlapping_groups(segmentArray, groups)
+        overlapping = overlaps[inverse]
+        if self.options.show_debug is True:
+            self.msg("broad phase: {} of {} paths overlap other paths ({} of {} sub split lines)".format(
+                np.count_nonzero(overlaps), len(overlaps), np.count_nonzero(overlapping), len(segmentArray)))
+        points = isect_segments(segmentArray[overlapping], validate=True)
+        isolated = np.flatnonzero(~overlapping)
+        isolated = isolated[np.argsort(inverse[isolated], kind='stable')]
+        groupStarts = np.flatnonzero(np.diff(inverse[isolated], prepend=-1))
+        for group in np.split(isolated, groupStarts[1:]):
+            if len(group) > 1:
+                points.extend(isect_segments(segmentArray[group], validate=True))
+        return points
+
+
+    def debug_timing(self, phase, start):
+        ''' print the duration of a processing phase if debug is enabled. Returns the start time for the next phase '''
+        now = time.perf_counter()
+        if self.options.show_debug is True:
+            self.msg("timing: {} took {:0.3f} s".format(phase, now - start))
+        return now
+
+
     def slope(self, p0, p1):
         '''
             Calculate the slope (gradient) of a line's start point p0 + end point p1
@@ -324,119 +414,126 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         return (p1[1] - p0[1]) / dx
 
 
-    def process_set_x(self, working_set):
+    def cluster_sorted(self, segments, key, epsilon):
+        '''
+            Split a list of segments (sorted by key) into runs. A run ends as soon as the key
+            differs by epsilon or more from the key of the run's first segment
+        '''
+        runs = []
+        run = []
+        for s in segments:
+            if run and abs(key(s) - key(run[0])) >= epsilon:
+                runs.append(run)
+                run = []
+            run.append(s)
+        if run:
+            runs.append(run)
+        return runs
+
+
+    def merge_collinear(self, working_set, axis):
+        '''
+            1-D interval sweep over a set of collinear segments along the given axis (0 = x, 1 = y).
+            Overlapping segments (or duplicates) are combined into one segment representing their furthest points.
+            The merged segment keeps the id of the segment with the lowest start coordinate.
+            Touching segments are merged too, only segments with a gap between them are left alone, e.g. ---  -----
+        '''
         if len(working_set) < 2:
-            return (True, working_set)
-    
-        # sort working set left to right
-        working_set.sort(key=lambda x: x['p0'][0])
-        for i in range(0, len(working_set)):
-            for j in range(i + 1, len(working_set)):
-    
-                # calculate slope from S0P0 to S1P1 and S0P1 to S1P0
-                # if slopes all match the working set's slope, we're collinear
-                # if not, these segments are parallel but not collinear and should be left alone
-                expected_slope = working_set[i]['slope']
-                if (abs(self.slope(working_set[i]['p1'], working_set[j]['p0']) - expected_slope) > self.options.collinear_filter_epsilon) \
-                or (abs(self.slope(working_set[i]['p0'], working_set[j]['p1']) - expected_slope) > self.options.collinear_filter_epsilon):
-                    continue
-    
-                # the only remaining permissible configuration: collinear segments with a gap between them
-                # e.g. ---  -----
-                # otherwise we combine segments and flag the set as requiring more processing
-                s0x0 = working_set[i]['p0'][0] 
-                s0x1 = working_set[i]['p1'][0] 
-                s1x0 = working_set[j]['p0'][0] 
-                s1x1 = working_set[j]['p1'][0]
-
-                if not (s0x0 < s0x1 and s0x1 < s1x0 and s1x0 < s1x1):
-                    # make a duplicate set, omitting segments i and j
-                    new_set = [x for (k, x) in enumerate(working_set) if k not in (i, j)]
-                    
-                    # add a segment representing i and j's furthest points
-                    pts = [ working_set[i]['p0'], working_set[i]['p1'], working_set[j]['p0'], working_set[j]['p1'] ]
-                    pts.sort(key=lambda x: x[0])
-
-                    new_set.append({
-                        'p0': pts[0], 
-                        'p1': pts[-1],
-                        'slope': self.slope(pts[0], pts[-1]),
-                        'id': working_set[i]['id'],
-                        'originalPathId': working_set[i]['originalPathId'],
-                        'composed_transform': working_set[i]['composed_transform']
-                        })
-                    return (False, new_set)
-    
-        return (True, working_set)
+            return working_set
+
+        lo = lambda s: min(s['p0'][axis], s['p1'][axis])
+        hi = lambda s: max(s['p0'][axis], s['p1'][axis])
+        working_set.sort(key=lo)
+
+        output_set = []
+        current = current_hi = working_set[0]
+        merged = False
+        for s in working_set[1:]:
+            if lo(s) <= hi(current_hi): # overlap or touch: extend the current segment
+                if hi(s) >= hi(current_hi):
+                    current_hi = s
+                merged = True
+            else: # gap: close the current segment and start a new one
+                output_set.append(self.merged_segment(current, current_hi, axis) if merged else current)
+                current = current_hi = s
+                merged = False
+        output_set.append(self.merged_segment(current, current_hi, axis) if merged else current)
+        return output_set
+
+
+    def collinear(self, s0, s1):
+        '''
+            calculate slope from S0P0 to S1P1 and S0P1 to S1P0
+            if slopes all match the slope of s0, the segments are collinear
+            if not, these segments are parallel but not collinear and should be left alone
+        '''
+        epsilon = self.options.collinear_filter_epsilon
+        for p, q in ((s0['p1'], s1['p0']), (s0['p0'], s1['p1'])):
+            if p != q and abs(self.slope(p, q) - s0['slope']) > epsilon:
+                return False
+        return True
 
 
-    def process_set_y(self, working_set):
-        if len(working_set) < 2:
-            return (True, working_set)
-        
-        # sort working set top to bottom
-        working_set.sort(key=lambda y: -y['p0'][1])
+    def split_collinear(self, working_set):
+        '''
+            Split a bucket of parallel segments into sets of collinear segments.
+            Each segment joins the first set whose first segment is collinear to it
+        '''
+        collinear_sets = []
+        for s in working_set:
+            for collinear_set in collinear_sets:
+                if self.collinear(collinear_set[0], s):
+                    collinear_set.append(s)
+                    break
+            else:
+                collinear_sets.append([s])
+        return collinear_sets
+
+
+    def merged_segment(self, first, highest, axis):
+        ''' a new segment from the lowest point of segment first to the highest point of segment highest '''
+        p0 = min(first['p0'], first['p1'], key=lambda p: p[axis])
+        p1 = max(highest['p1'], highest['p0'], key=lambda p: p[axis])
+        return {
+            'p0': p0,
+            'p1': p1,
+            'slope': self.slope(p0, p1),
+            'id': first['id'],
+            'originalPathId': first['originalPathId'],
+            'composed_transform': first['composed_transform']
+            }
+
 
-        for i in range(0, len(working_set)):
-            for j in range(i + 1, len(working_set)):
-        
-                # the only remaining permissible configuration: collinear segments with a gap between them
-                # e.g. 
-                #   |
-                #   |
-                #
-                #   |
-                #   |
-                #   |
-                #
-                # otherwise we combine segments and flag the set as requiring more processing
-                s0y0 = working_set[i]['p0'][1] 
-                s0y1 = working_set[i]['p1'][1] 
-                s1y0 = working_set[j]['p0'][1] 
-                s1y1 = working_set[j]['p1'][1]
-
-                if not (s0y0 < s0y1 and s0y1 < s1y0 and s1y0 < s1y1):
-                    # make a duplicate set, omitting segments i and j
-                    new_set = [y for (k, y) in enumerate(working_set) if k not in (i, j)]
-                    
-                    # add a segment representing i and j's furthest points
-                    pts = [ working_set[i]['p0'], working_set[i]['p1'], working_set[j]['p0'], working_set[j]['p1'] ]
-                    pts.sort(key=lambda y: y[1])
-                    new_set.append({
-                        'p0': pts[0], 
-                        'p1': pts[-1],
-                        'slope': self.slope(pts[0], pts[-1]),
-                        'id': working_set[i]['id'],
-                        'originalPathId': working_set[i]['originalPathId'],
-                        'composed_transform': working_set[i]['composed_transform']
-                        })
-                    return (False, new_set)
-        
-        return (True, working_set)
- 
-    
     def filter_collinear(self, lineArray):
         ''' Another sweep line algorithm to scan collinear lines
             Loop through a set of lines and find + fiter all overlapping segments / duplicate segments
             finally returns a set of merged-like lines and a set of original items which should be dropped.
-            Based on the style of the algorithm we have no good influence on the z-index of the items because 
-            it is scanned by slope and point coordinates. That's why we have a more special 
+            Lines are bucketed by slope (within collinear_filter_epsilon), then by their intercept with the y axis
+            (x axis for vertical lines, within collinear_filter_distance). The lines of a bucket are split into
+            sets of collinear lines and finally each set is merged by a 1-D interval sweep.
+            Based on the style of the algorithm we have no good influence on the z-index of the items because
+            it is scanned by slope and point coordinates. That's why we have a more special
             'remove_trim_duplicates()' function for trimmed duplicates!
         '''
-        
+
         '''
         filter for regular input lines and special vertical lines
         '''
         input_set = []
         input_ids = []
+        parentTransforms = {} #sub split lines share few parent groups
 
         # collect segments, calculate their slopes, order their points left-to-right
         for line in lineArray:
             #csp = line.path.to_arrays()
             parent = line.getparent()
             if parent is not None:
-                csp = Path(line.path.transform(parent.composed_transform())).to_arrays()
+                parentTransform = parentTransforms.get(parent)
+                if parentTransform is None:
+                    parentTransform = parentTransforms[parent] = parent.composed_transform()
+                csp = Path(line.path.transform(parentTransform)).to_arrays()
             else:
+                parentTransform = transforms.Transform()
                 csp = line.path.to_arrays()
             #self.msg("csp = {}".format(csp))
             x1, y1, x2, y2 = csp[0][1][0], csp[0][1][1], csp[1][1][0], csp[1][1][1]
@@ -454,148 +551,77 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
             s['slope'] = self.slope(s['p0'], s['p1'])
             s['id'] = line.attrib['id']
             s['originalPathId'] = line.attrib['originalPathId']
-            s['composed_transform'] = line.composed_transform()
+            s['composed_transform'] = parentTransform @ line.transform
             #s['d'] = line.attrib['d']
             input_set.append(s)
-    
+            if s['id'] != '': input_ids.append(s['id'])
+
         input_set.sort(key=lambda x: x['slope'])
-        #input_set.append(False) # used to clear out lingering contents of working_set_x on last iteration
 
-        input_set_new = []
-        
-        #loop through input_set to filter out the vertical lines because we need to handle them separately
-        vertical_set = []
-        vertical_ids = []
-        for i in range(0, len(input_set)):
-            if input_set[i]['slope'] == sys.float_info.max:
-                vertical_set.append(input_set[i])
-            else:
-                input_set_new.append(input_set[i])
-        
-        input_set = input_set_new #overwrite the input_set with the filtered one
-        input_set.append(False) # used to clear out lingering contents of working_set_x on last iteration
+        #filter out the vertical lines because we need to handle them separately
+        vertical_set = [s for s in input_set if s['slope'] == sys.float_info.max]
+        input_set = [s for s in input_set if s['slope'] != sys.float_info.max]
 
         '''
         process x lines (all lines except vertical ones)
         '''
-        working_set_x = []
-        working_x_ids = []
+        epsilon = self.options.collinear_filter_epsilon
+        distance = self.options.collinear_filter_distance
         output_set_x = []
-        output_x_ids = []
-        
         if len(input_set) > 0:
-            current_slope = input_set[0]['slope']
-            for input in input_set:
-                # bin sets of input_set by slope (within a tolerance)
-                dm = input and abs(input['slope'] - current_slope) or 0
-                if input and dm < self.options.collinear_filter_epsilon:
-                    working_set_x.append(input) #we put all lines to working set which have similar slopes
-                    if input['id'] != '': input_ids.append(input['id'])
-                else: # slope discontinuity, process accumulated set
-                    while True:
-                        (done, working_set_x) = self.process_set_x(working_set_x)
-                        if done:
-                            output_set_x.extend(working_set_x)
-                            break
-    
-                    if input: # begin new working set
-                        working_set_x = [input]
-                        current_slope = input['slope']
-                        if input['id'] != '': input_ids.append(input['id'])      
-            
-
-            for output_x in output_set_x:
-                output_x_ids.append(output_x['id'])
-    
-            for working_x in working_set_x:
-                working_x_ids.append(working_x['id'])
+            # bin sets of input_set by slope (within a tolerance), then by intercept (within a distance)
+            for slope_set in self.cluster_sorted(input_set, lambda s: s['slope'], epsilon):
+                slope = slope_set[0]['slope']
+                intercept = lambda s: s['p0'][1] - slope * s['p0'][0]
+                slope_set.sort(key=intercept)
+                # lines with a distance d have intercepts which differ by d * sqrt(1 + slope²)
+                for working_set_x in self.cluster_sorted(slope_set, intercept, distance * np.hypot(1.0, slope)):
+                    for collinear_set in self.split_collinear(working_set_x):
+                        output_set_x.extend(self.merge_collinear(collinear_set, 0))
         else:
             if self.options.show_debug is True:
-                self.msg("Scanning: no non-vertical input lines found. That might be okay or not ...")  
-        
+                self.msg("Scanning: no non-vertical input lines found. That might be okay or not ...")
+
         '''
         process vertical lines
         '''
-        working_set_y = []
-        working_y_ids = []
         output_set_y = []
-        output_y_ids = []
-
         if len(vertical_set) > 0:
             vertical_set.sort(key=lambda x: x['p0'][0]) #sort verticals by their x coordinate
-            vertical_set.append(False) # used to clear out lingering contents of working_set_y on last iteration
-            current_x = vertical_set[0]['p0'][0]
-            for vertical in vertical_set:
-                if vertical and current_x == vertical['p0'][0]:
-                    working_set_y.append(vertical) #we put all lines to working set which have same x coordinate
-                    if vertical['id'] != '': vertical_ids.append(vertical['id'])
-                else: # x coord discontinuity, process accumulated set
-                    while True:
-                        (done, working_set_y) = self.process_set_y(working_set_y)
-                        if done:
-                            output_set_y.extend(working_set_y)
-                            break
-                    if vertical: # begin new working set
-                        working_set_y = [vertical]
-                        current_x = vertical['p0'][0]
-                        if vertical['id'] != '': vertical_ids.append(vertical['id'])
+            for working_set_y in self.cluster_sorted(vertical_set, lambda s: s['p0'][0], distance):
+                output_set_y.extend(self.merge_collinear(working_set_y, 1))
         else:
             if self.options.show_debug is True:
-                self.msg("Scanning: no vertical lines found. That might be okay or not ...")  
-                   
-        for output_y in output_set_y:
-            output_y_ids.append(output_y['id'])
-
-        for working_y in working_set_y:
-            working_y_ids.append(working_y['id'])
+                self.msg("Scanning: no vertical lines found. That might be okay or not ...")
 
-        output_set = output_set_x
-        output_set.extend(output_set_y)
-        output_ids = []
-        for output in output_set:
-            #self.msg(output)
-            output_ids.append(output['id'])
+        output_set = output_set_x + output_set_y
+        output_ids = set(output['id'] for output in output_set)
 
         #we finally build a list which contains all overlapping elements we want to drop
-        dropped_ids = []
-        for input_id in input_ids: #if the input_id id is not in the output ids we are going to drop it
-            if input_id not in output_ids:
-               dropped_ids.append(input_id)
-        for vertical_id in vertical_ids: #if the input_id id is not in the output ids we are going to drop it
-            if vertical_id not in output_ids:
-               dropped_ids.append(vertical_id)
+        dropped_ids = [input_id for input_id in input_ids if input_id not in output_ids]
 
         if self.options.show_debug is True:
-            #self.msg("input_set:{}".format(input_set))               
             self.msg("input_ids [{}]:".format(len(input_ids)))
             for input_id in input_ids:
                self.msg(input_id)
-            self.msg("*"*24)     
-            #self.msg("working_set_x:{}".format(working_set_x))                  
-            self.msg("working_x_ids [{}]:".format(len(working_x_ids)))
-            for working_x_id in working_x_ids:
-               self.msg(working_x_id) 
-            self.msg("*"*24)     
-            #self.msg("output_set_x:{}".format(output_set_x))                  
-            self.msg("output_x_ids [{}]:".format(len(output_x_ids)))
-            for output_x_id in output_x_ids:
-               self.msg(output_x_id)
             self.msg("*"*24)
-            #self.msg("output_set_y:{}".format(output_set_y))                  
-            self.msg("output_y_ids [{}]:".format(len(output_y_ids)))
-            for output_y_id in output_y_ids:
-               self.msg(output_y_id)
+            self.msg("output_x_ids [{}]:".format(len(output_set_x)))
+            for output_x in output_set_x:
+               self.msg(output_x['id'])
+            self.msg("*"*24)
+            self.msg("output_y_ids [{}]:".format(len(output_set_y)))
+            for output_y in output_set_y:
+               self.msg(output_y['id'])
             self.msg("*"*24)
-            #self.msg("output_set:{}".format(output_set))                  
-            self.msg("output_ids [{}]:".format(len(output_ids)))
-            for output_id in output_ids:
-               self.msg(output_id)
+            self.msg("output_ids [{}]:".format(len(output_set)))
+            for output in output_set:
+               self.msg(output['id'])
             self.msg("*"*24)
             self.msg("dropped_ids [{}]:".format(len(dropped_ids)))
             for dropped_id in dropped_ids:
                self.msg(dropped_id)
-            self.msg("*"*24)     
-          
+            self.msg("*"*24)
+
         return output_set, dropped_ids
 
 
@@ -605,14 +631,15 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
             note: this function is similar to filter_collinear but we keep it because we have a 'reverse_trim_removal_order' option.
             We can use this option in some special situations where we work without the function 'filter_collinear()'.
         '''
-        totalTrimPaths = []
+        totalTrimPaths = {} #paths bucketed by their end points. Equal paths always share the end points
         if self.options.reverse_trim_removal_order is True:
             allTrimGroups = allTrimGroups[::-1]
         for trimGroup in allTrimGroups:
             for element in trimGroup:
                 path = element.path.transform(element.composed_transform())
-                if path not in totalTrimPaths:
-                    totalTrimPaths.append(path)
+                samePoints = totalTrimPaths.setdefault(tuple((p.x, p.y) for p in path.end_points), [])
+                if path not in samePoints:
+                    samePoints.append(path)
                 else:
                     if self.options.show_debug is True:
                         self.msg("Deleting path {}".format(element.get('id')))
@@ -732,6 +759,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         pars.add_argument("--decimals", type=int, default=3, help="Accuracy for sub split lines / lines trimmed by shapely")
         pars.add_argument("--snap_tolerance", type=float, default=0.1, help="Snap tolerance for intersection points")
         pars.add_argument("--collinear_filter_epsilon", type=float, default=0.01, help="Epsilon for collinear line filter")
+        pars.add_argument("--collinear_filter_distance", type=float, default=0.01, help="Maximum distance (px) between collinear lines")
         #Settings - General Style
         pars.add_argument("--strokewidth", type=float, default=1.0, help="Stroke width (px)")   
         pars.add_argument("--dotsize_intersections", type=int, default=30, help="Dot size (px) for self-intersecting and global intersection points")
@@ -787,6 +815,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         pars.add_argument("--bent_ott_use_paranoid", type=inkex.Boolean, default=False)
         pars.add_argument("--bent_ott_use_vertical", type=inkex.Boolean, default=True)
         pars.add_argument("--bent_ott_number_type", default="native")
+        pars.add_argument("--bent_ott_batched", type=inkex.Boolean, default=False, help="Sweep all paths at once, sweeping paths which do not overlap any other path separately. Trim sub split lines by nearby intersection points only")
 
         #Colors
         pars.add_argument("--color_subsplit", type=Color, default='1630897151', help="sub split lines")   
@@ -820,6 +849,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
             self.msg("Warning: 'Break apart input' setting is enabled. Cannot check accordingly for relative, absolute or mixed paths for breaked elements (they are always absolute)!")
      
         so.strokewidth = self.svg.unittouu("{}px".format(so.strokewidth)) #add unit conversion globally 
+        so.collinear_filter_distance = self.svg.unittouu("{}px".format(so.collinear_filter_distance))
      
         #some configuration dependecies
         if so.highlight_self_intersecting is True or \
@@ -866,25 +896,12 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
             poly_point_isect.USE_VERBOSE = False
         poly_point_isect.USE_PARANOID = so.bent_ott_use_paranoid
         poly_point_isect.USE_VERTICAL = so.bent_ott_use_vertical
-        NUMBER_TYPE = so.bent_ott_number_type
-        if NUMBER_TYPE == 'native':
-            Real = float
-            NUM_EPS = Real("1e-10")
-            NUM_INF = Real(float("inf"))
-        elif NUMBER_TYPE == 'numpy':
-            import numpy
-            Real = numpy.float64
-            del numpy
-            NUM_EPS = Real("1e-10")
-            NUM_INF = Real(float("inf"))
-        poly_point_isect.Real = Real
-        poly_point_isect.NUM_EPS = NUM_EPS
-        poly_point_isect.NUM_INF = NUM_INF
-        poly_point_isect.NUM_EPS_SQ = NUM_EPS * NUM_EPS
-        poly_point_isect.NUM_ZERO = Real(0.0)
-        poly_point_isect.NUM_ONE = Real(1.0)
+        poly_point_isect.set_number_type(so.bent_ott_number_type)
+        self.intersectionIndex = None
+        self.trimGroups = {}
 
         #get all paths which are within selection or in document and generate sub split lines
+        phaseStart = time.perf_counter()
         pathElements = self.get_path_elements()
                   
         subSplitLineArray = []
@@ -1133,7 +1150,8 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     subSplitLineGroup = reversed(subSplitLineGroup) #reverse the order to match the original path segment placing
 
         if so.show_debug is True:
-            self.msg("sub split line count: {}".format(len(subSplitLineArray)))   
+            self.msg("sub split line count: {}".format(len(subSplitLineArray)))
+        phaseStart = self.debug_timing("sub splitting", phaseStart)
 
         '''
         check for collinear lines and apply filters to remove or regroup and to restyle them
@@ -1145,32 +1163,34 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
             if so.show_debug is True: self.msg("filtering collinear overlapping lines / duplicate lines")
             if len(subSplitLineArray) > 0:
                 output_set, dropped_ids = self.filter_collinear(subSplitLineArray)
+                outputs = {output['id']: output for output in output_set}
+                dropped_ids = set(dropped_ids)
                 deleteIndices = []
                 deleteIndice = 0
                 for subSplitLine in subSplitLineArray:
                     '''
                     Replace the overlapping items with the new merged output
                     '''
-                    for output in output_set:
-                        if output['id'] == subSplitLine.attrib['id']:
-                            originalSplitLinePath = subSplitLine.path
-                            output_line = 'M {},{} L {},{}'.format(
-                                output['p0'][0], output['p0'][1], output['p1'][0], output['p1'][1])
-                            output_line_reversed = 'M {},{} L {},{}'.format(
-                                output['p1'][0], output['p1'][1], output['p0'][0], output['p0'][1])
-                            subSplitLine.attrib['d'] = output_line #we set the path using 'd' attribute because if we use trimLine.path the decimals get cut off unwantedly
-                            mergedSplitLinePath = subSplitLine.path
-                            mergedSplitLinePathReversed = Path(output_line_reversed)
-                            #subSplitLine.path = [['M', output['p0']], ['L', output['p1']]] 
-                            #self.msg("composed_transform = {}".format(output['composed_transform']))
-                            #subSplitLine.transform = Transform(-output['composed_transform']) * subSplitLine.transform
-
-                            subSplitLine.path = subSplitLine.path.transform(-output['composed_transform'])
-                            if so.highlight_merges is True:
-                                if originalSplitLinePath != mergedSplitLinePath and \
-                                   originalSplitLinePath != mergedSplitLinePathReversed: #if the path changed we are going to highlight it
-                                    subSplitLine.style = mergesPathStyle
-                                    
+                    output = outputs.get(subSplitLine.attrib['id'])
+                    if output is not None:
+                        originalSplitLinePath = subSplitLine.path
+                        output_line = 'M {},{} L {},{}'.format(
+                            output['p0'][0], output['p0'][1], output['p1'][0], output['p1'][1])
+                        output_line_reversed = 'M {},{} L {},{}'.format(
+                            output['p1'][0], output['p1'][1], output['p0'][0], output['p0'][1])
+                        subSplitLine.attrib['d'] = output_line #we set the path using 'd' attribute because if we use trimLine.path the decimals get cut off unwantedly
+                        mergedSplitLinePath = subSplitLine.path
+                        mergedSplitLinePathReversed = Path(output_line_reversed)
+                        #subSplitLine.path = [['M', output['p0']], ['L', output['p1']]] 
+                        #self.msg("composed_transform = {}".format(output['composed_transform']))
+                        #subSplitLine.transform = Transform(-output['composed_transform']) * subSplitLine.transform
+
+                        subSplitLine.path = subSplitLine.path.transform(-output['composed_transform'])
+                        if so.highlight_merges is True:
+                            if originalSplitLinePath != mergedSplitLinePath and \
+                               originalSplitLinePath != mergedSplitLinePathReversed: #if the path changed we are going to highlight it
+                                subSplitLine.style = mergesPathStyle
+                                
                     
                     '''
                     Delete or move sub split lines which are overlapping
@@ -1210,6 +1230,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     if self.options.show_debug is True:
                         self.msg("Deleting index {} from subSplitLineArray".format(deleteIndice))
                     del subSplitLineArray[deleteIndice]
+            phaseStart = self.debug_timing("collinear filtering", phaseStart)
 
         '''
         now we intersect the sub split lines to find the global intersection points using Bentley-Ottmann algorithm (contains self-intersections too!)
@@ -1217,6 +1238,8 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         if so.draw_trimmed is True:     
             try:
                 allSubSplitLineStrings = []
+                seenSubSplitLineStrings = set()
+                groups = []
                 for subSplitLine in subSplitLineArray:
                     csp = Path(subSplitLine.path.transform(subSplitLine.composed_transform())).to_arrays() #will be buggy if draw subsplit lines is deactivated
                     lineString = [(csp[0][1][0], csp[0][1][1]), (csp[1][1][0], csp[1][1][1])]                    
@@ -1227,18 +1250,29 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     #line.transform = -self.svg.get_current_layer().transform
                     
                     if so.remove_trim_duplicates is True:
-                        if lineString not in allSubSplitLineStrings:
+                        if tuple(lineString) not in seenSubSplitLineStrings:
+                            seenSubSplitLineStrings.add(tuple(lineString))
                             allSubSplitLineStrings.append(lineString)
+                            groups.append(subSplitLine.attrib['originalPathId'])
                         else:
                             if so.show_debug is True:
                                 self.msg("line {} already in sub split line collection. Dropping ...".format(lineString))
                     else: #if false we append all segments without filtering duplicate ones
-                        allSubSplitLineStrings.append(lineString)        
+                        allSubSplitLineStrings.append(lineString)
+                        groups.append(subSplitLine.attrib['originalPathId'])
+                phaseStart = self.debug_timing("collecting sub split lines", phaseStart)
                 if so.show_debug is True:
-                    self.msg("Going to calculate intersections using Bentley Ottmann Sweep Line Algorithm") 
-                globalIntersectionPoints = MultiPoint(isect_segments(allSubSplitLineStrings, validate=True))       
+                    self.msg("Going to calculate intersections using Bentley Ottmann Sweep Line Algorithm")
+                if so.bent_ott_batched is True:
+                    segmentArray = np.array(allSubSplitLineStrings, dtype=np.float64).reshape(-1, 2, 2)
+                    intersectionPoints = self.isect_segments_batched(segmentArray, np.array(groups))
+                    self.index_intersection_points(intersectionPoints)
+                else:
+                    intersectionPoints = isect_segments(allSubSplitLineStrings, validate=True)
+                globalIntersectionPoints = MultiPoint(intersectionPoints)
+                phaseStart = self.debug_timing("Bentley Ottmann sweep", phaseStart)
                 if so.show_debug is True:
-                    self.msg("global intersection points count: {}".format(len(globalIntersectionPoints)))   
+                    self.msg("global intersection points count: {}".format(len(globalIntersectionPoints.geoms)))
                 if len(globalIntersectionPoints.geoms) > 0:
                     if so.visualize_global_intersections is True:
                         self.visualize_global_intersections(globalIntersectionPoints)
@@ -1247,12 +1281,15 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     now we trim the sub split lines at all calculated intersection points. 
                     We do this path by path to keep the logic between original paths, sub split lines and the final output
                     '''                            
-                    allTrimGroups = [] #container to collect all trim groups for later on processing 
+                    allTrimGroups = [] #container to collect all trim groups for later on processing
+                    allTrimGroupIds = set()
                     for subSplitIndex in range(len(subSplitLineArray)):
                         trimGroup = self.build_trim_line_group(subSplitLineArray, subSplitIndex, globalIntersectionPoints)
                         if trimGroup is not None:
-                            if trimGroup not in allTrimGroups:
+                            if trimGroup.get('id') not in allTrimGroupIds:
+                                allTrimGroupIds.add(trimGroup.get('id'))
                                 allTrimGroups.append(trimGroup)
+                    phaseStart = self.debug_timing("trimming", phaseStart)
                  
                     if so.show_debug is True: self.msg("trim groups count: {}".format(len(allTrimGroups)))
                     if len(allTrimGroups) == 0:
@@ -1279,6 +1316,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                                 if self.options.show_debug is True:
                                     self.msg("Deleting group {}".format(ssl_parent.get('id')))
                                 ssl_parent.delete()
+                    phaseStart = self.debug_timing("cleaning up trim lines", phaseStart)
 
             except AssertionError as e:
                 self.msg("Error calculating global intersections.\n\
@@ -51,37 +51,49 @@ X, Y = 0, 1
 
 NUMBER_TYPE = 'native'
 
-if NUMBER_TYPE == 'native':
-    Real = float
-    NUM_EPS = Real("1e-10")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'decimal':
-    # Not passing tests!
-    import decimal
-    Real = decimal.Decimal
-    decimal.getcontext().prec = 80
-    NUM_EPS = Real("1e-10")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'numpy':
-    import numpy
-    Real = numpy.float64
-    del numpy
-    NUM_EPS = Real("1e-10")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'gmpy2':
-    # Not passing tests!
-    import gmpy2
-    gmpy2.set_context(gmpy2.ieee(128))
-    Real = gmpy2.mpz
-    NUM_EPS = Real(float("1e-10"))
-    NUM_INF = gmpy2.get_emax_max()
-    del gmpy2
-else:
-    raise Exception("Type not found")
-
-NUM_EPS_SQ = NUM_EPS * NUM_EPS
-NUM_ZERO = Real(0.0)
-NUM_ONE = Real(1.0)
+
+def set_number_type(number_type):
+    """
+    Switch the number implementation used by the sweep,
+    one of 'native', 'decimal', 'numpy' or 'gmpy2'.
+    """
+    global NUMBER_TYPE, Real, NUM_EPS, NUM_INF, NUM_EPS_SQ, NUM_ZERO, NUM_ONE
+
+    if number_type == 'native':
+        Real = float
+        NUM_EPS = Real("1e-10")
+        NUM_INF = Real(float("inf"))
+    elif number_type == 'decimal':
+        # Not passing tests!
+        import decimal
+        Real = decimal.Decimal
+        decimal.getcontext().prec = 80
+        NUM_EPS = Real("1e-10")
+        NUM_INF = Real(float("inf"))
+    elif number_type == 'numpy':
+        import numpy
+        Real = numpy.float64
+        del numpy
+        NUM_EPS = Real("1e-10")
+        NUM_INF = Real(float("inf"))
+    elif number_type == 'gmpy2':
+        # Not passing tests!
+        import gmpy2
+        gmpy2.set_context(gmpy2.ieee(128))
+        Real = gmpy2.mpz
+        NUM_EPS = Real(float("1e-10"))
+        NUM_INF = gmpy2.get_emax_max()
+        del gmpy2
+    else:
+        raise Exception("Type not found")
+
+    NUMBER_TYPE = number_type
+    NUM_EPS_SQ = NUM_EPS * NUM_EPS
+    NUM_ZERO = Real(0.0)
+    NUM_ONE = Real(1.0)
+
+
+set_number_type(NUMBER_TYPE)
 
 
 class Event:
@@ -546,44 +558,69 @@ class EventQueue:
         return p, events_current
 
 
-def isect_segments_impl(segments, *, include_segments=False, validate=True) -> list:
-    # order points left -> right
+def segments_from_array(segments, *, validate=True) -> list:
+    """
+    Convert a float64 array of shape (n, 2, 2) or (n, 4) into segments
+    ordered left -> right. With validate, points and duplicates are removed,
+    keeping the first occurrence like for list input.
+    """
+    import numpy
+    s = numpy.asarray(segments, dtype=numpy.float64).reshape(-1, 4)
+    # in nearly all cases, comparing X is enough,
+    # but compare Y too for vertical lines
+    swap = (s[:, 0] > s[:, 2]) | ((s[:, 0] == s[:, 2]) & (s[:, 1] > s[:, 3]))
+    s = numpy.where(swap[:, None], s[:, [2, 3, 0, 1]], s)
+    if validate and len(s) > 0:
+        s = s[(s[:, 0] != s[:, 2]) | (s[:, 1] != s[:, 3])]
+        first = numpy.unique(s, axis=0, return_index=True)[1]
+        s = s[numpy.sort(first)]
     if Real is float:
-        segments = [
-            # in nearly all cases, comparing X is enough,
-            # but compare Y too for vertical lines
-            (s[0], s[1]) if (s[0] <= s[1]) else
-            (s[1], s[0])
-            for s in segments]
-    else:
-        segments = [
-            # in nearly all cases, comparing X is enough,
-            # but compare Y too for vertical lines
-            (
-                (Real(s[0][0]), Real(s[0][1])),
-                (Real(s[1][0]), Real(s[1][1])),
-            ) if (s[0] <= s[1]) else
-            (
-                (Real(s[1][0]), Real(s[1][1])),
-                (Real(s[0][0]), Real(s[0][1])),
-            )
-            for s in segments]
+        return [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in s.tolist()]
+    return [((Real(x1), Real(y1)), (Real(x2), Real(y2))) for x1, y1, x2, y2 in s.tolist()]
 
-    # Ensure segments don't have duplicates or single points, see: #24.
-    if validate:
-        segments_old = segments
-        segments = []
-        visited = set()
-        for s in segments_old:
-            # Ignore points.
-            if s[0] == s[1]:
-                continue
-            # Ignore duplicates.
-            if s in visited:
-                continue
-            visited.add(s)
-            segments.append(s)
-        del segments_old
+
+def isect_segments_impl(segments, *, include_segments=False, validate=True) -> list:
+    if hasattr(segments, "ndim"):
+        # float64 array of shape (n, 2, 2) or (n, 4)
+        segments = segments_from_array(segments, validate=validate)
+    else:
+        # order points left -> right
+        if Real is float:
+            segments = [
+                # in nearly all cases, comparing X is enough,
+                # but compare Y too for vertical lines
+                (s[0], s[1]) if (s[0] <= s[1]) else
+                (s[1], s[0])
+                for s in segments]
+        else:
+            segments = [
+                # in nearly all cases, comparing X is enough,
+                # but compare Y too for vertical lines
+                (
+                    (Real(s[0][0]), Real(s[0][1])),
+                    (Real(s[1][0]), Real(s[1][1])),
+                ) if (s[0] <= s[1]) else
+                (
+                    (Real(s[1][0]), Real(s[1][1])),
+                    (Real(s[0][0]), Real(s[0][1])),
+                )
+                for s in segments]
+
+        # Ensure segments don't have duplicates or single points, see: #24.
+        if validate:
+            segments_old = segments
+            segments = []
+            visited = set()
+            for s in segments_old:
+                # Ignore points.
+                if s[0] == s[1]:
+                    continue
+                # Ignore duplicates.
+                if s in visited:
+                    continue
+                visited.add(s)
+                segments.append(s)
+            del segments_old
 
     queue = EventQueue(segments)
     sweep_line = SweepLine(queue)
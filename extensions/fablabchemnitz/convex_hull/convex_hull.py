@@ -4,10 +4,12 @@ import inkex
 import sys
 import numpy as n
 from inkex import PathElement
-from inkex.paths import CubicSuperPath, Path
 from inkex.transforms import Transform
 from lxml import etree
 
+sys.path.append("../path_intersections")
+from bezier_flattening import flatten_path
+
 link = lambda a,b: n.concatenate((a,b[1:]))
 edge = lambda a,b: n.concatenate(([a],[b]))
 
@@ -43,7 +45,9 @@ def qhull(sample):
         sys.setrecursionlimit(20000) #dangerous stuff
         h, t = base
         dists = n.dot(sample-h, n.dot(((0,-1),(1,0)),(t-h)))
-        outer = n.repeat(sample, dists>0, 0)
+        # points (almost) on the base line are no outer points. Without the tolerance rounding noise 
+        # lets (almost) duplicate points recurse endlessly
+        outer = n.repeat(sample, dists > 1e-9 * n.dot(t-h, t-h), 0)
 
         if len(outer):
             pivot = sample[n.argmax(dists)]
@@ -84,17 +88,10 @@ class ConvexHull(inkex.EffectExtension):
             #element.apply_transform()
             
             parent = element.getparent()
-            if parent is not None:
-                csp = Path(element.path.transform(parent.composed_transform())).to_arrays()
-            else:
-                csp = element.path.to_arrays()
-            p = CubicSuperPath(csp)
-
-            for subpath in p: # there may be several paths joined together (e.g. holes)
-                for csp in subpath: # groups of three to handle control points.
-                    # just the points no control points (handles)
-                    n_array.append(csp[1][0])
-                    n_array.append(csp[1][1])
+            transform = parent.composed_transform() if parent is not None else None
+            # flattened curves, so the hull also covers curves bulging out between the nodes
+            for subpath in flatten_path(element.path, transform): # there may be several paths joined together (e.g. holes)
+                n_array.extend(subpath.ravel())
         for child in element.getchildren():
             n_array += self.getControlPoints(child, n_array)
         return n_array
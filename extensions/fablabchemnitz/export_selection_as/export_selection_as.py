@@ -7,6 +7,8 @@ import math
 import os
 import sys
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from subprocess import Popen, PIPE
 import inkex
 from inkex import Rectangle
@@ -25,6 +27,21 @@ logger = logging.getLogger(__name__)
 
 DETACHED_PROCESS = 0x00000008
 GROUP_ID = 'export_selection_transform'
+SCOUR_LOCK = threading.Lock()
+
+class ExportJob:
+    """ one exported document: the elements, their bounding box and the output files """
+
+    def __init__(self, template, elements, bbox, filename_base):
+        self.template = template
+        self.elements = elements
+        self.bbox = bbox
+        self.filename_base = filename_base
+        self.svg_filename = filename_base + '.svg'
+        self.svg_out = os.path.join(tempfile.gettempdir(), self.svg_filename)
+        self.png_out = os.path.join(tempfile.gettempdir(), filename_base + '.png')
+        self.messages = [] #reported after all exports are done
+        self.failed = False
 
 class ExportObject(inkex.EffectExtension):
     
@@ -44,6 +61,8 @@ class ExportObject(inkex.EffectExtension):
         pars.add_argument("--replace_by_png", type=inkex.Boolean, default=False, help="Replace selection by png export")
         pars.add_argument("--newwindow", type=inkex.Boolean, default=False, help="Open file in new Inkscape window")      
         pars.add_argument("--skip_errors", type=inkex.Boolean, default=False, help="Skip on errors")
+        pars.add_argument("--per_object", type=inkex.Boolean, default=False, help="Export each selected object into its own files")
+        pars.add_argument("--max_workers", type=int, default=4, help="Number of exports running at the same time (0 = number of CPUs)")
 
     def openExplorer(self, dir):
         if os.name == 'nt':
@@ -94,13 +113,55 @@ class ExportObject(inkex.EffectExtension):
 
         offset = self.svg.unittouu(str(self.options.border_offset) + self.options.border_offset_unit)
 
-        bbox = inkex.BoundingBox()
-
         selected = self.svg.selected
-        firstId = selected[0].get('id')
-        parent = self.svg.getElementById(firstId).getparent()
+        template_data = self.create_document().tostring() #serialized once, parsed again for each exported document
+
+        jobs = []
+        if self.options.per_object is True:
+            for element in selected.values():
+                if element.tag == inkex.addNS('image', 'svg'):
+                    continue #skip images
+                bbox = self.bounding_box([element], scale_factor)
+                if bbox is None:
+                    return
+                if not bbox: #skipped text element
+                    continue
+                job = self.create_job(template_data, [element], bbox, offset, element.get('id'))
+                if job is not None:
+                    jobs.append(job)
+            if len(jobs) == 0:
+                self.msg("Selection does not contain any vector data.")
+                exit(1)
+        else:
+            bbox = self.bounding_box(selected.values(), scale_factor)
+            if bbox is None:
+                return
+            element = list(selected.values())[-1] #the file is named like the last selected element
+            job = self.create_job(template_data, selected.values(), bbox, offset, element.attrib.get('id', None))
+            if job is None:
+                self.msg("Selection does not contain any vector data.")
+                exit(1)
+            jobs.append(job)
+
+        self.run_jobs(jobs, export_dir)
+
+        if self.options.opendir is True:
+            self.openExplorer(export_dir)
+            
+        for job in jobs:
+            if self.options.newwindow is True:
+                #inkscape(os.path.join(export_dir, job.svg_filename)) #blocking cmd
+                self.spawnIndependentInkscape(job.svg_out) #non-blocking
+            if self.options.replace_by_png is True:
+                self.replace_by_png(job)
 
-        for element in selected.values():
+    def bounding_box(self, elements, scale_factor):
+        """
+        combined bounding box of the elements. Returns None if a text element makes the export
+        impossible and an empty bounding box if all elements were skipped
+        """
+        bbox = inkex.BoundingBox()
+        for element in elements:
             transform = inkex.Transform()
             parent = element.getparent()
             if parent is not None and isinstance(parent, inkex.ShapeElement):
@@ -119,7 +180,7 @@ class ExportObject(inkex.EffectExtension):
                      isinstance (element, inkex.Tspan):
                     if self.options.skip_errors is False:
                         self.msg("Text elements are not supported!")
-                        return
+                        return None
                     else:
                         continue  
                 else:
@@ -131,15 +192,17 @@ class ExportObject(inkex.EffectExtension):
                 x1, y1 = transform.apply_to_point([0, 0])
                 x2, y2 = transform.apply_to_point([1, 1])
                 bbox += inkex.BoundingBox((x1, x2), (y1, y2))
-             
-        template = self.create_document()
-        svg_filename = None
+        return bbox
+
+    def create_job(self, template_data, elements, bbox, offset, filename_base):
+        """ build the document for some elements from the serialized template. Returns None if there is no vector data """
+        template = inkex.load_svg(BytesIO(template_data)).getroot()
 
         group = etree.SubElement(template, '{http://www.w3.org/2000/svg}g')
         group.attrib['id'] = GROUP_ID
         group.attrib['transform'] = str(inkex.Transform(((1, 0, -bbox.left), (0, 1, -bbox.top))))
 
-        for element in self.svg.selected.values():
+        for element in elements:
             if element.tag == inkex.addNS('image', 'svg'):
                 continue #skip images
             elem_copy = deepcopy(element)
@@ -151,137 +214,156 @@ class ExportObject(inkex.EffectExtension):
         template.attrib['width'] = f'{bbox.width + offset * 2}' + self.svg.unit
         template.attrib['height'] = f'{bbox.height + offset * 2}' + self.svg.unit
 
-        if svg_filename is None:
-            filename_base = element.attrib.get('id', None).replace(os.sep, '_')
-            if filename_base:
-                svg_filename = filename_base + '.svg'
+        if filename_base:
+            filename_base = filename_base.replace(os.sep, '_')
         if not filename_base: #should never be the case. Inkscape might crash if the id attribute is empty or not existent due to invalid SVG
             filename_base = self.svg.get_unique_id("selection")
-            svg_filename = filename_base + '.svg'
 
         if len(group) == 0:
-            self.msg("Selection does not contain any vector data.")
-            exit(1)
+            return None
+        return ExportJob(template, list(elements), bbox, filename_base)
 
-        template.append(group)
-        svg_out = os.path.join(tempfile.gettempdir(), svg_filename)
-        
+    def run_jobs(self, jobs, export_dir):
+        """
+        prepare the SVG of each job, then run its format conversions. All steps are run by a
+        pool of max_workers threads, the actual work is done by Inkscape and python subprocesses
+        """
+        max_workers = self.options.max_workers if self.options.max_workers > 0 else os.cpu_count()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            prepared = {executor.submit(self.prepare_svg, job, export_dir): job for job in jobs}
+            conversions = {}
+            for future in as_completed(prepared):
+                job = prepared[future]
+                if self.check_result(future, job):
+                    for conversion in self.conversions(job):
+                        conversions[executor.submit(conversion, job, export_dir)] = job
+            for future in as_completed(conversions):
+                self.check_result(future, conversions[future])
+        for job in jobs:
+            for message in job.messages:
+                self.msg(message)
+
+    def check_result(self, future, job):
+        """ True if a pool task succeeded. Failures are raised or, with skip_errors, reported """
+        try:
+            future.result()
+            return True
+        except Exception as e:
+            if self.options.skip_errors is False:
+                raise
+            job.failed = True
+            job.messages.append("Export of {} failed: {}".format(job.filename_base, e))
+            return False
+
+    def conversions(self, job):
+        """ format conversions to run after the SVG of the job is prepared """
+        conversions = []
+        if self.options.export_dxf is True:
+            conversions.append(self.export_dxf)
+        if self.options.export_pdf is True or self.options.export_png is True or self.options.replace_by_png is True:
+            conversions.append(self.export_inkscape)
+        return conversions
+
+    def prepare_svg(self, job, export_dir):
+        """ write the (ungrouped) SVG of the job into the temp dir and the export dir """
+        self.save_document(job.template, job.svg_out) #export recent file
         if self.options.wrap_transform is False:
-            self.save_document(template, svg_out) #export recent file
             actions_list=[]
             actions_list.append("selection-ungroup")
             actions_list.append("export-type:svg")
-            actions_list.append("export-filename:{}".format(svg_out))
+            actions_list.append("export-filename:{}".format(job.svg_out))
             actions_list.append("export-do") 
             actions = ";".join(actions_list)
-            cli_output = inkscape(svg_out, actions=actions) #process recent file
-            if len(cli_output) > 0:
-                self.msg("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
-                self.msg(cli_output)
-            self.load(svg_out) #reload recent file
-            
-            template = self.svg
+            self.inkscape_job(job, job.svg_out, actions) #process recent file
+            template = inkex.load_svg(job.svg_out).getroot() #reload recent file
             for child in template.getchildren():
                 if child.tag == '{http://www.w3.org/2000/svg}metadata':
                     template.remove(child)
+            job.template = template
 
-        self.save_document(template, svg_out) # save one into temp dir to access for dxf/pdf/new window instance
+        self.save_document(job.template, job.svg_out) # save one into temp dir to access for dxf/pdf/new window instance
 
         if self.options.export_svg is True:
-            self.save_document(template, export_dir / svg_filename)
-        
-        if self.options.opendir is True:
-            self.openExplorer(export_dir)
-            
-        if self.options.newwindow is True:
-            #inkscape(os.path.join(export_dir, svg_filename)) #blocking cmd
-            self.spawnIndependentInkscape(os.path.join(tempfile.gettempdir(), svg_filename)) #non-blocking
-            
-        if self.options.export_dxf is True:
-            #ensure that python command is available #we pass 25.4/96 which stands for unit mm. See inkex.units.UNITS and dxf_outlines.inx
-            cmd = [
-                sys.executable, #the path of the python interpreter which is used for this script 
-                self.options.dxf_exporter_path, 
-                '--output=' + os.path.join(export_dir, filename_base + '.dxf'), 
-                r'--units=25.4/96', 
-                os.path.join(tempfile.gettempdir(), svg_filename)
-                ]
-            proc = Popen(cmd, shell=False, stdout=PIPE, stderr=PIPE)
-            stdout, stderr = proc.communicate()
-            if proc.returncode != 0:
-                inkex.utils.debug("%d %s %s" % (proc.returncode, stdout, stderr))
-
-        if self.options.export_pdf is True:    
-            cli_output = inkscape(os.path.join(tempfile.gettempdir(), svg_filename), actions='export-pdf-version:1.5;export-text-to-path;export-filename:{file_name};export-do'.format(file_name=os.path.join(export_dir, filename_base + '.pdf')))
-            if len(cli_output) > 0:
-                self.msg("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
-                self.msg(cli_output)
-            
+            self.save_document(job.template, export_dir / job.svg_filename)
+
+    def export_dxf(self, job, export_dir):
+        #ensure that python command is available #we pass 25.4/96 which stands for unit mm. See inkex.units.UNITS and dxf_outlines.inx
+        cmd = [
+            sys.executable, #the path of the python interpreter which is used for this script 
+            self.options.dxf_exporter_path, 
+            '--output=' + os.path.join(export_dir, job.filename_base + '.dxf'), 
+            r'--units=25.4/96', 
+            job.svg_out
+            ]
+        proc = Popen(cmd, shell=False, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = proc.communicate()
+        if proc.returncode != 0:
+            job.messages.append("%d %s %s" % (proc.returncode, stdout, stderr))
+
+    def export_inkscape(self, job, export_dir):
+        """ PDF, PNG and the PNG for replacing the selection with a single Inkscape run """
+        actions_list=[]
+        if self.options.export_pdf is True:
+            actions_list.append("export-pdf-version:1.5")
+            actions_list.append("export-text-to-path")
+            actions_list.append("export-filename:{}".format(os.path.join(export_dir, job.filename_base + '.pdf')))
+            actions_list.append("export-do")
+        png_exports = []
         if self.options.export_png is True:
-            png_export=os.path.join(export_dir, filename_base + '.png')
-            try:
-                os.remove(png_export)
-            except OSError as e: 
-                #inkex.utils.debug("Error while deleting previously generated output file " + png_export)
-                pass
-            actions_list=[]
-            actions_list.append("export-background:white")
-            actions_list.append("export-type:png")
-            actions_list.append("export-dpi:{}".format(self.options.png_dpi))
-            actions_list.append("export-filename:{}".format(png_export))
-            actions_list.append("export-do") 
-            actions = ";".join(actions_list)
-            cli_output = inkscape(os.path.join(tempfile.gettempdir(), svg_filename), actions=actions)
-            if len(cli_output) > 0:
-                self.msg("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
-                self.msg(cli_output)
-                
+            png_exports.append(os.path.join(export_dir, job.filename_base + '.png'))
         if self.options.replace_by_png is True:
-            #export to png file to temp
-            png_export=os.path.join(tempfile.gettempdir(), filename_base + '.png')
+            png_exports.append(job.png_out) #export to png file to temp
+        for png_export in png_exports:
             try:
                 os.remove(png_export)
             except OSError as e: 
                 #inkex.utils.debug("Error while deleting previously generated output file " + png_export)
                 pass
-            actions_list=[]
             actions_list.append("export-background:white")
             actions_list.append("export-type:png")
             actions_list.append("export-dpi:{}".format(self.options.png_dpi))
             actions_list.append("export-filename:{}".format(png_export))
             actions_list.append("export-do") 
-            actions = ";".join(actions_list)
-            cli_output = inkscape(os.path.join(tempfile.gettempdir(), svg_filename), actions=actions)
-            if len(cli_output) > 0:
-                self.msg("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
-                self.msg(cli_output)         
-            #then remove the selection and replace it by png
-            #self.msg(parent.get('id'))
-            for element in selected.values():
-                element.delete()
-            #read png file and get base64 string from it
-            try:
-                img = Image.open(png_export)
-            except Image.DecompressionBombError as e: #we could also increse PIL.Image.MAX_IMAGE_PIXELS = some large int
-                self.msg("Error. Image is too large ({} x {} px). Reduce DPI and try again!".format(self.svg.uutounit(bbox.width), self.svg.uutounit(bbox.height)))
-                exit(1)
-            output_buffer = BytesIO()
-            img.save(output_buffer, format='PNG')
-            byte_data = output_buffer.getvalue()
-            base64_str = base64.b64encode(byte_data).decode('UTF-8')
-            #finally replace the svg:path(s) with svg:image
-            imgReplacement = etree.SubElement(Rectangle(), '{http://www.w3.org/2000/svg}image')
-            imgReplacement.attrib['x'] = str(bbox.left)
-            imgReplacement.attrib['y'] = str(bbox.top)
-            imgReplacement.attrib['width'] = str(bbox.width)
-            imgReplacement.attrib['height'] = str(bbox.height)
-            imgReplacement.attrib['id'] = firstId
-            imgReplacement.attrib['{http://www.w3.org/1999/xlink}href'] = "data:image/png;base64,{}".format(base64_str)
-            parent.append(imgReplacement)
-            if parent.attrib.has_key('transform'):
-                del parent.attrib['transform'] #remove transform
-
-                
+        self.inkscape_job(job, job.svg_out, ";".join(actions_list))
+
+    def inkscape_job(self, job, filename, actions):
+        cli_output = inkscape(filename, actions=actions)
+        if len(cli_output) > 0:
+            job.messages.append("Inkscape returned the following output when trying to run the file export; the file export may still have worked:")
+            job.messages.append(cli_output)
+
+    def replace_by_png(self, job):
+        if job.failed:
+            return
+        bbox = job.bbox
+        firstId = job.elements[0].get('id')
+        parent = job.elements[-1].getparent()
+        #then remove the selection and replace it by png
+        #self.msg(parent.get('id'))
+        for element in job.elements:
+            element.delete()
+        #read png file and get base64 string from it
+        try:
+            img = Image.open(job.png_out)
+        except Image.DecompressionBombError as e: #we could also increse PIL.Image.MAX_IMAGE_PIXELS = some large int
+            self.msg("Error. Image is too large ({} x {} px). Reduce DPI and try again!".format(self.svg.uutounit(bbox.width), self.svg.uutounit(bbox.height)))
+            exit(1)
+        output_buffer = BytesIO()
+        img.save(output_buffer, format='PNG')
+        byte_data = output_buffer.getvalue()
+        base64_str = base64.b64encode(byte_data).decode('UTF-8')
+        #finally replace the svg:path(s) with svg:image
+        imgReplacement = etree.SubElement(Rectangle(), '{http://www.w3.org/2000/svg}image')
+        imgReplacement.attrib['x'] = str(bbox.left)
+        imgReplacement.attrib['y'] = str(bbox.top)
+        imgReplacement.attrib['width'] = str(bbox.width)
+        imgReplacement.attrib['height'] = str(bbox.height)
+        imgReplacement.attrib['id'] = firstId
+        imgReplacement.attrib['{http://www.w3.org/1999/xlink}href'] = "data:image/png;base64,{}".format(base64_str)
+        parent.append(imgReplacement)
+        if parent.attrib.has_key('transform'):
+            del parent.attrib['transform'] #remove transform
+
     def create_document(self):
         document = self.svg.copy()
         for child in document.getchildren():
@@ -291,9 +373,11 @@ class ExportObject(inkex.EffectExtension):
         return document
 
     def save_document(self, document, filename):
+        document = document.tostring()
+        with SCOUR_LOCK: #scour is not thread-safe
+            document = scourString(document)
         with open(filename, 'wb') as fp:
-            document = document.tostring()
-            fp.write(scourString(document).encode('utf8'))
+            fp.write(document.encode('utf8'))
 
 
 if __name__ == '__main__':
@@ -17,9 +17,35 @@ import inkex
 import sys
 import argparse
 from io import StringIO
-from math import sqrt ,pi, sin, cos, tan, acos, atan2, fabs
+from math import sqrt ,pi, sin, cos, tan, acos, atan2, fabs, inf
 from lxml import etree
 
+# G-code comments and words, compiled once for all lines.
+COMMENTS = re.compile(r'\([^\)]*\)')
+WORDS = re.compile('([MSGXYZIJKR])([-.0-9]+)')
+
+# Report progress every so many lines.
+PROGRESS_LINES = 100000
+
+def tokenizeGCode(gcode_file, progress=False):
+    """ Yield the words (code, value) of each line of a G-code file.
+
+    Lines are read one at a time, so the file is never held in memory.
+    Lines starting with ';' are comments and yield no words.
+    """
+    count = 0
+    for count, line in enumerate(gcode_file, 1):
+        if line.startswith(";"):
+            yield []
+        else:
+            yield WORDS.findall(COMMENTS.sub('', line))
+        if progress and not count % PROGRESS_LINES:
+            sys.stderr.write('\rRead {} lines'.format(count))
+            sys.stderr.flush()
+    if progress:
+        sys.stderr.write('\rRead {} lines\n'.format(count))
+        sys.stderr.flush()
+
 class ImportGCode:
     """ Import a GCode file and process it into an SVG. """
     current_id = 0
@@ -27,7 +53,8 @@ class ImportGCode:
     
     def __init__(self,gcode_filename,v_carve=False,laser_mode=False,
                  ignore_z=True,label_z=True,
-                 tool_diameter=1.0,v_angle=90.0,v_top=0.0,v_step=1.0):
+                 tool_diameter=1.0,v_angle=90.0,v_top=0.0,v_step=1.0,
+                 progress=False):
         """ Load a GCode file and process it into an SVG. """
         self.unit = 1.0
         self.ignore_z = ignore_z or v_carve
@@ -40,6 +67,7 @@ class ImportGCode:
         self.laser_mode = laser_mode
         self.spindle = False
         self.speed = 0
+        self.progress = progress
         with open(gcode_filename) as file:
             self.loadGCode(file)
         self.createSVG()
@@ -212,13 +240,13 @@ class ImportGCode:
         """
         vs = v_segments
         # Move to the starting point.
-        path = 'M {} {} '.format(vs[0][1][0][0],vs[0][1][0][1])
+        path = ['M {} {} '.format(vs[0][1][0][0],vs[0][1][0][1])]
         # Initial arc, if it's not a point.
         if vs[0][0][0][2] > 0:
-            path += ('A {} {} 0 {} {} {} {} '
+            path.append(('A {} {} 0 {} {} {} {} '
                     ).format(vs[0][0][0][2],vs[0][0][0][2],
                                  1 if (vs[0][0][0][2] > vs[0][0][1][2]) else 0,
-                                 0,vs[0][1][1][0],vs[0][1][1][1])
+                                 0,vs[0][1][1][0],vs[0][1][1][1]))
         # Step through all the segments on the way to the other end.
         for v in range(len(vs)-1):
             # Check whether an intersection exists between the two
@@ -228,25 +256,25 @@ class ImportGCode:
                                                      vs[v+1][1][1],
                                                      vs[v+1][1][2])
             if included: #line segments
-                path += 'L {} {} '.format(x,y)
+                path.append('L {} {} '.format(x,y))
             else:
-                path += ('L {} {} A {} {} 0 {} {} {} {} '
+                path.append(('L {} {} A {} {} 0 {} {} {} {} '
                         ).format(vs[v][1][2][0],vs[v][1][2][1],
                                      vs[v][0][1][2],vs[v][0][1][2],
                                      self.isLargeAngle(vs[v][0][1],
                                                        vs[v][1][2],
                                                        vs[v+1][1][1]),
-                                     0,vs[v+1][1][1][0],vs[v+1][1][1][1])
+                                     0,vs[v+1][1][1][0],vs[v+1][1][1][1]))
         # Connecting line.
-        path += 'L {} {} '.format(vs[len(vs)-1][1][2][0],
-                                  vs[len(vs)-1][1][2][1])
+        path.append('L {} {} '.format(vs[len(vs)-1][1][2][0],
+                                     vs[len(vs)-1][1][2][1]))
         # Switchback arc, if it's not a point.
         if vs[len(vs)-1][0][1][2] > 0:
-            path += ('A {} {} 0 {} {} {} {} '
+            path.append(('A {} {} 0 {} {} {} {} '
                     ).format(vs[len(vs)-1][0][1][2],vs[len(vs)-1][0][1][2],
                              1 if (vs[len(vs)-1][0][1][2] >
                                    vs[len(vs)-2][0][0][2]) else 0,
-                             0,vs[len(vs)-1][1][3][0],vs[len(vs)-1][1][3][1])
+                             0,vs[len(vs)-1][1][3][0],vs[len(vs)-1][1][3][1]))
         # Step through all the segments on the way back home.
         for v in range(len(vs)-1,0,-1):
             # Check whether an intersection exists between the two
@@ -256,18 +284,18 @@ class ImportGCode:
                                                      vs[v-1][1][3],
                                                      vs[v-1][1][0])
             if included: #line segments
-                path += 'L {} {} '.format(x,y)
+                path.append('L {} {} '.format(x,y))
             else:
-                path += ('L {} {} A {} {} 0 {} {} {} {} '
+                path.append(('L {} {} A {} {} 0 {} {} {} {} '
                         ).format(vs[v][1][0][0],vs[v][1][0][1],
                                  vs[v-1][0][1][2],vs[v-1][0][1][2],
                                  self.isLargeAngle(vs[v-1][0][1],
                                                    vs[v][1][0],
                                                    vs[v-1][1][3]),
-                                 0,vs[v-1][1][3][0],vs[v-1][1][3][1])
+                                 0,vs[v-1][1][3][0],vs[v-1][1][3][1]))
         # And finally, close the curve.
-        path += 'Z'
-        return path
+        path.append('Z')
+        return ''.join(path)
             
     def getVsegment(self,x1,y1,z1,x2,y2,z2):
         """ Compute the required data to define a V-carve segment. """
@@ -276,17 +304,15 @@ class ImportGCode:
         p = self.getTangentPoints(x1,y1,r1,x2,y2,r2)
         return (((x1,y1,r1),(x2,y2,r2)),p)
         
-    def parseLine(self,command,X,Y,Z,line,no_path=False):
+    def parseLine(self,command,X,Y,Z,words,no_path=False):
         """ Parse a line of G-code. 
         
         This takes the current coordinates and modal command, then processes
-        the new line of G-code to yield a new ending set of coordinates
-        plus values necessary for curve computations.  It also returns the
-        resulting path data, unless otherwise indicated, e.g. for V-carves.
+        the words of the new line of G-code (see tokenizeGCode) to yield a new
+        ending set of coordinates plus values necessary for curve computations.
+        It also returns the resulting path data, unless otherwise indicated,
+        e.g. for V-carves.
         """
-        comments = re.compile('\([^\)]*\)')
-        commands = re.compile('([MSGXYZIJKR])([-.0-9]+)')
-        
         lastX = X
         lastY = Y
         lastZ = Z
@@ -294,71 +320,68 @@ class ImportGCode:
         J = 0.0
         K = 0.0
         R = None
-        results = commands.findall(comments.sub('',line))
-        if not line.startswith(";"):
-
-            for (code,val) in results:
-                v = float(val)
-                i = int(v)
-                
-                if code == 'M':
-                    if i == 3:
-                        self.spindle = True
-                    elif i == 5:
-                        self.spindle = False
-                elif code == 'S':
-                    self.speed = v
-                elif code == 'G':
-                    if i == 0:
-                        command = 'G0'
-                    elif i == 1:
-                        command = 'G1'
-                    elif i == 2:
-                        command = 'G2'
-                    elif i == 3:
-                        command = 'G3'
-                    elif i == 20:
-                        self.unit = 25.4
-                    elif i == 21:
-                        self.unit = 1.0
-                    elif val == "90":
-                        self.absolute = True
-                    elif val == "91":
-                        self.absolute = False
-                    elif val == "90.1":
-                        self.absoluteIJK = True
-                    elif val == "91.1":
-                        self.absoluteIJK = False
-                elif code == 'X':
-                    if self.absolute:
-                        X = v * self.unit
-                    else:
-                        X += v * self.unit
-                elif code == 'Y':
-                    if self.absolute:
-                        Y = v * self.unit
-                    else:
-                        Y += v * self.unit
-                elif code == 'Z':
-                    if self.absolute:
-                        Z = v * self.unit
-                    else:
-                        Z += v * self.unit
-                elif code == 'I':
-                    I = v * self.unit
-                    if self.absoluteIJK:
-                        I -= X
-                elif code == 'J':
-                    J = v * self.unit
-                    if self.absoluteIJK:
-                        J -= Y
-                elif code == 'K':
-                    # Sure, process it, but we don't *do* anything with K.
-                    K = v * self.unit
-                    if self.absoluteIJK:
-                        K -= Z
-                elif code == 'R':
-                    R = v * self.unit
+        for (code,val) in words:
+            v = float(val)
+            i = int(v)
+            
+            if code == 'M':
+                if i == 3:
+                    self.spindle = True
+                elif i == 5:
+                    self.spindle = False
+            elif code == 'S':
+                self.speed = v
+            elif code == 'G':
+                if i == 0:
+                    command = 'G0'
+                elif i == 1:
+                    command = 'G1'
+                elif i == 2:
+                    command = 'G2'
+                elif i == 3:
+                    command = 'G3'
+                elif i == 20:
+                    self.unit = 25.4
+                elif i == 21:
+                    self.unit = 1.0
+                elif val == "90":
+                    self.absolute = True
+                elif val == "91":
+                    self.absolute = False
+                elif val == "90.1":
+                    self.absoluteIJK = True
+                elif val == "91.1":
+                    self.absoluteIJK = False
+            elif code == 'X':
+                if self.absolute:
+                    X = v * self.unit
+                else:
+                    X += v * self.unit
+            elif code == 'Y':
+                if self.absolute:
+                    Y = v * self.unit
+                else:
+                    Y += v * self.unit
+            elif code == 'Z':
+                if self.absolute:
+                    Z = v * self.unit
+                else:
+                    Z += v * self.unit
+            elif code == 'I':
+                I = v * self.unit
+                if self.absoluteIJK:
+                    I -= X
+            elif code == 'J':
+                J = v * self.unit
+                if self.absoluteIJK:
+                    J -= Y
+            elif code == 'K':
+                # Sure, process it, but we don't *do* anything with K.
+                K = v * self.unit
+                if self.absoluteIJK:
+                    K -= Z
+            elif code == 'R':
+                R = v * self.unit
 
         if no_path: # V-carving doesn't need any path data.
             return ((command, X, Y, Z, I, J, K, R, ''))
@@ -403,25 +426,23 @@ class ImportGCode:
         return ((command, X, Y, Z, I, J, K, R, path))
 
     def savePath(self,path,Z):
-        """ Save a set of path data, filing it by Z if appropriate. """
+        """ Save a set of path data, filing it by Z if appropriate. 
+
+        Duplicate paths are only kept once, at the deepest Z they occur.
+        """
         if (path.find('A') == -1) and (path.find('L') == -1):
             return #empty path
         if self.ignore_z:
-            if path not in self.paths:
-                self.paths.add(path)
-        else:
-            try:
-                if path not in self.paths_by_z[Z]:
-                    self.paths_by_z[Z].add(path)
-            except KeyError:
-                self.paths_by_z[Z] = set([path])
-        
-    def loadGCode(self,gcode_file):
-        """ Load a G-code file, handling the contents. """
-        if self.ignore_z:
-            self.paths = set([])
-        else:
-            self.paths_by_z = {}
+            self.paths.setdefault(path)
+        elif Z < self.path_depths.get(path, inf):
+            self.path_depths[path] = Z
+
+    def generatePaths(self,lines):
+        """ Generate the path data of the G-code lines, given as words.
+
+        Yields (path, Z) for each path once it's complete, so only the
+        path being built is kept in memory.
+        """
         self.absolute = True
         self.absoluteIJK = False
         self.unit=1.0
@@ -439,12 +460,11 @@ class ImportGCode:
         self.maxY = 0.0
         self.maxZ = 0.0
         
-        path = ''
-        line = gcode_file.readline()
+        path = []
         v_segments = []
-        while line:
+        for words in lines:
             command,X,Y,Z,I,J,K,R,path_data = self.parseLine(command, 
-                                                             X, Y, Z, line,
+                                                             X, Y, Z, words,
                                                              self.v_carve)
             self.minX = X if X < self.minX else self.minX
             self.maxX = X if X > self.maxX else self.maxX
@@ -457,8 +477,8 @@ class ImportGCode:
             if self.v_carve:
                 if (lastX != X) or (lastY != Y):
                     if command == 'G1':
-                        v_segments += [self.getVsegment(lastX, lastY, lastZ,
-                                                        X, Y, Z)]
+                        v_segments.append(self.getVsegment(lastX, lastY, lastZ,
+                                                           X, Y, Z))
                     elif (command == 'G2') or (command == 'G3'):
                         # We don't attempt to handle the plethora of curves
                         # that can result from V-carving arcs.  Instead, we
@@ -470,14 +490,14 @@ class ImportGCode:
                         iY = lastY
                         iZ = lastZ
                         for p in points:
-                            v_segments += [self.getVsegment(iX, iY, iZ,
-                                                            p[0], p[1], p[2])]
+                            v_segments.append(self.getVsegment(iX, iY, iZ,
+                                                               p[0], p[1], p[2]))
                             iX = p[0]
                             iY = p[1]
                             iZ = p[2]
                     else:
                         if len(v_segments):
-                            self.savePath(self.makeVcarve(v_segments),'VCarve')
+                            yield self.makeVcarve(v_segments), 'VCarve'
                         v_segments = []
             # Standard mode (non-V-carve).
             else:
@@ -485,35 +505,43 @@ class ImportGCode:
                     (not self.ignore_z and (Z != lastZ)) or 
                     (self.laser_mode and ((not self.spindle) or 
                                           (self.speed == 0)))):
-                    if (path != ''):
-                        self.savePath(path,lastZ)
-                        path = ''
+                    if path:
+                        yield ''.join(path), lastZ
+                        path = []
                 if (((command == 'G1') or 
                      (command == 'G2') or 
-                     (command == 'G3')) and (path == '')):
-                    path = 'M {} {} {}'.format(lastX,lastY,path_data)
-                else:
-                    path += path_data
+                     (command == 'G3')) and not path):
+                    path = ['M {} {} '.format(lastX,lastY), path_data]
+                elif path_data:
+                    path.append(path_data)
             lastX = X
             lastY = Y
             lastZ = Z
-            line = gcode_file.readline()
         # Always remember to save the tail end of your work.
         if self.v_carve:
             if len(v_segments):
-                self.savePath(self.makeVcarve(v_segments),'VCarve')
+                yield self.makeVcarve(v_segments), 'VCarve'
+        else:
+            if path:
+                yield ''.join(path), lastZ
+
+    def loadGCode(self,gcode_file):
+        """ Load a G-code file, handling the contents. """
+        if self.ignore_z:
+            self.paths = {}
         else:
-            if (path != ''):
-                self.savePath(path,lastZ)
+            self.path_depths = {}
+        lines = tokenizeGCode(gcode_file, self.progress)
+        for path, Z in self.generatePaths(lines):
+            self.savePath(path, Z)
             
     def filterPaths(self):
-        """ Filter out duplicate paths, leaving only the deepest instance. """
+        """ Group the paths by Z, each at the deepest Z it was found at. """
         if self.ignore_z:
             return
-        z_depths = sorted(self.paths_by_z,None,None,True)
-        for i in range(0,len(z_depths)):
-            for j in range(i+1, len(z_depths)):
-                self.paths_by_z[z_depths[i]] -= self.paths_by_z[z_depths[j]]
+        self.paths_by_z = {}
+        for path, Z in self.path_depths.items():
+            self.paths_by_z.setdefault(Z, []).append(path)
     
     def next_id(self):
         """ Return an incrementing value. """
@@ -625,6 +653,7 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--tool_diameter', help='Tool diameter / path width.', default=None)
     parser.add_argument('-u', '--units',  help='Dialog units.', default='mm')
     parser.add_argument('-z', '--z_axis', help='Z-axis: ignore,group,label', default=False)
+    parser.add_argument('-p', '--progress', action='store_true', help='Report the number of lines read to stderr.')
     parser.add_argument('--tab')
     parser.add_argument('--inputhelp')
     parser.add_argument('inputfile')
@@ -668,5 +697,5 @@ if __name__ == '__main__':
     ignore_z = (args.z_axis == 'ignore')
     label_z = (args.z_axis == 'label')
      
-    gc = ImportGCode(args.inputfile, v_carve, laser_mode, ignore_z, label_z, diameter, v_angle, v_top, v_step)
+    gc = ImportGCode(args.inputfile, v_carve, laser_mode, ignore_z, label_z, diameter, v_angle, v_top, v_step, args.progress)
     gc.doc.write(sys.stdout.buffer)
\ No newline at end of file
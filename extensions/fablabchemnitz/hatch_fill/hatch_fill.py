@@ -98,10 +98,15 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 import math
+import sys
+import numpy
 from lxml import etree
 import inkex
 from inkex import Transform
-from inkex.paths import Path, CubicSuperPath
+from inkex.paths import Path
+
+sys.path.append("../path_intersections")
+from bezier_flattening import flatten_path
 
 N_PAGE_WIDTH = 3200
 N_PAGE_HEIGHT = 800
@@ -124,10 +129,6 @@ RADIAN_TOLERANCE_FOR_COLINEAR = 0.1
 RADIAN_TOLERANCE_FOR_ALTERNATING_DIRECTION = 0.1
 # Pragmatic adjustment again, as with colinearity tolerance
 
-RECURSION_LIMIT = 500
-# Pragmatic - if too high, risk runtime python error;
-# if too low, miss some chances for reducing pen lifts
-
 EXTREME_POS = 1.0e70  # Extremely large positive number
 EXTREME_NEG = -1.0e70  # Extremely large negative number
 
@@ -304,128 +305,9 @@ def interstices(self, p1, p2, paths, hatches, b_hold_back_hatches, f_hold_back_s
                 if 0.0 <= s <= 1.0:
                     # Save this intersection point along the hatch line
                     if b_hold_back_hatches:
-                        # We will need to know how the hatch meets the polygon segment, so that we can
-                        # calculate the end of a shorter line that stops short
-                        # of the polygon segment.
-                        # We compute the angle now while we have the information required,
-                        # but do _not_ apply it now, as we need the real,original, intersects
-                        # for the odd/even inside/outside operations yet to come.
-                        # Note that though the intersect() routine _could_ compute the join angle,
-                        # we do it here because we go thru here much less often than we go thru intersect().
-                        angle_hatch_radians = math.atan2(
-                            -(p2[1] - p1[1]), (p2[0] - p1[0])
-                        )  # from p1 toward p2, cartesian coordinates
-                        angle_segment_radians = math.atan2(
-                            -(p4[1] - p3[1]), (p4[0] - p3[0])
-                        )  # from p3 toward p4, cartesian coordinates
-                        angle_difference_radians = (
-                            angle_hatch_radians - angle_segment_radians
+                        d_and_a.append(
+                            (s, path) + hold_back_lengths(p1, p2, p3, p4, s, f_hold_back_steps)
                         )
-                        # coerce to range -pi to +pi
-                        if angle_difference_radians > math.pi:
-                            angle_difference_radians -= 2 * math.pi
-                        elif angle_difference_radians < -math.pi:
-                            angle_difference_radians += 2 * math.pi
-                        f_sin_of_join_angle = math.sin(angle_difference_radians)
-                        f_abs_sin_of_join_angle = abs(f_sin_of_join_angle)
-                        if (
-                            f_abs_sin_of_join_angle != 0.0
-                        ):  # Worrying about case of intersecting a segment parallel to the hatch
-                            prelim_length_to_be_removed = (
-                                f_hold_back_steps / f_abs_sin_of_join_angle
-                            )
-                            b_unconditionally_excise_hatch = False
-                        else:
-                            b_unconditionally_excise_hatch = True
-
-                        if not b_unconditionally_excise_hatch:
-                            # The relevant end of the segment is the end from which the hatch approaches at an acute angle.
-                            intersection = [0, 0]
-                            intersection[0] = p1[0] + s * (
-                                p2[0] - p1[0]
-                            )  # compute intersection point of hatch with segment
-                            intersection[1] = p1[1] + s * (
-                                p2[1] - p1[1]
-                            )  # intersecting hatch line starts at p1, vectored toward p2,
-                            # but terminates at intersection
-                            # Note that atan2 returns answer in range -pi to pi
-                            # Which end is the approach end of the hatch to the segment?
-                            # The dot product tells the answer:
-                            #    if dot product is positive, p2 is at the p4 end,
-                            #    else p2 is at the p3 end
-                            # We really don't need to take the time to actually take
-                            #     the cosine of the angle, we are just interested in
-                            #    the quadrant within which the angle lies.
-                            # I'm sure there is an elegant way to do this, but I'll settle for results just now.
-                            # If the angle is in quadrants I or IV then p4 is the relevant end, otherwise p3 is
-                            # nb: Y increases down, rather than up
-                            # nb: difference angle has been forced to the range -pi to +pi
-                            if abs(angle_difference_radians) < math.pi / 2:
-                                # It's near the p3 the relevant end from which the hatch departs
-                                dist_intersection_to_relevant_end = math.hypot(
-                                    p3[0] - intersection[0], p3[1] - intersection[1]
-                                )
-                                dist_intersection_to_irrelevant_end = math.hypot(
-                                    p4[0] - intersection[0], p4[1] - intersection[1]
-                                )
-                            else:
-                                # It's near the p4 end from which the hatch departs
-                                dist_intersection_to_relevant_end = math.hypot(
-                                    p4[0] - intersection[0], p4[1] - intersection[1]
-                                )
-                                dist_intersection_to_irrelevant_end = math.hypot(
-                                    p3[0] - intersection[0], p3[1] - intersection[1]
-                                )
-
-                            # Now, the problem defined in issue 22 is that we may not need to remove the
-                            # entire preliminary length we've calculated.  This problem occurs because
-                            # we have so far been considering the polygon segment as a line of infinite extent.
-                            # Thus, we may be holding back at a point where no holdback is required, when
-                            # calculated holdback is well beyond the position of the segment end.
-
-                            # To make matters worse, we do not currently know whether we're
-                            # starting a hatch or terminating a hatch, because the duplicates have
-                            # yet to be removed.  All we can do then, is calculate the required
-                            # line shortening for both possibilities - and then choose the correct
-                            # one after duplicate-removal, when actually finalizing the hatches.
-
-                            # Let's see if either end, or perhaps both ends, has a case of excessive holdback
-
-                            # First, default assumption is that neither end has excessive holdback
-                            length_remove_starting_hatch = prelim_length_to_be_removed
-                            length_remove_ending_hatch = prelim_length_to_be_removed
-
-                            # Now check each of the two ends
-                            if prelim_length_to_be_removed > (
-                                dist_intersection_to_relevant_end + f_hold_back_steps
-                            ):
-                                # Yes, would be excessive holdback approaching from this direction
-                                length_remove_starting_hatch = (
-                                    dist_intersection_to_relevant_end
-                                    + f_hold_back_steps
-                                )
-                            if prelim_length_to_be_removed > (
-                                dist_intersection_to_irrelevant_end + f_hold_back_steps
-                            ):
-                                # Yes, would be excessive holdback approaching from other direction
-                                length_remove_ending_hatch = (
-                                    dist_intersection_to_irrelevant_end
-                                    + f_hold_back_steps
-                                )
-
-                            d_and_a.append(
-                                (
-                                    s,
-                                    path,
-                                    length_remove_starting_hatch,
-                                    length_remove_ending_hatch,
-                                )
-                            )
-                        else:
-                            d_and_a.append(
-                                (s, path, 123456.0, 123456.0)
-                            )  # Mark for complete hatch excision, hatch is parallel to segment
-                            # Just a random number guaranteed large enough to be longer than any hatch length
                     else:
                         d_and_a.append(
                             (s, path, 0, 0)
@@ -433,6 +315,258 @@ def interstices(self, p1, p2, paths, hatches, b_hold_back_hatches, f_hold_back_s
 
                 p3 = p4
 
+    hatch_segments(self, p1, p2, d_and_a, hatches, b_hold_back_hatches)
+
+
+def hold_back_lengths(p1, p2, p3, p4, s, f_hold_back_steps):
+    """
+    Compute by how much the hatch line p1 & p2 has to be shortened where it
+    crosses the polygon edge p3 & p4 at the fractional distance s, in order
+    to stay f_hold_back_steps away from the edge. Returns the lengths to
+    remove when starting a hatch and when ending a hatch at this intersection.
+    """
+
+    # We will need to know how the hatch meets the polygon segment, so that we can
+    # calculate the end of a shorter line that stops short
+    # of the polygon segment.
+    # We compute the angle now while we have the information required,
+    # but do _not_ apply it now, as we need the real,original, intersects
+    # for the odd/even inside/outside operations yet to come.
+    # Note that though the intersect() routine _could_ compute the join angle,
+    # we do it here because we go thru here much less often than we go thru intersect().
+    angle_hatch_radians = math.atan2(
+        -(p2[1] - p1[1]), (p2[0] - p1[0])
+    )  # from p1 toward p2, cartesian coordinates
+    angle_segment_radians = math.atan2(
+        -(p4[1] - p3[1]), (p4[0] - p3[0])
+    )  # from p3 toward p4, cartesian coordinates
+    angle_difference_radians = (
+        angle_hatch_radians - angle_segment_radians
+    )
+    # coerce to range -pi to +pi
+    if angle_difference_radians > math.pi:
+        angle_difference_radians -= 2 * math.pi
+    elif angle_difference_radians < -math.pi:
+        angle_difference_radians += 2 * math.pi
+    f_sin_of_join_angle = math.sin(angle_difference_radians)
+    f_abs_sin_of_join_angle = abs(f_sin_of_join_angle)
+    if (
+        f_abs_sin_of_join_angle != 0.0
+    ):  # Worrying about case of intersecting a segment parallel to the hatch
+        prelim_length_to_be_removed = (
+            f_hold_back_steps / f_abs_sin_of_join_angle
+        )
+        b_unconditionally_excise_hatch = False
+    else:
+        b_unconditionally_excise_hatch = True
+
+    if not b_unconditionally_excise_hatch:
+        # The relevant end of the segment is the end from which the hatch approaches at an acute angle.
+        intersection = [0, 0]
+        intersection[0] = p1[0] + s * (
+            p2[0] - p1[0]
+        )  # compute intersection point of hatch with segment
+        intersection[1] = p1[1] + s * (
+            p2[1] - p1[1]
+        )  # intersecting hatch line starts at p1, vectored toward p2,
+        # but terminates at intersection
+        # Note that atan2 returns answer in range -pi to pi
+        # Which end is the approach end of the hatch to the segment?
+        # The dot product tells the answer:
+        #    if dot product is positive, p2 is at the p4 end,
+        #    else p2 is at the p3 end
+        # We really don't need to take the time to actually take
+        #     the cosine of the angle, we are just interested in
+        #    the quadrant within which the angle lies.
+        # I'm sure there is an elegant way to do this, but I'll settle for results just now.
+        # If the angle is in quadrants I or IV then p4 is the relevant end, otherwise p3 is
+        # nb: Y increases down, rather than up
+        # nb: difference angle has been forced to the range -pi to +pi
+        if abs(angle_difference_radians) < math.pi / 2:
+            # It's near the p3 the relevant end from which the hatch departs
+            dist_intersection_to_relevant_end = math.hypot(
+                p3[0] - intersection[0], p3[1] - intersection[1]
+            )
+            dist_intersection_to_irrelevant_end = math.hypot(
+                p4[0] - intersection[0], p4[1] - intersection[1]
+            )
+        else:
+            # It's near the p4 end from which the hatch departs
+            dist_intersection_to_relevant_end = math.hypot(
+                p4[0] - intersection[0], p4[1] - intersection[1]
+            )
+            dist_intersection_to_irrelevant_end = math.hypot(
+                p3[0] - intersection[0], p3[1] - intersection[1]
+            )
+
+        # Now, the problem defined in issue 22 is that we may not need to remove the
+        # entire preliminary length we've calculated.  This problem occurs because
+        # we have so far been considering the polygon segment as a line of infinite extent.
+        # Thus, we may be holding back at a point where no holdback is required, when
+        # calculated holdback is well beyond the position of the segment end.
+
+        # To make matters worse, we do not currently know whether we're
+        # starting a hatch or terminating a hatch, because the duplicates have
+        # yet to be removed.  All we can do then, is calculate the required
+        # line shortening for both possibilities - and then choose the correct
+        # one after duplicate-removal, when actually finalizing the hatches.
+
+        # Let's see if either end, or perhaps both ends, has a case of excessive holdback
+
+        # First, default assumption is that neither end has excessive holdback
+        length_remove_starting_hatch = prelim_length_to_be_removed
+        length_remove_ending_hatch = prelim_length_to_be_removed
+
+        # Now check each of the two ends
+        if prelim_length_to_be_removed > (
+            dist_intersection_to_relevant_end + f_hold_back_steps
+        ):
+            # Yes, would be excessive holdback approaching from this direction
+            length_remove_starting_hatch = (
+                dist_intersection_to_relevant_end
+                + f_hold_back_steps
+            )
+        if prelim_length_to_be_removed > (
+            dist_intersection_to_irrelevant_end + f_hold_back_steps
+        ):
+            # Yes, would be excessive holdback approaching from other direction
+            length_remove_ending_hatch = (
+                dist_intersection_to_irrelevant_end
+                + f_hold_back_steps
+            )
+        return length_remove_starting_hatch, length_remove_ending_hatch
+    else:
+        # Mark for complete hatch excision, hatch is parallel to segment
+        # Just a random number guaranteed large enough to be longer than any hatch length
+        return 123456.0, 123456.0
+
+
+def interstices_batch(self, grid, paths, hatches, b_hold_back_hatches, f_hold_back_steps):
+    """
+    Vectorized equivalent of calling interstices() for every hatch line
+    (x1, y1, x2, y2) of grid.
+
+    All polygon edges are packed into one NumPy edge array. Since hatch lines
+    of the same angle are parallel, each of them is identified by its offset
+    along the common normal. Sorting the lines by offset, the lines an edge can
+    cross are found by a binary search for the offset range of the edge. The
+    intersections of all these (hatch line, edge) candidates are then computed
+    at once with the same arithmetic as intersect(), and handed to the same
+    post-processing as interstices(), grouped per hatch line.
+    """
+
+    if len(grid) == 0:
+        return
+
+    # Pack the polygon edges, remembering the node each edge belongs to
+    nodes = []
+    edge_chunks = []
+    node_chunks = []
+    edge_points = []  # the original (p3, p4) of every edge, for the hold back computation
+    for path in paths:
+        for subpath in paths[path]:
+            if len(subpath) < 2:
+                continue
+            vertices = numpy.array([(pt[0], pt[1]) for pt in subpath], dtype=float)
+            edge_chunks.append(numpy.hstack((vertices[:-1], vertices[1:])))
+            node_chunks.append(numpy.full(len(vertices) - 1, len(nodes)))
+            edge_points.extend(zip(subpath[:-1], subpath[1:]))
+        nodes.append(path)
+    if len(edge_chunks) == 0:
+        return
+    edges = numpy.vstack(edge_chunks)
+    edge_nodes = numpy.concatenate(node_chunks)
+
+    lines = numpy.array(grid, dtype=float)
+    d21x = lines[:, 2] - lines[:, 0]
+    d21y = lines[:, 3] - lines[:, 1]
+
+    # Group the hatch lines by angle (there are two angles when cross hatching)
+    angles = numpy.round(numpy.arctan2(d21y, d21x), 9)
+    candidate_lines = []
+    candidate_edges = []
+    for angle in numpy.unique(angles):
+        family = numpy.nonzero(angles == angle)[0]
+        length = math.hypot(d21x[family[0]], d21y[family[0]])
+        nx = -d21y[family[0]] / length
+        ny = d21x[family[0]] / length
+        offsets = lines[family, 0] * nx + lines[family, 1] * ny
+        order = numpy.argsort(offsets)
+        family = family[order]
+        offsets = offsets[order]
+
+        edge_offsets_1 = edges[:, 0] * nx + edges[:, 1] * ny
+        edge_offsets_2 = edges[:, 2] * nx + edges[:, 3] * ny
+        # Widen the ranges a little, the exact test below sorts out the extra candidates
+        tolerance = 1e-7 * (1.0 + numpy.abs(offsets).max())
+        first = numpy.searchsorted(offsets, numpy.minimum(edge_offsets_1, edge_offsets_2) - tolerance, "left")
+        last = numpy.searchsorted(offsets, numpy.maximum(edge_offsets_1, edge_offsets_2) + tolerance, "right")
+        counts = last - first
+        total = counts.sum()
+        if total == 0:
+            continue
+        # Expand every edge into its (line, edge) candidate pairs
+        pair_edges = numpy.repeat(numpy.arange(len(edges)), counts)
+        starts = numpy.repeat(first - (numpy.cumsum(counts) - counts), counts)
+        candidate_lines.append(family[starts + numpy.arange(total)])
+        candidate_edges.append(pair_edges)
+
+    if len(candidate_lines) == 0:
+        return
+    li = numpy.concatenate(candidate_lines)
+    ei = numpy.concatenate(candidate_edges)
+
+    # Same arithmetic as intersect(), for all candidates at once
+    p1x = lines[li, 0]
+    p1y = lines[li, 1]
+    p3x = edges[ei, 0]
+    p3y = edges[ei, 1]
+    dx = d21x[li]
+    dy = d21y[li]
+    d43x = edges[ei, 2] - p3x
+    d43y = edges[ei, 3] - p3y
+    d = dx * d43y - dy * d43x
+    valid = d != 0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        sb = ((p1y - p3y) * dx - (p1x - p3x) * dy) / d
+        sa = ((p1y - p3y) * d43x - (p1x - p3x) * d43y) / d
+    valid &= (sb >= 0) & (sb <= 1) & (sa >= 0) & (sa <= 1)
+
+    li = li[valid]
+    ei = ei[valid]
+    sa = sa[valid]
+    # Visit the intersections line by line, and per line in edge order like interstices() does
+    order = numpy.lexsort((ei, li))
+    li = li[order]
+    ei = ei[order]
+    sa = sa[order]
+    line_starts = numpy.flatnonzero(numpy.r_[True, li[1:] != li[:-1]]) if len(li) else []
+    line_ends = list(line_starts[1:]) + [len(li)]
+
+    for start, end in zip(line_starts, line_ends):
+        h = grid[li[start]]
+        p1 = (h[0], h[1])
+        p2 = (h[2], h[3])
+        d_and_a = []
+        for k in range(start, end):
+            s = float(sa[k])
+            path = nodes[edge_nodes[ei[k]]]
+            if b_hold_back_hatches:
+                p3, p4 = edge_points[ei[k]]
+                d_and_a.append(
+                    (s, path) + hold_back_lengths(p1, p2, p3, p4, s, f_hold_back_steps)
+                )
+            else:
+                d_and_a.append((s, path, 0, 0))
+        hatch_segments(self, p1, p2, d_and_a, hatches, b_hold_back_hatches)
+
+
+def hatch_segments(self, p1, p2, d_and_a, hatches, b_hold_back_hatches):
+    """
+    Turn the intersections d_and_a of the hatch line p1 & p2 with the polygon
+    edges into hatch line segments, see interstices().
+    """
+
     # Return now if there were no intersections
     if len(d_and_a) == 0:
         return None
@@ -579,42 +713,6 @@ def inverseTransform(tran):
     ]
 
 
-import inkex.bezier
-
-
-def subdivideCubicPath(sp, flat, i=1):
-    """
-    Break up a bezier curve into smaller curves, each of which
-    is approximately a straight line within a given tolerance
-    (the "smoothness" defined by [flat]).
-
-    to avoid recurrence.
-    """
-
-    while True:
-        while True:
-            if i >= len(sp):
-                return
-
-            p0 = sp[i - 1][1]
-            p1 = sp[i - 1][2]
-            p2 = sp[i][0]
-            p3 = sp[i][1]
-
-            b = (p0, p1, p2, p3)
-
-            if inkex.bezier.maxdist(b) > flat:
-                break
-
-            i += 1
-
-        one, two = inkex.bezier.beziersplitatt(b, 0.5)
-        sp[i - 1][2] = one[1]
-        sp[i][0] = two[2]
-        p = [one[2], one[3], two[1]]
-        sp[i:1] = [p]
-
-
 def distanceSquared(p1, p2):
     """
     Pythagorean distance formula WITHOUT the square root.  Since
@@ -629,6 +727,47 @@ def distanceSquared(p1, p2):
     return dx * dx + dy * dy
 
 
+class SegmentEndGrid:
+    """
+    Uniform grid over the end points of the hatch segments. The cell size
+    equals the neighborhood radius, so all end points within that radius
+    of a reference point are found in the 3 x 3 cells around it.
+    """
+
+    def __init__(self, abs_line_segments, radius):
+        self.cell_size = max(radius, F_MINGAP_SMALL_VALUE)
+        self.cells = {}
+        for n_segment, segment in abs_line_segments.items():
+            if not segment[2]:
+                for n_end_index in range(2):
+                    self.cells.setdefault(self.cellOf(segment[n_end_index]), set()).add(
+                        (n_segment, n_end_index)
+                    )
+
+    def cellOf(self, pt):
+        return (
+            int(math.floor(pt[0] / self.cell_size)),
+            int(math.floor(pt[1] / self.cell_size)),
+        )
+
+    def remove(self, abs_line_segments, n_segment):
+        for n_end_index in range(2):
+            cell = self.cells.get(self.cellOf(abs_line_segments[n_segment][n_end_index]))
+            if cell is not None:
+                cell.discard((n_segment, n_end_index))
+
+    def neighbors(self, pt):
+        """
+        Yields (segment index, end index) of all end points in the cells around pt
+        """
+        col, row = self.cellOf(pt)
+        for c in range(col - 1, col + 2):
+            for r in range(row - 1, row + 2):
+                cell = self.cells.get((c, r))
+                if cell:
+                    yield from cell
+
+
 class HatchFill(inkex.Effect):
     def __init__(self):
 
@@ -656,6 +795,7 @@ class HatchFill(inkex.Effect):
         self.arg_parser.add_argument( "--hatchAngle", type=float, default=90.0, help="Angle of inclination for hatch lines", )
         self.arg_parser.add_argument( "--hatchSpacing", type=float, default=10.0, help="Spacing between hatch lines", )
         self.arg_parser.add_argument( "--tolerance", type=float, default=20.0, help="Allowed deviation from original paths", )
+        self.arg_parser.add_argument( "--batchIntersections", type=inkex.Boolean, default=True, help="Compute all hatch line intersections at once with NumPy", )
         self.arg_parser.add_argument( "--tab", default="splash")
 
     def getDocProps(self):
@@ -710,40 +850,13 @@ class HatchFill(inkex.Effect):
             return
 
         # parsePath() may raise an exception.  This is okay
-        sp = inkex.paths.Path(path).to_arrays()
-        if not sp or len(sp) == 0:
-            return
-
-        # Get a cubic super duper path
-        p = CubicSuperPath(sp)
-        if not p or len(p) == 0:
-            return
-
-        # Apply any transformation
-        if transform is not None:
-            Path(p).transform(transform)
-
-        # Now traverse the simplified path
+        # Flatten the curves within the tolerance (the path is kept in its
+        # own coordinates, the transform is stored below)
         subpaths = []
-        subpath_vertices = []
-        for sp in p:
-            # We've started a new subpath
-            # See if there is a prior subpath and whether we should keep it
-            if len(subpath_vertices):
-                if distanceSquared(subpath_vertices[0], subpath_vertices[-1]) < 1:
-                    # Keep the prior subpath: it appears to be a closed path
-                    subpaths.append(subpath_vertices)
-            subpath_vertices = []
-            subdivideCubicPath(sp, float(self.options.tolerance / 100))
-            for csp in sp:
-                # Add this vertex to the list of vertices
-                subpath_vertices.append(csp[1])
-
-        # Handle final subpath
-        if len(subpath_vertices):
-            if distanceSquared(subpath_vertices[0], subpath_vertices[-1]) < 1:
-                # Path appears to be closed so let's keep it
-                subpaths.append(subpath_vertices)
+        for vertices in flatten_path(path, tolerance=float(self.options.tolerance / 100)):
+            if distanceSquared(vertices[0], vertices[-1]) < 1:
+                # Keep the subpath: it appears to be a closed path
+                subpaths.append(vertices.tolist())
 
         # Empty path?
         if len(subpaths) == 0:
@@ -880,16 +993,7 @@ class HatchFill(inkex.Effect):
                                 False,
                             )
                         # Now loop over our hatch lines looking for intersections
-                        for h in self.grid:
-                            interstices(
-                                self,
-                                (h[0], h[1]),
-                                (h[2], h[3]),
-                                self.paths,
-                                self.hatches,
-                                self.options.holdBackHatchFromEdges,
-                                self.options.holdBackSteps,
-                            )
+                        self.intersectHatchGrid()
 
             elif node.tag in [inkex.addNS("rect", "svg"), "rect"]:
 
@@ -934,16 +1038,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
-                        interstices(
-                            self,
-                            (h[0], h[1]),
-                            (h[2], h[3]),
-                            self.paths,
-                            self.hatches,
-                            self.options.holdBackHatchFromEdges,
-                            self.options.holdBackSteps,
-                        )
+                    self.intersectHatchGrid()
 
             elif node.tag in [inkex.addNS("line", "svg"), "line"]:
 
@@ -980,16 +1075,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
-                        interstices(
-                            self,
-                            (h[0], h[1]),
-                            (h[2], h[3]),
-                            self.paths,
-                            self.hatches,
-                            self.options.holdBackHatchFromEdges,
-                            self.options.holdBackSteps,
-                        )
+                    self.intersectHatchGrid()
 
             elif node.tag in [inkex.addNS("polyline", "svg"), "polyline"]:
 
@@ -1037,16 +1123,7 @@ class HatchFill(inkex.Effect):
                                 False,
                             )
                             # Now loop over our hatch lines looking for intersections
-                        for h in self.grid:
-                            interstices(
-                                self,
-                                (h[0], h[1]),
-                                (h[2], h[3]),
-                                self.paths,
-                                self.hatches,
-                                self.options.holdBackHatchFromEdges,
-                                self.options.holdBackSteps,
-                            )
+                        self.intersectHatchGrid()
 
             elif node.tag in [inkex.addNS("polygon", "svg"), "polygon"]:
                 # Convert
@@ -1085,16 +1162,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
-                        interstices(
-                            self,
-                            (h[0], h[1]),
-                            (h[2], h[3]),
-                            self.paths,
-                            self.hatches,
-                            self.options.holdBackHatchFromEdges,
-                            self.options.holdBackSteps,
-                        )
+                    self.intersectHatchGrid()
 
             elif node.tag in [
                 inkex.addNS("ellipse", "svg"),
@@ -1154,16 +1222,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                     # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
-                        interstices(
-                            self,
-                            (h[0], h[1]),
-                            (h[2], h[3]),
-                            self.paths,
-                            self.hatches,
-                            self.options.holdBackHatchFromEdges,
-                            self.options.holdBackSteps,
-                        )
+                    self.intersectHatchGrid()
 
             elif node.tag in [inkex.addNS("pattern", "svg"), "pattern"]:
                 pass
@@ -1328,6 +1387,31 @@ class HatchFill(inkex.Effect):
 
         return ret_value
 
+    def intersectHatchGrid(self):
+        """
+        Intersect all hatch lines of the grid with the paths collected so far
+        """
+        if self.options.batchIntersections:
+            interstices_batch(
+                self,
+                self.grid,
+                self.paths,
+                self.hatches,
+                self.options.holdBackHatchFromEdges,
+                self.options.holdBackSteps,
+            )
+        else:
+            for h in self.grid:
+                interstices(
+                    self,
+                    (h[0], h[1]),
+                    (h[2], h[3]),
+                    self.paths,
+                    self.hatches,
+                    self.options.holdBackHatchFromEdges,
+                    self.options.holdBackSteps,
+                )
+
     def effect(self):
 
         global ref_count
@@ -1493,6 +1577,11 @@ class HatchFill(inkex.Effect):
                     transformed_hatch_spacing
                 )
                 # Just fixed and simple for now - may make function of neighborhood later
+                # Index all segment ends, so that only nearby ends are examined when joining
+                end_grid = SegmentEndGrid(
+                    abs_line_segments,
+                    math.sqrt(f_proposed_neighborhood_radius_squared),
+                )
 
                 for ref_count in range(
                     n_abs_line_segment_total
@@ -1519,104 +1608,21 @@ class HatchFill(inkex.Effect):
                             123456  # just a random large number
                         )
                         for n_ref_end_index in range(2):
-                            pt_reference = abs_line_segments[ref_count][n_ref_end_index]
-                            pt_reference_other_end = abs_line_segments[ref_count][
-                                not n_ref_end_index
-                            ]
-                            f_reference_direction_radians = math.atan2(
-                                pt_reference_other_end[1] - pt_reference[1],
-                                pt_reference_other_end[0] - pt_reference[0],
-                            )  # from other end to this end
-                            # The following is just a simple copy from the routine in recursivelyAppendNearbySegments procedure
-                            # Look through all possibilities to choose the closest that fulfills all requirements e.g. direction and colinearity
-                            for innerCount in range(
-                                n_abs_line_segment_total
-                            ):  # investigate all segments
-                                if not abs_line_segments[innerCount][2]:
-                                    # This segment currently undrawn, so it is a candidate for a path extension
-                                    # Need to check both ends of each and every proposed segment so we can find the most appropriate one
-                                    # Define pt2 in the reference as the end which we want to extend
-                                    for nNewSegmentInitialEndIndex in range(2):
-                                        # First try initial end of test segment (aka pt1) vs final end (aka pt2) of reference segment
-                                        if (
-                                            innerCount != ref_count
-                                        ):  # don't investigate self ends
-                                            delta_x = (
-                                                abs_line_segments[innerCount][
-                                                    nNewSegmentInitialEndIndex
-                                                ][0]
-                                                - pt_reference[0]
-                                            )  # proposed initial pt1 X minus existing final pt1 X
-                                            delta_y = (
-                                                abs_line_segments[innerCount][
-                                                    nNewSegmentInitialEndIndex
-                                                ][1]
-                                                - pt_reference[1]
-                                            )  # proposed initial pt1 Y minus existing final pt1 Y
-                                            if (
-                                                (delta_x * delta_x + delta_y * delta_y)
-                                                < f_proposed_neighborhood_radius_squared
-                                            ):
-                                                f_this_distance_squared = (
-                                                    delta_x * delta_x
-                                                    + delta_y * delta_y
-                                                )
-                                                pt_new_segment_this_end = abs_line_segments[
-                                                    innerCount
-                                                ][
-                                                    nNewSegmentInitialEndIndex
-                                                ]
-                                                pt_new_segment_other_end = abs_line_segments[
-                                                    innerCount
-                                                ][
-                                                    not nNewSegmentInitialEndIndex
-                                                ]
-                                                f_new_segment_direction_radians = math.atan2(
-                                                    pt_new_segment_this_end[1]
-                                                    - pt_new_segment_other_end[1],
-                                                    pt_new_segment_this_end[0]
-                                                    - pt_new_segment_other_end[0],
-                                                )  # from other end to this end
-                                                # If this end would cause an alternating direction,
-                                                # then exclude it
-                                                if not self.WouldBeAnAlternatingDirection(
-                                                    f_reference_direction_radians,
-                                                    f_new_segment_direction_radians,
-                                                ):
-                                                    pass
-                                                elif (
-                                                    f_this_distance_squared
-                                                    < f_closest_distance_squared
-                                                ):
-                                                    # One other thing could rule out choosing this segment end:
-                                                    # Want to screen and remove two segments that, while close enough,
-                                                    # should be disqualified because they are colinear.  The reason for this is that
-                                                    # if they are colinear, they arose from the same global grid line, which means
-                                                    # that the gap between them arises from intersections with the boundary.
-                                                    # The idea here is that, all things being more-or-less equal,
-                                                    # we would like to give preference to connecting to a segment
-                                                    # which is the reverse of our current direction.  This makes for better
-                                                    # bezier curve join.
-                                                    # The criterion for being colinear is that the reference segment angle is effectively
-                                                    # the same as the line connecting the reference segment to the end of the new segment.
-                                                    f_joiner_direction_radians = math.atan2(
-                                                        pt_new_segment_this_end[1]
-                                                        - pt_reference[1],
-                                                        pt_new_segment_this_end[0]
-                                                        - pt_reference[0],
-                                                    )
-                                                    if not self.AreCoLinear(
-                                                        f_reference_direction_radians,
-                                                        f_joiner_direction_radians,
-                                                    ):
-                                                        # not colinear
-                                                        f_closest_distance_squared = (
-                                                            f_this_distance_squared
-                                                        )
-                                                        b_found_segment_to_add = True
-                                                        n_ref_end_index_at_closest = (
-                                                            n_ref_end_index
-                                                        )
+                            # Only the segment ends in the grid cells around the reference end can be close enough
+                            closest = self.findClosestJoinableEnd(
+                                end_grid,
+                                abs_line_segments,
+                                ref_count,
+                                n_ref_end_index,
+                                f_proposed_neighborhood_radius_squared,
+                            )
+                            if (
+                                closest is not None
+                                and closest[0] < f_closest_distance_squared
+                            ):
+                                f_closest_distance_squared = closest[0]
+                                b_found_segment_to_add = True
+                                n_ref_end_index_at_closest = n_ref_end_index
 
                         # At last we've looked at all the candidate segment ends, as related to all the reference ends
                         if not b_found_segment_to_add:
@@ -1653,6 +1659,7 @@ class HatchFill(inkex.Effect):
                             ] = True  # True flags that this line segment has been
                             # added to the path to be drawn, so should
                             # no longer be a candidate for any kind of move.
+                            end_grid.remove(abs_line_segments, ref_count)
                             n_pen_lifts += 1
                         else:
                             # Found segment to add, and we must get to it in absolute terms
@@ -1720,6 +1727,7 @@ class HatchFill(inkex.Effect):
                             ] = True  # True flags that this line segment has been
                             # added to the path to be drawn, so should
                             # no longer be a candidate for any kind of move.
+                            end_grid.remove(abs_line_segments, ref_count)
                             n_pen_lifts += 1
                             # Now comes the speedup logic:
                             # We've just drawn a segment starting at an absolute, not relative, position.
@@ -1727,15 +1735,14 @@ class HatchFill(inkex.Effect):
                             # Look for an as-yet-not-drawn segment which has a beginning or ending
                             # point "near" the end point of this absolute draw, and leave the pen down
                             # while moving to and then drawing this found line.
-                            # Do this recursively, marking each segment True to show that
+                            # Repeat this until no more segment can be appended, marking each segment True to show that
                             # it has been "drawn" already.
                             # pt2 is the reference point, ie. the point from which the next segment will start
-                            path = self.recursivelyAppendNearbySegments(
+                            path = self.appendNearbySegments(
                                 transformed_hatch_spacing,
-                                0,
+                                end_grid,
                                 ref_count,
                                 n_ref_end_index_at_closest,
-                                n_abs_line_segment_total,
                                 abs_line_segments,
                                 path,
                                 relative_held_line_pos,
@@ -1743,135 +1750,110 @@ class HatchFill(inkex.Effect):
 
                 self.joinFillsWithNode(key, stroke_width, path[:-1])
 
-    def recursivelyAppendNearbySegments(
+    def findClosestJoinableEnd(
+        self,
+        end_grid,
+        abs_line_segments,
+        n_ref_segment_count,
+        n_ref_end_index,
+        f_proposed_neighborhood_radius_squared,
+    ):
+        """
+        Find the closest end of an undrawn segment which may be joined to the
+        given end of the reference segment. Returns a tuple of
+        (distance squared, segment index, end index, delta x, delta y) or None.
+        Of equally close ends, the one of the lowest segment index is chosen.
+        """
+        pt_reference = abs_line_segments[n_ref_segment_count][n_ref_end_index]
+        pt_reference_other_end = abs_line_segments[n_ref_segment_count][
+            not n_ref_end_index
+        ]
+        f_reference_direction_radians = math.atan2(
+            pt_reference_other_end[1] - pt_reference[1],
+            pt_reference_other_end[0] - pt_reference[0],
+        )  # from other end to this end
+
+        closest = None
+        for n_segment, n_end_index in end_grid.neighbors(pt_reference):
+            if n_segment == n_ref_segment_count:  # don't investigate self ends
+                continue
+            pt_new_segment_this_end = abs_line_segments[n_segment][n_end_index]
+            delta_x = pt_new_segment_this_end[0] - pt_reference[0]
+            delta_y = pt_new_segment_this_end[1] - pt_reference[1]
+            f_this_distance_squared = delta_x * delta_x + delta_y * delta_y
+            if f_this_distance_squared >= f_proposed_neighborhood_radius_squared:
+                continue
+            if closest is not None and (f_this_distance_squared, n_segment, n_end_index) >= closest[:3]:
+                continue
+            pt_new_segment_other_end = abs_line_segments[n_segment][not n_end_index]
+            f_new_segment_direction_radians = math.atan2(
+                pt_new_segment_this_end[1] - pt_new_segment_other_end[1],
+                pt_new_segment_this_end[0] - pt_new_segment_other_end[0],
+            )  # from other end to this end
+            if not self.WouldBeAnAlternatingDirection(
+                f_reference_direction_radians, f_new_segment_direction_radians
+            ):
+                # If this end would cause an alternating direction,
+                # then exclude it regardless of how close it is
+                continue
+            # One other thing could rule out choosing this segment end:
+            # Want to screen and remove two segments that, while close enough,
+            # should be disqualified because they are colinear.  The reason for this is that
+            # if they are colinear, they arose from the same global grid line, which means
+            # that the gap between them arises from intersections with the boundary.
+            # The idea here is that, all things being more-or-less equal,
+            # we would like to give preference to connecting to a segment
+            # which is the reverse of our current direction.  This makes for better
+            # bezier curve join.
+            # The criterion for being colinear is that the reference segment angle is effectively
+            # the same as the line connecting the reference segment to the end of the new segment.
+            f_joiner_direction_radians = math.atan2(delta_y, delta_x)
+            if self.AreCoLinear(f_reference_direction_radians, f_joiner_direction_radians):
+                continue
+            closest = (f_this_distance_squared, n_segment, n_end_index, delta_x, delta_y)
+        return closest
+
+    def appendNearbySegments(
         self,
         transformed_hatch_spacing,
-        n_recursion_count,
+        end_grid,
         n_ref_segment_count,
         n_ref_end_index,
-        n_abs_line_segment_total,
         abs_line_segments,
         cumulative_path,
         relative_held_line_pos,
     ):
-
+        """
+        Keep the pen down and chain undrawn segments onto the end of the reference
+        segment, one at a time, until no suitable segment is left in its neighborhood.
+        """
         global pt_last_position_abs
         f_proposed_neighborhood_radius_squared = self.ProposeNeighborhoodRadiusSquared(
             transformed_hatch_spacing
         )
 
-        # Look through all possibilities to choose the closest
-        b_found_segment_to_add = False  # default assumption
-        n_new_segment_end1_index_at_closest = 0
-        n_outer_count_at_closest = -1
-        f_closest_distance_squared = 123456789.0  # just a random large number
-
-        pt_reference = abs_line_segments[n_ref_segment_count][n_ref_end_index]
-        pt_reference_other_end = abs_line_segments[n_ref_segment_count][
-            not n_ref_end_index
-        ]
-        f_reference_delta_x = pt_reference_other_end[0] - pt_reference[0]
-        f_reference_delta_y = pt_reference_other_end[1] - pt_reference[1]
-        f_reference_direction_radians = math.atan2(
-            f_reference_delta_y, f_reference_delta_x
-        )  # from other end to this end
-
-        for outerCount in range(n_abs_line_segment_total):  # investigate all segments
-            if not abs_line_segments[outerCount][2]:
-                # This segment currently undrawn, so it is a candidate for a path extension
-
-                # Need to check both ends of each and every proposed segment until we find one in the neighborhood
-                # Defines pt2 in the reference as the end which we want to extend
-
-                for n_new_segment_end1_index in range(2):
-                    # First try initial end of test segment (aka pt1) vs final end (aka pt2) of reference segment
-                    if outerCount != n_ref_segment_count:  # don't investigate self ends
-                        delta_x = (
-                            abs_line_segments[outerCount][n_new_segment_end1_index][0]
-                            - pt_reference[0]
-                        )  # proposed initial pt1 X minus existing final pt1 X
-                        delta_y = (
-                            abs_line_segments[outerCount][n_new_segment_end1_index][1]
-                            - pt_reference[1]
-                        )  # proposed initial pt1 Y minus existing final pt1 Y
-                        if (
-                            delta_x * delta_x + delta_y * delta_y
-                        ) < f_proposed_neighborhood_radius_squared:
-                            f_this_distance_squared = (
-                                delta_x * delta_x + delta_y * delta_y
-                            )
-                            pt_new_segment_this_end = abs_line_segments[outerCount][
-                                n_new_segment_end1_index
-                            ]
-                            pt_new_segment_other_end = abs_line_segments[outerCount][
-                                not n_new_segment_end1_index
-                            ]
-                            f_new_segment_Dx = (
-                                pt_new_segment_this_end[0] - pt_new_segment_other_end[0]
-                            )
-                            f_new_segment_Dy = (
-                                pt_new_segment_this_end[1] - pt_new_segment_other_end[1]
-                            )
-                            f_new_segment_direction_radians = math.atan2(
-                                f_new_segment_Dy, f_new_segment_Dx
-                            )  # from other end to this end
-                            if not self.WouldBeAnAlternatingDirection(
-                                f_reference_direction_radians,
-                                f_new_segment_direction_radians,
-                            ):
-                                # If this end would cause an alternating direction,
-                                # then exclude it regardless of how close it is
-                                pass
-
-                            elif f_this_distance_squared < f_closest_distance_squared:
-                                # One other thing could rule out choosing this segment end:
-                                # Want to screen and remove two segments that, while close enough,
-                                # should be disqualified because they are colinear.  The reason for this is that
-                                # if they are colinear, they arose from the same global grid line, which means
-                                # that the gap between them arises from intersections with the boundary.
-                                # The idea here is that, all things being more-or-less equal,
-                                # we would like to give preference to connecting to a segment
-                                # which is the reverse of our current direction.  This makes for better
-                                # bezier curve join.
-                                # The criterion for being colinear is that the reference segment angle is effectively
-                                # the same as the line connecting the reference segment to the end of the new segment.
-
-                                f_joiner_direction_radians = math.atan2(
-                                    pt_new_segment_this_end[1] - pt_reference[1],
-                                    pt_new_segment_this_end[0] - pt_reference[0],
-                                )
-                                if not self.AreCoLinear(
-                                    f_reference_direction_radians,
-                                    f_joiner_direction_radians,
-                                ):
-                                    # not colinear
-                                    f_closest_distance_squared = f_this_distance_squared
-                                    b_found_segment_to_add = True
-                                    n_new_segment_end1_index_at_closest = (
-                                        n_new_segment_end1_index
-                                    )
-                                    n_outer_count_at_closest = outerCount
-                                    delta_x_at_closest = delta_x
-                                    delta_y_at_closest = delta_y
-
-        # At last we've looked at all the candidate segment ends
-        n_recursion_count += 1
-        if not b_found_segment_to_add or n_recursion_count >= RECURSION_LIMIT:
-            cumulative_path += "{0:f},{1:f} ".format(
-                relative_held_line_pos[0], relative_held_line_pos[1]
-            )  # close out this segment
-            pt_last_position_abs[0] += relative_held_line_pos[0]
-            pt_last_position_abs[1] += relative_held_line_pos[1]
-            return cumulative_path  # No undrawn segments were suitable for appending,
-            # or there were so many that we worry about python recursion limit
-        else:
-            n_new_segment_end1_index = n_new_segment_end1_index_at_closest
+        while True:
+            closest = self.findClosestJoinableEnd(
+                end_grid,
+                abs_line_segments,
+                n_ref_segment_count,
+                n_ref_end_index,
+                f_proposed_neighborhood_radius_squared,
+            )
+            if closest is None:
+                cumulative_path += "{0:f},{1:f} ".format(
+                    relative_held_line_pos[0], relative_held_line_pos[1]
+                )  # close out this segment
+                pt_last_position_abs[0] += relative_held_line_pos[0]
+                pt_last_position_abs[1] += relative_held_line_pos[1]
+                return cumulative_path  # No undrawn segments were suitable for appending
+
+            _, count, n_new_segment_end1_index, delta_x, delta_y = closest
             n_new_segment_end2_index = not n_new_segment_end1_index
             # n_new_segment_end1_index is 0 for connecting to pt1,
             # and is 1 for connecting to pt2
-            count = n_outer_count_at_closest  # count is the index of the segment to be appended.
-            delta_x = delta_x_at_closest  # delta from final end of incoming segment to initial end of outgoing segment
-            delta_y = delta_y_at_closest
+            # count is the index of the segment to be appended.
+            # delta is from final end of incoming segment to initial end of outgoing segment
 
             # First, move pen to initial end (may be either its pt1 or its pt2) of new segment
 
@@ -2007,18 +1989,11 @@ class HatchFill(inkex.Effect):
 
             # Mark this segment as drawn
             abs_line_segments[count][2] = True
+            end_grid.remove(abs_line_segments, count)
 
-            cumulative_path = self.recursivelyAppendNearbySegments(
-                transformed_hatch_spacing,
-                n_recursion_count,
-                count,
-                n_new_segment_end2_index,
-                n_abs_line_segment_total,
-                abs_line_segments,
-                cumulative_path,
-                relative_held_line_pos,
-            )
-            return cumulative_path
+            # Continue from the far end of the appended segment
+            n_ref_segment_count = count
+            n_ref_end_index = n_new_segment_end2_index
 
     def ProposeNeighborhoodRadiusSquared(self, transformed_hatch_spacing):
         return (
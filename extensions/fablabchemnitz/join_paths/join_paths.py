@@ -27,6 +27,8 @@ from inkex.paths import CubicSuperPath
 import sys
 import copy
 import math
+sys.path.append("../purge_duplicate_path_segments")
+from fixed_radius_search import FixedRadiusSearch, manhattan
 
 def floatCmpWithMargin(float1, float2, margin):
     return abs(float1 - float2) < margin 
@@ -65,46 +67,52 @@ def getCubicSuperFromParts(parts):
         cbsuper.append(subpath)
     return cbsuper
     
+def reversedParts(parts):
+    return [[[pts for pts in reversed(seg)] for seg in reversed(part)] for part in reversed(parts)]
+
 def getArrangedIds(pathMap, startPathId):
+    keys = list(pathMap)
+    for key in keys:
+        if pathMap[key][-1] == []:
+            inkex.utils.debug("Warning. Selection seems to contain invalid paths, e.g. pointy paths like M 54,54 Z. Please check and try again!")
+            exit(1)
+
+    #index the end nodes of all paths, item is (path index, isEnd)
+    ends = [(tuple(pathMap[key][0][0][0][:2]), tuple(pathMap[key][-1][-1][-1][:2])) for key in keys]
+    xs = [pt[0] for pair in ends for pt in pair]
+    ys = [pt[1] for pair in ends for pt in pair]
+    extent = max(max(xs) - min(xs), max(ys) - min(ys))
+    index = FixedRadiusSearch(extent / math.sqrt(len(keys)) if extent > 0 else 1)
+    for i, (start, end) in enumerate(ends):
+        if keys[i] != startPathId:
+            index.add(start, (i, False))
+            index.add(end, (i, True))
+
     nextPathId = startPathId
     orderPathIds = [nextPathId]
     
     #Arrange in order
     while(len(orderPathIds) < len(pathMap)):
-        minDist = 9e+100 #A large float
-        closestId = None        
         np = pathMap[nextPathId]
-        if np[-1] == []:
-            inkex.utils.debug("Warning. Selection seems to contain invalid paths, e.g. pointy paths like M 54,54 Z. Please check and try again!")
-            exit(1)
         npPts = [np[-1][-1][-1]]
         if(len(orderPathIds) == 1):#compare both the ends for the first path
             npPts.append(np[0][0][0])
-        
-        for key in pathMap:
-            if(key in orderPathIds):
-                continue
-            parts = pathMap[key] 
-            start = parts[0][0][0]
-            end = parts[-1][-1][-1]
-            
-            for i, npPt in enumerate(npPts):
-                dist = abs(start[0] - npPt[0]) + abs(start[1] - npPt[1])
-                if(dist < minDist):
-                    minDist = dist
-                    closestId = key
-                dist = abs(end[0] - npPt[0]) + abs(end[1] - npPt[1])
-                if(dist < minDist):
-                    minDist = dist
-                    pathMap[key] = [[[pts for pts in reversed(seg)] for seg in \
-                        reversed(part)] for part in reversed(parts)]
-                    closestId = key
-                    
-                #If start point of the first path is closer reverse its direction    
-                if(i > 0 and closestId == key):
-                    pathMap[nextPathId] = [[[pts for pts in reversed(seg)] for seg in \
-                        reversed(part)] for part in reversed(np)]
-                    
+
+        closest = None
+        for i, npPt in enumerate(npPts):
+            for dist, pt, (k, isEnd) in index.nearest(npPt, metric=manhattan):
+                if closest is None or (dist, k, i, isEnd) < closest:
+                    closest = (dist, k, i, isEnd)
+        dist, k, i, isEnd = closest
+        closestId = keys[k]
+        index.remove(ends[k][0], (k, False))
+        index.remove(ends[k][1], (k, True))
+        if isEnd:
+            pathMap[closestId] = reversedParts(pathMap[closestId])
+        #If start point of the first path is closer reverse its direction
+        if i > 0:
+            pathMap[nextPathId] = reversedParts(np)
+
         orderPathIds.append(closestId)
         nextPathId = closestId
     return orderPathIds
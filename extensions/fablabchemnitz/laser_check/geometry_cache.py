@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+"""
+Per-element geometry cache for the laser check.
+
+For every path element the flattened length, the bounding box, the enclosed area and
+the node/segment counts (all in document coordinates, i.e. after applying the composed
+transform) are computed at once with numpy for all paths which are not cached yet.
+
+Entries are keyed by the element id and validated by a hash of the path data and the
+composed transform, so edited elements are recomputed and unchanged ones are taken
+from the sidecar file written by the previous run on the same document.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import inkex
+from bezier_flattening import flatten_cubics
+
+LENGTH_TOLERANCE = 0.001 # max. deviation of the flattened curves (document units)
+CACHE_VERSION = 2 # entries of older versions are recomputed
+
+
+def cubic_bounds(cubics):
+    """ (n, 2) minima and maxima of the (n, 4, 2) ``cubics``, considering the curve extrema """
+    p0, p1, p2, p3 = cubics[:, 0], cubics[:, 1], cubics[:, 2], cubics[:, 3]
+    # derivative / 3 = a t^2 + b t + c
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = np.sqrt(np.maximum(b * b - 4 * a * c, 0))
+        quadratic = np.abs(a) > 1e-12
+        t1 = np.where(quadratic, (-b + disc) / (2 * a), np.where(np.abs(b) > 1e-12, -c / b, 0))
+        t2 = np.where(quadratic, (-b - disc) / (2 * a), 0)
+    candidates = [np.zeros_like(a), np.ones_like(a), np.clip(np.nan_to_num(t1), 0, 1), np.clip(np.nan_to_num(t2), 0, 1)]
+    values = []
+    for t in candidates:
+        mt = 1 - t
+        values.append(mt * mt * mt * p0 + 3 * mt * mt * t * p1 + 3 * mt * t * t * p2 + t * t * t * p3)
+    values = np.stack(values)
+    return values.min(axis=0), values.max(axis=0)
+
+
+class GeometryCache:
+    """ flattened length, bbox, area and segment counts of path elements, persisted in a sidecar file """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.entries = {}
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self.anonymous = {} # elements without (unique) id are cached for the current run only
+        self.seen = set()
+        if filename is not None and os.path.isfile(filename):
+            try:
+                with open(filename, "r") as cacheFile:
+                    data = json.load(cacheFile)
+                if data.get("version") == CACHE_VERSION:
+                    self.entries = data["entries"]
+            except (OSError, ValueError, KeyError):
+                self.entries = {}
+
+    @staticmethod
+    def element_hash(element, transform):
+        key = "{}|{}".format(element.get('d'), repr(transform.to_hexad()))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def update(self, elements):
+        """ compute the geometry of all given path elements which are not cached (or changed) at once """
+        parentTransforms = {}
+        missing = []
+        for element in elements:
+            parent = element.getparent()
+            parentTransform = parentTransforms.get(parent)
+            if parentTransform is None:
+                parentTransform = parent.composed_transform() if isinstance(parent, inkex.ShapeElement) else inkex.Transform()
+                parentTransforms[parent] = parentTransform
+            transform = parentTransform @ element.transform
+            elementHash = self.element_hash(element, transform)
+            elementId = element.get('id')
+            if elementId is None or elementId in self.seen: #duplicate ids are cached for the current run only
+                missing.append((element, transform, elementHash, None))
+                continue
+            self.seen.add(elementId)
+            entry = self.entries.get(elementId)
+            if entry is not None and entry["hash"] == elementHash:
+                self.hits += 1
+            else:
+                missing.append((element, transform, elementHash, elementId))
+        if len(missing) > 0:
+            self.misses += len(missing)
+            for (element, transform, elementHash, elementId), geometry in zip(missing, self.compute(missing)):
+                geometry["hash"] = elementHash
+                if elementId is not None:
+                    self.entries[elementId] = geometry
+                    self.changed = True
+                else:
+                    self.anonymous[element] = geometry
+
+    def compute(self, missing):
+        """ geometries of a list of (element, transform, hash) tuples, all cubics are processed in bulk """
+        cubics = []
+        starts = [] # start point of each subpath
+        cubicCounts = [] # number of cubics per subpath
+        subpathCounts = [] # number of subpaths per element
+        nodes = []
+        for element, transform, elementHash, elementId in missing:
+            path = element.path
+            nodes.append(len(path))
+            subpathCount = 0
+            for subpath in path.to_superpath():
+                if len(subpath) == 0:
+                    continue
+                subpathCount += 1
+                starts.append(subpath[0][1])
+                for prev, node in zip(subpath, subpath[1:]):
+                    cubics.append((prev[1], prev[2], node[0], node[1]))
+                cubicCounts.append(len(subpath) - 1)
+            subpathCounts.append(subpathCount)
+
+        # transform everything to document coordinates at once
+        matrices = []
+        for (element, transform, elementHash, elementId), subpathCount in zip(missing, subpathCounts):
+            matrices.extend([transform.matrix] * subpathCount)
+        cubicCounts = np.array(cubicCounts, dtype=np.int64)
+        if len(starts) > 0:
+            matrices = np.array(matrices, dtype=float) # (subpaths, 2, 3)
+            starts = np.array(starts, dtype=float)
+            starts = np.einsum('nij,nj->ni', matrices[:, :, :2], starts) + matrices[:, :, 2]
+        cubics = np.array(cubics, dtype=float).reshape(-1, 4, 2)
+        if len(cubics) > 0:
+            cubicMatrices = np.repeat(matrices, cubicCounts, axis=0)
+            cubics = np.einsum('nij,nkj->nki', cubicMatrices[:, :, :2], cubics) + cubicMatrices[:, None, :, 2]
+
+        # flattened lengths and areas per subpath
+        subpathLengths = np.zeros(len(cubicCounts))
+        subpathAreas = np.zeros(len(cubicCounts))
+        subpathPoints = np.ones(len(cubicCounts), dtype=np.int64)
+        if len(cubics) > 0:
+            points, pointCounts = flatten_cubics(cubics, LENGTH_TOLERANCE)
+            subpathOfCubic = np.repeat(np.arange(len(cubicCounts)), cubicCounts)
+            subpathOfPoint = np.repeat(subpathOfCubic, pointCounts)
+            # previous point of each flattened point; the first point of a subpath follows its start point
+            previous = np.empty_like(points)
+            previous[1:] = points[:-1]
+            firstPoint = np.ones(len(points), dtype=bool)
+            firstPoint[1:] = subpathOfPoint[1:] != subpathOfPoint[:-1]
+            previous[firstPoint] = starts[subpathOfPoint[firstPoint]]
+            segmentLengths = np.hypot(*(points - previous).T)
+            subpathLengths = np.bincount(subpathOfPoint, weights=segmentLengths, minlength=len(cubicCounts))
+            # shoelace formula, subpaths are closed implicitly
+            cross = previous[:, 0] * points[:, 1] - points[:, 0] * previous[:, 1]
+            subpathAreas = np.bincount(subpathOfPoint, weights=cross, minlength=len(cubicCounts))
+            lastPoint = np.ones(len(points), dtype=bool)
+            lastPoint[:-1] = firstPoint[1:]
+            closing = np.zeros(len(cubicCounts))
+            closing[subpathOfPoint[lastPoint]] = \
+                points[lastPoint, 0] * starts[subpathOfPoint[lastPoint], 1] - starts[subpathOfPoint[lastPoint], 0] * points[lastPoint, 1]
+            subpathAreas = 0.5 * (subpathAreas + closing)
+            subpathPoints += np.bincount(subpathOfPoint, minlength=len(cubicCounts))
+
+            cubicMin, cubicMax = cubic_bounds(cubics)
+
+        # bounding boxes per subpath (start point and all cubics)
+        subpathMin = starts.copy() if len(cubicCounts) > 0 else np.empty((0, 2))
+        subpathMax = starts.copy() if len(cubicCounts) > 0 else np.empty((0, 2))
+        if len(cubics) > 0:
+            withCubics = np.flatnonzero(cubicCounts > 0)
+            offsets = np.concatenate(([0], np.cumsum(cubicCounts)[:-1]))[withCubics]
+            subpathMin[withCubics] = np.minimum(subpathMin[withCubics], np.minimum.reduceat(cubicMin, offsets))
+            subpathMax[withCubics] = np.maximum(subpathMax[withCubics], np.maximum.reduceat(cubicMax, offsets))
+
+        # per element
+        geometries = []
+        first = 0
+        for i, subpathCount in enumerate(subpathCounts):
+            last = first + subpathCount
+            if subpathCount > 0:
+                low = subpathMin[first:last].min(axis=0)
+                high = subpathMax[first:last].max(axis=0)
+                bbox = [float(low[0]), float(high[0]), float(low[1]), float(high[1])]
+            else:
+                bbox = None
+            geometries.append({
+                "length": float(subpathLengths[first:last].sum()),
+                "area": float(abs(subpathAreas[first:last].sum())),
+                "bbox": bbox,
+                "nodes": nodes[i],
+                "segments": int(cubicCounts[first:last].sum()),
+                "points": int(subpathPoints[first:last].sum()),
+                })
+            first = last
+        return geometries
+
+    def get(self, element):
+        """ the cached geometry of a path element, update() needs to be called before """
+        geometry = self.anonymous.get(element)
+        if geometry is None:
+            geometry = self.entries[element.get('id')]
+        return geometry
+
+    def bounding_box(self, element):
+        """ bounding box of a path element in document coordinates """
+        bbox = self.get(element)["bbox"]
+        if bbox is None:
+            return None
+        return inkex.BoundingBox((bbox[0], bbox[1]), (bbox[2], bbox[3]))
+
+    def save(self, prune=False):
+        """ write the sidecar file if anything changed. With prune, entries of elements not seen in this run are dropped """
+        if self.filename is None:
+            return
+        if prune is True and len(self.seen) < len(self.entries):
+            self.entries = {key: value for key, value in self.entries.items() if key in self.seen}
+            self.changed = True
+        if self.changed is False:
+            return
+        try:
+            with open(self.filename, "w") as cacheFile:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, cacheFile)
+        except OSError as e:
+            inkex.utils.debug("Could not write geometry cache {}: {}".format(self.filename, e))
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 import inkex
-from inkex.bezier import csplength, csparea
+from inkex.bezier import csparea
 from lxml import etree
 import re
 import math
@@ -9,13 +9,18 @@ import sys
 from math import log
 import datetime
 import os
-from collections import Counter
+import tempfile
+import time
+from collections import Counter, defaultdict
 from PIL import Image
 from io import BytesIO
 import base64
 import urllib.request as urllib
 from _ast import Or
 
+sys.path.append("../path_intersections")
+from geometry_cache import GeometryCache
+
 class LaserCheck(inkex.EffectExtension):
     
     '''
@@ -111,6 +116,396 @@ class LaserCheck(inkex.EffectExtension):
         pars.add_argument('--nodes_per_path', type=inkex.Boolean, default=False)
         pars.add_argument('--nodes_per_path_max', type=int, default=2)
         pars.add_argument('--nodes_per_path_interval', type=float, default=10.000)
+        pars.add_argument('--show_timings', type=inkex.Boolean, default=False)
+        pars.add_argument('--geometry_cache', type=inkex.Boolean, default=True)
+
+    def register_checks(self):
+        '''
+        All checks in order of their reports. Each check is a tuple of (name, enabled, visit).
+        visit(element, style) is called for each element during the single traversal of the document
+        (None if the check does not look at single elements). The reports are printed by effect() afterwards.
+        '''
+        so = self.options
+        checkAll = so.checks == "check_all"
+        return [
+            ("default checks", so.basic_checks is True, None),
+            ("bounding box", checkAll or so.bbox is True, self.visit_bbox),
+            ("groups and layers", checkAll or so.groups_and_layers is True, self.visit_groups_and_layers),
+            ("style types", checkAll or so.style_types is True, self.visit_style_types),
+            ("clones", checkAll or so.clones is True, self.visit_clones),
+            ("clippings", checkAll or so.clippaths is True, self.visit_clippaths),
+            ("images", checkAll or so.images is True, self.visit_images),
+            ("low level strokes", checkAll or so.lowlevelstrokes is True, self.visit_lowlevelstrokes),
+            ("texts", checkAll or so.texts is True, self.visit_texts),
+            ("filters", checkAll or so.filters is True, self.visit_filters),
+            ("stroke colors", checkAll or so.stroke_colors is True, self.visit_stroke_colors),
+            ("stroke widths", checkAll or so.stroke_widths is True, self.visit_stroke_widths),
+            ("cosmetic dashes", checkAll or so.cosmestic_dashes is True, self.visit_cosmestic_dashes),
+            ("invisible shapes", checkAll or so.invisible_shapes is True, self.visit_invisible_shapes),
+            ("opacities", checkAll or so.opacities is True, self.visit_opacities),
+            ("pointy paths", checkAll or so.pointy_paths is True, self.visit_pointy_paths),
+            ("combined paths", checkAll or so.combined_paths is True, self.visit_combined_paths),
+            ("transformations", checkAll or so.transformations is True, self.visit_transformations),
+            ("short paths", checkAll or so.short_paths is True, self.visit_short_paths),
+            ("cutting estimation", checkAll or so.cutting_estimation is True, self.visit_cutting_estimation),
+            ("nodes per path", checkAll or so.nodes_per_path is True, self.visit_nodes_per_path),
+            ("elements outside canvas", checkAll or so.elements_outside_canvas is True, self.visit_elements_outside_canvas),
+            ("non-path shapes", checkAll or so.non_path_shapes is True, self.visit_non_path_shapes),
+        ]
+
+    def iter_selected(self):
+        ''' all elements to check (each once): the complete document or the selected elements and their descendants '''
+        docroot = self.document.getroot()
+        if len(self.svg.selected) == 0:
+            for element in docroot.iter(tag=etree.Element):
+                if element != docroot:
+                    yield element
+        else:
+            seen = set()
+            for selectedElement in self.svg.selected.values():
+                for element in selectedElement.iter(tag=etree.Element):
+                    if element not in seen:
+                        seen.add(element)
+                        yield element
+
+    def geometry_cache_file(self):
+        ''' sidecar file of the geometry cache, one per document name '''
+        docname = self.svg.get('sodipodi:docname') or os.path.splitext(os.path.basename(self.options.input_file))[0]
+        return os.path.join(tempfile.gettempdir(), "laser_check_{}.json".format(re.sub(r"[^\w.-]", "_", docname)))
+
+    def path_length(self, element):
+        ''' flattened length of a path element in document coordinates, shared by the length based checks '''
+        return self.geometry.get(element)["length"]
+
+    def shape_bounding_box(self, element, style, transform):
+        ''' bounding box of a shape in document coordinates. Unclipped paths are taken from the geometry cache '''
+        if isinstance(element, inkex.PathElement) and self.geometry is not None and element.get('clip-path') is None and 'clip-path' not in style:
+            return self.geometry.bounding_box(element)
+        return element.bounding_box(transform)
+
+    def report_timing(self, name):
+        ''' stop the report timer of the previous check and start the one of the given check (None just stops) '''
+        now = time.perf_counter()
+        if self.reportName is not None:
+            self.timings[self.reportName][1] += now - self.reportStart
+        self.reportName = name
+        self.reportStart = now
+
+    def visit_bbox(self, element, style):
+        if isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('use','svg') and element.get('inkscape:groupmode') != 'layer': #bbox fails for svg:use elements and layers
+            if isinstance (element, inkex.TextElement) or isinstance (element, inkex.Tspan):
+                return
+            transform = inkex.Transform()
+            parent = element.getparent()
+            if parent is not None and isinstance(parent, inkex.ShapeElement):
+                transform = parent.composed_transform()
+            try:
+                self.found['bbox'].append(self.shape_bounding_box(element, style, transform))
+            except Exception:
+                transform = element.composed_transform()
+                x1, y1 = transform.apply_to_point([0, 0])
+                x2, y2 = transform.apply_to_point([1, 1])
+                self.found['bbox'].append(inkex.BoundingBox((x1, x2), (y1, y2)))
+
+    def visit_groups_and_layers(self, element, style):
+        if element.tag == inkex.addNS('g','svg'):
+            if element.get('inkscape:groupmode') == 'layer':
+                self.found['layers'].append(element)
+            else:
+                self.found['groups'].append(element)
+
+    dedicatedStyleDict = ['opacity', 'stroke', 'stroke-opacity', 'stroke-width', 'stroke-dasharray', 'stroke-dashoffset', 'stroke-linecap', 'stroke-linejoin', 'stroke-miterlimit', 'fill', 'fill-opacity']
+
+    def visit_style_types(self, element, style):
+        if element.tag == inkex.addNS('g','svg'):
+            styleAttr = element.get('style')
+            if styleAttr is not None and styleAttr != "": #style may also be just empty (weird, but was validated on 21.12.2021)
+                self.found['groupStyles'].append(element)
+        if element.tag == inkex.addNS('style', 'svg'):
+            self.found['svgStyleElements'].append(element)
+        if isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('g','svg'):
+            if element.get('style') is not None: #do not use "element.style" - this uses the composed style from parent
+                self.found['styleInNonGroupLayerShapes'].append(element)
+            for dedicatedStyleItem in self.dedicatedStyleDict:
+                if element.attrib.has_key(str(dedicatedStyleItem)):
+                    self.found['dedicatedStylesInNonGroupLayerShapes'].append(element)
+
+    def visit_clones(self, element, style):
+        if element.tag == inkex.addNS('use','svg'):
+            self.found['uses'].append(element)
+
+    def visit_clippaths(self, element, style):
+        if element.tag == inkex.addNS('clipPath','svg'):
+            self.found['clipPaths'].append(element)
+
+    def visit_images(self, element, style):
+        if element.tag == inkex.addNS('image','svg'):
+            self.found['images'].append(element)
+
+    def visit_lowlevelstrokes(self, element, style):
+        if element.tag in (inkex.addNS('line','svg'), inkex.addNS('polyline','svg'), inkex.addNS('polygon','svg')):
+            self.found['lowlevels'].append(element)
+
+    def visit_texts(self, element, style):
+        if element.tag == inkex.addNS('text','svg'):
+            self.found['texts'].append(element)
+
+    def visit_filters(self, element, style):
+        if element.tag == inkex.addNS('filter','svg'):
+            self.found['filter_elements'].append(element)
+        filter_style = style.get('filter')
+        if filter_style is not None and filter_style != "none":
+            self.found['filter_styles'].append([element, filter_style])
+
+    def visit_stroke_colors(self, element, style):
+        if isinstance(element, inkex.ShapeElement):
+            self.found['strokeColors'].append(style.get('stroke')) #we also add None (default value is #000000 then) and "none" values.
+
+    def visit_stroke_widths(self, element, style):
+        if isinstance(element, inkex.ShapeElement):
+            self.found['strokeWidths'].append(style.get('stroke-width')) #we also add None and "none" values. Default width for None value seems to be 1px
+
+    def visit_cosmestic_dashes(self, element, style):
+        if isinstance(element, inkex.ShapeElement):
+            strokeDasharray = style.get('stroke-dasharray')
+            if strokeDasharray is not None and strokeDasharray != 'none':
+                self.found['strokeDasharrays'].append(strokeDasharray)
+
+    def visit_invisible_shapes(self, element, style):
+        if not isinstance(element, inkex.ShapeElement):
+            return
+        if element.tag not in (inkex.addNS('tspan','svg')) and element.get('inkscape:groupmode') != 'layer' and not isinstance(element, inkex.Group):
+            strokeAttr = element.get('stroke') #same information could be in regular attribute instead nested in style attribute
+            if strokeAttr is None or strokeAttr == "none":
+                strokeVis = 0
+            elif strokeAttr in ('#ffffff', 'white', 'rgb(255,255,255)'):
+                strokeVis = 0
+            else:
+                strokeVis = 1
+            stroke = style.get('stroke')
+            if stroke is not None:
+                if stroke == "none":
+                    strokeVis = 0
+                elif stroke in ('#ffffff', 'white', 'rgb(255,255,255)'):
+                    strokeVis = 0
+                else:
+                    strokeVis = 1
+
+
+            strokeWidthAttr = element.get('stroke-width') #same information could be in regular attribute instead nested in style attribute
+            if strokeWidthAttr == "none":
+                widthVis = 0
+            elif strokeWidthAttr is not None and self.svg.unittouu(strokeWidthAttr) < 0.005: #really thin (0,005pc = 0,080px)
+                widthVis = 0
+            else:
+                widthVis = 1
+            stroke_width = style.get('stroke-width')
+            if stroke_width is not None:
+                if stroke_width == "none":
+                    widthVis = 0
+                elif stroke_width is not None and self.svg.unittouu(stroke_width) < 0.005: #really thin (0,005pc = 0,080px)
+                    widthVis = 0
+                else:
+                    widthVis = 1
+
+
+            strokeOpacityAttr = element.get('stroke-opacity') #same information could be in regular attribute instead nested in style attribute
+            if strokeOpacityAttr == "none":
+                strokeOpacityVis = 0
+            elif strokeOpacityAttr is not None and self.svg.unittouu(strokeOpacityAttr) < 0.05: #nearly invisible (<5% opacity)
+                strokeOpacityVis = 0
+            else:
+                strokeOpacityVis = 1
+            stroke_opacity = style.get('stroke-opacity')
+            if stroke_opacity is not None:
+                if stroke_opacity == "none": #none means visible!
+                    strokeOpacityVis = 1
+                elif stroke_opacity is not None and self.svg.unittouu(stroke_opacity) < 0.05: #nearly invisible (<5% opacity)
+                    strokeOpacityVis = 0
+                else:
+                    strokeOpacityVis = 1
+
+
+            if self.pagecolor == '#ffffff':
+                invisColors = [self.pagecolor, 'white', 'rgb(255,255,255)']
+            else:
+                invisColors = [self.pagecolor] #we could add some parser to convert pagecolor to rgb/hsl/cmyk
+            fillAttr = element.get('fill') #same information could be in regular attribute instead nested in style attribute
+            if fillAttr is None or fillAttr == "none":
+                fillVis = 0
+            elif fillAttr in invisColors:
+                fillVis = 0
+            else:
+                fillVis = 1
+            fill = style.get('fill')
+            if fill is not None:
+                if fill == "none": #none means invisible! (opposite of stroke behaviour)
+                    fillVis = 0
+                elif fill in invisColors:
+                    fillVis = 0
+                else:
+                    fillVis = 1
+
+
+            fillOpacityAttr = element.get('fill-opacity') #same information could be in regular attribute instead nested in style attribute
+            if fillOpacityAttr == "none":
+                fillOpacityVis = 0
+            elif strokeOpacityAttr is not None and self.svg.unittouu(fillOpacityAttr) < 0.05: #nearly invisible (<5% opacity)
+                fillOpacityVis = 0
+            else:
+                fillOpacityVis = 1
+            fill_opacity = style.get('fill-opacity')
+            if fill_opacity is not None:
+                if fill_opacity == "none":
+                    fillOpacityVis = 0
+                elif fill_opacity is not None and self.svg.unittouu(fill_opacity) < 0.05: #nearly invisible (<5% opacity)
+                    fillOpacityVis = 0
+                else:
+                    fillOpacityVis = 1
+
+
+            display = style.get('display')
+            if display == "none":
+                displayVis = 0
+            else:
+                displayVis = 1
+            displayAttr = element.get('display') #same information could be in regular attribute instead nested in style attribute
+            if displayAttr == "none":
+                displayAttrVis = 0
+            else:
+                displayAttrVis = 1
+
+
+            #check for svg:path elements which have consistent slope (straight lines) and no a defined fill and no stroke. such (poly)lines are still not visible
+            pathVis = 1
+            if element.tag == inkex.addNS('path','svg') and fillVis == 1 and strokeVis == 0:
+                segments = element.path.to_arrays()
+                chars = set('aAcCqQtTsS')
+                if not any((c in chars) for c in str(element.path)): #skip beziers (we only check for polylines)
+                    slopes = set()
+                    for i in range(0, len(segments)):
+                        if i > 0:
+                            if segments[i][0].lower() == 'z' or segments[i-1][0].lower() == 'z':
+                                continue #skip closed contours in combined path
+                            x1, y1, x2, y2 = segments[i-1][1][0], segments[i-1][1][1], segments[i][1][0], segments[i][1][1]
+                            if x1 < x2:
+                                p0 = [x1, y1]
+                                p1 = [x2, y2]
+                            else:
+                                p0 = [x2, y2]
+                                p1 = [x1, y1]
+                            dx = p1[0] - p0[0]
+                            if dx == 0:
+                                slope = sys.float_info.max #vertical
+                            else:
+                                slope = (p1[1] - p0[1]) / dx
+                            slopes.add(round(slope, 6))
+                    if len(slopes) < 2:
+                        pathVis = 0
+
+            if style is not None: #f if the style attribute is not set at all, the element will be visible with default black color fill and w/o stroke
+                if (strokeVis == 0 or widthVis == 0 or strokeOpacityVis == 0):
+                    strokeInvis = True
+                else:
+                    strokeInvis = False
+                if (fillVis == 0 or fillOpacityVis == 0):
+                    fillInvis = True
+                else:
+                    fillInvis = False
+                if (strokeInvis is True and fillInvis is True) or displayVis == 0 or displayAttrVis == 0 or pathVis == 0:
+                    self.found['invisibles'].append("id={},strokeVis={},widthVis={},strokeOpacityVis={}=>strokeInvisble:{}|fillVis={},fillOpacityVis={}=>fillInvisble:{}|displayVis={},displayAttrVis=, {}|pathVis={}"\
+                    .format(element.get('id'), strokeVis, widthVis, strokeOpacityVis, strokeInvis, fillVis, fillOpacityVis, fillInvis, displayVis, displayAttrVis, pathVis))
+
+    def visit_opacities(self, element, style):
+        if not isinstance(element, inkex.ShapeElement):
+            return
+        transparencies = self.found['transparencies']
+        for attribute in ('stroke-opacity', 'fill-opacity', 'opacity'):
+            opacityAttr = element.get(attribute) #same information could be in regular attribute instead nested in style attribute
+            if opacityAttr is not None:
+                if float(opacityAttr) < 1.0:
+                    transparencies.append([element, opacityAttr, attribute])
+            opacity = style.get(attribute)
+            if opacity is not None and opacity != "none":
+                if float(opacity) < 1.0:
+                    transparencies.append([element, opacity, attribute])
+
+    def visit_pointy_paths(self, element, style):
+        if isinstance(element, inkex.PathElement):
+            p = element.path
+            commandsCoords = p.to_arrays()
+            if len(commandsCoords) == 1 or \
+                (len(commandsCoords) == 2 and commandsCoords[0][1] == commandsCoords[1][1]) or \
+                (len(commandsCoords) == 2 and commandsCoords[-1][0] == 'Z') or \
+                (len(commandsCoords) == 3 and commandsCoords[0][1] == commandsCoords[1][1] and commandsCoords[2][1] == 'Z'):
+                self.found['pointyPaths'].append(element)
+
+    def visit_combined_paths(self, element, style):
+        if isinstance(element, inkex.PathElement):
+            break_paths = element.path.break_apart()
+            if len(break_paths) > 2:
+                self.found['combinedPaths'].append([element, len(break_paths)])
+
+    def visit_transformations(self, element, style):
+        if isinstance(element, inkex.ShapeElement) and element.get('transform') is not None:
+            self.found['transformations'].append(element)
+
+    def visit_short_paths(self, element, style):
+        if isinstance(element, inkex.PathElement):
+            self.found['shortPathLengths'].append([element, self.path_length(element)])
+
+    def visit_cutting_estimation(self, element, style):
+        if isinstance(element, inkex.PathElement):
+            self.found['cuttingPathLengths'].append([element, self.path_length(element)])
+
+    def visit_nodes_per_path(self, element, style):
+        if isinstance(element, inkex.PathElement):
+            self.found['nodesPathLengths'].append([element, self.geometry.get(element)["nodes"], self.path_length(element)])
+
+    def visit_elements_outside_canvas(self, element, style):
+        if isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('g', 'svg'):
+            parent = element.getparent()
+            transform = parent.composed_transform() if isinstance(parent, inkex.ShapeElement) else inkex.Transform()
+            ebbox = self.shape_bounding_box(element, style, transform)
+            if ebbox is not None: #pointy paths for example could generate non-bbox shapes. So we ignore them here
+                precision = 3
+                #inkex.utils.debug("{} | bbox: left = {:0.3f} right = {:0.3f} top = {:0.3f} bottom = {:0.3f}".format(element.get('id'), ebbox.left, ebbox.right, ebbox.top, ebbox.bottom))
+                #pagew = round(self.svg.unittouu(self.svg.get('width')), precision)
+                #pageh = round(self.svg.unittouu(self.svg.get('height')), precision)
+                vxMin, vyMin, vxMax, vyMax = self.viewbox
+                pagew = round(vxMax - vxMin, precision)
+                pageh = round(vyMax - vyMin, precision)
+
+                if round(ebbox.right,  precision) == 0 or \
+                   round(ebbox.left,   precision) == pagew or \
+                   round(ebbox.top,    precision) == 0 or \
+                   round(ebbox.bottom, precision) == pageh:
+                    self.found['elementsOutside'].append([element, "touching"])
+                elif \
+                   round(ebbox.right,  precision) < 0 or \
+                   round(ebbox.left,   precision) > pagew or \
+                   round(ebbox.top,    precision) < 0 or \
+                   round(ebbox.bottom, precision) > pageh:
+                    self.found['elementsOutside'].append([element, "fully outside"])
+                else: #fully inside or partially inside/outside. we check if one or more corners is outside the canvas
+                    rightOutside = False
+                    leftOutside = False
+                    topOutside = False
+                    bottomOutside = False
+                    if round(ebbox.right,  precision) < 0 or round(ebbox.right,  precision) > pagew:
+                       rightOutside = True
+                    if round(ebbox.left,  precision) < 0 or round(ebbox.left,  precision) > pagew:
+                       leftOutside = True
+                    if round(ebbox.top,  precision) < 0 or round(ebbox.top,  precision) > pageh:
+                       topOutside = True
+                    if round(ebbox.bottom,  precision) < 0 or round(ebbox.bottom,  precision) > pageh:
+                       bottomOutside = True
+                    if rightOutside is True or leftOutside is True or topOutside is True or bottomOutside is True:
+                        self.found['elementsOutside'].append([element, "partially outside"])
+
+    def visit_non_path_shapes(self, element, style):
+        if isinstance(element, inkex.ShapeElement) and not isinstance(element, inkex.PathElement) and not isinstance(element, inkex.Group):
+            self.found['nonPathShapes'].append(element)
         
     def effect(self):
         
@@ -119,28 +514,6 @@ class LaserCheck(inkex.EffectExtension):
         
         machineWidth = self.svg.unittouu(so.machine_size.split('x')[0] + "mm")
         machineHeight = self.svg.unittouu(so.machine_size.split('x')[1] + "mm")
-        selected = [] #total list of elements to parse
-
-        
-        def parseChildren(element):
-            if element not in selected:
-                selected.append(element)
-            children = element.getchildren()
-            if children is not None:
-                for child in children:
-                    if child not in selected:
-                        selected.append(child)
-                    parseChildren(child) #go deeper and deeper
-        
-        #check if we have selected elements or if we should parse the whole document instead
-        if len(self.svg.selected) == 0:
-            for element in docroot.iter(tag=etree.Element):
-                if element != docroot:
-
-                    selected.append(element)
-        else:
-            for element in self.svg.selected.values():
-                parseChildren(element)
                 
         namedView = docroot.find(inkex.addNS('namedview', 'sodipodi'))
         doc_units = namedView.get(inkex.addNS('document-units', 'inkscape'))        
@@ -185,9 +558,37 @@ class LaserCheck(inkex.EffectExtension):
         need for a laser cutter. Usually we need svg:path and maybe svg:image; we can drop a lot of stuff
         like svg:defs, svg:desc, etc.
         '''
+        checks = [(name, visit) for name, enabled, visit in self.register_checks() if enabled is True]
+        visitors = [(name, visit) for name, visit in checks if visit is not None]
+        self.timings = {name: [0.0, 0.0] for name, visit in checks} #visit and report time per check
+        self.reportName = None
+        self.found = defaultdict(list) #results of the visitors
+        elements = list(self.iter_selected())
+
+        #length, bounding box and node counts of all paths at once (from the sidecar file of the last run if unchanged)
+        self.geometry = None
+        geometryChecks = ("bounding box", "short paths", "cutting estimation", "nodes per path", "elements outside canvas")
+        if any(name in geometryChecks for name, visit in checks):
+            start = time.perf_counter()
+            self.geometry = GeometryCache(self.geometry_cache_file() if so.geometry_cache is True else None)
+            self.geometry.update([element for element in elements if isinstance(element, inkex.PathElement)])
+            if so.geometry_cache is True:
+                self.geometry.save(prune=len(self.svg.selected) == 0)
+            geometryTime = time.perf_counter() - start
+        self.pagecolor = pagecolor
+        self.viewbox = (vxMin, vyMin, vxMax, vyMax)
         nonShapes = []
         shapes = [] #this may contains paths, rectangles, circles, groups and more
-        for element in selected:       
+        counter = Counter() #element types
+        traversalStart = time.perf_counter()
+        for element in elements:
+            counter[element.tag
+                .replace("{http://www.w3.org/2000/svg}", "")
+                .replace("{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}", "")
+                .replace("{http://www.w3.org/1999/02/22-rdf-syntax-ns#}", "")
+                .replace("{http://creativecommons.org/ns#}", "")
+                .replace("{http://www.inkscape.org/namespaces/inkscape}", "")
+            ] += 1
             if not isinstance(element, inkex.ShapeElement):
                 if element.tag not in (
                         "{http://www.w3.org/2000/svg}defs", 
@@ -198,22 +599,17 @@ class LaserCheck(inkex.EffectExtension):
                     nonShapes.append(element)
             else:
                 shapes.append(element)
-          
-        elementTypes = []
-        for element in selected:
-            if element not in elementTypes:
-                elementTypes.append(element.tag
-                    .replace("{http://www.w3.org/2000/svg}", "")
-                    .replace("{http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd}", "")
-                    .replace("{http://www.w3.org/1999/02/22-rdf-syntax-ns#}", "")
-                    .replace("{http://creativecommons.org/ns#}", "")
-                    .replace("{http://www.inkscape.org/namespaces/inkscape}", "")
-                )
-        
-        counter = Counter(elementTypes)
-        uniqElementTypes = counter
+
+            #parse the style only once per element
+            style = {key: element.style.get(key) for key in element.style.keys()}
+            for name, visit in visitors:
+                start = time.perf_counter()
+                visit(element, style)
+                self.timings[name][0] += time.perf_counter() - start
+        traversalTime = time.perf_counter() - traversalStart - sum(timing[0] for timing in self.timings.values())
             
         if so.basic_checks is True:
+            self.report_timing("default checks")
             inkex.utils.debug("---------- Default checks")
             if so.show_issues_only is False:
                 inkex.utils.debug("Document units: {}".format(doc_units))
@@ -276,6 +672,7 @@ class LaserCheck(inkex.EffectExtension):
         leave some borders off the actual part geometries.
         '''
         if so.checks == "check_all" or so.bbox is True:
+            self.report_timing("bounding box")
             inkex.utils.debug("\n---------- Borders around all elements - minimum offset {} mm from each side".format(so.bbox_offset))
             if scaleOk is False:
                 inkex.utils.debug("WARNING: Document scale is not 100%. Calculating bounding boxes might create wrong results.")
@@ -288,23 +685,8 @@ class LaserCheck(inkex.EffectExtension):
                     inkex.utils.debug("EXTENSION TIP:\n"\
                   " - Use 'FabLab Chemnitz > Transformations > Normalize Drawing Scale' can fix this")
             bbox = inkex.BoundingBox()
-            for element in selected:
-            #for element in docroot.iter(tag=etree.Element):
-                if element != docroot and isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('use','svg') and element.get('inkscape:groupmode') != 'layer': #bbox fails for svg:use elements and layers
-                    transform = inkex.Transform()
-                    parent = element.getparent()
-                    if parent is not None and isinstance(parent, inkex.ShapeElement):
-                        transform = parent.composed_transform()
-                    try:
-                        if isinstance (element, inkex.TextElement) or isinstance (element, inkex.Tspan):
-                            continue
-                        else:  
-                            bbox += element.bounding_box(transform)
-                    except Exception:
-                        transform = element.composed_transform()
-                        x1, y1 = transform.apply_to_point([0, 0])
-                        x2, y2 = transform.apply_to_point([1, 1])
-                        bbox += inkex.BoundingBox((x1, x2), (y1, y2))
+            for elementBbox in self.found['bbox']:
+                bbox += elementBbox
      
             if abs(bbox.width) == math.inf or abs(bbox.height) == math.inf:
                 inkex.utils.debug("bounding box could not be calculated. SVG seems to be empty.")
@@ -361,6 +743,7 @@ class LaserCheck(inkex.EffectExtension):
         We check for possible deep nested groups/layers, empty groups/layers or groups/layers with styles.
         '''
         if so.checks == "check_all" or so.groups_and_layers is True:
+            self.report_timing("groups and layers")
             inkex.utils.debug("\n---------- Groups and layers")
             global md
             md = 0
@@ -375,16 +758,10 @@ class LaserCheck(inkex.EffectExtension):
                inkex.utils.debug("Maximum group depth={}".format(md - 1))
             if md - 1 > so.nest_depth_max:
                 inkex.utils.debug("Warning: maximum allowed group depth reached: {}".format(so.nest_depth_max))
-            groups = []
+            groups = self.found['groups']
             emptyGroups = 0
-            layers = []
+            layers = self.found['layers']
             emptyLayers = 0
-            for element in selected:
-                if element.tag == inkex.addNS('g','svg'):
-                    if element.get('inkscape:groupmode') == 'layer':
-                        layers.append(element)
-                    else:
-                        groups.append(element)
 
             if so.show_issues_only is False:  
                 inkex.utils.debug("{} groups in total".format(len(groups)))
@@ -420,27 +797,12 @@ class LaserCheck(inkex.EffectExtension):
         at svg:path level or using properly defined css classes
         '''
         if so.checks == "check_all" or so.style_types is True: 
+            self.report_timing("style types")
             inkex.utils.debug("\n---------- Style types")
-            groupStyles = []
-            svgStyleElements = []
-            styleInNonGroupLayerShapes = []
-            dedicatedStylesInNonGroupLayerShapes = []
-            dedicatedStyleDict = []
-            dedicatedStyleDict.extend(['opacity', 'stroke', 'stroke-opacity', 'stroke-width', 'stroke-dasharray', 'stroke-dashoffset', 'stroke-linecap', 'stroke-linejoin', 'stroke-miterlimit', 'fill', 'fill-opacity'])
-
-            for element in selected:
-                if element.tag == inkex.addNS('g','svg'):
-                    if element.style is not None and element.style != "": #style may also be just empty (weird, but was validated on 21.12.2021)
-                        groupStyles.append(element)
-                if element.tag == inkex.addNS('style', 'svg'):
-                    svgStyleElements.append(element)
-            for element in shapes:
-                if element.tag != inkex.addNS('g','svg'):
-                    if element.get('style') is not None: #do not use "element.style" - this uses the composed style from parent
-                        styleInNonGroupLayerShapes.append(element)
-                    for dedicatedStyleItem in dedicatedStyleDict:
-                        if element.attrib.has_key(str(dedicatedStyleItem)):
-                            dedicatedStylesInNonGroupLayerShapes.append(element)           
+            groupStyles = self.found['groupStyles']
+            svgStyleElements = self.found['svgStyleElements']
+            styleInNonGroupLayerShapes = self.found['styleInNonGroupLayerShapes']
+            dedicatedStylesInNonGroupLayerShapes = self.found['dedicatedStylesInNonGroupLayerShapes']
             for groupStyle in groupStyles:
                 inkex.utils.debug("group id={} has style attribute".format(groupStyle.get('id')))
             for svgStyleElement in svgStyleElements:
@@ -464,11 +826,9 @@ class LaserCheck(inkex.EffectExtension):
         Clones should be unlinked because they cause similar issues like transformations
         '''
         if so.checks == "check_all" or so.clones is True:
+            self.report_timing("clones")
             inkex.utils.debug("\n---------- Clones (svg:use)") 
-            uses = []
-            for element in selected:
-                if element.tag == inkex.addNS('use','svg'):
-                    uses.append(element)
+            uses = self.found['uses']
             for use in uses:
                 inkex.utils.debug("id={}".format(use.get('id')))
             if so.show_issues_only is False:
@@ -482,11 +842,9 @@ class LaserCheck(inkex.EffectExtension):
         Please perform real intersections to have an intact target geometry.
         '''
         if so.checks == "check_all" or so.clippaths is True:
+            self.report_timing("clippings")
             inkex.utils.debug("\n---------- Clippings (svg:clipPath)") 
-            clipPaths = []
-            for element in selected:
-                if element.tag == inkex.addNS('clipPath','svg'):
-                    clipPaths.append(element)
+            clipPaths = self.found['clipPaths']
             for clipPath in clipPaths:
                 inkex.utils.debug("id={}".format(clipPath.get('id')))
             if so.show_issues_only is False:
@@ -500,11 +858,9 @@ class LaserCheck(inkex.EffectExtension):
         check to drop or trace to vector paths
         '''
         if so.checks == "check_all" or so.images is True:
+            self.report_timing("images")
             inkex.utils.debug("\n---------- Images (svg:image)") 
-            images = []
-            for element in selected:
-                if element.tag == inkex.addNS('image','svg'):
-                    images.append(element)
+            images = self.found['images']
             malformedScales = []
             maxDPIhits = []
             minDPIhits = []
@@ -600,11 +956,9 @@ class LaserCheck(inkex.EffectExtension):
         Low level strokes cannot be properly edited in Inkscape (no node handles). Converting helps
         '''
         if so.checks == "check_all" or so.lowlevelstrokes is True:
+            self.report_timing("low level strokes")
             inkex.utils.debug("\n---------- Low level strokes (svg:line/polyline/polygon)") 
-            lowlevels = []
-            for element in selected:
-                if element.tag in (inkex.addNS('line','svg'), inkex.addNS('polyline','svg'), inkex.addNS('polygon','svg')):
-                    lowlevels.append(element)
+            lowlevels = self.found['lowlevels']
             for lowlevel in lowlevels:
                 inkex.utils.debug("id={}".format(lowlevel.get('id')))
             if so.show_issues_only is False:
@@ -619,11 +973,9 @@ class LaserCheck(inkex.EffectExtension):
         everywhere.
         '''
         if so.checks == "check_all" or so.texts is True:
+            self.report_timing("texts")
             inkex.utils.debug("\n---------- Texts") 
-            texts = []
-            for element in selected:
-                if element.tag == inkex.addNS('text','svg'):
-                    texts.append(element)
+            texts = self.found['texts']
             for text in texts:
                 inkex.utils.debug("id={}".format(text.get('id')))
             if so.show_issues_only is False:
@@ -637,24 +989,15 @@ class LaserCheck(inkex.EffectExtension):
         but not in usual case.
         '''
         if so.checks == "check_all" or so.filters is True:
+            self.report_timing("filters")
             inkex.utils.debug("\n---------- Filters") 
 
-            filter_elements = []
-            for element in selected:
-                if element.tag == inkex.addNS('filter','svg'):
-                    filter_elements.append(element)                    
-            filter_styles = []
+            filter_elements = self.found['filter_elements']
+            filter_styles = self.found['filter_styles']
             if so.show_issues_only is False:
                 inkex.utils.debug("{} filters (as svg:filter) in total".format(len(filter_elements)))
             for filter_element in filter_elements:
                 inkex.utils.debug("id={}".format(filter_element.get('id')))
-                
-            for element in selected:
-                filter_style = [element, element.style.get('filter')]
-                if filter_style[1] is None or filter_style[1]  == "none":
-                    filter_style[1] = "none"
-                if filter_style[1] != "none" and filter_style not in filter_styles:
-                    filter_styles.append(filter_style)
             for filter_style in filter_styles:
                 inkex.utils.debug("id={}, filter={}".format(filter_style[0].get('id'), filter_style[1]))
             if so.show_issues_only is False:
@@ -668,12 +1011,9 @@ class LaserCheck(inkex.EffectExtension):
         to a minimum of stroke colors to be quicker. Note that a None stroke might be same like #000000 but thats not guaranteed
         '''
         if so.checks == "check_all" or so.stroke_colors is True:
+            self.report_timing("stroke colors")
             inkex.utils.debug("\n---------- Stroke colors ({} are allowed)".format(so.stroke_colors_max))
-            strokeColors = []
-            for element in shapes:
-                strokeColor = element.style.get('stroke')
-                if  strokeColor not in strokeColors: #we also add None (default value is #000000 then) and "none" values. 
-                    strokeColors.append(strokeColor)
+            strokeColors = list(dict.fromkeys(self.found['strokeColors'])) #unique, in order of appearance
             if len(strokeColors) > so.stroke_colors_max:
                 for strokeColor in strokeColors:
                     inkex.utils.debug("stroke color {}".format(strokeColor))
@@ -691,12 +1031,9 @@ class LaserCheck(inkex.EffectExtension):
         Ideally all stroke widths are set to 1 pixel.
         '''
         if so.checks == "check_all" or so.stroke_widths is True:              
+            self.report_timing("stroke widths")
             inkex.utils.debug("\n---------- Stroke widths ({} are allowed)".format(so.stroke_widths_max))
-            strokeWidths = []
-            for element in shapes:  
-                strokeWidth = element.style.get('stroke-width')
-                if strokeWidth not in strokeWidths: #we also add None and "none" values. Default width for None value seems to be 1px
-                    strokeWidths.append(strokeWidth)
+            strokeWidths = list(dict.fromkeys(self.found['strokeWidths'])) #unique, in order of appearance
             if len(strokeWidths) > so.stroke_widths_max:
                 for strokeWidth in strokeWidths:
                     if strokeWidth is None:
@@ -722,12 +1059,9 @@ class LaserCheck(inkex.EffectExtension):
         with clip paths. Please convert lines to real dash segments if you want to laser them.
         '''
         if so.checks == "check_all" or so.cosmestic_dashes is True:   
+            self.report_timing("cosmetic dashes")
             inkex.utils.debug("\n---------- Cosmetic dashes")
-            strokeDasharrays = []
-            for element in shapes:  
-                strokeDasharray = element.style.get('stroke-dasharray')
-                if strokeDasharray is not None and strokeDasharray != 'none' and strokeDasharray not in strokeDasharrays:
-                    strokeDasharrays.append(strokeDasharray)
+            strokeDasharrays = list(dict.fromkeys(self.found['strokeDasharrays'])) #unique, in order of appearance
 
             for strokeDasharray in strokeDasharrays:
                 inkex.utils.debug("stroke dash array {}".format(strokeDasharray))
@@ -745,160 +1079,9 @@ class LaserCheck(inkex.EffectExtension):
         Please transfer styles from layers/groups level to element level! You can use "Cleanup Styles" extension to do that
         '''
         if so.checks == "check_all" or so.invisible_shapes is True:     
+            self.report_timing("invisible shapes")
             inkex.utils.debug("\n---------- Invisible shapes")
-            invisibles = []
-            for element in shapes:
-                if element.tag not in (inkex.addNS('tspan','svg')) and element.get('inkscape:groupmode') != 'layer' and not isinstance(element, inkex.Group):                             
-                    strokeAttr = element.get('stroke') #same information could be in regular attribute instead nested in style attribute
-                    if strokeAttr is None or strokeAttr == "none":
-                        strokeVis = 0
-                    elif strokeAttr in ('#ffffff', 'white', 'rgb(255,255,255)'):
-                        strokeVis = 0
-                    else:
-                        strokeVis = 1
-                    stroke = element.style.get('stroke')
-                    if stroke is not None:
-                        if stroke == "none":
-                            strokeVis = 0
-                        elif stroke in ('#ffffff', 'white', 'rgb(255,255,255)'):
-                            strokeVis = 0
-                        else:
-                            strokeVis = 1
-                    
-                    
-                    strokeWidthAttr = element.get('stroke-width') #same information could be in regular attribute instead nested in style attribute
-                    if strokeWidthAttr == "none":
-                        widthVis = 0
-                    elif strokeWidthAttr is not None and self.svg.unittouu(strokeWidthAttr) < 0.005: #really thin (0,005pc = 0,080px)
-                        widthVis = 0
-                    else:
-                        widthVis = 1
-                    stroke_width = element.style.get('stroke-width')
-                    if stroke_width is not None:
-                        if stroke_width == "none":
-                            widthVis = 0
-                        elif stroke_width is not None and self.svg.unittouu(stroke_width) < 0.005: #really thin (0,005pc = 0,080px)
-                            widthVis = 0
-                        else:
-                            widthVis = 1
-  
-  
-                    strokeOpacityAttr = element.get('stroke-opacity') #same information could be in regular attribute instead nested in style attribute
-                    if strokeOpacityAttr == "none":
-                        strokeOpacityVis = 0
-                    elif strokeOpacityAttr is not None and self.svg.unittouu(strokeOpacityAttr) < 0.05: #nearly invisible (<5% opacity)
-                        strokeOpacityVis = 0
-                    else:
-                        strokeOpacityVis = 1
-                    stroke_opacity = element.style.get('stroke-opacity')
-                    if stroke_opacity is not None:
-                        if stroke_opacity == "none": #none means visible!
-                            strokeOpacityVis = 1
-                        elif stroke_opacity is not None and self.svg.unittouu(stroke_opacity) < 0.05: #nearly invisible (<5% opacity)
-                            strokeOpacityVis = 0
-                        else:
-                            strokeOpacityVis = 1
-  
-  
-                    if pagecolor == '#ffffff':
-                        invisColors = [pagecolor, 'white', 'rgb(255,255,255)']
-                    else:
-                        invisColors = [pagecolor] #we could add some parser to convert pagecolor to rgb/hsl/cmyk
-                    fillAttr = element.get('fill') #same information could be in regular attribute instead nested in style attribute
-                    if fillAttr is None or fillAttr == "none":
-                        fillVis = 0
-                    elif fillAttr in invisColors:
-                        fillVis = 0
-                    else:
-                        fillVis = 1
-                    fill = element.style.get('fill')
-                    if fill is not None:
-                        if fill == "none": #none means invisible! (opposite of stroke behaviour)
-                            fillVis = 0
-                        elif fill in invisColors:
-                            fillVis = 0
-                        else:
-                            fillVis = 1
-              
-
-                    fillOpacityAttr = element.get('fill-opacity') #same information could be in regular attribute instead nested in style attribute
-                    if fillOpacityAttr == "none":
-                        fillOpacityVis = 0
-                    elif strokeOpacityAttr is not None and self.svg.unittouu(fillOpacityAttr) < 0.05: #nearly invisible (<5% opacity)
-                        fillOpacityVis = 0
-                    else:
-                        fillOpacityVis = 1
-                    fill_opacity = element.style.get('fill-opacity')
-                    if fill_opacity is not None:
-                        if fill_opacity == "none":
-                            fillOpacityVis = 0
-                        elif fill_opacity is not None and self.svg.unittouu(fill_opacity) < 0.05: #nearly invisible (<5% opacity)
-                            fillOpacityVis = 0
-                        else:
-                            fillOpacityVis = 1
-
-
-                    display = element.style.get('display')
-                    if display == "none":
-                        displayVis = 0
-                    else:
-                        displayVis = 1
-                    displayAttr = element.get('display') #same information could be in regular attribute instead nested in style attribute
-                    if displayAttr == "none":
-                        displayAttrVis = 0
-                    else:
-                        displayAttrVis = 1
-                     
-                 
-                    #check for svg:path elements which have consistent slope (straight lines) and no a defined fill and no stroke. such (poly)lines are still not visible
-                    pathVis = 1
-                    if element.tag == inkex.addNS('path','svg') and fillVis == 1 and strokeVis == 0:
-                        segments = element.path.to_arrays()
-                        chars = set('aAcCqQtTsS')
-                        if not any((c in chars) for c in str(element.path)): #skip beziers (we only check for polylines)
-                            slopes = []
-                            for i in range(0, len(segments)):
-                                if i > 0:
-                                    if segments[i][0].lower() == 'z' or segments[i-1][0].lower() == 'z':
-                                        continue #skip closed contours in combined path
-                                    x1, y1, x2, y2 = segments[i-1][1][0], segments[i-1][1][1], segments[i][1][0], segments[i][1][1]
-                                    if x1 < x2:
-                                        p0 = [x1, y1]
-                                        p1 = [x2, y2]
-                                    else:
-                                        p0 = [x2, y2]
-                                        p1 = [x1, y1]
-                                    dx = p1[0] - p0[0]
-                                    if dx == 0:
-                                        slope = sys.float_info.max #vertical
-                                    else:
-                                        slope = (p1[1] - p0[1]) / dx
-                                    slope = round(slope, 6)
-                                    if slope not in slopes:
-                                        slopes.append(slope)
-                            if len(slopes) < 2:
-                                pathVis = 0
-                              
-                    if element.style is not None: #f if the style attribute is not set at all, the element will be visible with default black color fill and w/o stroke
-                        if (strokeVis == 0 or widthVis == 0 or strokeOpacityVis == 0):
-                            strokeInvis = True
-                        else:
-                            strokeInvis = False
-                        if (fillVis == 0 or fillOpacityVis == 0):
-                            fillInvis = True
-                        else:
-                            fillInvis = False
-                        flags = "id={},strokeVis={},widthVis={},strokeOpacityVis={}=>strokeInvisble:{}|fillVis={},fillOpacityVis={}=>fillInvisble:{}|displayVis={},displayAttrVis=, {}|pathVis={}"\
-                        .format(element.get('id'), strokeVis, widthVis, strokeOpacityVis, strokeInvis, fillVis, fillOpacityVis, fillInvis, displayVis, displayAttrVis, pathVis)
-                        if strokeInvis is True and fillInvis is True:
-                            if element not in invisibles:
-                                invisibles.append(flags)
-                        if displayVis == 0 or displayAttrVis == 0:
-                            if element not in invisibles:
-                                invisibles.append(flags)
-                        if pathVis == 0:
-                            if element not in invisibles:
-                                invisibles.append(flags) 
+            invisibles = self.found['invisibles']
             for invisible in invisibles:
                 inkex.utils.debug(invisible)
             if so.show_issues_only is False:
@@ -914,39 +1097,9 @@ class LaserCheck(inkex.EffectExtension):
         adjust all strokes to use full opacity.
         '''
         if so.checks == "check_all" or so.opacities is True:
+            self.report_timing("opacities")
             inkex.utils.debug("\n---------- Objects with transparencies < 1.0")
-            transparencies = []
-            for element in shapes: 
-                strokeOpacityAttr = element.get('stroke-opacity') #same information could be in regular attribute instead nested in style attribute
-                if strokeOpacityAttr is not None and strokeOpacityAttr not in transparencies:
-                    if float(strokeOpacityAttr) < 1.0:
-                            transparencies.append([element, strokeOpacityAttr, "stroke-opacity"])
-                stroke_opacity = element.style.get('stroke-opacity')
-                if stroke_opacity is not None and stroke_opacity not in transparencies:
-                    if stroke_opacity != "none":
-                        if float(stroke_opacity) < 1.0:
-                                transparencies.append([element, stroke_opacity, "stroke-opacity"])
-                                
-                fillOpacityAttr = element.get('fill-opacity') #same information could be in regular attribute instead nested in style attribute
-                if fillOpacityAttr is not None and fillOpacityAttr not in transparencies:
-                    if float(fillOpacityAttr) < 1.0:
-                            transparencies.append([element, fillOpacityAttr, "fill-opacity"])
-                fill_opacity = element.style.get('fill-opacity')
-                if fill_opacity is not None and fill_opacity not in transparencies:
-                    if fill_opacity != "none":
-                        if float(fill_opacity) < 1.0:
-                                transparencies.append([element, fill_opacity, "fill-opacity"])
-                  
-                opacityAttr = element.get('opacity') #same information could be in regular attribute instead nested in style attribute
-                if opacityAttr is not None and opacityAttr not in transparencies:
-                    if float(opacityAttr) < 1.0:
-                            transparencies.append([element, opacityAttr, "opacity"])
-                opacity = element.style.get('opacity')
-                if opacity is not None and opacity not in transparencies:
-                    if opacity != "none":
-                        if float(opacity) < 1.0:
-                                transparencies.append([element, opacity, "opacity"])
-                                
+            transparencies = self.found['transparencies']
 
             for transparency in transparencies:
                 inkex.utils.debug("id={}, transparency={}, attribute={}".format(transparency[0].get('id'), transparency[1], transparency[2]))
@@ -965,17 +1118,9 @@ class LaserCheck(inkex.EffectExtension):
         Note: this scan only works for paths, not for subpaths. If so, you need to break apart before
         '''
         if so.checks == "check_all" or so.pointy_paths is True:          
+            self.report_timing("pointy paths")
             inkex.utils.debug("\n---------- Pointy paths")
-            pointyPaths = []
-            for element in shapes:
-                if isinstance(element, inkex.PathElement):
-                    p = element.path
-                    commandsCoords = p.to_arrays()
-                    if len(commandsCoords) == 1 or \
-                        (len(commandsCoords) == 2 and commandsCoords[0][1] == commandsCoords[1][1]) or \
-                        (len(commandsCoords) == 2 and commandsCoords[-1][0] == 'Z') or \
-                        (len(commandsCoords) == 3 and commandsCoords[0][1] == commandsCoords[1][1] and commandsCoords[2][1] == 'Z'):
-                        pointyPaths.append(element)
+            pointyPaths = self.found['pointyPaths']
             for pointyPath in pointyPaths:
                 inkex.utils.debug("id={}".format(pointyPath.get('id')))  
             if so.show_issues_only is False:
@@ -990,13 +1135,9 @@ class LaserCheck(inkex.EffectExtension):
         Combined paths make trouble with vector sorting algorithm. Check which paths could be broken apart
         '''
         if so.checks == "check_all" or so.combined_paths is True:          
+            self.report_timing("combined paths")
             inkex.utils.debug("\n---------- Combined paths")
-            combinedPaths = []
-            for element in shapes:
-                if isinstance(element, inkex.PathElement):
-                    break_paths = element.path.break_apart()
-                    if len(break_paths) > 2:
-                        combinedPaths.append([element, len(break_paths)])
+            combinedPaths = self.found['combinedPaths']
             for combinedPath in combinedPaths:
                 inkex.utils.debug("id={} has sub paths: {}".format(combinedPath[0].get('id'), combinedPath[1]))
             if so.show_issues_only is False:
@@ -1012,11 +1153,9 @@ class LaserCheck(inkex.EffectExtension):
         apply absolute coordinates only.
         '''
         if so.checks == "check_all" or so.transformations is True:
+            self.report_timing("transformations")
             inkex.utils.debug("\n---------- Transformations")
-            transformations = []
-            for element in shapes:
-                if element.get('transform') is not None:
-                    transformations.append(element)
+            transformations = self.found['transformations']
 
             for transformation in transformations:
                 inkex.utils.debug("transformation in id={}".format(transformation.get('id')))
@@ -1032,17 +1171,17 @@ class LaserCheck(inkex.EffectExtension):
         have healthier stepper motor belts, etc.
         '''
         if so.checks == "check_all" or so.short_paths is True:  
+            self.report_timing("short paths")
             inkex.utils.debug("\n---------- Short paths (< {} mm)".format(so.short_paths_min))
             shortPaths = []
             totalLength = 0
             totalDropLength = 0
-            for element in shapes:
-                if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
-                    totalLength += stotal
-                    if stotal < self.svg.unittouu(str(so.short_paths_min) + "mm"):
-                        shortPaths.append([element, stotal])
-                        totalDropLength += stotal
+            minLength = self.svg.unittouu(str(so.short_paths_min) + "mm")
+            for element, stotal in self.found['shortPathLengths']:
+                totalLength += stotal
+                if stotal < minLength:
+                    shortPaths.append([element, stotal])
+                    totalDropLength += stotal
             if so.show_issues_only is False:
                 inkex.utils.debug("{} short paths in total".format(len(shortPaths)))
             if totalDropLength > 0:
@@ -1064,23 +1203,22 @@ class LaserCheck(inkex.EffectExtension):
          Additional variables include acceleration, deceleration and how our laser handles/translates the vector data."
         '''
         if so.checks == "check_all" or so.cutting_estimation is True:
+            self.report_timing("cutting estimation")
             inkex.utils.debug("\n---------- Cutting time estimation (Epilog Lasers)")
             totalCuttingLength = 0
             totalTravelLength = 0
             cuttingPathCount = 0
             travelPathCount = 0
             
-            for element in shapes:
-                if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
-                    if "-travelLine" in element.get('id'): #we use that id scheme together with the extension "Draw Directions / Travel Moves"
-                        totalTravelLength += stotal
-                        travelPathCount += 1
-                    elif "markerId-" in element.get('id'):
-                        pass #we skip the path "markerId-<nr>", possibly generated by the extension "Draw Directions / Travel Moves
-                    else:
-                        totalCuttingLength += stotal
-                        cuttingPathCount += 1
+            for element, stotal in self.found['cuttingPathLengths']:
+                if "-travelLine" in element.get('id'): #we use that id scheme together with the extension "Draw Directions / Travel Moves"
+                    totalTravelLength += stotal
+                    travelPathCount += 1
+                elif "markerId-" in element.get('id'):
+                    pass #we skip the path "markerId-<nr>", possibly generated by the extension "Draw Directions / Travel Moves
+                else:
+                    totalCuttingLength += stotal
+                    cuttingPathCount += 1
             totalLength = totalCuttingLength + totalTravelLength
             v_travel = so.max_travel_speed #this is always at maximum
             inkex.utils.debug("total cutting paths={}".format(cuttingPathCount))
@@ -1158,16 +1296,15 @@ class LaserCheck(inkex.EffectExtension):
         '''
         
         if so.checks == "check_all" or so.nodes_per_path is True:  
+            self.report_timing("nodes per path")
             inkex.utils.debug("\n---------- Heavy node-loaded paths (allowed: {} node(s) per {} mm)".format(so.nodes_per_path_max, round(so.nodes_per_path_interval, 3)))
             heavyPaths = []
             totalNodesCount = 0
-            for element in shapes:
-                if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
-                    nodes = len(element.path)
-                    if stotal > 0: #ignore pointy paths, which might generate zero length paths. Use the pointy path check to find them!
-                        if nodes /  stotal > so.nodes_per_path_max / self.svg.unittouu(str(so.nodes_per_path_interval) + "mm"):
-                            heavyPaths.append([element, nodes, stotal])
+            maxDensity = so.nodes_per_path_max / self.svg.unittouu(str(so.nodes_per_path_interval) + "mm")
+            for element, nodes, stotal in self.found['nodesPathLengths']:
+                if stotal > 0: #ignore pointy paths, which might generate zero length paths. Use the pointy path check to find them!
+                    if nodes /  stotal > maxDensity:
+                        heavyPaths.append([element, nodes, stotal])
             if so.show_issues_only is False:
                 inkex.utils.debug("{} Heavy node-loaded paths in total".format(len(heavyPaths)))
             if so.show_expert_tips is True and len(heavyPaths) > 0:
@@ -1200,46 +1337,9 @@ class LaserCheck(inkex.EffectExtension):
 
 
         if so.checks == "check_all" or so.elements_outside_canvas is True:  
+            self.report_timing("elements outside canvas")
             inkex.utils.debug("\n---------- Elements outside canvas or touching the border")
-            elementsOutside = []
-            for element in shapes:
-                if element.tag != inkex.addNS('g', 'svg'):
-                    ebbox = element.bounding_box(element.composed_transform())
-                    if ebbox is not None: #pointy paths for example could generate non-bbox shapes. So we ignore them here
-                        precision = 3
-                        #inkex.utils.debug("{} | bbox: left = {:0.3f} right = {:0.3f} top = {:0.3f} bottom = {:0.3f}".format(element.get('id'), ebbox.left, ebbox.right, ebbox.top, ebbox.bottom))
-                        #pagew = round(self.svg.unittouu(self.svg.get('width')), precision)
-                        #pageh = round(self.svg.unittouu(self.svg.get('height')), precision)   
-                        vxMin, vyMin, vxMax, vyMax = self.svg.get_viewbox()
-                        pagew = round(vxMax - vxMin, precision)
-                        pageh = round(vyMax - vyMin, precision)  
-                        
-                        if round(ebbox.right,  precision) == 0 or \
-                           round(ebbox.left,   precision) == pagew or \
-                           round(ebbox.top,    precision) == 0 or \
-                           round(ebbox.bottom, precision) == pageh:
-                            elementsOutside.append([element, "touching"])
-                        elif \
-                           round(ebbox.right,  precision) < 0 or \
-                           round(ebbox.left,   precision) > pagew or \
-                           round(ebbox.top,    precision) < 0 or \
-                           round(ebbox.bottom, precision) > pageh:
-                            elementsOutside.append([element, "fully outside"])
-                        else: #fully inside or partially inside/outside. we check if one or more corners is outside the canvas
-                            rightOutside = False
-                            leftOutside = False
-                            topOutside = False
-                            bottomOutside = False
-                            if round(ebbox.right,  precision) < 0 or round(ebbox.right,  precision) > pagew:
-                               rightOutside = True
-                            if round(ebbox.left,  precision) < 0 or round(ebbox.left,  precision) > pagew:
-                               leftOutside = True  
-                            if round(ebbox.top,  precision) < 0 or round(ebbox.top,  precision) > pageh:
-                               topOutside = True
-                            if round(ebbox.bottom,  precision) < 0 or round(ebbox.bottom,  precision) > pageh:
-                               bottomOutside = True
-                            if rightOutside is True or leftOutside is True or topOutside is True or bottomOutside is True:
-                                elementsOutside.append([element, "partially outside"])
+            elementsOutside = self.found['elementsOutside']
             for elementOutside in elementsOutside:
                 inkex.utils.debug("id={}, status={}".format(
                         elementOutside[0].get('id'), 
@@ -1255,11 +1355,9 @@ class LaserCheck(inkex.EffectExtension):
              
     
         if so.checks == "check_all" or so.non_path_shapes is True:          
+            self.report_timing("non-path shapes")
             inkex.utils.debug("\n---------- Non-path shapes")
-            nonPathShapes = []
-            for element in shapes:
-                if not isinstance(element, inkex.PathElement) and not isinstance(element, inkex.Group):
-                    nonPathShapes.append(element)
+            nonPathShapes = self.found['nonPathShapes']
             for nonPathShape in nonPathShapes:
                 inkex.utils.debug("id={}, type={}".format(nonPathShape.get('id'), nonPathShape.tag.replace("{http://www.w3.org/2000/svg}", "")))
             if so.show_issues_only is False:
@@ -1269,6 +1367,18 @@ class LaserCheck(inkex.EffectExtension):
               " - Shapes like rectangles, ellipses, arcs, spirals should be converted to svg:path"
               )
          
+        self.report_timing(None)
+        if so.show_timings is True:
+            inkex.utils.debug("\n---------- Timings")
+            inkex.utils.debug("{:<30}{:>12}{:>12}".format("check", "visit (s)", "report (s)"))
+            inkex.utils.debug("{:<30}{:>12.3f}{:>12}".format("traversal", traversalTime, "-"))
+            if self.geometry is not None:
+                traversalTime += geometryTime
+                inkex.utils.debug("{:<30}{:>12.3f}{:>12}".format("geometry ({}/{} cached)".format(self.geometry.hits, self.geometry.hits + self.geometry.misses), geometryTime, "-"))
+            for name, timing in self.timings.items():
+                inkex.utils.debug("{:<30}{:>12.3f}{:>12.3f}".format(name, timing[0], timing[1]))
+            inkex.utils.debug("{:<30}{:>12.3f}{:>12.3f}".format("total", traversalTime + sum(t[0] for t in self.timings.values()), sum(t[1] for t in self.timings.values())))
+
         exit(0)
                              
 if __name__ == '__main__':
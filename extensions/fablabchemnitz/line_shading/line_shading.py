@@ -20,27 +20,40 @@ import math
 import inkex
 import sys
 import png
+import numpy as np
 from lxml import etree
-from inkex.paths import Path
 
 def saw(x):
     #The function returns a symmetric triangle wave with period 4 and varying between -1 and 1
-    x = math.fmod(x, 4.0)
-    x = math.fabs(x)
-    if x > 2.0:
-        y = 3 - x
-    else:
-        y = x - 1        
-    return y
+    x = np.fabs(np.fmod(x, 4.0))
+    return np.where(x > 2.0, 3 - x, x - 1)
  
 def square(x):
     #The function returns a square wave with period 4 and varying between -1 and 1
-    x = math.fmod(x, 4.0)
-    if 1.0 < x < 3.0:
-        y = 1.0
-    else:
-        y = -1.0        
-    return y
+    x = np.fmod(x, 4.0)
+    return np.where((1.0 < x) & (x < 3.0), 1.0, -1.0)
+
+def phases(d_phase, wrap):
+    #Phase of a row before it gets wrapped at each pixel (plus the phase after the last pixel)
+    #and the wrapped phase at each pixel, as the per pixel loop with fmod(phase, wrap) gives them
+    wrapped = np.mod(np.concatenate(([0.0], np.cumsum(d_phase))), wrap)
+    unwrapped = np.concatenate(([0.0], wrapped[:-1] + d_phase))
+    return unwrapped, wrapped[:-1]
+
+def forward_fill(mask, values, initial=0.0):
+    #Value at the last index where mask is set, up to and including each index
+    index = np.where(mask, np.arange(len(mask)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, values[np.maximum(index, 0)], initial)
+
+def segment_means(values, bounds):
+    #Mean of the values between consecutive bounds
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    return (sums[bounds[1:]] - sums[bounds[:-1]]) / np.diff(bounds)
+
+def pack_path(commands, coords):
+    #Pack path commands with their coordinates (one row per command) into a path data string
+    return " ".join(command + " " + " ".join("%.8g" % c for c in row) for command, row in zip(commands, coords))
 
 class LineShading(inkex.EffectExtension):
     
@@ -53,207 +66,138 @@ class LineShading(inkex.EffectExtension):
         pars.add_argument("--min_amplitude", type=float, help="Minimum amplitude (corresponds to white pixels)")         
         pars.add_argument("--max_amplitude", type=float, help="Maximum amplitude (corresponds to black pixels)")     
         pars.add_argument("--gamma", type=float, help="Maximum amplitude (corresponds to black pixels)")                                             
+        pars.add_argument("--use_pillow", type=inkex.Boolean, default=False, help="Read the exported PNG with Pillow instead of the bundled png.py")
         pars.add_argument("--line_width", type=float, help="Line width")
         pars.add_argument("--units", help="Units for line thickness")                        
         pars.add_argument("--remove", type=inkex.Boolean, help="If True, source image is removed")                                    
         pars.add_argument("--active-tab", help="The selected UI-tab when OK was pressed")
 
+    def read_png(self, file):
+        #Returns the darkness of the PNG pixels as (h, w) array, 0.0 for white and 1.0 for black
+        if self.options.use_pillow:
+            from PIL import Image
+            rgb = np.asarray(Image.open(file).convert('RGB'), dtype=float)
+        else:
+            w, h, pixels, metadata = png.Reader(file).read_flat()
+            rgb = np.asarray(pixels, dtype=float).reshape(h, w, metadata['planes'])[:, :, :3]
+        #RGB convert to grayscale 0.21R + 0.72G + 0.07B
+        p = 1.0 - rgb.dot([0.21, 0.72, 0.07])/255.0
+        return np.power(np.clip(p, 0.0, 1.0), 1.0/self.options.gamma)
+
     def drawfunction(self, image_w, image_h, file):        
-        reader = png.Reader(file)
-        w, h, pixels, metadata = reader.read_flat()                    
-        matrice = [[1.0 for i in range(w)]for j in range(h)] 
-        if metadata['alpha']: 
-            n = 4 
-        else: 
-            n = 3
-        #RGB convert to grayscale 0.21R + 0.72G + 0.07B        
-        for y in range(h):        
-            for x in range(w):
-                 pixel_pos = (x + y * w)*n
-                 p = 1.0 - (pixels[pixel_pos]*0.21 + pixels[(pixel_pos+1)]*0.72 + pixels[(pixel_pos+2)]*0.07)/255.0
-                 matrice[y][x] = math.pow(p, 1.0/self.options.gamma)
+        matrice = self.read_png(file)
+        h, w = matrice.shape
         
-        points = []
+        rows = []
         step_y = image_h/h
         step_x = image_w/(w-1)
         min_amplitude = self.options.min_amplitude*step_y/2
         max_amplitude = self.options.max_amplitude*step_y/2
         min_period = self.options.min_period*step_y
         max_period = self.options.max_period*step_y
-        min_frequency = 1.0/max_period     
-        max_frequency = 1.0/min_period        
+        #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
+        periods = min_period + (max_period - min_period)*(1-matrice)
+        amplitudes = min_amplitude + (max_amplitude - min_amplitude)*matrice
+        columns = np.arange(w)
+        pi = math.pi
                         
         #Sinusoidal wave (optimized)            
         if self.options.waveform == 'sin':
             for y in range(h):
-                pi = math.pi
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0
-                x0 = 0.0
-                y0 = math.sin(phase)*(min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x]) + (y+0.5)*step_y
-                points.append(['M',[x0, y0]])
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 2.0*pi/period*step_x                        
-                    #calculate y
-                    if phase > 2.0*pi:
-                        if n_step > 0:
-                            x3 = coord_x
-                            y3 = -amplitude/n_step + (y+0.5)*step_y
-                            x2 = x3 - (x3-x0)*0.32
-                            y2 = y3
-                            x1 = x0 + (x3-x0)*0.34
-                            y1 = y0
-                            x0 = x3
-                            y0 = y3
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                            n_step = 0
-                            amplitude = 0
-                    elif phase < pi < (phase + d_phase):
-                        if n_step > 0:
-                            x3 = coord_x
-                            y3 = amplitude/n_step + (y+0.5)*step_y
-                            x2 = x3 - (x3-x0)*0.34
-                            y2 = y3
-                            x1 = x0 + (x3-x0)*0.32
-                            y1 = y0
-                            x0 = x3
-                            y0 = y3
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                            n_step = 0
-                            amplitude = 0
-                    phase = math.fmod(phase, 2.0*pi)                        
-                    #calculate x
-                    if phase < 0.5*pi < (phase + d_phase):
-                        coord_x = (x - (phase - 0.5*pi)/d_phase)*step_x
-                    elif phase < 1.5*pi < (phase + d_phase):
-                        coord_x = (x - (phase - 1.5*pi)/d_phase)*step_x                             
-                    phase += d_phase
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
-                    n_step += 1                 
+                base = (y+0.5)*step_y
+                d_phase = 2.0*pi/periods[y]*step_x
+                unwrapped, phase = phases(d_phase, 2.0*pi)
+                #crossings of phase pi (top) and 2 pi (bottom), emitted at the last calculated x
+                bottom = (unwrapped[:-1] > 2.0*pi) & (columns > 0)
+                top = ~bottom & (unwrapped[:-1] < pi) & (pi < unwrapped[:-1] + d_phase) & (columns > 0)
+                #calculate x
+                quarter = (phase < 0.5*pi) & (0.5*pi < phase + d_phase)
+                three_quarter = ~quarter & (phase < 1.5*pi) & (1.5*pi < phase + d_phase)
+                coords = forward_fill(quarter | three_quarter, np.where(quarter,
+                    (columns - (phase - 0.5*pi)/d_phase)*step_x,
+                    (columns - (phase - 1.5*pi)/d_phase)*step_x))
+                events = np.flatnonzero(bottom | top)
+                means = segment_means(amplitudes[y], np.concatenate(([0], events, [w])))
+                #calculate y
+                x3 = np.concatenate(([0.0], coords[:-1]))[events]
+                y3 = np.where(bottom[events], -means[:-1], means[:-1]) + base
+                x0 = np.concatenate(([0.0], x3))[:-1]
+                y0 = np.concatenate(([base], y3))[:-1]
+                f1 = np.where(bottom[events], 0.34, 0.32)
+                f2 = np.where(bottom[events], 0.32, 0.34)
+                curves = np.column_stack((x0 + (x3-x0)*f1, y0, x3 - (x3-x0)*f2, y3, x3, y3))
+                rows.append(pack_path(['M'] + ['C']*len(events), [[0.0, base]] + curves.tolist()))
                 #add last point                    
-                if n_step > 0:
-                    phase = math.fmod(phase, 2.0*pi)
-                    if (0 < phase < 0.5*pi) or (pi < phase < 1.5*pi):
+                x0 = float(x3[-1]) if len(events) else 0.0
+                y0 = float(y3[-1]) if len(events) else base
+                amplitude = float(means[-1])
+                coord_x = float(coords[-1])
+                phase = math.fmod(float(unwrapped[-1]), 2.0*pi)
+                points = []
+                if (0 < phase < 0.5*pi) or (pi < phase < 1.5*pi):
+                    x3 = (w-1)*step_x
+                    y3 = amplitude*math.sin(phase) + base
+                    points.append([x0 + (x3-x0)*0.33, y0, x3, y3, x3, y3])
+                else:
+                    if coord_x > (w-1)*step_x:
+                        coord_x = (w-1)*step_x
+                    x3 = coord_x
+                    y3 = math.copysign(amplitude, math.sin(phase)) + base
+                    points.append([x0 + (x3-x0)*0.34, y0, x3 - (x3-x0)*0.32, y3, x3, y3])
+                    if coord_x < (w-1)*step_x:
+                        x0 = x3
+                        y0 = y3
                         x3 = (w-1)*step_x
-                        y3 = amplitude*math.sin(phase)/n_step + (y+0.5)*step_y
-                        x2 = x3
-                        y2 = y3
-                        x1 = x0 + (x3-x0)*0.33
-                        y1 = y0
-                        points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                    else:
-                        if coord_x > (w-1)*step_x:
-                            coord_x = (w-1)*step_x
-                        x3 = coord_x
-                        y3 = math.copysign( amplitude , math.sin(phase))/n_step + (y+0.5)*step_y
-                        x2 = x3 - (x3-x0)*0.32
-                        y2 = y3
-                        x1 = x0 + (x3-x0)*0.34
-                        y1 = y0
-                        points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                        if coord_x < (w-1)*step_x:
-                            x0 = x3
-                            y0 = y3
-                            x3 = (w-1)*step_x
-                            y3 = amplitude*math.sin(phase)/n_step + (y+0.5)*step_y
-                            x2 = x3
-                            y2 = y3
-                            x1 = x0 + (x3-x0)*0.33
-                            y1 = y0
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
+                        y3 = amplitude*math.sin(phase) + base
+                        points.append([x0 + (x3-x0)*0.33, y0, x3, y3, x3, y3])
+                rows.append(pack_path(['C']*len(points), points))
                     
         #Sinusoidal wave (Brute-force)            
         elif self.options.waveform == 'sin_b': 
-            pi2 = math.pi*2.0
             for y in range(h):                    
-                phase = - pi2/4.0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    amplitude = min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x]
-                    phase += pi2*step_x/period
-                    phase = math.fmod(phase, pi2)
-                    if x == 0:
-                        points.append(['M',[x*step_x, amplitude*math.sin(phase) + (y+0.5)*step_y]])
-                    else:
-                        points.append(['L',[x*step_x, amplitude*math.sin(phase) + (y+0.5)*step_y]])             
+                phase = - pi/2.0 + np.cumsum(2.0*pi*step_x/periods[y])
+                coords = np.column_stack((columns*step_x, amplitudes[y]*np.sin(phase) + (y+0.5)*step_y))
+                rows.append(pack_path(['M'] + ['L']*(w-1), coords.tolist()))
                         
-        #Saw wave                        
-        elif self.options.waveform == 'saw':
-            for y in range(h):                    
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0.0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 4.0/period*step_x
-                    if phase > 4.0:
-                        coord_x = (x - (phase - 4.0)/d_phase)*step_x
-                    elif phase < 2.0 < (phase + d_phase):
-                        coord_x = (x - (phase - 2.0)/d_phase)*step_x     
-                    phase = math.fmod(phase, 4.0)
-                    if (phase < 1.0 < (phase + d_phase)) or (phase < 3.0 < (phase + d_phase)): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, amplitude*square(phase - 1.0)/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, amplitude*square(phase - 1.0)/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0                                                    
-                    phase += d_phase
-                    n_step += 1.0
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
-                if n_step > 0:
-                    points.append(['L',[(w-1)*step_x, amplitude*saw(phase - 1.0)/n_step + (y+0.5)*step_y]])
-
-        #Square wave            
+        #Saw wave and square wave
         else:
-            for y in range(h):                    
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 4.0/period*step_x                     
-                    if phase > 4.0:
-                        coord_x = (x - (phase - 4.0)/d_phase)*step_x
-                    elif phase < 2.0 < (phase + d_phase):
-                        coord_x = (x - (phase - 2.0)/d_phase)*step_x                                
-                    phase = math.fmod(phase, 4.0)    
-                    if phase < 1.0 < (phase + d_phase): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                                points.append(['L',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0         
-                    elif phase < 3.0 < (phase + d_phase): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                                points.append(['L',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0                                                            
-                    phase += d_phase
-                    n_step += 1
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
-                if n_step > 0:
-                    if 3.0 > phase > 1.0:
-                        points.append(['L',[(w-1)*step_x, amplitude/n_step + (y+0.5)*step_y]])
+            for y in range(h):
+                base = (y+0.5)*step_y
+                d_phase = 4.0/periods[y]*step_x
+                unwrapped, phase = phases(d_phase, 4.0)
+                #crossings of phase 4 (after they happened) and 2
+                full = unwrapped[:-1] > 4.0
+                half = ~full & (unwrapped[:-1] < 2.0) & (2.0 < unwrapped[:-1] + d_phase)
+                coords = forward_fill(full | half, np.where(full,
+                    (columns - (unwrapped[:-1] - 4.0)/d_phase)*step_x,
+                    (columns - (unwrapped[:-1] - 2.0)/d_phase)*step_x))
+                rising = (phase < 1.0) & (1.0 < phase + d_phase) & (columns > 0)
+                falling = ~rising & (phase < 3.0) & (3.0 < phase + d_phase) & (columns > 0)
+                events = np.flatnonzero(rising | falling)
+                means = segment_means(amplitudes[y], np.concatenate(([0], events, [w])))
+                commands = []
+                points = []
+                if self.options.waveform == 'saw':
+                    for coord_x, amplitude in zip(coords[events].tolist(), (means[:-1]*square(phase[events] - 1.0)).tolist()):
+                        commands.append('M' if coord_x == 0.0 else 'L')
+                        points.append([coord_x, amplitude + base])
+                    commands.append('L' if len(events) else 'M')
+                    points.append([(w-1)*step_x, float(means[-1]*saw(unwrapped[-1] - 1.0)) + base])
+                else:
+                    for coord_x, amplitude in zip(coords[events].tolist(), np.where(rising[events], means[:-1], -means[:-1]).tolist()):
+                        if coord_x == 0.0:
+                            commands.append('M')
+                            points.append([coord_x, amplitude + base])
+                        else:
+                            commands.extend(['L', 'L'])
+                            points.extend([[coord_x, -amplitude + base], [coord_x, amplitude + base]])
+                    commands.append('L' if len(events) else 'M')
+                    if 3.0 > unwrapped[-1] > 1.0:
+                        points.append([(w-1)*step_x, float(means[-1]) + base])
                     else:
-                        points.append(['L',[(w-1)*step_x, -amplitude/n_step + (y+0.5)*step_y]])
-        return points
+                        points.append([(w-1)*step_x, -float(means[-1]) + base])
+                rows.append(pack_path(commands, points))
+        return " ".join(rows)
     
     def draw_path(self, node, file):         
         newpath = etree.Element(inkex.addNS('path','svg'))
@@ -271,7 +215,7 @@ class LineShading(inkex.EffectExtension):
         newpath.set('transform', t)
         image_w = float(node.get('width'))
         image_h = float(node.get('height'))                    
-        newpath.set('d', str(Path(self.drawfunction(image_w, image_h, file))))
+        newpath.set('d', self.drawfunction(image_w, image_h, file))
         newpath.set('title', 'Line_Shading')
         node.getparent().append(newpath)
         newpath.set('x', x)
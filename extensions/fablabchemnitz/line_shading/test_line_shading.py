@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import io
+import types
+import pytest
+
+pytest.importorskip("inkex")
+Image = pytest.importorskip("PIL.Image")
+
+from line_shading import LineShading
+
+def shade(color, waveform, max_period):
+    image = io.BytesIO()
+    Image.new('RGB', (20, 3), color).save(image, format='PNG')
+    image.seek(0)
+    extension = LineShading()
+    extension.options = types.SimpleNamespace(waveform=waveform, min_period=0.5, max_period=max_period,
+        min_amplitude=0.1, max_amplitude=1.0, gamma=1.0, use_pillow=True)
+    return extension.drawfunction(100.0, 30.0, image)
+
+@pytest.mark.parametrize("waveform", ['sin', 'saw', 'square'])
+def test_row_without_crossings(waveform):
+    #a white image with a long period has no phase crossings in any row
+    path = shade((255, 255, 255), waveform, 1000.0)
+    rows = ['M' + row for row in path.split('M')[1:]]
+    assert path.startswith('M') and len(rows) == 3
+    for y, row in enumerate(rows):
+        coords = [float(c) for c in row.split() if not c.isalpha()]
+        assert coords[-2] == pytest.approx(100.0)
+        assert coords[-1] == pytest.approx((y + 0.5)*10.0, abs=0.5)
+
+def test_rows_with_crossings():
+    path = shade((0, 0, 0), 'sin', 1000.0)
+    assert path.startswith('M') and path.count('M') == 3
+    assert path.count('C') > 3
@@ -22,145 +22,16 @@ import math
 import random
 import colorsys
 import os
-import numpy
 import timeit
+import heapq
 
 import networkx as nx
 
 MAX_CONSECUTIVE_OVERWRITE_EDGE = 3
-STOP_SHORTEST_PATH_IF_SMALLER_OR_EQUAL_TO = 1
 OVERWRITE_ALLOW = 0
 OVERWRITE_ALLOW_SOME = 1
 OVERWRITE_ALLOW_NONE = 2
 
-"""
-class Graph:
-    def __init__(self):
-        self.__adj = {}
-        self.__data = {}
-
-    def __str__(self):
-        return str(self.__adj)
-
-    def nodes(self):
-        nodes = []
-        for n in self.__adj:
-            nodes.append(n)
-        return nodes
-
-    def edges(self):
-        edges = []
-        for n1 in self.__adj:
-            for n2 in self.neighbours(n1):
-                if((n2, n1) not in edges):
-                    edges.append((n1, n2))
-        return edges
-
-    def node(self, n):
-        if n in self.__adj:
-            return self.__data[n]
-        else:
-            raise ValueError('Inexistant node')
-
-    def neighbours(self, n):
-        if n in self.__adj:
-            return self.__adj[n]
-        else:
-            raise ValueError('Inexistant node')
-
-    def outEdges(self, n):
-        edges = []
-        for n2 in self.neighbours(n):
-            edges.append((n, n2))
-        return edges
-
-    def degree(self, n):
-        if n in self.__adj:
-            return len(self.__adj[n])
-        else:
-            raise ValueError('Inexistant node')
-
-    def addNode(self, n, data):
-        if n not in self.__adj:
-            self.__adj[n] = []
-            self.__data[n] = data
-        else:
-            raise ValueError('Node already exists')
-
-    def removeNode(self, n):
-        if n in self.__adj:
-            #Remove all edges pointing to node
-            for n2 in self.__adj:
-                neighbours = self.__adj[n2]
-                if n in neighbours:
-                    neighbours.remove(n)
-            del self.__adj[n]
-            del self.__data[n]
-        else:
-            raise ValueError('Removing inexistant node')
-
-    def addEdge(self, n1, n2):
-        if(n1 in self.__adj and n2 in self.__adj):
-            self.__adj[n1].append(n2)
-            self.__adj[n2].append(n1)
-        else:
-            raise ValueError('Adding edge to inexistant node')
-
-    def removeEdge(self, n1, n2):
-        if(n1 in self.__adj and n2 in self.__adj and
-        n2 in self.__adj[n1] and n1 in self.__adj[n2]):
-            self.__adj[n1].remove(n2)
-            self.__adj[n2].remove(n1)
-        else:
-            raise ValueError('Removing inexistant edge')
-
-    def __sortedEdgesByAngle(self, previousEdge, edges):
-        previousEdgeVectNormalized = numpy.array(self.node(previousEdge[1])) - numpy.array(self.node(previousEdge[0]))
-        previousEdgeVectNormalized = previousEdgeVectNormalized/numpy.linalg.norm(previousEdgeVectNormalized)
-        #previousEdgeVectNormalized = numpy.array((0,1))
-        def angleKey(outEdge):
-            edgeVectNormalized = numpy.array(self.node(outEdge[1])) - numpy.array(self.node(outEdge[0]))
-            edgeVectNormalized = edgeVectNormalized/numpy.linalg.norm(edgeVectNormalized)
-            return -numpy.dot(previousEdgeVectNormalized, edgeVectNormalized)
-
-        return sorted(edges, key=angleKey)
-
-    def dfsEdges(self):
-        nodes = self.nodes()
-        visitedEdges = set()
-        visitedNodes = set()
-        edges = {}
-        dfsEdges = []
-
-        for startNode in nodes:
-            #if self.degree(startNode) != 1:
-                #continue#Makes sure we don't start in the middle of a path
-            stack = [startNode]
-            prevEdge = None
-            while stack:
-                currentNode = stack[-1]
-                if currentNode not in visitedNodes:
-                    edges[currentNode] = self.outEdges(currentNode)
-                    visitedNodes.add(currentNode)
-
-                if edges[currentNode]:
-                    if(prevEdge):
-                        edges[currentNode] = self.__sortedEdgesByAngle(prevEdge, edges[currentNode])
-                    edge = edges[currentNode][0]
-                    if edge not in visitedEdges and (edge[1], edge[0]) not in visitedEdges:
-                        visitedEdges.add(edge)
-                        # Mark the traversed "to" node as to-be-explored.
-                        stack.append(edge[1])
-                        dfsEdges.append(edge)
-                        prevEdge = edge
-                    edges[currentNode].pop(0)
-                else:
-                    # No more edges from the current node.
-                    stack.pop()
-                    prevEdge = None
-
-        return dfsEdges
-"""
 
 class LongestContinuousPath(inkex.GenerateExtension):
 
@@ -225,15 +96,33 @@ class LongestContinuousPath(inkex.GenerateExtension):
             inkex.utils.debug(message)
 
     def mergeWithTolerance(self, G, tolerance):
+        if tolerance <= 0:
+            return
+
+        # Hash the nodes into a grid of tolerance sized cells, so each node
+        # is only compared with the nodes in the surrounding cells
+        grid = {}
+        for n, data in G.nodes(data=True):
+            cell = (math.floor(data['x'] / tolerance), math.floor(data['y'] / tolerance))
+            grid.setdefault(cell, []).append(n)
+
         mergeTo = {}
-        for ni in G.nodes():
-            for nj in G.nodes():
-                if nj <= ni:
+        for ni in sorted(G.nodes()):
+            if ni in mergeTo:
+                continue
+            node_i = G.nodes[ni]
+            cx = math.floor(node_i['x'] / tolerance)
+            cy = math.floor(node_i['y'] / tolerance)
+            neighbours = []
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    neighbours.extend(grid.get((cx + dx, cy + dy), ()))
+            for nj in sorted(neighbours):
+                if nj <= ni or nj in mergeTo:
                     continue
                 # self.log("Test " + str(ni) + " with " + str(nj))
-                dist_ij = self.dist(G.nodes[ni], G.nodes[nj])
-                if (dist_ij < tolerance) and (nj not in mergeTo) and (ni not in mergeTo):
-                    # self.log("Merge " + str(nj) + " with " + str(ni) + " (dist=" + str(dist_ij) + ")")
+                if self.dist(node_i, G.nodes[nj]) < tolerance:
+                    # self.log("Merge " + str(nj) + " with " + str(ni))
                     mergeTo[nj] = ni
 
         for n in mergeTo:
@@ -384,11 +273,40 @@ class LongestContinuousPath(inkex.GenerateExtension):
                 length += self.dist(G.nodes[path[i - 1]], G.nodes[path[i]])
         return length
 
+    # Shortest path (by physical length) from source to the closest node of targets.
+    # Dijkstra, stopped as soon as the first target is reached
+    def shortestPathToClosest(self, G, source, targets):
+        distances = {source: 0.0}
+        previous = {}
+        visited = set()
+        heap = [(0.0, source)]
+        while heap:
+            distance, n = heapq.heappop(heap)
+            if n in visited:
+                continue
+            visited.add(n)
+            if n in targets:
+                path = [n]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                path.reverse()
+                return path
+            node_n = G.nodes[n]
+            for neighbour in G[n]:
+                if neighbour in visited:
+                    continue
+                newDistance = distance + self.dist(node_n, G.nodes[neighbour])
+                if newDistance < distances.get(neighbour, math.inf):
+                    distances[neighbour] = newDistance
+                    previous[neighbour] = n
+                    heapq.heappush(heap, (newDistance, neighbour))
+        return None
+
     # Eulerization algorithm:
     # 1. Find all vertices with odd valence.
-    # 2. Pair them up with their nearest neighbor.
-    # 3. Find the shortest path between each pair.
-    # 4. Duplicate these edges.
+    # 2. Pair each one up with the closest unpaired one along the graph,
+    #    found by a single Dijkstra search
+    # 3. Duplicate the edges of the shortest path between each pair.
     # Doesn't modify input graph
     def makeEulerianGraph(self, G):
         oddNodes = []
@@ -400,32 +318,16 @@ class LongestContinuousPath(inkex.GenerateExtension):
         if len(oddNodes) == 0:
             return G
 
-        # self.computeEdgeWeights(G)
-
         pathsToDuplicate = []
-
-        while (oddNodes):
-            n1 = oddNodes[0]
-
-            shortestPaths = []
-            # For every other node, find the shortest path to the closest node
-            for n2 in oddNodes:
-                if n2 != n1:
-                    # self.log(str(n1) + " " + str(n2))
-                    shortestPath = nx.astar_path(G, n1, n2,
-                                                 lambda n1, n2: self.dist(G.nodes[n1], G.nodes[n2]), 'weight')
-                    # self.log(str(len(shortestPath)))
-                    shortestPaths.append(shortestPath)
-                    if len(shortestPath) <= STOP_SHORTEST_PATH_IF_SMALLER_OR_EQUAL_TO:
-                        # If we find a path of length <= STOP_SHORTEST_PATH_IF_SMALLER_OR_EQUAL_TO,
-                        # we assume it's good enough (to speed up calculation)
-                        break
-            # For all the shortest paths from n1, we take the shortest one and therefore get the closest odd node
-            shortestShortestPath = min(shortestPaths, key=lambda x: self.pathLength(G, x))
-            closestNode = shortestShortestPath[-1]
-            pathsToDuplicate.append(shortestShortestPath)
-            oddNodes.pop(0)
-            oddNodes.remove(closestNode)
+        unpairedNodes = set(oddNodes)
+        for n1 in oddNodes:
+            if n1 not in unpairedNodes:
+                continue
+            unpairedNodes.remove(n1)
+            # Every connected graph has an even number of odd nodes
+            shortestPath = self.shortestPathToClosest(G, n1, unpairedNodes)
+            unpairedNodes.remove(shortestPath[-1])
+            pathsToDuplicate.append(shortestPath)
 
         numberOfDuplicatedEdges = 0
         lenghtOfDuplicatedEdges = 0.0
@@ -467,94 +369,77 @@ class LongestContinuousPath(inkex.GenerateExtension):
             dist = self.dist(G.nodes[n1], G.nodes[n2])
             G.add_edge(n1, n2, weight=dist)"""
 
-    def _getNodePosition(self, G, n):
-        return (G.nodes[n]['x'], G.nodes[n]['y'])
-
-    def _getBestEdge(self, G, previousEdge, edges):
-        previousEdgeVectNormalized = numpy.array(self._getNodePosition(G, previousEdge[1])) - numpy.array(
-            self._getNodePosition(G, previousEdge[0]))
-        # self.log(str(numpy.linalg.norm(previousEdgeVectNormalized)) + " " + str(previousEdge[1]) + " " + str(previousEdge[0]))
-        previousEdgeVectNormalized = previousEdgeVectNormalized / numpy.linalg.norm(previousEdgeVectNormalized)
-
-        # previousEdgeVectNormalized = numpy.array((0,1))
-        def angleKey(outEdge):
-            edgeVectNormalized = numpy.array(self._getNodePosition(G, outEdge[1])) - numpy.array(
-                self._getNodePosition(G, outEdge[0]))
-            edgeVectNormalized = edgeVectNormalized / numpy.linalg.norm(edgeVectNormalized)
-            return numpy.dot(previousEdgeVectNormalized, edgeVectNormalized)
-
-        return max(edges, key=angleKey)
-
-    """def eulerian_circuit(self, G):
-        g = G.__class__(G)#G.copy()
-        v = next(g.nodes())
-
-        degree = g.degree
-        edges = g.edges
-
+    # Hierholzer's algorithm on indexed adjacency lists, without recursion.
+    # From each node the walk continues as straight as possible
+    def eulerian_circuit_hierholzer(self, G):
+        nodes = list(G.nodes)
+        nodeIndex = {n: i for i, n in enumerate(nodes)}
+        xs = [G.nodes[n]['x'] for n in nodes]
+        ys = [G.nodes[n]['y'] for n in nodes]
+
+        # Parallel edges of a multigraph are separate entries
+        edgeEnds = []
+        incidentEdges = [[] for n in nodes]
+        for n1, n2 in G.edges():
+            i, j = nodeIndex[n1], nodeIndex[n2]
+            incidentEdges[i].append(len(edgeEnds))
+            incidentEdges[j].append(len(edgeEnds))
+            edgeEnds.append((i, j))
+        used = [False] * len(edgeEnds)
+        firstUnused = [0] * len(nodes)  # all incident edges before are used
+        extraNode = nodeIndex.get(-1)  # from makeEulerianGraphExtraNode()
+
+        def otherEnd(e, i):
+            i1, i2 = edgeEnds[e]
+            return i2 if i1 == i else i1
+
+        def nextEdge(i, previous):
+            edges = incidentEdges[i]
+            k = firstUnused[i]
+            while k < len(edges) and used[edges[k]]:
+                k += 1
+            firstUnused[i] = k
+            if k == len(edges):
+                return None
+            if previous is None or i == extraNode:
+                return edges[k]
+            # Take the edge with the smallest angle to the previous one
+            px, py = xs[i] - xs[previous], ys[i] - ys[previous]
+            norm = math.hypot(px, py)
+            if norm > 0:
+                px, py = px / norm, py / norm
+            bestEdge = None
+            bestDot = -math.inf
+            for e in edges[k:]:
+                if used[e]:
+                    continue
+                j = otherEnd(e, i)
+                ex, ey = xs[j] - xs[i], ys[j] - ys[i]
+                norm = math.hypot(ex, ey)
+                dot = (px * ex + py * ey) / norm if norm > 0 else -1.0
+                if dot > bestDot:
+                    bestEdge = e
+                    bestDot = dot
+            return bestEdge
+
+        # Nodes are emitted when they have no more unused edges, which gives
+        # the circuit backwards
         circuit = []
-        vertex_stack = [v]
-        last_vertex = None
-        while vertex_stack:
-            current_vertex = vertex_stack[-1]
-            if degree(current_vertex) == 0:
-                if last_vertex is not None:
-                    circuit.append((last_vertex, current_vertex))
-                    self.log(str(last_vertex) + " " + str(current_vertex))
-                last_vertex = current_vertex
-                vertex_stack.pop()
+        stack = [(0, None)]  # node and the node it was reached from
+        while stack:
+            i, previous = stack[-1]
+            e = nextEdge(i, previous)
+            if e is None:
+                stack.pop()
+                circuit.append(nodes[i])
             else:
-                if circuit:
-                    arbitrary_edge = self._getBestEdge(g, circuit[-1], edges(current_vertex))
-                else:#For the first iteration we arbitrarily take the first edge
-                    arbitrary_edge = next(edges(current_vertex))
-                #self.log(str(arbitrary_edge) + "::" + str(edges[current_vertex]))
-
-                #self.log(str(edges[current_vertex]))
-                #self.log(" ")
-
-                vertex_stack.append(arbitrary_edge[1])
-                g.remove_edge(*arbitrary_edge)
-
-        return circuit"""
-
-    # Walk as straight as possible from node until stuck
-    def walk(self, node, G):
-        n = node
-        e = None
-        path = [n]
-
-        while G.degree[n]:  # Continue until there no unvisited edges from n
-            if e:
-                e = self._getBestEdge(G, e, G.edges(n))
-            else:  # For the first iteration we arbitrarily take the first edge
-                e = (n, next(iter(G[n])))
-            n = e[1]
-            G.remove_edge(*e)
-            path.append(n)
-
-        return path
-
-    def eulerian_circuit_hierholzer(self, G):
-        g = G.copy()
-        v = next(iter(g.nodes))  # First vertex, arbitrary
-
-        cycle = self.walk(v, g)
-        assert cycle[0] == cycle[-1]
-        notvisited = set(cycle)
-
-        while len(notvisited) != 0:
-            v = notvisited.pop()
-            if g.degree(v) != 0:
-                i = cycle.index(v)
-                sub = self.walk(v, g)
-                assert sub[0] == sub[-1]
-                cycle = cycle[:i] + sub[:-1] + cycle[i:]
-                notvisited.update(sub)
+                used[e] = True
+                stack.append((otherEnd(e, i), i))
+        circuit.reverse()
 
         cycleEdges = []
         prevNode = None
-        for n in cycle:
+        for n in circuit:
             if prevNode != None:
                 cycleEdges.append((prevNode, n))
             prevNode = n
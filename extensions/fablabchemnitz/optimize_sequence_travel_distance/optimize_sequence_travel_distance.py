@@ -33,6 +33,7 @@
 
 import math
 import sys
+import time
 from lxml import etree
 import inkex
 import simpletransform
@@ -64,6 +65,210 @@ default=1,help="How compound paths are handled")
 
 """
 
+class PointGrid:
+    """
+    Uniform grid over a set of 2D points, used to find the nearest remaining point
+    without scanning all of them. Points are identified by an integer handle and
+    can be removed once they have been used.
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.remaining = len(points)
+        if not points:
+            return
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        self.x_min = min(xs)
+        self.y_min = min(ys)
+        width = max(xs) - self.x_min
+        height = max(ys) - self.y_min
+        # aim for roughly one point per cell
+        self.cell = max(math.sqrt(max(width * height, 1e-12) / len(points)), width / len(points), height / len(points), 1e-9)
+        self.cols = int(width / self.cell) + 1
+        self.rows = int(height / self.cell) + 1
+        self.cells = {}
+        for handle, point in enumerate(points):
+            self.cells.setdefault(self.cell_of(point), set()).add(handle)
+
+    def cell_of(self, point):
+        col = min(max(int((point[0] - self.x_min) / self.cell), 0), self.cols - 1)
+        row = min(max(int((point[1] - self.y_min) / self.cell), 0), self.rows - 1)
+        return col, row
+
+    def remove(self, handle):
+        key = self.cell_of(self.points[handle])
+        self.cells[key].discard(handle)
+        if not self.cells[key]:
+            del self.cells[key]
+        self.remaining -= 1
+
+    def nearest(self, x, y):
+        """
+        Return the handle of the point closest to (x, y), or None if the grid is empty.
+        Ties are resolved in favour of the higher handle, like the original linear scan.
+        """
+        if self.remaining == 0:
+            return None
+        col, row = self.cell_of((x, y))
+        best = None
+        best_dist = float('inf')
+        ring = 0
+        while True:
+            if (2 * ring + 1) ** 2 > len(self.cells):
+                # the ring covers more cells than are occupied: scan what is left instead
+                candidates = (h for handles in self.cells.values() for h in handles)
+                ring_candidates = candidates
+            else:
+                ring_candidates = self._ring(col, row, ring)
+            for handle in ring_candidates:
+                px, py = self.points[handle]
+                dist = (px - x) * (px - x) + (py - y) * (py - y)
+                if dist < best_dist or (dist == best_dist and handle > best):
+                    best = handle
+                    best_dist = dist
+            if (2 * ring + 1) ** 2 > len(self.cells):
+                return best
+            # everything outside of the current ring is at least ring * cell away
+            if best is not None and best_dist < (ring * self.cell) ** 2:
+                return best
+            ring += 1
+
+    def _ring(self, col, row, ring):
+        for c in range(col - ring, col + ring + 1):
+            for r in range(row - ring, row + ring + 1):
+                if ring and c not in (col - ring, col + ring) and r not in (row - ring, row + ring):
+                    continue
+                handles = self.cells.get((c, r))
+                if handles:
+                    yield from handles
+
+
+def pen_up_distance(a, b):
+    return math.hypot(b[0] - a[0], b[1] - a[1])
+
+
+def tour_length(start, entries, exits, tour):
+    """
+    Total pen-up distance of a tour, given as a list of (index, reversed) pairs,
+    starting from the pen position start.
+    """
+    total = 0.0
+    last = start
+    for i, is_reversed in tour:
+        if is_reversed:
+            total += pen_up_distance(last, exits[i])
+            last = entries[i]
+        else:
+            total += pen_up_distance(last, entries[i])
+            last = exits[i]
+    return total
+
+
+def greedy_tour(start, entries, exits, reversible):
+    """
+    Nearest neighbour tour over the elements described by entries and exits.
+    Reversible elements may be entered from their exit point as well.
+    Returns a list of (index, reversed) pairs.
+    """
+    count = len(entries)
+    # every element owns its entry point and, if reversible, its exit point as well
+    points = list(entries)
+    owner = list(range(count))
+    exit_handle = [None] * count
+    for i in range(count):
+        if reversible[i]:
+            exit_handle[i] = len(points)
+            points.append(exits[i])
+            owner.append(i)
+    grid = PointGrid(points)
+
+    tour = []
+    x_last, y_last = start
+    while len(tour) < count:
+        handle = grid.nearest(x_last, y_last)
+        i = owner[handle]
+        is_reversed = handle >= count
+        grid.remove(i)
+        if exit_handle[i] is not None:
+            grid.remove(exit_handle[i])
+        tour.append((i, is_reversed))
+        x_last, y_last = entries[i] if is_reversed else exits[i]
+    return tour
+
+
+def refine_tour(start, entries, exits, reversible, tour, time_budget, window=50):
+    """
+    Improve a tour by Or-opt moves (relocating chains of up to three elements) and,
+    for reversible elements, 2-opt moves (drawing a run of elements backwards).
+    Candidate moves are limited to a window of neighbouring tour positions. Stops
+    when no move improves the tour anymore or when time_budget seconds are spent.
+    """
+    deadline = time.monotonic() + time_budget
+    order = [i for i, is_reversed in tour]
+    flipped = [is_reversed for i, is_reversed in tour]
+    n = len(order)
+
+    def entry(p):
+        return exits[order[p]] if flipped[p] else entries[order[p]]
+
+    def exit(p):
+        return entries[order[p]] if flipped[p] else exits[order[p]]
+
+    def before(p):
+        return start if p == 0 else exit(p - 1)
+
+    def link(a, p):
+        # pen-up distance from point a to the element at position p (nothing after the last one)
+        return pen_up_distance(a, entry(p)) if p < n else 0.0
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for p in range(n):
+            if time.monotonic() >= deadline:
+                break
+
+            # 2-opt: draw the elements p..q in opposite order and direction
+            for q in range(p + 1, min(n, p + window)):
+                if not reversible[order[q]] or not reversible[order[p]]:
+                    break
+                old = pen_up_distance(before(p), entry(p)) + link(exit(q), q + 1)
+                new = pen_up_distance(before(p), exit(q)) + link(entry(p), q + 1)
+                if new < old - 1e-9:
+                    order[p:q + 1] = order[p:q + 1][::-1]
+                    flipped[p:q + 1] = [not f for f in flipped[p:q + 1][::-1]]
+                    improved = True
+
+            # Or-opt: move the chain p..e between positions j and j + 1
+            for k in range(1, 4):
+                e = p + k - 1
+                if e >= n:
+                    break
+                removal_gain = pen_up_distance(before(p), entry(p)) + link(exit(e), e + 1) - link(before(p), e + 1)
+                best_j = None
+                best_gain = 1e-9
+                for j in range(max(-1, p - window), min(n, e + window)):
+                    if p - 1 <= j <= e:
+                        continue
+                    a = start if j == -1 else exit(j)
+                    insert_cost = pen_up_distance(a, entry(p)) + link(exit(e), j + 1) - link(a, j + 1)
+                    if removal_gain - insert_cost > best_gain:
+                        best_j = j
+                        best_gain = removal_gain - insert_cost
+                if best_j is not None:
+                    chain = order[p:e + 1]
+                    chain_flipped = flipped[p:e + 1]
+                    del order[p:e + 1]
+                    del flipped[p:e + 1]
+                    at = best_j + 1 if best_j < p else best_j + 1 - k
+                    order[at:at] = chain
+                    flipped[at:at] = chain_flipped
+                    improved = True
+                    break
+    return list(zip(order, flipped))
+
+
 class OptimizeSequenceTravelDistance(inkex.EffectExtension):
     """
     Inkscape effect extension.
@@ -78,6 +283,9 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
     def add_arguments(self, pars):
         pars.add_argument( "--reordering",type=int, default=1, help="How groups are handled")
         pars.add_argument( "--preview_rendering",type=inkex.Boolean, default=False, help="Preview rendering") # Rendering is available for debug purposes. It only previews pen-up movements that are reordered and typically does not include all possible movement.
+        pars.add_argument( "--allow_reverse",type=inkex.Boolean, default=False, help="Allow drawing paths in reverse direction")
+        pars.add_argument( "--refine_time",type=float, default=0.0, help="Time budget (seconds) for 2-opt/Or-opt refinement. 0 = disabled")
+        pars.add_argument( "--report_travel",type=inkex.Boolean, default=True, help="Report pen-up travel distance before and after")
         self.auto_rotate = True
 
     def effect(self):
@@ -181,6 +389,9 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
 
         self.svg = self.parse_svg(self.svg, matCurrent)
 
+        if self.options.report_travel == True:
+            self.msg("Pen-up travel distance: {:0.1f} mm before, {:0.1f} mm after optimization".format(
+                self.air_total_default * 25.4, self.air_total_sorted * 25.4))
 
     def parse_svg(self, input_node, mat_current=None, parent_vis='visible'):
         """
@@ -1104,85 +1315,76 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
 
 
     def ReorderNodeList(self, coord_dict, group_dict):
-        # Re-order the given set of SVG elements, using a simple "greedy" algorithm.
-        # The first object will be the element closest to the origin
-        # After this choice, the algorithm loops through all remaining elements looking for the element whose first x,y
-        # coordinates are closest to the the previous choice's last x,y coordinates
-        # This process continues until all elements have been sorted into ordered_element_list and removed from group_dict    
-        
-        ordered_layer_element_list = []
-            
-        # Continue until all elements have been re-ordered
-        while group_dict:
-            
-            nearest_dist = float('inf')
-            for key,node in group_dict.items():    
-                # Is this node non-plottable?
-                # If so, exit loop and append element to ordered_layer_element_list
-                if not coord_dict[key][0]:
-                    # Object is not Plottable
-                    nearest = node 
-                    nearest_id = key 
-                    continue
-                
-                # If we reach this point, node is plottable and needs to be considered in our algo
-                entry_x = coord_dict[key][1] # x-coordinate of first point of the path
-                entry_y = coord_dict[key][2] # y-coordinate of first point of the path
-
-                exit_x = coord_dict[key][3] # x-coordinate of last point of the path
-                exit_y = coord_dict[key][4] # y-coordinate of last point of the path
-
-                object_dist = (entry_x-self.x_last)*(entry_x-self.x_last) + (entry_y-self.y_last) * (entry_y-self.y_last)
-                # This is actually the distance squared; calculating it rather than the pythagorean distance
-                #  saves a square root calculation. Right now, we only care about _which distance is less_
-                #  not the exact value of it, so this is a harmless shortcut.
-                # If this distance is smaller than the previous element's distance, then replace the previous
-                # element's entry with our current element's distance 
-                if nearest_dist >= object_dist:
-                    # We have found an element closer than the previous closest element 
-                    nearest = node
-                    nearest_id = key 
-                    nearest_dist = object_dist
-                    nearest_start_x = entry_x
-                    nearest_start_y = entry_y
-
-            # Now that the closest object has been determined, it is time to add it to the 
-            # optimized list of closest objects
-            ordered_layer_element_list.append(nearest)
-    
-            # To determine the closest object in the next iteration of the loop, 
-            # we must save the last x,y coor of this element
-            # If this element is plottable, then save the x,y coordinates
-            # If this element is non-plottable, then do not save the x,y coordinates
-            if coord_dict[nearest_id][0]:
-            
-                # Also, draw line indicating that we've found a new point.
-                if self.options.preview_rendering == True: 
-                    preview_path = []    # pen-up path data for preview 
-
-                    preview_path.append("M{0:.3f} {1:.3f}".format(
-                        self.x_last, self.y_last))
-                    preview_path.append("{0:.3f} {1:.3f}".format(
-                        nearest_start_x, nearest_start_y))
-                    self.p_style.update({'stroke': self.color_index(self.layer_index)})  
-                    path_attrs = {
-                        'style': str(inkex.Style(self.p_style)),
-                        'd': " ".join(preview_path)}
-                        
-                    etree.SubElement( self.preview_layer,
-                        inkex.addNS( 'path', 'svg'), path_attrs, nsmap=inkex.NSS )
+        # Re-order the given set of SVG elements, using a "greedy" nearest neighbour algorithm.
+        # The first object will be the element closest to the current pen position.
+        # After this choice, a grid index over the entry (and, if reversing is allowed, the exit)
+        # points is queried for the element closest to the previous choice's last x,y coordinates.
+        # This process continues until all plottable elements have been sorted. The greedy tour
+        # is then optionally refined by 2-opt / Or-opt moves within the given time budget.
+        # Non-plottable elements keep their relative order and are appended at the end.
+
+        keys = []           # plottable element ids, in document order
+        unplottable = []    # non-plottable elements, in document order
+        for key, node in group_dict.items():
+            if coord_dict[key][0]:
+                keys.append(key)
+            else:
+                unplottable.append(node)
 
-                self.x_last = coord_dict[nearest_id][3]
-                self.y_last = coord_dict[nearest_id][4]
+        entries = [(coord_dict[key][1], coord_dict[key][2]) for key in keys]
+        exits = [(coord_dict[key][3], coord_dict[key][4]) for key in keys]
+        reversible = [self.options.allow_reverse and self.isReversible(group_dict[key]) for key in keys]
 
-            # Remove this element from group_dict to indicate it has been optimized
-            del group_dict[nearest_id]
-    
-        # Once all elements have been removed from the group_dictionary
-        # Return the optimized list of svg elements in the layer
+        start = (self.x_last, self.y_last)
+        self.air_total_default += tour_length(start, entries, exits, [(i, False) for i in range(len(keys))])
+
+        tour = greedy_tour(start, entries, exits, reversible)
+        if self.options.refine_time > 0 and len(tour) > 2:
+            tour = refine_tour(start, entries, exits, reversible, tour, self.options.refine_time)
+        self.air_total_sorted += tour_length(start, entries, exits, tour)
+
+        ordered_layer_element_list = []
+        for i, is_reversed in tour:
+            node = group_dict[keys[i]]
+            if is_reversed:
+                node.set('d', str(inkex.Path(node.get('d')).reverse()))
+                entry, exit = exits[i], entries[i]
+            else:
+                entry, exit = entries[i], exits[i]
+
+            # Also, draw line indicating that we've found a new point.
+            if self.options.preview_rendering == True:
+                preview_path = []    # pen-up path data for preview
+
+                preview_path.append("M{0:.3f} {1:.3f}".format(
+                    self.x_last, self.y_last))
+                preview_path.append("{0:.3f} {1:.3f}".format(
+                    entry[0], entry[1]))
+                self.p_style.update({'stroke': self.color_index(self.layer_index)})
+                path_attrs = {
+                    'style': str(inkex.Style(self.p_style)),
+                    'd': " ".join(preview_path)}
+
+                etree.SubElement( self.preview_layer,
+                    inkex.addNS( 'path', 'svg'), path_attrs, nsmap=inkex.NSS )
+
+            # To determine the pen-up move to the next object, save the last x,y coor of this element
+            self.x_last = exit[0]
+            self.y_last = exit[1]
+            ordered_layer_element_list.append(node)
+
+        ordered_layer_element_list.extend(unplottable)
         return ordered_layer_element_list
 
-    
+
+    def isReversible(self, node):
+        """
+        Only plain paths can be drawn in opposite direction by reversing their path data.
+        Groups and other shapes keep their direction.
+        """
+        return node.tag == inkex.addNS('path', 'svg') and node.get('d') is not None
+
+
     def color_index(self, index):
         index = index % 9
         
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 
-import inkex, re, os, random, sys, subprocess, shutil
+import inkex, re, os, random, sys, shutil
 from inkex.command import inkscape
 
-from outputpro import cmyk, cutmarks
+from outputpro import cmyk, cutmarks, raster
 
 from PyQt5 import QtGui, QtCore, uic, QtWidgets
 from PyQt5.QtWidgets import QMainWindow, QApplication
 from PyQt5.QtCore import *
 
+from PIL import Image
+
 import gettext
 _ = gettext.gettext
 
@@ -65,11 +67,6 @@ class OutputPro(inkex.EffectExtension):
             list_of_dct_jpeg = {u'Integer':'int', u'Integer (fast)':'fast', u'Floating point':'float'}
             list_of_area_to_export = [_(u"Page"), _(u"Drawing"), _(u"Object")]#,  _(u"Área definida")]
             
-            if "nt" in os.name:
-                shell = True
-            else:
-                 shell = False
-
             selected_screen_profile = inkscape_config.split('id="displayprofile"')[1].split('uri="')[1].split('" />')[0].split('/')[-1]
             #if selected_screen_profile == '':
             #    inkex.utils.debug("Configured icc color profile (Inkscape) is not set. Configure it in preferences and restart Inkscape to apply changes.")
@@ -102,6 +99,14 @@ class OutputPro(inkex.EffectExtension):
                     self.move(int((QtWidgets.QDesktopWidget().screenGeometry().width()-self.geometry().width())/2), int((QtWidgets.QDesktopWidget().screenGeometry().height()-self.geometry().height())/2))
     
                     self.preview_zoom = 1.0
+
+                    #in-memory raster pipeline, each stage is only recomputed if its input or settings change
+                    self.pipeline = raster.RasterPipeline()
+                    self.source = None
+                    self.separation_channels = {}
+                    self.separations_image = None
+                    self.result_data = None
+                    self.preview_mask = Image.open(os.path.join(dirpathSoftware, 'preview_mask.png')).getchannel('A') #opaque part shows the original
     
                     self.top_title_bitmap = QtWidgets.QLabel(parent=self)
                     self.top_title_bitmap.setGeometry(0, 0, 950, 60)
@@ -558,83 +563,43 @@ class OutputPro(inkex.EffectExtension):
                 def generate_preview(self):
                     if self.format_preview_check.isChecked():
                         self.generate_final_file()
+                        if self.result_data is None:
+                            return
     
                         if self.option_box.currentIndex() == 0:
                             self.preview_original_title.setVisible(True)
                             self.preview_result_title.setVisible(True)
     
-                            final_command = ['convert']
-                            final_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.') + list_of_export_formats[self.format_choice.currentIndex()].lower())
-    
-                            if self.color_profile_choice_jpeg.isChecked():
-                                final_command.append('-profile')
-                                final_command.append(os.path.join(self.icc_dir_textbox.text(), selected_screen_profile))
+                            result = self.pipeline.stage('decoded', raster.decode, self.result_data)
     
-                            final_command.append(os.path.join(dirpathTempFolder.name, 'result.png'))
-                            subprocess.Popen(final_command, shell=shell).wait()
-    
-                            file_info = subprocess.Popen(['identify', os.path.join(dirpathTempFolder.name,  'source.png')], shell=shell, stdout=subprocess.PIPE).communicate()[0].decode('UTF-8')
-                            image_width = int(file_info.split(' ')[2].split('x')[0])
-                            image_height = int(file_info.split(' ')[2].split('x')[1])
+                            image_width, image_height = self.source.size
     
                             marksize = (self.dpi_choice.value() / 96) * unittouu(str(self.prepress_paper_cutmarks_marksize_value.text()) + str(self.prepress_paper_cutmarks_marksize_choice.currentText()))
                             imposition_space = (self.dpi_choice.value() / 96) * unittouu(str(self.imposition_space_value.text()) + str(self.imposition_space_choice.currentText()))
     
-                            file_info = subprocess.Popen(['identify', '-verbose', os.path.join(dirpathTempFolder.name,  'result-imp.') + list_of_export_formats[self.format_choice.currentIndex()].lower()], shell=shell, stdout=subprocess.PIPE).communicate()[0].decode('UTF-8')
-                            file_info_final = ''
-                            for line in file_info.split('\n'):
-                                if '  Format: ' in line:
-                                    file_info_final += 'Image Format: <strong>' + line.replace('  Format: ', '') + '</strong><br>'
-                                if '  Geometry: ' in line:
-                                    file_info_final += 'Width and height: <strong>' + line.replace('  Geometry: ', '').split('+')[0] + '</strong><br>'
-                                if '  Resolution: ' in line:
-                                    file_info_final += 'Resolution: <strong>' + line.replace('  Resolution: ', '')
-                                if '  Units: ' in line:
-                                    file_info_final += ' ' + line.replace('  Units: ', '').replace('Per', ' per ').replace('Pixels', 'pixels').replace('Centimeter', 'centimeter').replace('Inch', 'inch') + '</strong><br>'
-                                if '  Colorspace: ' in line:
-                                    file_info_final += 'Colorspace: <strong>' + line.replace('  Colorspace: ', '') + '</strong><br>'
-                                if '  Depth: ' in line:
-                                    file_info_final += 'Depth: <strong>' + line.replace('  Depth: ', '') + '</strong><br>'
-                                if '  Quality: ' in line:
-                                    file_info_final += 'Quality: <strong>' + line.replace('  Quality: ', '') + '%</strong><br>'
-                                if '  Filesize: ' in line:
-                                    file_info_final += 'Filesize: <strong>' + line.replace('  Filesize: ', '') + '</strong><br>'
-                                if '    jpeg:sampling-factor: ' in line:
-                                    file_info_final += 'Sampling: <strong>' + line.replace('    jpeg:sampling-factor: ', '') + '</strong><br>'
+                            file_info_final = 'Image Format: <strong>JPEG (Joint Photographic Experts Group JFIF format)</strong><br>'
+                            file_info_final += 'Width and height: <strong>' + str(result.width) + 'x' + str(result.height) + '</strong><br>'
+                            file_info_final += 'Resolution: <strong>' + str(self.dpi_choice.value()) + 'x' + str(self.dpi_choice.value()) + ' pixels per inch</strong><br>'
+                            file_info_final += 'Colorspace: <strong>' + list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()] + '</strong><br>'
+                            file_info_final += 'Depth: <strong>8-bit</strong><br>'
+                            file_info_final += 'Quality: <strong>' + str(self.quality_choice_dial_jpeg.value()) + '%</strong><br>'
+                            file_info_final += 'Filesize: <strong>' + '{:0.1f}KB'.format(len(self.result_data) / 1000) + '</strong><br>'
+                            file_info_final += 'Sampling: <strong>' + self.jpeg_subsampling_choice_jpeg.currentText() + '</strong><br>'
     
                             if self.prepress_paper_cutmarks_check.isChecked():
                                 margin = marksize
                             else:
                                 margin = imposition_space
     
-                            if image_width < 300 or image_height < 300:
-                                what_show = '-extent ' + str(int(300 * self.preview_zoom)) + 'x' + str(int(300 * self.preview_zoom)) + '-' + str(int(150 * self.preview_zoom) - int(image_width / 2)) + '-' + str(int(150 * self.preview_zoom) - int(image_height / 2))
-                            else:
-                                what_show = '-crop ' + str(int(300 * self.preview_zoom)) + 'x' + str(int(300 * self.preview_zoom)) + '+' + str(int(image_width / 2) - int(150 * self.preview_zoom)) + '+' + str(int(image_height / 2) - int(150 * self.preview_zoom))
-                            os.system('convert "' + os.path.join(dirpathTempFolder.name,  'source.png') +  '" ' + what_show + ' "' + os.path.join(dirpathTempFolder.name,  'original.png') +  '"' )
-    
-                            if image_width < 300 or image_height < 300:
-                                what_show = '-extent ' + str(int(300 * self.preview_zoom)) + 'x' + str(int(300 * self.preview_zoom)) + '-' + str(int(150 * self.preview_zoom) - int(image_width / 2) - margin) + '-' + str(int(150 * self.preview_zoom) - int(image_height / 2) - margin)
-                            else:
-                                what_show = '-crop ' + str(int(300 * self.preview_zoom)) + 'x' + str(int(300 * self.preview_zoom)) + '+' + str(int(image_width / 2) - int(150 * self.preview_zoom) + margin) + '+' + str(int(image_height / 2) - int(150 * self.preview_zoom) + margin)
-    
-                            os.system('convert "' + os.path.join(dirpathTempFolder.name,  'result.png') +  '" ' + what_show + ' "' + os.path.join(dirpathTempFolder.name,  'result.png') +  '"' )
+                            window_size = int(300 * self.preview_zoom)
+                            original = raster.preview_window(self.source, window_size, (image_width / 2, image_height / 2))
+                            result = raster.preview_window(result, window_size, (image_width / 2 + margin, image_height / 2 + margin))
     
                             if not self.preview_zoom == 1:
-                                os.system('convert "' + os.path.join(dirpathTempFolder.name,  'original.png') +  '" -filter box -resize 300x300 "' + os.path.join(dirpathTempFolder.name,  'original.png') +  '"' )
-                                os.system('convert "' + os.path.join(dirpathTempFolder.name,  'result.png') +  '" -filter box -resize 300x300 "' + os.path.join(dirpathTempFolder.name,  'result.png') +  '"' )
-    
-                            os.system(
-                                'convert "' + 
-                                os.path.join(dirpathTempFolder.name, 'original.png') +  
-                                '" "' + 
-                                os.path.join(dirpathTempFolder.name, 'result.png') +  
-                                '" "' + 
-                                os.path.join(dirpathSoftware, 'preview_mask.png') + #static file from extension directory
-                                '" -composite "' +  
-                                os.path.join(dirpathTempFolder.name, 'preview.png') +  
-                                '"'
-                                )
+                                original = original.resize((300, 300), Image.BOX)
+                                result = result.resize((300, 300), Image.BOX)
+    
+                            preview = Image.composite(original, result, self.preview_mask)
     
                             self.view_image_info.setText(file_info_final + '<br><small>' + list_of_format_tips[list_of_export_formats[self.format_choice.currentIndex()]] + '</small>')
     
@@ -642,53 +607,30 @@ class OutputPro(inkex.EffectExtension):
                             self.preview_original_title.setVisible(False)
                             self.preview_result_title.setVisible(False)
     
-                            subprocess.Popen(['convert', os.path.join(dirpathTempFolder.name,  'result-imp.') + list_of_export_formats[self.format_choice.currentIndex()].lower(), '-resize', '300x300', os.path.join(dirpathTempFolder.name, 'preview.png')], shell=shell).wait()
-    
-                        elif self.option_box.currentIndex() == 2:
-                            None
+                            preview = raster.fit(self.pipeline.stage('decoded', raster.decode, self.result_data), 300)
     
-                        elif self.option_box.currentIndex() == 3:
-                            None
+                        else:
+                            return
     
-                        self.preview_bitmap.setPixmap(QtGui.QPixmap(os.path.join(dirpathTempFolder.name, 'preview.png')))
+                        pixmap = QtGui.QPixmap()
+                        pixmap.loadFromData(raster.to_png(preview), 'PNG')
+                        self.preview_bitmap.setPixmap(pixmap)
     
                 def generate_final_file(self):
+                    if self.source is None:
+                        return
                     if list_of_export_formats[self.format_choice.currentIndex()] == 'JPEG':
-                        jpeg_command = ['convert']
-    
-                        if not self.cmyk_advanced_manipulation_option_jpeg.isChecked():
-                            pre_command = ['convert']
-                            pre_command.append(os.path.join(dirpathTempFolder.name, 'source.tiff'))
-    
-                            if list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()] == 'CMYK' or list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()] == 'RGB':
-                                if self.color_profile_choice_jpeg.isChecked():
-                                    pre_command.append('-profile')
-                                    pre_command.append(os.path.join(self.icc_dir_textbox.text(), selected_screen_profile))
-    
-                                if list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()] == 'RGB':
-                                    pre_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                                    subprocess.Popen(pre_command, shell=shell).wait()
-                                    del pre_command[:]
-                                    pre_command.append('convert')
-                                    pre_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                                    pre_command.append('-profile')
-                                    pre_command.append(os.path.join(self.icc_dir_textbox.text(), selected_screen_profile))
-    
-                            pre_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                            subprocess.Popen(pre_command, shell=shell).wait()
-                            if not os.path.isfile(os.path.join(dirpathTempFolder.name, 'result.tiff')):
-                                inkex.utils.debug("Error. Missing result.tiff")
-
+                        color_mode = list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()]
+    
+                        if self.cmyk_advanced_manipulation_option_jpeg.isChecked() and self.separations_image is not None:
+                            image = self.separations_image
                         else:
-                            if self.color_profile_choice_jpeg.isChecked():
-                                pre_command = ['convert']
-                                pre_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                                pre_command.append('-profile')
-                                pre_command.append(os.path.join(self.icc_dir_textbox.text(), selected_screen_profile))
-                                pre_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                                subprocess.Popen(pre_command, shell=shell).wait()
-    
-                        file_info = subprocess.Popen(['identify', os.path.join(dirpathTempFolder.name, 'source.png')], shell=shell, stdout=subprocess.PIPE).communicate()[0].decode('UTF-8')
+                            image = self.source
+    
+                        icc_profile = None
+                        if self.color_profile_choice_jpeg.isChecked():
+                            icc_profile = self.pipeline.stage('profile', raster.read_profile, os.path.join(self.icc_dir_textbox.text(), selected_screen_profile))
+    
                         if self.prepress_paper_cutmarks_check.isChecked():
                             bleedsize = (self.dpi_choice.value() / 96) * unittouu(str(self.prepress_paper_cutmarks_bleedsize_value.text()) + str(self.prepress_paper_cutmarks_bleedsize_choice.currentText()))
                             marksize = (self.dpi_choice.value() / 96) * unittouu(str(self.prepress_paper_cutmarks_marksize_value.text()) + str(self.prepress_paper_cutmarks_marksize_choice.currentText()))
@@ -698,101 +640,37 @@ class OutputPro(inkex.EffectExtension):
     
                         imposition_space = (self.dpi_choice.value() / 96) *unittouu(str(self.imposition_space_value.text()) + str(self.imposition_space_choice.currentText()))
     
-                        image_width = []
-                        for i in range(self.imposition_vertical_number_value.value()):
-                            image_width.append(int(file_info.split(' ')[2].split('x')[0]))
-    
-                        image_height = []
-                        for i in range(self.imposition_horizontal_number_value.value()):
-                            image_height.append(int(file_info.split(' ')[2].split('x')[1]))
-    
-                        imposition_command = ['convert']
-                        imposition_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                        imposition_command.append('-extent')
-                        imposition_command.append(str(sum(image_width) + (marksize*2) + (imposition_space * (len(image_width) -1))) + 'x' + str(sum(image_height) + (marksize*2) + (imposition_space * (len(image_height) -1))) + '-' + str(marksize) + '-' + str(marksize))
-                        imposition_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-                        subprocess.Popen(imposition_command, shell=shell).wait()
-    
-                        last_width = 0
-                        last_height = 0
-                        last_marksize = marksize
-                        for width in image_width:
-                            for height in image_height:
-                                if not (last_width == 0 and last_height == 0):
-                                    imposition_command = ['composite']
-                                    imposition_command.append('-geometry')
-                                    imposition_command.append('+'  + str(last_width + marksize) + '+' + str(last_height + marksize))
-                                    imposition_command.append(os.path.join(dirpathTempFolder.name, 'result.tiff'))
-                                    imposition_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-                                    imposition_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-                                    subprocess.Popen(imposition_command, shell=shell).wait()
-    
-                                last_height += height + imposition_space
-                                last_marksize = 0
-                            last_width += width + imposition_space
-                            last_height = 0
+                        image_width = (image.width,) * self.imposition_vertical_number_value.value()
+                        image_height = (image.height,) * self.imposition_horizontal_number_value.value()
+    
+                        image = self.pipeline.stage('imposition', raster.impose, image, len(image_width), len(image_height), imposition_space, marksize)
     
                         if self.prepress_paper_cutmarks_check.isChecked():
-                            cutmarks.generate_final_file(False, 
-                                                         self.prepress_paper_cutmarks_inside_check.isChecked(),
-                                                         list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()], 
-                                                         image_width, 
-                                                         image_height, 
-                                                         imposition_space,
-                                                         unittouu(str(self.prepress_paper_cutmarks_strokewidth_value.text()) + str(self.prepress_paper_cutmarks_strokewidth_choice.currentText())), 
-                                                         bleedsize, 
-                                                         marksize, 
-                                                         dirpathTempFolder.name)
-    
-                            cut_marks_command = ['composite']
-                            cut_marks_command.append('-compose')
-                            cut_marks_command.append('Multiply')
-                            cut_marks_command.append('-gravity')
-                            cut_marks_command.append('center')
-                            cut_marks_command.append(os.path.join(dirpathTempFolder.name, 'cut_mark.tiff'))
-                            cut_marks_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-                            cut_marks_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-                            subprocess.Popen(cut_marks_command, shell=shell).wait()
-    
-                        if not os.path.isfile(os.path.join(dirpathTempFolder.name, 'result-imp.tiff')):
-                            inkex.utils.debug("Error. Missing result-imp.tiff")
-                                
-                        jpeg_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.tiff'))
-    
-                        if self.prepress_paper_settings_invert.isChecked():
-                            jpeg_command.append('-negate')
-    
-                        if self.prepress_paper_settings_mirror.isChecked():
-                            jpeg_command.append('-flop')
-    
-                        jpeg_command.append('-quality')
-                        jpeg_command.append(str(self.quality_choice_dial_jpeg.value()))
-    
-                        jpeg_command.append('-colorspace')
-                        jpeg_command.append(list_of_color_modes_jpeg[self.color_mode_choice_jpeg.currentIndex()])
-    
-                        if self.jpeg_interlace_option_jpeg.isChecked():
-                            jpeg_command.append('-interlace')
-                            jpeg_command.append(list_of_interlacing_jpeg[self.jpeg_interlace_choice_jpeg.currentText()])
-    
-                        if self.jpeg_optimize_option_jpeg.isChecked():
-                            jpeg_command.append('-type')
-                            jpeg_command.append('optimize')
+                            cut_marks = self.pipeline.stage('cut_marks', cutmarks.generate_cut_marks,
+                                                            self.prepress_paper_cutmarks_inside_check.isChecked(),
+                                                            image_width, 
+                                                            image_height, 
+                                                            imposition_space,
+                                                            unittouu(str(self.prepress_paper_cutmarks_strokewidth_value.text()) + str(self.prepress_paper_cutmarks_strokewidth_choice.currentText())), 
+                                                            bleedsize, 
+                                                            marksize)
+                            image = self.pipeline.stage('apply_cut_marks', raster.apply_cut_marks, image, cut_marks)
     
-                        if self.jpeg_noise_option_jpeg.isChecked():
-                            jpeg_command.append('-evaluate')
-                            jpeg_command.append(list_of_noise_jpeg[self.jpeg_noise_choice_jpeg.currentText()])
-                            jpeg_command.append(str(self.jpeg_noise_ammount_jpeg.value()))
+                        image = self.pipeline.stage('finish', raster.finish, image, self.prepress_paper_settings_invert.isChecked(), self.prepress_paper_settings_mirror.isChecked())
     
-                        jpeg_command.append('-sampling-factor')
-                        jpeg_command.append(self.jpeg_subsampling_choice_jpeg.currentText())
+                        image = self.pipeline.stage('colorspace', raster.convert_colorspace, image, color_mode)
     
-                        jpeg_command.append('-define')
-                        jpeg_command.append('jpeg:dct-method=' + list_of_dct_jpeg[self.jpeg_dct_choice_jpeg.currentText()])
+                        if self.jpeg_noise_option_jpeg.isChecked():
+                            image = self.pipeline.stage('noise', raster.add_noise, image, list_of_noise_jpeg[self.jpeg_noise_choice_jpeg.currentText()], self.jpeg_noise_ammount_jpeg.value())
     
-                        jpeg_command.append(os.path.join(dirpathTempFolder.name, 'result-imp.jpeg'))
-                        
-                        subprocess.Popen(jpeg_command, shell=shell).wait()
+                        #all interlace types are progressive JPEG files, the DCT method is chosen by Pillow
+                        self.result_data = self.pipeline.stage('jpeg', raster.encode_jpeg, image,
+                                                               self.quality_choice_dial_jpeg.value(),
+                                                               self.jpeg_interlace_option_jpeg.isChecked() and list_of_interlacing_jpeg[self.jpeg_interlace_choice_jpeg.currentText()] != 'none',
+                                                               self.jpeg_optimize_option_jpeg.isChecked(),
+                                                               self.jpeg_subsampling_choice_jpeg.currentText(),
+                                                               self.dpi_choice.value(),
+                                                               icc_profile)
     
                 def change_format(self):
                     self.general_options_panel_jpeg.setVisible(False)
@@ -880,56 +758,19 @@ class OutputPro(inkex.EffectExtension):
                     cmyk.generate_png_separations(dirpathTempFolder.name, self.area_to_export(), self.dpi_choice.value(), False)
     
                     for color in ['C', 'M', 'Y', 'K']:
-                        cmd = ['convert', 
-                             os.path.join(dirpathTempFolder.name, 'separated' + area_to_export.replace(' ', '') + color + ".png"),
-                             '-colorspace', 
-                             'CMYK', 
-                             '-channel', 
-                             color,
-                             '-separate',
-                             os.path.join(dirpathTempFolder.name, 'separated' + area_to_export.replace(' ', '') + color + ".png")]
-                        #inkex.utils.debug(cmd)
-                        p = subprocess.Popen(cmd, shell=shell).wait()
+                        self.separation_channels[color] = raster.separation_channel(os.path.join(dirpathTempFolder.name, 'separated' + area_to_export.replace(' ', '') + color + ".png"), color)
 
                     self.cmyk_advanced_manipulation_view_separations()
     
                 def cmyk_advanced_manipulation_view_separations(self):
-                    area_to_export = self.area_to_export()
-    
-                    file_info = subprocess.Popen(['identify', os.path.join(dirpathTempFolder.name, 'source.png')], shell=shell, stdout=subprocess.PIPE).communicate()[0].decode('UTF-8')
-    
-                    image_size = file_info.split(' ')[2]
-    
-                    subprocess.Popen(['convert', '-size', image_size, 'xc:black',  os.path.join(dirpathTempFolder.name, 'empty.png')], shell=shell).wait()
-    
-                    final_command = ['convert']
-    
-                    if self.view_c_button.isChecked():
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'separated') + area_to_export.replace(' ', '') + 'C' + ".png")
-                    else:
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'empty.png'))
-    
-                    if self.view_m_button.isChecked():
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'separated') + area_to_export.replace(' ', '') + 'M' + ".png")
-                    else:
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'empty.png'))
-    
-                    if self.view_y_button.isChecked():
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'separated') + area_to_export.replace(' ', '') + 'Y' + ".png")
-                    else:
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'empty.png'))
-    
-                    if self.view_k_button.isChecked():
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'separated') + area_to_export.replace(' ', '') + 'K' + ".png")
-                    else:
-                        final_command.append(os.path.join(dirpathTempFolder.name, 'empty.png'))
-    
-                    if not os.path.isfile(os.path.join(dirpathTempFolder.name, 'empty.png')):
-                        inkex.utils.debug("Error. Missing empty.png")
-    
-                    final_command.extend(['-set', 'colorspace', 'cmyk'])
-                    final_command.extend(['-combine', os.path.join(dirpathTempFolder.name, 'result.tiff')])
-                    subprocess.Popen(final_command, shell=shell).wait()
+                    if self.source is None or len(self.separation_channels) == 0:
+                        return
+                    channels = (
+                        self.separation_channels['C'] if self.view_c_button.isChecked() else None,
+                        self.separation_channels['M'] if self.view_m_button.isChecked() else None,
+                        self.separation_channels['Y'] if self.view_y_button.isChecked() else None,
+                        self.separation_channels['K'] if self.view_k_button.isChecked() else None)
+                    self.separations_image = self.pipeline.stage('separations', raster.combine_separations, *channels, self.source.size)
     
                     self.generate_preview()
     
@@ -977,10 +818,11 @@ class OutputPro(inkex.EffectExtension):
                         self.debug(_("Inkscape returned the following output when trying to run the file export; the file export may still have worked:"))
                         self.debug(cli_output)
     
-                    subprocess.Popen(['convert', os.path.join(dirpathTempFolder.name, 'source.png'), os.path.join(dirpathTempFolder.name, 'source.tiff')], shell=shell).wait()
+                    if not os.path.isfile(os.path.join(dirpathTempFolder.name, 'source.png')):
+                        inkex.utils.debug("Error. Missing source.png")
+                        return
 
-                    if not os.path.isfile(os.path.join(dirpathTempFolder.name, 'source.tiff')):
-                        inkex.utils.debug("Error. Missing source.tiff")
+                    self.source = raster.load_source(os.path.join(dirpathTempFolder.name, 'source.png'))
 
                     self.generate_preview()
     
@@ -1062,13 +904,13 @@ class OutputPro(inkex.EffectExtension):
                         self.generate_final_file()
     
                     if not str(self.location_path) == '':
-                        result_imp = os.path.join(dirpathTempFolder.name, 'result-imp.' + list_of_export_formats[self.format_choice.currentIndex()].lower())
                         target_imp = os.path.abspath(self.location_path[0] + "." + self.location_path[1].lower())
-                        if not os.path.isfile(result_imp):
+                        if self.result_data is None:
                             inkex.utils.debug("Error. No result generated to export. The following files were created in temp dir:")
                             inkex.utils.debug(os.listdir(dirpathTempFolder.name))                   
                         else:
-                            shutil.copy2(result_imp, target_imp)    
+                            with open(target_imp, 'wb') as f:
+                                f.write(self.result_data)
     
                 def change_icc_dir(self):
                     self.icc_dir_textbox.setText(QtWidgets.QFileDialog.getExistingDirectory(self, 'Select Folder'))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+'''
+In-memory raster processing for Output Pro, done with Pillow and numpy instead of
+ImageMagick convert/composite/identify calls on temp files.
+
+RasterPipeline caches the result of each stage together with its arguments, so a
+changed setting only recomputes the stages from the first one using it (e.g. a new
+JPEG quality only encodes the imposed sheet again).
+'''
+
+import io
+import numpy as np
+from PIL import Image, ImageChops, ImageOps
+
+#Pillow only knows 4:4:4, 4:2:2 and 4:2:0, 1x2 (4:4:0) is written as 4:2:2
+SUBSAMPLING = {'1x1, 1x1, 1x1': 0, '2x1, 1x1, 1x1': 1, '1x2, 1x1, 1x1': 1, '2x2, 1x1, 1x1': 2}
+
+#ImageMagick colorspaces stored as three channels of a JPEG file: matrix and offset applied to sRGB values (0..1)
+COLORSPACE_MATRICES = {
+    'YCbCr':       ([[0.298839, 0.586811, 0.114350], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]], [0, 0.5, 0.5]),
+    'Rec601YCbCr': ([[0.298839, 0.586811, 0.114350], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]], [0, 0.5, 0.5]),
+    'YPbPr':       ([[0.298839, 0.586811, 0.114350], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]], [0, 0.5, 0.5]),
+    'Rec709YCbCr': ([[0.212656, 0.715158, 0.072186], [-0.114572, -0.385428, 0.5], [0.5, -0.454153, -0.045847]], [0, 0.5, 0.5]),
+    'YUV':         ([[0.298839, 0.586811, 0.114350], [-0.14740, -0.28950, 0.43690], [0.61500, -0.51500, -0.10000]], [0, 0.5, 0.5]),
+    'YIQ':         ([[0.298839, 0.586811, 0.114350], [0.595716, -0.274453, -0.321263], [0.211456, -0.522591, 0.311135]], [0, 0.5, 0.5]),
+    'OHTA':        ([[1/3, 1/3, 1/3], [0.5, 0, -0.5], [-0.25, 0.5, -0.25]], [0, 0.5, 0.5]),
+}
+LUMA = {'Rec601Luma': [0.298839, 0.586811, 0.114350], 'Rec709Luma': [0.212656, 0.715158, 0.072186]}
+SRGB_TO_XYZ = [[0.4124564, 0.3575761, 0.1804375], [0.2126729, 0.7151522, 0.0721750], [0.0193339, 0.1191920, 0.9503041]]
+D65 = [0.95047, 1.0, 1.08883]
+
+
+class RasterPipeline:
+    '''
+    cache for the stages of the raster processing. Images are compared by identity, other
+    arguments by value, so the result of a stage is reused as long as its input images are
+    the (cached) results of the previous stages and its settings did not change
+    '''
+
+    def __init__(self):
+        self.results = {}
+
+    def stage(self, name, compute, *args):
+        cached = self.results.get(name)
+        if cached is not None and len(cached[0]) == len(args) and \
+           all(a is b if isinstance(a, Image.Image) else a == b for a, b in zip(cached[0], args)):
+            return cached[1]
+        result = compute(*args)
+        self.results[name] = (args, result) #keeps the arguments alive, so identities can't be reused
+        return result
+
+    def clear(self):
+        self.results.clear()
+
+
+def white(mode):
+    return {'CMYK': (0, 0, 0, 0), 'L': 255}.get(mode, (255, 255, 255))
+
+def to_uint8(values):
+    return (np.clip(values, 0, 1) * 255 + 0.5).astype(np.uint8)
+
+def rgb_array(image):
+    return np.asarray(image.convert('RGB'), dtype=np.float32) / 255
+
+def rgb_to_cmyk(rgb):
+    ''' CMYK ink amounts (0..1) of sRGB values like calculateCMYK '''
+    k = 1 - rgb.max(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cmy = np.where(k < 1, (1 - rgb - k) / (1 - k), 0)
+    return np.concatenate((cmy, k), axis=-1)
+
+def load_source(filename):
+    ''' RGB image of an Inkscape PNG export, transparent areas become white '''
+    with Image.open(filename) as image:
+        image = image.convert('RGBA')
+    background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, image).convert('RGB')
+
+def read_profile(filename):
+    ''' ICC profile data or None if the file can't be read '''
+    try:
+        with open(filename, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def separation_channel(filename, color):
+    ''' ink amount (L image) of one color of a separated PNG, like convert -colorspace CMYK -channel <color> -separate '''
+    cmyk = rgb_to_cmyk(rgb_array(load_source(filename)))
+    return Image.fromarray(to_uint8(cmyk[..., 'CMYK'.index(color)]), 'L')
+
+def combine_separations(c, m, y, k, size):
+    ''' CMYK image of the C, M, Y and K channels (L images), hidden (None) channels get no ink '''
+    empty = Image.new('L', size, 0)
+    return Image.merge('CMYK', [channel if channel is not None else empty for channel in (c, m, y, k)])
+
+def impose(image, columns, rows, space, marksize):
+    ''' sheet with columns x rows copies of the image, separated by space and surrounded by a margin of marksize '''
+    if columns == 1 and rows == 1 and int(round(marksize)) == 0:
+        return image
+    width, height = image.size
+    sheet = Image.new(image.mode,
+                      (int(round(columns * width + marksize * 2 + space * (columns - 1))),
+                       int(round(rows * height + marksize * 2 + space * (rows - 1)))),
+                      white(image.mode))
+    for column in range(columns):
+        for row in range(rows):
+            sheet.paste(image, (int(round(marksize + column * (width + space))), int(round(marksize + row * (height + space)))))
+    return sheet
+
+def apply_cut_marks(image, marks):
+    ''' draw the (L, black on white) cut marks onto the sheet. On CMYK sheets they are registration marks with full ink on all plates '''
+    if image.mode == 'CMYK':
+        ink = ImageOps.invert(marks)
+        return Image.merge('CMYK', [ImageChops.lighter(channel, ink) for channel in image.split()])
+    return ImageChops.multiply(image, Image.merge(image.mode, [marks] * len(image.getbands())))
+
+def finish(image, negate, mirror):
+    ''' prepress paper settings: inverted colors and/or mirrored image '''
+    if negate:
+        image = Image.eval(image, lambda value: 255 - value)
+    if mirror:
+        image = ImageOps.mirror(image)
+    return image
+
+def hue(rgb, maximum, delta):
+    ''' hue (0..1) of sRGB values '''
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.where(maximum == r, (g - b) / delta,
+            np.where(maximum == g, 2 + (b - r) / delta, 4 + (r - g) / delta))
+    return np.where(delta > 0, (h / 6) % 1, 0)
+
+def convert_colorspace(image, colorspace):
+    '''
+    image in the mode of the JPEG file, like convert -colorspace <colorspace>: CMYK, L for the gray
+    colorspaces and RGB channels holding the values of all the others. Log and YCC are written as sRGB
+    '''
+    if image.mode == 'CMYK' and colorspace == 'CMYK':
+        return image
+    if colorspace in ('RGB', 'sRGB', 'Log', 'YCC'):
+        return image.convert('RGB')
+    if colorspace == 'Gray':
+        return image.convert('L')
+    rgb = rgb_array(image)
+    if colorspace == 'CMYK':
+        return Image.fromarray(to_uint8(rgb_to_cmyk(rgb)), 'CMYK')
+    if colorspace in LUMA:
+        return Image.fromarray(to_uint8(rgb @ np.array(LUMA[colorspace], dtype=np.float32)), 'L')
+    if colorspace in COLORSPACE_MATRICES:
+        matrix, offset = COLORSPACE_MATRICES[colorspace]
+        values = rgb @ np.array(matrix, dtype=np.float32).T + np.array(offset, dtype=np.float32)
+    elif colorspace == 'CMY':
+        values = 1 - rgb
+    elif colorspace in ('HSB', 'HSL', 'HWB'):
+        maximum, minimum = rgb.max(axis=-1), rgb.min(axis=-1)
+        delta = maximum - minimum
+        h = hue(rgb, maximum, delta)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if colorspace == 'HSB':
+                values = np.stack((h, np.where(maximum > 0, delta / maximum, 0), maximum), axis=-1)
+            elif colorspace == 'HSL':
+                lightness = (maximum + minimum) / 2
+                values = np.stack((h, np.where(delta > 0, delta / (1 - np.abs(2 * lightness - 1)), 0), lightness), axis=-1)
+            else:
+                values = np.stack((h, minimum, 1 - maximum), axis=-1)
+    elif colorspace in ('XYZ', 'Lab'):
+        linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+        values = linear @ np.array(SRGB_TO_XYZ, dtype=np.float32).T
+        if colorspace == 'Lab':
+            xyz = values / np.array(D65, dtype=np.float32)
+            f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+            values = np.stack((1.16 * f[..., 1] - 0.16,
+                               (500 * (f[..., 0] - f[..., 1])) / 255 + 0.5,
+                               (200 * (f[..., 1] - f[..., 2])) / 255 + 0.5), axis=-1)
+    else:
+        return image.convert('RGB')
+    return Image.fromarray(to_uint8(values), 'RGB')
+
+def add_noise(image, noise, amount, seed=0):
+    ''' add noise of the given type (list_of_noise_jpeg values), amount in color levels (0..255). The same seed gives the same noise on every preview '''
+    if amount <= 0:
+        return image
+    rng = np.random.default_rng(seed)
+    values = np.asarray(image, dtype=np.float32)
+    if noise == 'Gaussian-noise':
+        values = values + rng.normal(0, amount, values.shape)
+    elif noise == 'Laplacian-noise':
+        values = values + rng.laplace(0, amount, values.shape)
+    elif noise == 'Uniform-noise':
+        values = values + rng.uniform(-amount, amount, values.shape)
+    elif noise == 'Multiplicative-noise':
+        values = values * (1 + rng.normal(0, amount / 255, values.shape))
+    elif noise == 'Poisson-noise':
+        scale = amount / 10
+        values = rng.poisson(values / scale) * scale
+    elif noise == 'Impulse-noise':
+        hits = rng.random(values.shape) < amount / 1000
+        values = np.where(hits, np.where(rng.random(values.shape) < 0.5, 0, 255), values)
+    return Image.fromarray(np.clip(values + 0.5, 0, 255).astype(np.uint8), image.mode)
+
+def encode_jpeg(image, quality, progressive, optimize, subsampling, dpi, icc_profile=None):
+    ''' JPEG file data '''
+    options = {'quality': quality, 'progressive': progressive, 'optimize': optimize, 'dpi': (dpi, dpi)}
+    if image.mode == 'RGB':
+        options['subsampling'] = SUBSAMPLING.get(subsampling, 0)
+        if icc_profile is not None:
+            options['icc_profile'] = icc_profile #the profile of the screen only fits to RGB data
+    output = io.BytesIO()
+    image.save(output, format='JPEG', **options)
+    return output.getvalue()
+
+def decode(data):
+    ''' RGB image of a JPEG file for displaying it '''
+    with Image.open(io.BytesIO(data)) as image:
+        return image.convert('RGB')
+
+def preview_window(image, size, center):
+    ''' size x size part of the image around center, padded with white like convert -crop/-extent '''
+    window = Image.new(image.mode, (size, size), white(image.mode))
+    window.paste(image, (int(size / 2 - center[0]), int(size / 2 - center[1])))
+    return window
+
+def fit(image, size):
+    ''' image scaled to fit into size x size, like convert -resize <size>x<size> '''
+    scale = size / max(image.size)
+    return image.resize((max(1, int(round(image.width * scale))), max(1, int(round(image.height * scale)))))
+
+def to_png(image):
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Adaptive bezier flattening, shared by the path processing extensions.
+
+Usage from another extension folder:
+
+    sys.path.append("../path_intersections")
+    from bezier_flattening import flatten_path
+
+Every path is converted to a cubic super path (lines, quadratic beziers and arcs
+included), optionally transformed and then all cubic segments are evaluated with
+numpy at once. The number of points per segment is chosen with Wang's formula, so the
+resulting polyline deviates at most 'tolerance' (in the units of the transformed path)
+from the curve. Straight (or flat enough) segments yield their end point only.
+
+Results are memoized per (path d-string, transform, tolerance) and returned as
+read-only numpy arrays, one (n, 2) array of points per subpath.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from inkex.paths import Path
+from inkex.transforms import Transform
+
+DEFAULT_TOLERANCE = 0.1
+
+
+def distance_to_segment(points, a, b):
+    """ distances of (n, 2) ``points`` to the segments ``a`` - ``b`` (both (n, 2)) """
+    ab = b - a
+    length_sq = (ab * ab).sum(axis=1)
+    t = np.divide(((points - a) * ab).sum(axis=1), length_sq, out=np.zeros(len(ab)), where=length_sq > 0)
+    closest = a + np.clip(t, 0, 1)[:, None] * ab
+    return np.hypot(*(points - closest).T)
+
+
+def cubic_segment_counts(cubics, tolerance=DEFAULT_TOLERANCE):
+    """
+    number of line segments needed for each of the (n, 4, 2) ``cubics``
+    to stay within ``tolerance`` (Wang's formula). Cubics with both control
+    points within ``tolerance`` of their chord need a single segment
+    (the curve lies in the convex hull of its control points)
+    """
+    dd1 = cubics[:, 0] - 2 * cubics[:, 1] + cubics[:, 2]
+    dd2 = cubics[:, 1] - 2 * cubics[:, 2] + cubics[:, 3]
+    dd = np.maximum(np.hypot(dd1[:, 0], dd1[:, 1]), np.hypot(dd2[:, 0], dd2[:, 1]))
+    counts = np.maximum(np.ceil(np.sqrt(0.75 * dd / tolerance)), 1).astype(np.int64)
+    flat = np.maximum(distance_to_segment(cubics[:, 1], cubics[:, 0], cubics[:, 3]),
+                      distance_to_segment(cubics[:, 2], cubics[:, 0], cubics[:, 3])) <= tolerance
+    counts[flat] = 1
+    return counts
+
+
+def flatten_cubics(cubics, tolerance=DEFAULT_TOLERANCE):
+    """
+    flatten (n, 4, 2) ``cubics`` at once. Returns the points of all cubics
+    (start points excluded, end points included) and the number of points per cubic
+    """
+    cubics = np.asarray(cubics, dtype=float).reshape(-1, 4, 2)
+    counts = cubic_segment_counts(cubics, tolerance)
+    ends = np.cumsum(counts)
+    owner = np.repeat(np.arange(len(cubics)), counts)
+    k = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts) + 1
+    t = (k / counts[owner])[:, None]
+    mt = 1 - t
+    c = cubics[owner]
+    points = mt * mt * mt * c[:, 0] + 3 * mt * mt * t * c[:, 1] + 3 * mt * t * t * c[:, 2] + t * t * t * c[:, 3]
+    points[ends - 1] = cubics[:, 3] # exact end points, so subsequent segments connect
+    return points, counts
+
+
+@lru_cache(maxsize=1024)
+def _flatten(d, hexad, tolerance):
+    path = Path(d)
+    if hexad is not None:
+        path = path.transform(Transform(hexad))
+
+    starts = []
+    cubics = []
+    first_cubic = [0] # index of the first cubic of each subpath
+    for subpath in path.to_superpath():
+        if len(subpath) == 0:
+            continue
+        starts.append(subpath[0][1])
+        for prev, node in zip(subpath, subpath[1:]):
+            cubics.append((prev[1], prev[2], node[0], node[1]))
+        first_cubic.append(len(cubics))
+
+    if cubics:
+        points, counts = flatten_cubics(cubics, tolerance)
+        first_point = np.concatenate(([0], np.cumsum(counts)))
+    else:
+        points, first_point = np.empty((0, 2)), np.zeros(1, dtype=np.int64)
+
+    result = []
+    for i, start in enumerate(starts):
+        vertices = np.vstack(([start], points[first_point[first_cubic[i]]:first_point[first_cubic[i + 1]]]))
+        vertices.setflags(write=False) # shared by the cache
+        result.append(vertices)
+    return tuple(result)
+
+
+def flatten_path(path, transform=None, tolerance=DEFAULT_TOLERANCE):
+    """
+    flatten a path (d-string or inkex Path) into a tuple of (n, 2) point arrays, one per subpath.
+    The ``transform`` is applied before flattening, so ``tolerance`` is given in transformed units
+    """
+    if not isinstance(path, str):
+        # str(Path) rounds to 6 digits, the cache key has to be exact
+        path = " ".join("{} {}".format(cmd, " ".join(map(repr, args))) for cmd, args in Path(path).to_arrays())
+    hexad = None
+    if transform is not None:
+        transform = Transform(transform)
+        if transform:
+            hexad = tuple(transform.to_hexad())
+    return _flatten(path, hexad, float(tolerance))
@@ -67,55 +67,25 @@ What do we want to check?
 
 from lxml import etree
 import inkex
-from inkex import bezier
-from inkex.paths import Path
 from inkex import Color
 import sys
 import logging
+from collections import defaultdict
 
 from shapely.geometry import LineString, MultiLineString, Point, MultiPoint, GeometryCollection
-from shapely import speedups
-
-if speedups.available:
+from shapely.ops import unary_union
+from shapely.strtree import STRtree
+try:
+    from shapely import speedups #deprecated in Shapely 2.0 (always enabled there), removed in 2.1
+except ImportError:
+    speedups = None
+
+if speedups is not None and speedups.available:
     speedups.enable()
 
-logger = logging.getLogger(__name__)
-
-def take_N(seq, n):
-    """
-    split ``seq`` into slices of length ``n``. the total
-    length of ``seq` must be a multiple of ``n``.
-    """
-    if len(seq) % n != 0:
-        raise ValueError("len=%d, n=%d, (%s)" % (len(seq), n, seq))
-    sub = []
-    for elem in seq:
-        sub.append(elem)
-        if len(sub) == n:
-            yield sub
-            sub = []
-
-
-def linear_interp(a, b, t):
-    """
-    linearly interpolate between ``a`` and ``b``. ``t`` must be a
-    a float between 0 and 1.
-    """
-    return (1 - t) * a + t * b
-
-
-def sample(start, stop, num):
-    """
-    interpolate between start and stop, and yield ``num`` samples
-    """
-    if num == 0:
-        return
-    delta = 1.0 / num
-    t = 0
-    for i in range(num):
-        yield linear_interp(start, stop, t)
-        t += delta
+from bezier_flattening import flatten_path
 
+logger = logging.getLogger(__name__)
 
 class CheckerResult(object):
 
@@ -176,155 +146,101 @@ class ElemBlacklistChecker(Checker):
             yield CheckerResult("'%s' element found in document" % tag, elem)
 
 
-class Subpath(object):
-    def __init__(self):
-        self.points = []
-        self.cursor = None
-
-    def __len__(self):
-        return len(self.points)
-
-    @property
-    def last_point(self):
-        if self.points:
-            return self.points[-1]
-
-    @property
-    def first_point(self):
-        if self.points:
-            return self.points[0]
-
-    def moveto(self, point):
-        assert len(self) == 0, "moveto may only be called at the beginning of a subpath"
-        self.points.append(point)
-        self.cursor = point
-
-    def lineto(self, point):
-        self.points.append(point)
-        self.cursor = point
-
-    def curveto(self, points):
-        for p in self.approx_curve([self.cursor] + points):
-            self.lineto(p)
-
-    def closepath(self):
-        self.lineto(self.first_point)
-
-    def add_points(self, points):
-        self.points.extend(points)
-        self.cursor = points[-1]
-
-    def as_linestring(self):
-        return LineString(self.points)
-
-    def approx_curve(self, points):
-        for four in take_N(points, 4):
-            # TODO: automatically set number of samples depending on length
-            for t in sample(0, 1, 50):
-                yield bezier.bezierpointatt(four, t)
-
-
 class IntersectionChecker(Checker):
-    def __init__(self):
+    def __init__(self, tolerance=0.1, incremental=False):
         self.paths = []
+        self.tolerance = tolerance
+        self.incremental = incremental
 
     def __call__(self, elem):
         # logger.debug(elem.attrib)
         path = elem.get("d")
         if path is None:
             return []
-        parsed = Path(path).to_arrays()
-        self.paths.append((parsed, elem))
-        # logger.debug(parsed)
+        self.paths.append((path, elem))
         return []
 
-    def fixVHbehaviour(self, elem):
-        raw = Path(elem.get("d")).to_arrays()
-        subpaths, prev = [], 0
-        for i in range(len(raw)): # Breaks compound paths into simple paths
-            if raw[i][0] == 'M' and i != 0:
-                subpaths.append(raw[prev:i])
-                prev = i
-        subpaths.append(raw[prev:])
-        seg = []
-        for simpath in subpaths:
-            if simpath[-1][0] == 'Z':
-                simpath[-1][0] = 'L'
-                if simpath[-2][0] == 'L': simpath[-1][1] = simpath[0][1]
-                else: simpath.pop()
-            for i in range(len(simpath)):
-                if simpath[i][0] == 'V': # vertical and horizontal lines only have one point in args, but 2 are required
-                    #inkex.utils.debug(simpath[i][0])
-                    simpath[i][0]='L' #overwrite V with regular L command
-                    add=simpath[i-1][1][0] #read the X value from previous segment
-                    simpath[i][1].append(simpath[i][1][0]) #add the second (missing) argument by taking argument from previous segment
-                    simpath[i][1][0]=add #replace with recent X after Y was appended
-                if simpath[i][0] == 'H': # vertical and horizontal lines only have one point in args, but 2 are required
-                    #inkex.utils.debug(simpath[i][0])
-                    simpath[i][0]='L' #overwrite H with regular L command
-                    simpath[i][1].append(simpath[i-1][1][1]) #add the second (missing) argument by taking argument from previous segment				
-                #inkex.utils.debug(simpath[i])
-                seg.append(simpath[i])
-        elem.set("d", Path(seg))
-        return seg
-        
     def get_line_strings(self):
+        """
+        yield (linestring, elem) for each subpath in document coordinates. Curves
+        (C, Q, A) are flattened within the tolerance, closed subpaths end at their start point
+        """
         # logger.debug("paths: %s", self.paths)
         for path, elem in self.paths:
-            path = self.fixVHbehaviour(elem)
             logger.debug("new path, %s", elem.get("id"))
-            current_subpath = Subpath()
-            for cmd, coords in path:
-                logger.debug("  new command: %s", cmd)
-                if cmd != "A":
-                    points = list(take_N(coords, n=2))
-                else:
-                    points = list(take_N(coords, n=7))
-                logger.debug("  points: %s", points)
-                if cmd == "M":
-                    # M starts a new subpath
-                    if len(current_subpath) > 1:
-                        yield current_subpath, elem
-                    current_subpath = Subpath()
-                    current_subpath.moveto(points[0])
-                    # more than one point means the rest of the points are to
-                    # be treated as if cmd was L:
-                    # http://www.w3.org/TR/SVG/paths.html#PathDataMovetoCommands
-                    if len(points) > 1:
-                        points = points[1:]
-                        cmd = "L"
-                if cmd == "L":
-                    current_subpath.add_points(points)
-                if cmd == "Z":
-                    current_subpath.closepath()
-                if cmd == "C":
-                    current_subpath.curveto(points)
-                if cmd == "Q":
-                    logger.warning("quadratic beziers are not supported yet")
-                    # current_subpath.moveto(points[-1])
-                if cmd == "A":
-                    logger.warning("elliptic arcs are not supported yet")
-            if len(current_subpath) > 1:
-                yield current_subpath, elem
-            current_subpath = Subpath()
+            for points in flatten_path(path, elem.composed_transform(), self.tolerance):
+                if len(points) > 1:
+                    yield LineString(points), elem
 
     def collect(self):
+        if self.incremental:
+            return self.iter_intersections()
         return self.check_intersections()
 
+    def intersection_result(self, line, elem, others):
+        """
+        result for the intersection of ``line`` with the ``others`` lines (which
+        were already checked), or None if ``others`` is empty
+        """
+        if not others:
+            return None
+        if len(others) == 1:
+            intersection = others[0].intersection(line)
+        else:
+            intersection = unary_union(others).intersection(line)
+        return CheckerResult("intersection found", elem, extra={"intersection": intersection})
+
     def check_intersections(self):
-        checks_done = MultiLineString()
-        for subpath, elem in self.get_line_strings():
-            line = subpath.as_linestring()
+        """
+        check all subpaths at once. A STRtree over the linestrings selects the
+        intersecting candidates, each subpath is reported against the subpaths before it
+        """
+        lines, elems = [], []
+        for line, elem in self.get_line_strings():
+            lines.append(line)
+            elems.append(elem)
+        if not lines:
+            return
+        tree = STRtree(lines)
+        previous = defaultdict(list)
+        for i, j in zip(*tree.query(lines, predicate="intersects")):
+            if j < i:
+                previous[i].append(lines[j])
+        for i, line in enumerate(lines):
             if not line.is_simple:
                 # TODO: find location of self-intersection and introduce some
                 # tolerance
-                # checks_done = checks_done.union(line)
+                yield CheckerResult("self-intersection found", elems[i])
+            result = self.intersection_result(line, elems[i], previous[i])
+            if result is not None:
+                yield result
+
+    def iter_intersections(self):
+        """
+        incremental check, yielding the results as they are found. The subpaths are swept
+        by the left edge of their bounding boxes. Only the linestrings overlapping the sweep
+        position are kept in memory, each subpath is reported against the active ones before it
+        """
+        boxes = []
+        for k, (path, elem) in enumerate(self.paths):
+            for n, points in enumerate(flatten_path(path, elem.composed_transform(), self.tolerance)):
+                if len(points) > 1:
+                    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+                    boxes.append((x0, y0, x1, y1, k, n))
+        boxes.sort()
+
+        active = [] # (x1, y0, y1, linestring)
+        for x0, y0, x1, y1, k, n in boxes:
+            path, elem = self.paths[k]
+            line = LineString(flatten_path(path, elem.composed_transform(), self.tolerance)[n])
+            active = [a for a in active if a[0] >= x0]
+            if not line.is_simple:
                 yield CheckerResult("self-intersection found", elem)
-                # continue
-            if checks_done.intersects(line):
-                intersection = checks_done.intersection(line)
-                yield CheckerResult("intersection found", elem, extra={"intersection": intersection})
-            checks_done = checks_done.union(line)
+            others = [a[3] for a in active if a[1] <= y1 and a[2] >= y0 and a[3].intersects(line)]
+            result = self.intersection_result(line, elem, others)
+            if result is not None:
+                yield result
+            active.append((x1, y0, y1, line))
 
 
 class ErrorVisualization(object):
@@ -387,9 +303,10 @@ class ErrorVisualization(object):
 class PathIntersections(inkex.Effect):
     def __init__(self, *args, **kwargs):
         self.check_result = []
-        self.checkers = [ElemBlacklistChecker(), StyleChecker(), IntersectionChecker()]
         inkex.Effect.__init__(self, *args, **kwargs)
         self.arg_parser.add_argument("--color", type=Color, default='4012452351', help="Error highlight color")
+        self.arg_parser.add_argument("--tolerance", type=float, default=0.1, help="Max. deviation of flattened curves from the original curves")
+        self.arg_parser.add_argument("--incremental", type=inkex.Boolean, default=False, help="Report intersections while scanning (low memory)")
 
     def walk(self, elem):
         if elem.get("id") == "precut_errors":
@@ -404,18 +321,27 @@ class PathIntersections(inkex.Effect):
             self.check_result.extend(checker(elem))
 
     def effect(self):
+        self.checkers = [ElemBlacklistChecker(), StyleChecker(), IntersectionChecker(self.options.tolerance, self.options.incremental)]
         svg = self.document.getroot()
         self.walk(svg)
         vis = ErrorVisualization(svg, self, color=self.options.color)
         # additional "collect" pass for "global" analysis
         for checker in self.checkers:
-            self.check_result.extend(checker.collect())
+            if self.options.incremental is True:
+                # draw the results as they come instead of collecting them first
+                for res in checker.collect():
+                    self.add_error(vis, res)
+            else:
+                self.check_result.extend(checker.collect())
         for res in self.check_result:
-            #print >>sys.stderr, unicode(res).encode("utf8")
-            #print(sys.stderr, str(res.encode("utf8")))
-            if res.extra and "intersection" in res.extra:
-                # TODO: add visualization for other kinds of errors
-                vis.add_error(res.extra["intersection"])
+            self.add_error(vis, res)
+
+    def add_error(self, vis, res):
+        #print >>sys.stderr, unicode(res).encode("utf8")
+        #print(sys.stderr, str(res.encode("utf8")))
+        if res.extra and "intersection" in res.extra:
+            # TODO: add visualization for other kinds of errors
+            vis.add_error(res.extra["intersection"])
 
 
 if __name__ == "__main__":
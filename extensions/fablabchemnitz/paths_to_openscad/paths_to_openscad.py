@@ -115,10 +115,12 @@
 
 import os
 import sys
+import hashlib
 import os.path
 import inkex
 import inkex.paths
 import inkex.bezier
+import numpy
 from inkex.transforms import Transform
 import re
 import time
@@ -202,130 +204,142 @@ def parseLengthWithUnits(str, default_unit="px"):
     return v, u
 
 
-def pointInBBox(pt, bbox):
+def pointsInPoly(points, poly):
     """
-    Determine if the point pt=[x, y] lies on or within the bounding
-    box bbox=[xmin, xmax, ymin, ymax].
+    Vectorized ray casting: for each point of points = [[x, y], ...] see if it
+    lies within the polygon poly = [[x1,y1],[x2,y2],...].  A point is within
+    poly if it is inside, lies on a horizontal edge of poly, or is a vertex of
+    poly.  Returns a numpy array of booleans, one per point.
     """
 
-    # if ( x < xmin ) or ( x > xmax ) or ( y < ymin ) or ( y > ymax )
-    if (pt[0] < bbox[0]) or (pt[0] > bbox[1]) or (pt[1] < bbox[2]) or (pt[1] > bbox[3]):
-        return False
-    else:
-        return True
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+    poly = numpy.asarray(poly, dtype=float).reshape(-1, 2)
+    result = numpy.zeros(len(points), dtype=bool)
+    n = len(poly)
+    if n == 0:
+        return result
+
+    # edges from each vertex to the next one (closing the polygon) for the
+    # ray casting, horizontal edge handling considers the open polyline only
+    p1 = poly
+    p2 = numpy.roll(poly, -1, axis=0)
+    open_p1 = poly[:-1]
+    open_p2 = poly[1:]
+
+    # limit the size of the (points x edges) matrices
+    chunk = max(1, (1 << 20) // n)
+    for start in range(0, len(points), chunk):
+        x = points[start:start + chunk, 0:1]
+        y = points[start:start + chunk, 1:2]
+
+        # Check to see if the point is a vertex
+        inside = ((x == poly[:, 0]) & (y == poly[:, 1])).any(axis=1)
+
+        # Handle a boundary case associated with the point
+        # lying on a horizontal edge of the polygon
+        if n > 1:
+            inside |= (
+                (y == open_p1[:, 1])
+                & (open_p1[:, 1] == open_p2[:, 1])
+                & (x > numpy.minimum(open_p1[:, 0], open_p2[:, 0]))
+                & (x < numpy.maximum(open_p1[:, 0], open_p2[:, 0]))
+            ).any(axis=1)
+
+        crossing = (
+            (y > numpy.minimum(p1[:, 1], p2[:, 1]))
+            & (y <= numpy.maximum(p1[:, 1], p2[:, 1]))
+            & (x <= numpy.maximum(p1[:, 0], p2[:, 0]))
+        )
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            intersect = p1[:, 0] + (y - p1[:, 1]) * (p2[:, 0] - p1[:, 0]) / (p2[:, 1] - p1[:, 1])
+        crossing &= (p1[:, 1] == p2[:, 1]) | (x <= intersect)
+        inside |= crossing.sum(axis=1) % 2 == 1
 
+        result[start:start + chunk] = inside
 
-def bboxInBBox(bbox1, bbox2):
-    """
-    Determine if the bounding box bbox1 lies on or within the
-    bounding box bbox2.  NOTE: we do not test for strict enclosure.
+    return result
 
-    Structure of the bounding boxes is
 
-    bbox1 = [ xmin1, xmax1, ymin1, ymax1 ]
-    bbox2 = [ xmin2, xmax2, ymin2, ymax2 ]
+def polyInPoly(poly1, poly2):
     """
-
-    # if ( xmin1 < xmin2 ) or ( xmax1 > xmax2 ) or
-    # ( ymin1 < ymin2 ) or ( ymax1 > ymax2 )
-
-    if (
-        (bbox1[0] < bbox2[0])
-        or (bbox1[1] > bbox2[1])
-        or (bbox1[2] < bbox2[2])
-        or (bbox1[3] > bbox2[3])
-    ):
-        return False
-    else:
-        return True
-
-
-def pointInPoly(p, poly, bbox=None):
-    """
-    Use a ray casting algorithm to see if the point p = [x, y] lies within
-    the polygon poly = [[x1,y1],[x2,y2],...].  Returns True if the point
-    is within poly, lies on an edge of poly, or is a vertex of poly.
+    Determine if polygon poly2 = [[x1,y1],[x2,y2],...] contains polygon
+    poly1, i.e. if each vertex of poly1 lies on or within poly2.  The first
+    vertex is tested alone before, which rejects most of the candidates
+    with a single point test.  The bounding boxes have to be checked by the caller.
     """
 
-    if (p is None) or (poly is None):
-        return False
-
-    # Check to see if the point lies outside the polygon's bounding box
-    if bbox is not None:
-        if not pointInBBox(p, bbox):
-            return False
-
-    # Check to see if the point is a vertex
-    if p in poly:
+    if len(poly1) == 0:
         return True
-
-    # Handle a boundary case associated with the point
-    # lying on a horizontal edge of the polygon
-    x = p[0]
-    y = p[1]
-    p1 = poly[0]
-    p2 = poly[1]
-    for i in range(len(poly)):
-        if i != 0:
-            p1 = poly[i - 1]
-            p2 = poly[i]
-        if (
-            (y == p1[1])
-            and (p1[1] == p2[1])
-            and (x > min(p1[0], p2[0]))
-            and (x < max(p1[0], p2[0]))
-        ):
-            return True
-
-    n = len(poly)
-    inside = False
-
-    p1_x, p1_y = poly[0]
-    for i in range(n + 1):
-        p2_x, p2_y = poly[i % n]
-        if y > min(p1_y, p2_y):
-            if y <= max(p1_y, p2_y):
-                if x <= max(p1_x, p2_x):
-                    if p1_y != p2_y:
-                        intersect = p1_x + (y - p1_y) * (p2_x - p1_x) / (p2_y - p1_y)
-                        if x <= intersect:
-                            inside = not inside
-                    else:
-                        inside = not inside
-        p1_x, p1_y = p2_x, p2_y
-
-    return inside
+    if not pointsInPoly(poly1[:1], poly2)[0]:
+        return False
+    return bool(pointsInPoly(poly1, poly2).all())
 
 
-def polyInPoly(poly1, bbox1, poly2, bbox2):
+def subpathContainment(subpaths):
     """
-    Determine if polygon poly2 = [[x1,y1],[x2,y2],...]
-    contains polygon poly1.
-
-    The bounding box information, bbox=[xmin, xmax, ymin, ymax]
-    is optional.  When supplied it can be used to perform rejections.
-    Note that one bounding box containing another is not sufficient
-    to imply that one polygon contains another.  It's necessary, but
-    not sufficient.
-    """
-
-    # See if poly1's bboundin box is NOT contained by poly2's bounding box
-    # if it isn't, then poly1 cannot be contained by poly2.
-
-    if (bbox1 is not None) and (bbox2 is not None):
-        if not bboxInBBox(bbox1, bbox2):
-            return False
-
-    # To see if poly1 is contained by poly2, we need to ensure that each
-    # vertex of poly1 lies on or within poly2
+    Determine which subpaths contain which.  subpaths is a list of
+    [vertices, bbox] items with bbox=[xmin, xmax, ymin, ymax].
 
-    for p in poly1:
-        if not pointInPoly(p, poly2, bbox2):
-            return False
+    Only pairs whose bounding boxes lie on or within each other are tested:
+    the bounding boxes are sorted by xmin, so all candidates for an outer
+    subpath are found with a binary search on the x-axis and a vectorized
+    comparison of the remaining extents.  If two subpaths contain each other
+    (identical subpaths), the one coming first contains the other one.
 
-    # Looks like poly1 is contained on or in Poly2
+    Returns the lists contains[i] (subpaths contained in subpath i) and
+    contained_by[j] (subpaths containing subpath j), both sorted.
+    """
 
-    return True
+    count = len(subpaths)
+    contains = [[] for i in range(count)]
+    contained_by = [[] for i in range(count)]
+    if count < 2:
+        return contains, contained_by
+
+    bboxes = numpy.array([subpath[1] for subpath in subpaths], dtype=float)
+    order = numpy.argsort(bboxes[:, 0], kind="stable")
+    xmins = bboxes[order, 0]
+
+    candidates = set()
+    for i in range(count):
+        xmin, xmax, ymin, ymax = bboxes[i]
+        lo = numpy.searchsorted(xmins, xmin, side="left")
+        hi = numpy.searchsorted(xmins, xmax, side="right")
+        inner = order[lo:hi]
+        inner_bboxes = bboxes[inner]
+        inner = inner[
+            (inner_bboxes[:, 1] <= xmax)
+            & (inner_bboxes[:, 2] >= ymin)
+            & (inner_bboxes[:, 3] <= ymax)
+            & (inner != i)
+        ]
+        for j in inner.tolist():
+            candidates.add((i, j))
+
+    polys = {}
+
+    def poly(i):
+        if i not in polys:
+            polys[i] = numpy.asarray(subpaths[i][0], dtype=float).reshape(-1, 2)
+        return polys[i]
+
+    for i, j in sorted(candidates):
+        if i > j and (j, i) in candidates:
+            continue  # handled together with (j, i)
+        a, b = min(i, j), max(i, j)
+        if (a, b) in candidates and polyInPoly(poly(b), poly(a)):
+            # subpath a contains subpath b
+            contains[a].append(b)
+            contained_by[b].append(a)
+        elif (b, a) in candidates and polyInPoly(poly(a), poly(b)):
+            # subpath b contains subpath a
+            contains[b].append(a)
+            contained_by[a].append(b)
+
+    for i in range(count):
+        contains[i].sort()
+        contained_by[i].sort()
+    return contains, contained_by
 
 
 def subdivideCubicPath(sp, flat, i=1):
@@ -462,6 +476,7 @@ class PathsToOpenSCAD(inkex.EffectExtension):
         pars.add_argument( "--stlpost",  type=inkex.utils.Boolean, default=False, help="Start e.g. a slicer. This implies the --scad2stl option. ( see --stlpostcmd )", )
         pars.add_argument( "--stlpostcmd", default=INX_STL_POSTPROCESSING, help="Command used for post processing an STL file (typically a slicer). You can use {NAME}.stl for the STL file.", )
         pars.add_argument( "--stlmodule", type=inkex.utils.Boolean, default=False, help="Output configured to comment out final rendering line, to create a module file for import.", )
+        pars.add_argument( "--share_shapes", type=inkex.utils.Boolean, default=False, help="Write the modules while traversing and emit identical shapes only once, placing the repetitions with translate().", )
 
         self.userunitsx = 1.0  # Move to pure userunits per mm for v1.0
         self.userunitsy = 1.0
@@ -482,8 +497,13 @@ class PathsToOpenSCAD(inkex.EffectExtension):
         self.call_list_neg = []  # anti-matter (holes via difference)
         self.pathid = int(0)
 
-        # Output file
-        outfile = None
+        # Output file, only set while streaming the modules (share_shapes)
+        self.outfile = None
+
+        # Module ids written so far and, for shared shapes, the module id
+        # keyed by a hash of the shape's polygon data
+        self.module_ids = set()
+        self.shapes = {}
 
         # For handling an SVG viewbox attribute, we will need to know the
         # values of the document's <svg> width and height attributes as well
@@ -675,6 +695,11 @@ class PathsToOpenSCAD(inkex.EffectExtension):
 
         if len(subpath_list) > 0:
             self.paths[node] = subpath_list
+            if self.outfile is not None:
+                # Streaming: write the module now and drop the vertices
+                self.outfile.write("\n")
+                self.convertPath(node, self.outfile)
+                del self.paths[node]
 
     def getPathStyle(self, node):
         style = node.get("style", "")
@@ -694,6 +719,83 @@ class PathsToOpenSCAD(inkex.EffectExtension):
                 ret[key] = val
         return ret
 
+    def polygonData(self, id, path, contains, contained_by, ox, oy):
+        """
+        Global data for the msg_*() functions: center, points and index
+        paths of each outermost subpath, relative to (ox, oy).
+        """
+        # #### global data for msg_*() functions. ####
+        # fold subpaths into a single list of points and index paths.
+        data = ""
+        prefix = 0
+        for i in range(0, len(path)):
+            # Skip this subpath if it is contained by another one
+            if len(contained_by[i]) != 0:
+                continue
+            subpath = path[i][0]
+            bbox = path[i][1]  # [xmin, xmax, ymin, ymax]
+
+            #
+            polycenter = (
+                id
+                + "_"
+                + str(prefix)
+                + "_center = [%f,%f]"
+                % (
+                    (bbox[0] + bbox[1]) * .5 - ox,
+                    (bbox[2] + bbox[3]) * .5 - oy,
+                )
+            )
+            polypoints = id + "_" + str(prefix) + "_points = ["
+            # polypaths = [[0,1,2], [3,4,5]]   # this path is two triangle
+            polypaths = id + "_" + str(prefix) + "_paths = [["
+            if len(contains[i]) == 0:
+                # This subpath does not contain any subpaths
+                for point in subpath:
+                    polypoints += "[%f,%f]," % (
+                        (point[0] - ox),
+                        (point[1] - oy),
+                    )
+                polypoints = polypoints[:-1]
+                polypoints += "];\n"
+                data += polycenter + ";\n"
+                data += polypoints
+                prefix += 1
+            else:
+                # This subpath contains other subpaths
+                # collect all points into polypoints
+                # also collect the indices into polypaths
+                for point in subpath:
+                    polypoints += "[%f,%f]," % (
+                        (point[0] - ox),
+                        (point[1] - oy),
+                    )
+                count = len(subpath)
+                for k in range(0, count):
+                    polypaths += "%d," % (k)
+                polypaths = polypaths[:-1] + "],\n\t\t\t\t["
+                # The nested paths
+                for j in contains[i]:
+                    for point in path[j][0]:
+                        polypoints += "[%f,%f]," % (
+                            (point[0] - ox),
+                            (point[1] - oy),
+                        )
+                    for k in range(count, count + len(path[j][0])):
+                        polypaths += "%d," % k
+                    count += len(path[j][0])
+                    polypaths = polypaths[:-1] + "],\n\t\t\t\t["
+                polypoints = polypoints[:-1]
+                polypoints += "];\n"
+                polypaths = polypaths[:-7] + "];\n"
+                # write the polys and paths
+                data += polycenter + ";\n"
+                data += polypoints
+                data += polypaths
+                prefix += 1
+        # #### end global data for msg_*() functions. ####
+        return data
+
     def convertPath(self, node, outfile):
         def object_merge_extrusion_values(extrusion, node):
 
@@ -737,22 +839,7 @@ class PathsToOpenSCAD(inkex.EffectExtension):
             return
 
         # Determine which polys contain which
-
-        contains = [[] for i in range(len(path))]
-        contained_by = [[] for i in range(len(path))]
-
-        for i in range(0, len(path)):
-            for j in range(i + 1, len(path)):
-                if polyInPoly(path[j][0], path[j][1], path[i][0], path[i][1]):
-                    # subpath i contains subpath j
-                    contains[i].append(j)
-                    # subpath j is contained in subpath i
-                    contained_by[j].append(i)
-                elif polyInPoly(path[i][0], path[i][1], path[j][0], path[j][1]):
-                    # subpath j contains subpath i
-                    contains[j].append(i)
-                    # subpath i is contained in subpath j
-                    contained_by[i].append(j)
+        contains, contained_by = subpathContainment(path)
 
         # Generate an OpenSCAD module for this path
         rawid = node.get("id", "")
@@ -780,80 +867,20 @@ class PathsToOpenSCAD(inkex.EffectExtension):
             )
             return
 
-        # #### global data for msg_*() functions. ####
-        # fold subpaths into a single list of points and index paths.
-        prefix = 0
-        for i in range(0, len(path)):
-            # Skip this subpath if it is contained by another one
-            if len(contained_by[i]) != 0:
-                continue
-            subpath = path[i][0]
-            bbox = path[i][1]  # [xmin, xmax, ymin, ymax]
-
-            #
-            polycenter = (
-                id
-                + "_"
-                + str(prefix)
-                + "_center = [%f,%f]"
-                % (
-                    (bbox[0] + bbox[1]) * .5 - self.cx,
-                    (bbox[2] + bbox[3]) * .5 - self.cy,
-                )
+        if self.options.share_shapes:
+            # Polygon data relative to the lower left corner of the shape,
+            # so all repetitions of a shape have the same data
+            ox = min(subpath[1][0] for subpath in path)
+            oy = min(subpath[1][2] for subpath in path)
+            shape = "%d\n%s" % (
+                filled and not self.options.force_line,
+                self.polygonData("", path, contains, contained_by, ox, oy),
             )
-            polypoints = id + "_" + str(prefix) + "_points = ["
-            # polypaths = [[0,1,2], [3,4,5]]   # this path is two triangle
-            polypaths = id + "_" + str(prefix) + "_paths = [["
-            if len(contains[i]) == 0:
-                # This subpath does not contain any subpaths
-                for point in subpath:
-                    polypoints += "[%f,%f]," % (
-                        (point[0] - self.cx),
-                        (point[1] - self.cy),
-                    )
-                polypoints = polypoints[:-1]
-                polypoints += "];\n"
-                outfile.write(polycenter + ";\n")
-                outfile.write(polypoints)
-                prefix += 1
-            else:
-                # This subpath contains other subpaths
-                # collect all points into polypoints
-                # also collect the indices into polypaths
-                for point in subpath:
-                    polypoints += "[%f,%f]," % (
-                        (point[0] - self.cx),
-                        (point[1] - self.cy),
-                    )
-                count = len(subpath)
-                for k in range(0, count):
-                    polypaths += "%d," % (k)
-                polypaths = polypaths[:-1] + "],\n\t\t\t\t["
-                # The nested paths
-                for j in contains[i]:
-                    for point in path[j][0]:
-                        polypoints += "[%f,%f]," % (
-                            (point[0] - self.cx),
-                            (point[1] - self.cy),
-                        )
-                    for k in range(count, count + len(path[j][0])):
-                        polypaths += "%d," % k
-                    count += len(path[j][0])
-                    polypaths = polypaths[:-1] + "],\n\t\t\t\t["
-                polypoints = polypoints[:-1]
-                polypoints += "];\n"
-                polypaths = polypaths[:-7] + "];\n"
-                # write the polys and paths
-                outfile.write(polycenter + ";\n")
-                outfile.write(polypoints)
-                outfile.write(polypaths)
-                prefix += 1
-        # #### end global data for msg_*() functions. ####
-
-        outfile.write("module poly_" + id + "(h, w, s, res=line_fn)\n{\n")
-        # Element is transformed to correct size, so scale is now just for the user to
-        # tweak after the fact
-        outfile.write("  scale([custom_scale_x, -custom_scale_y, 1]) union()\n  {\n")
+            shape = hashlib.sha1(shape.encode("utf-8")).hexdigest()
+            shape_id = self.shapes.get(shape)
+        else:
+            ox, oy = self.cx, self.cy
+            shape_id = None
 
         # And add the call to the call list
         # Z-size is set by the overall module parameter
@@ -862,19 +889,52 @@ class PathsToOpenSCAD(inkex.EffectExtension):
         if self.options.parsedesc is True:
             object_merge_extrusion_values(extrusion, node)
 
-        call_item = "translate ([0,0,%s]) poly_%s(%s, min_line_mm(%s), %s);\n" % (
-            extrusion["zoffset"],
-            id,
-            extrusion["zsize"],
-            stroke_width_mm,
-            extrusion["scale"],
-        )
+        if shape_id is None:
+            if id in self.module_ids:
+                # e.g. the same element referenced by several <use> elements
+                id = "%s_%d" % (id, len(self.module_ids))
+            self.module_ids.add(id)
+            if self.options.share_shapes:
+                self.shapes[shape] = id
+            self.writeModule(outfile, id, path, contains, contained_by, ox, oy, filled)
+            shape_id = id
+
+        if self.options.share_shapes:
+            # The drawing's center is only known at the end, see effect()
+            call_item = "translate ([custom_scale_x*(%f-center_x),-custom_scale_y*(%f-center_y),%s]) poly_%s(%s, min_line_mm(%s), %s);\n" % (
+                ox,
+                oy,
+                extrusion["zoffset"],
+                shape_id,
+                extrusion["zsize"],
+                stroke_width_mm,
+                extrusion["scale"],
+            )
+        else:
+            call_item = "translate ([0,0,%s]) poly_%s(%s, min_line_mm(%s), %s);\n" % (
+                extrusion["zoffset"],
+                shape_id,
+                extrusion["zsize"],
+                stroke_width_mm,
+                extrusion["scale"],
+            )
 
         if extrusion["neg"]:
             self.call_list_neg.append(call_item)
         else:
             self.call_list.append(call_item)
 
+    def writeModule(self, outfile, id, path, contains, contained_by, ox, oy, filled):
+        """
+        Write the polygon data and the OpenSCAD module poly_<id> of a path.
+        """
+        outfile.write(self.polygonData(id, path, contains, contained_by, ox, oy))
+
+        outfile.write("module poly_" + id + "(h, w, s, res=line_fn)\n{\n")
+        # Element is transformed to correct size, so scale is now just for the user to
+        # tweak after the fact
+        outfile.write("  scale([custom_scale_x, -custom_scale_y, 1]) union()\n  {\n")
+
         prefix = 0
         for i in range(0, len(path)):
 
@@ -882,9 +942,6 @@ class PathsToOpenSCAD(inkex.EffectExtension):
             if len(contained_by[i]) != 0:
                 continue
 
-            subpath = path[i][0]
-            bbox = path[i][1]
-
             if filled and not self.options.force_line:
 
                 if len(contains[i]) == 0:
@@ -1234,10 +1291,7 @@ class PathsToOpenSCAD(inkex.EffectExtension):
         else:
             return self.docTransform
 
-    def effect(self):
-        # Viewbox handling
-        self.handleViewBox()
-
+    def traverseDocument(self):
         # First traverse the document (or selected items), reducing
         # everything to line segments.  If working on a selection,
         # then determine the selection's bounding box in the process.
@@ -1256,6 +1310,13 @@ class PathsToOpenSCAD(inkex.EffectExtension):
         self.cx = self.xmin + (self.xmax - self.xmin) / 2.0
         self.cy = self.ymin + (self.ymax - self.ymin) / 2.0
 
+    def effect(self):
+        # Viewbox handling
+        self.handleViewBox()
+
+        if not self.options.share_shapes:
+            self.traverseDocument()
+
         # Determine which polygons lie entirely within other polygons
         try:
             self.options.fname = self.options.fname.format(**{"NAME": self.basename})
@@ -1315,7 +1376,15 @@ fudge = 0.1;
                     "function min_line_mm(w) = max(min_line_width, w * line_width_scale) * %g;\n\n"
                     % self.userunitsx
                 )
-    
+
+                if self.options.share_shapes:
+                    # Write the modules while traversing the document,
+                    # the drawing's center is known afterwards
+                    self.outfile = outfile
+                    self.traverseDocument()
+                    self.outfile = None
+                    outfile.write("\ncenter_x = %f;\ncenter_y = %f;\n" % (self.cx, self.cy))
+
                 for key in self.paths:
                     outfile.write("\n")
                     self.convertPath(key, outfile)
@@ -33,6 +33,7 @@ import base64
 from io import StringIO, BytesIO
 import urllib.request as urllib
 import inkex
+import numpy as np
 from PIL import Image
 from lxml import etree
 
@@ -62,6 +63,7 @@ class Pixel2SVG(inkex.EffectExtension):
         pars.add_argument("--verbose", type=inkex.Boolean, default=False)
         pars.add_argument("--color_mode", default="all", help="Which colors to trace.")
         pars.add_argument("--color", default="FFFFFF", help="Special color")
+        pars.add_argument("--output_mode", default="pixels", help="One rect per pixel (pixels), per horizontal run (runs), per merged rectangle (rects) or one path per color (paths)")
         pars.add_argument("--tab")
 
     def checkImagePath(self, node):
@@ -88,16 +90,14 @@ class Pixel2SVG(inkex.EffectExtension):
         if (os.path.isfile(path)):
             return path
 
-    def drawFilledRect(self, parent, svgpx):
+    def fillStyle(self, rgb, alpha):
         """
-        Draw rect based on ((x, y), (width,height), ((r,g,b),a)), add to parent
+        Style for a fill color based on (r,g,b) and alpha, cached per color
         """
+        key = (tuple(rgb), alpha)
+        if key in self.fill_styles:
+            return self.fill_styles[key]
         style = {}
-        pos = svgpx[0]
-        dim = svgpx[1]
-        rgb = svgpx[2][0]
-        alpha = svgpx[2][1]
-
         style['stroke'] = 'none'
 
         if len(rgb) == 3:
@@ -114,16 +114,112 @@ class Pixel2SVG(inkex.EffectExtension):
             # only write 'fill-opacity' for non-default value
             style['fill-opacity'] = '%s' % round(alpha/255.0, 8)
 
+        self.fill_styles[key] = str(inkex.Style(style))
+        return self.fill_styles[key]
+
+    def drawFilledRect(self, parent, svgpx):
+        """
+        Draw rect based on ((x, y), (width,height), ((r,g,b),a)), add to parent
+        """
+        pos = svgpx[0]
+        dim = svgpx[1]
+        rgb = svgpx[2][0]
+        alpha = svgpx[2][1]
+
         rect_attribs = {'x': str(pos[0]),
                         'y': str(pos[1]),
                         'width': str(dim[0]),
                         'height': str(dim[1]),
-                        'style': str(inkex.Style(style)), }
+                        'style': self.fillStyle(rgb, alpha), }
 
         rect = etree.SubElement(parent, inkex.addNS('rect', 'svg'), rect_attribs)
 
         return rect
 
+    def pixelColors(self, image):
+        """
+        Color key per pixel as int64 array (height, width): (r << 24) + (g << 16)
+        + (b << 8) + alpha, or -1 for pixels which are not traced
+        """
+        rgba = np.asarray(image, dtype=np.int64)
+        traced = rgba[:, :, 3] > 0  # Omit transparent pixels
+        if self.options.color_mode != "all":
+            if self.options.color:
+                match = (rgba[:, :, :3] == hex_to_int_color(self.options.color)).all(axis=2)
+            else:
+                match = np.zeros(traced.shape, dtype=bool)
+            if self.options.color_mode == "other":
+                traced &= ~match
+            elif self.options.color_mode == "this":
+                traced &= match
+        alpha = rgba[:, :, 3] if self.options.transparency else 255
+        colors = (rgba[:, :, 0] << 24) + (rgba[:, :, 1] << 16) + (rgba[:, :, 2] << 8) + alpha
+        return np.where(traced, colors, -1)
+
+    @staticmethod
+    def horizontalRuns(colors):
+        """
+        Runs of equal colors in each row: arrays of y, x, length and color
+        """
+        height, width = colors.shape
+        starts = np.ones(colors.shape, dtype=bool)
+        starts[:, 1:] = colors[:, 1:] != colors[:, :-1]
+        starts = np.flatnonzero(starts)
+        lengths = np.diff(np.append(starts, height * width))
+        runColors = colors.reshape(-1)[starts]
+        traced = runColors >= 0
+        starts, lengths, runColors = starts[traced], lengths[traced], runColors[traced]
+        return starts // width, starts % width, lengths, runColors
+
+    @staticmethod
+    def mergeRuns(ys, xs, lengths, colors):
+        """
+        Merge runs with the same position, length and color in consecutive
+        rows to rectangles. Returns a list of (x, y, width, height, color)
+        """
+        rects = []
+        open_rects = {}  # (x, length, color) -> index of the rect ending in the previous row
+        previous_row = {}
+        row = None
+        for y, x, length, color in zip(ys.tolist(), xs.tolist(), lengths.tolist(), colors.tolist()):
+            if y != row:
+                previous_row, open_rects = open_rects, {}
+                row = y
+            key = (x, length, color)
+            index = previous_row.get(key)
+            if index is not None and rects[index][1] + rects[index][3] == y:
+                rects[index][3] += 1
+            else:
+                index = len(rects)
+                rects.append([x, y, length, 1, color])
+            open_rects[key] = index
+        return rects
+
+    @staticmethod
+    def colorToRGBA(color):
+        """
+        Split a color key from pixelColors into ((r,g,b), alpha)
+        """
+        return ((color >> 24) & 0xFF, (color >> 16) & 0xFF, (color >> 8) & 0xFF), color & 0xFF
+
+    def drawColorPaths(self, parent, rects):
+        """
+        Draw one compound path per color with the rectangles
+        (x, y, width, height, color) as subpaths, add to parent
+        """
+        size = self.options.squaresize
+        subpaths = {}
+        for x, y, width, height, color in rects:
+            subpaths.setdefault(color, []).append("M %d,%d h %d v %d h %d Z" % (
+                x * size, y * size,
+                width * size + self.options.overlap,
+                height * size + self.options.overlap,
+                -(width * size + self.options.overlap)))
+        for color, d in subpaths.items():
+            rgb, alpha = self.colorToRGBA(color)
+            etree.SubElement(parent, inkex.addNS('path', 'svg'),
+                             {'d': " ".join(d), 'style': self.fillStyle(rgb, alpha)})
+
     def vectorizeImage(self, node):
         """
         Parse RGBA values of linked bitmap image, create a group and
@@ -166,14 +262,6 @@ class Pixel2SVG(inkex.EffectExtension):
 
             if width <= pixel2svg_max and height <= pixel2svg_max:
 
-                # color trace modes
-                trace_color = []
-                if self.options.color:
-                    trace_color = hex_to_int_color(self.options.color)
-
-                # get RGBA data
-                rgba_values = list(image.getdata())
-
                 # create group
                 nodeParent = node.getparent()
                 nodeIndex = nodeParent.index(node)
@@ -252,47 +340,28 @@ class Pixel2SVG(inkex.EffectExtension):
                     .format(scale_x, scale_y, float(img_x) + x_offset, float(img_y) + y_offset)
                 pixel2svg_group.attrib['transform'] = transform
 
-                # reverse list (performance), pop last one instead of first
-                rgba_values.reverse()
-                # loop through pixels (per row)
-                rowcount = 0
-                while rowcount < height:
-                    colcount = 0
-                    while colcount < width:
-                        rgba_tuple = rgba_values.pop()
-                        # Omit transparent pixels
-                        if rgba_tuple[3] > 0:
-                            # color options
-                            do_trace = True
-                            if (self.options.color_mode != "all"):
-                                if (trace_color == rgba_tuple[:3]):
-                                    # colors match
-                                    if (self.options.color_mode == "other"):
-                                        do_trace = False
-                                else:
-                                    # colors don't match
-                                    if (self.options.color_mode == "this"):
-                                        do_trace = False
-                            if do_trace:
-                                # position
-                                svgpx_x = colcount * self.options.squaresize
-                                svgpx_y = rowcount * self.options.squaresize
-                                # dimension + overlap
-                                svgpx_size = self.options.squaresize + self.options.overlap
-                                # get color, ignore alpha
-                                svgpx_rgb = rgba_tuple[:3]
-                                svgpx_a = 255
-                                # transparency
-                                if self.options.transparency:
-                                    svgpx_a = rgba_tuple[3]
-                                svgpx = ((svgpx_x, svgpx_y),
-                                         (svgpx_size, svgpx_size),
-                                         (svgpx_rgb, svgpx_a)
-                                         )
-                                # draw square in group
-                                self.drawFilledRect(pixel2svg_group, svgpx)
-                        colcount = colcount + 1
-                    rowcount = rowcount + 1
+                colors = self.pixelColors(image)
+                size = self.options.squaresize
+                if self.options.output_mode == "pixels":
+                    ys, xs = np.nonzero(colors >= 0)
+                    rects = [(x, y, 1, 1, colors[y, x]) for y, x in zip(ys.tolist(), xs.tolist())]
+                else:
+                    ys, xs, lengths, runColors = self.horizontalRuns(colors)
+                    if self.options.output_mode == "runs":
+                        rects = zip(xs.tolist(), ys.tolist(), lengths.tolist(), [1] * len(xs), runColors.tolist())
+                    else:
+                        rects = self.mergeRuns(ys, xs, lengths, runColors)
+
+                if self.options.output_mode == "paths":
+                    self.drawColorPaths(pixel2svg_group, rects)
+                else:
+                    for x, y, w, h, color in rects:
+                        rgb, alpha = self.colorToRGBA(int(color))
+                        svgpx = ((x * size, y * size),
+                                 (w * size + self.options.overlap, h * size + self.options.overlap),
+                                 (rgb, alpha))
+                        # draw rect in group
+                        self.drawFilledRect(pixel2svg_group, svgpx)
 
                 # all done
                 if DEBUG:
@@ -322,6 +391,7 @@ class Pixel2SVG(inkex.EffectExtension):
         Pixel2SVG - Convert the pixels of bitmap images to SVG rects
         """
         found_image = False
+        self.fill_styles = {}
         if (self.options.ids):
             for node in self.svg.selected.values():
                 if node.tag == inkex.addNS('image', 'svg'):
@@ -23,23 +23,13 @@ Optionally join separate subpaths if end nodes closer than a specified distance.
 Joining subpaths can be done either by interpolating or straight line segment. 
 """
 
+import sys
 import inkex
 from inkex import bezier, PathElement, CubicSuperPath
 import numpy as np
 from tkinter import messagebox
-
-def joinTest(xdiff,ydiff,limDist,idsIncluded):
-    joinFlag=False
-    idJoin=-1
-    dist=np.sqrt(np.add(np.power(xdiff,2),np.power(ydiff,2)))
-    minDist=np.amin(dist)
-    if minDist < limDist:
-        joinFlag=True
-        idMins=np.where(dist==minDist)
-        idMin=idMins[0]
-        idJoin=idsIncluded[idMin[0]]
-        
-    return [joinFlag,idJoin]
+sys.path.append("../purge_duplicate_path_segments")
+from fixed_radius_search import FixedRadiusSearch
 
 def revSub(subPath):
     subPath=subPath[::-1]
@@ -224,63 +214,63 @@ class RemoveDuplicateNodes(inkex.EffectExtension):
                     joinEndTo[closedPaths]=2*maxdist2#set higher than maxdist2 to avoid join to closedPaths
                     joinStartTo=np.copy(joinEndTo)
     
+                    #index of the start and end nodes still available for joining
+                    startIndex=FixedRadiusSearch(maxdist2 if maxdist2 > 0 else 1)
+                    endIndex=FixedRadiusSearch(startIndex.r)
+                    for t in openPaths[0]:
+                        startIndex.add((xStart[t],yStart[t]),t)
+                        endIndex.add((xEnd[t],yEnd[t]),t)
+
+                    def closestJoin(index,p,s):
+                        #closest available node of other subpath with distance less than maxdist2 (lowest id if equal)
+                        for dist, q, t in index.radius(p,maxdist2):
+                            if dist >= maxdist2:
+                                break
+                            if t != s:#avoid join to self
+                                return t
+                        return -1
+
+                    def setJoin(joinTo,index,points,s,jID):
+                        joinTo[s]=jID
+                        index.remove((points[0][s],points[1][s]),s)
+
+                    starts=(xStart,yStart)
+                    ends=(xEnd,yEnd)
                     #join end node of current subpath to startnode of any other or start node of current to end node of other (no reverse)
                     s=0
                     while s < nSub:
                         #end of current to start of other
                         if joinEndTo[s]==-1:
-                            idsTest=np.where(joinStartTo==-1)#find available start nodes
-                            id2Test=np.delete(idsTest[0],np.where(idsTest[0] == s))#avoid join to self
-                            if id2Test.size > 0:
-                                diff_x=np.subtract(xStart[id2Test],xEnd[s])#calculate distances in x direction
-                                diff_y=np.subtract(yStart[id2Test],yEnd[s])#calculate distances in y direction
-                                res=joinTest(diff_x,diff_y,maxdist2,id2Test)#find shortest distance if less than minimum
-                                if res[0] == True:#if match found flag end of this with id of other and flag start of match to end of this
-                                    joinEndTo[s]=res[1]
-                                    joinStartTo[res[1]]=s 
+                            jID=closestJoin(startIndex,(xEnd[s],yEnd[s]),s)
+                            if jID > -1:#if match found flag end of this with id of other and flag start of match to end of this
+                                setJoin(joinEndTo,endIndex,ends,s,jID)
+                                setJoin(joinStartTo,startIndex,starts,jID,s)
                         
                         #start of current to end of other
                         if joinStartTo[s]==-1:
-                            idsTest=np.where(joinEndTo==-1)
-                            id2Test=np.delete(idsTest[0],np.where(idsTest[0] == s))
-                            if id2Test.size > 0:
-                                diff_x=np.subtract(xEnd[id2Test],xStart[s])
-                                diff_y=np.subtract(yEnd[id2Test],yStart[s])
-                                res=joinTest(diff_x,diff_y,maxdist2,id2Test)
-                                if res[0] == True:
-                                    joinStartTo[s]=res[1]
-                                    joinEndTo[res[1]]=s 
+                            jID=closestJoin(endIndex,(xStart[s],yStart[s]),s)
+                            if jID > -1:
+                                setJoin(joinStartTo,startIndex,starts,s,jID)
+                                setJoin(joinEndTo,endIndex,ends,jID,s)
                                 
                         if self.options.allowReverse==True:
                             #start to start - if match reverse (reverseSub[s]=True)
                             if joinStartTo[s]==-1:
-                                idsTest=np.where(joinStartTo==-1)
-                                id2Test=np.delete(idsTest[0],np.where(idsTest[0] == s))
-                                if id2Test.size > 0:
-                                    diff_x=np.subtract(xStart[id2Test],xStart[s])
-                                    diff_y=np.subtract(yStart[id2Test],yStart[s])
-                                    res=joinTest(diff_x,diff_y,maxdist2,id2Test)
-                                    if res[0] == True:
-                                        jID=res[1]
-                                        joinStartTo[s]=jID
-                                        joinStartTo[jID]=s
-                                        joinStartToEnd[s]=False #false means reverse
-                                        joinStartToEnd[jID]=False
+                                jID=closestJoin(startIndex,(xStart[s],yStart[s]),s)
+                                if jID > -1:
+                                    setJoin(joinStartTo,startIndex,starts,s,jID)
+                                    setJoin(joinStartTo,startIndex,starts,jID,s)
+                                    joinStartToEnd[s]=False #false means reverse
+                                    joinStartToEnd[jID]=False
     
                             #end to end
                             if joinEndTo[s]==-1:
-                                idsTest=np.where(joinEndTo==-1)
-                                id2Test=np.delete(idsTest[0],np.where(idsTest[0] == s))
-                                if id2Test.size > 0:
-                                    diff_x=np.subtract(xEnd[id2Test],xEnd[s])
-                                    diff_y=np.subtract(yEnd[id2Test],yEnd[s])
-                                    res=joinTest(diff_x,diff_y,maxdist2,id2Test)
-                                    if res[0] == True:
-                                        jID=res[1]
-                                        joinEndTo[s]=jID
-                                        joinEndTo[jID]=s
-                                        joinEndToStart[s]=False
-                                        joinEndToStart[jID]=False
+                                jID=closestJoin(endIndex,(xEnd[s],yEnd[s]),s)
+                                if jID > -1:
+                                    setJoin(joinEndTo,endIndex,ends,s,jID)
+                                    setJoin(joinEndTo,endIndex,ends,jID,s)
+                                    joinEndToStart[s]=False
+                                    joinEndToStart[jID]=False
                     
                         s+=1
                         
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+'''
+Fixed radius point search (bin hash), shared by the path cleanup extensions.
+
+Copyright (C) 2010 David Turner <novalis@novalis.org>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St Fifth Floor, Boston, MA 02139
+
+Usage from another extension folder:
+
+    sys.path.append("../purge_duplicate_path_segments")
+    from fixed_radius_search import FixedRadiusSearch
+
+Points are hashed into square bins of size r. Every point may carry an item
+(for example the index of the path it belongs to). Queries return
+(distance, point, item) tuples, sorted by distance and, for equal distances,
+by the order in which the points were added.
+'''
+import math
+from collections import defaultdict
+
+def euclidean(dx, dy):
+    return math.sqrt(dx * dx + dy * dy)
+
+def manhattan(dx, dy):
+    return abs(dx) + abs(dy)
+
+class FixedRadiusSearch():
+    def __init__(self, r=0.1):
+        self.r = r
+        self.seen = defaultdict(list) # bin -> [(point, item, insertion number)]
+        self.count = 0
+        self.added = 0
+        self.min_bin = None
+        self.max_bin = None
+
+    def __len__(self):
+        return self.count
+
+    def round(self, f):
+        return int(round(f/self.r))
+
+    def bin(self, p):
+        return (self.round(p[0]), self.round(p[1]))
+
+    def test(self, p, q):
+        return abs(self.round(p[0] - q[0])) <= 1 and abs(self.round(p[1] - q[1])) <= 1
+
+    def search(self, p):
+        """ return a stored point in about the distance r of p, or None """
+        b = self.bin(p)
+        for i in range(b[0]-1, b[0]+2):
+            for j in range(b[1]-1, b[1]+2):
+                for q, item, n in self.seen.get((i, j), ()):
+                    if self.test(p, q):
+                        return q
+        return None
+
+    def add(self, p, item=None):
+        b = self.bin(p)
+        self.seen[b].append((p, item, self.added))
+        self.added += 1
+        self.count += 1
+        if self.min_bin is None:
+            self.min_bin = list(b)
+            self.max_bin = list(b)
+        else:
+            self.min_bin = [min(self.min_bin[0], b[0]), min(self.min_bin[1], b[1])]
+            self.max_bin = [max(self.max_bin[0], b[0]), max(self.max_bin[1], b[1])]
+
+    def add_all(self, points, items=None):
+        """ bulk insert of points, optionally with one item per point """
+        if items is None:
+            for p in points:
+                self.add(p)
+        else:
+            for p, item in zip(points, items):
+                self.add(p, item)
+
+    def remove(self, p, item=None):
+        """ remove the first stored entry of point p with the given item. Returns False if there is none """
+        entries = self.seen.get(self.bin(p))
+        if entries:
+            for k, (q, i, n) in enumerate(entries):
+                if q == p and i == item:
+                    del entries[k]
+                    self.count -= 1
+                    return True
+        return False
+
+    def get_or_add(self, p):
+        result = self.search(p)
+        if result == None:
+            self.add(p)
+            return p
+        return result
+
+    def radius(self, p, radius, metric=euclidean):
+        """ all stored entries within (<=) radius of p, as sorted (distance, point, item) list """
+        found = []
+        if self.count == 0:
+            return found
+        i0, j0 = self.round(p[0] - radius), self.round(p[1] - radius)
+        i1, j1 = self.round(p[0] + radius), self.round(p[1] + radius)
+        # never look at more bins than there are bins in use
+        i0, j0 = max(i0, self.min_bin[0]), max(j0, self.min_bin[1])
+        i1, j1 = min(i1, self.max_bin[0]), min(j1, self.max_bin[1])
+        if i1 < i0 or j1 < j0:
+            return found
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.seen):
+            candidates = (e for entries in self.seen.values() for e in entries)
+        else:
+            candidates = (e for i in range(i0, i1+1) for j in range(j0, j1+1) for e in self.seen.get((i, j), ()))
+        for q, item, n in candidates:
+            d = metric(q[0] - p[0], q[1] - p[1])
+            if d <= radius:
+                found.append((d, n, q, item))
+        found.sort(key=lambda e: (e[0], e[1]))
+        return [(d, q, item) for d, n, q, item in found]
+
+    def nearest(self, p, k=1, accept=None, metric=euclidean):
+        """
+        the k stored entries closest to p, as sorted (distance, point, item) list.
+        accept(point, item) may reject entries, e.g. the query point itself.
+        The metric has to be euclidean or manhattan (or another one which is at least the maximum norm).
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        bi, bj = self.bin(p)
+        # rings needed until all bins in use are covered
+        last_ring = max(abs(bi - self.min_bin[0]), abs(bi - self.max_bin[0]),
+                        abs(bj - self.min_bin[1]), abs(bj - self.max_bin[1]))
+        found = []
+        ring = 0
+        while ring <= last_ring:
+            if (2 * ring + 1) ** 2 > len(self.seen):
+                # the ring is larger than the number of bins in use: visit the rest directly
+                candidates = (e for b, entries in self.seen.items()
+                              if max(abs(b[0] - bi), abs(b[1] - bj)) >= ring for e in entries)
+                last_ring = ring
+            else:
+                candidates = (e for b in self._ring(bi, bj, ring) for e in self.seen.get(b, ()))
+            for q, item, n in candidates:
+                if accept is None or accept(q, item):
+                    found.append((metric(q[0] - p[0], q[1] - p[1]), n, q, item))
+            if len(found) >= k:
+                found.sort(key=lambda e: (e[0], e[1]))
+                del found[k:]
+                # entries outside of the visited rings are at least ring * r away
+                if found[-1][0] < ring * self.r:
+                    break
+            ring += 1
+        found.sort(key=lambda e: (e[0], e[1]))
+        return [(d, q, item) for d, n, q, item in found[:k]]
+
+    def _ring(self, bi, bj, ring):
+        if ring == 0:
+            yield (bi, bj)
+            return
+        for i in range(bi - ring, bi + ring + 1):
+            yield (i, bj - ring)
+            yield (i, bj + ring)
+        for j in range(bj - ring + 1, bj + ring):
+            yield (bi - ring, j)
+            yield (bi + ring, j)
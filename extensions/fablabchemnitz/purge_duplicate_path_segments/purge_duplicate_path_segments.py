@@ -18,40 +18,7 @@ Foundation, Inc., 51 Franklin St Fifth Floor, Boston, MA 02139
 '''
 import inkex
 from inkex import paths
-from collections import defaultdict
-
-class FixedRadiusSearch():
-    def __init__(self, r=0.1):
-        self.r = r
-        self.seen = defaultdict(list)
-
-    def round(self, f):
-        return int(round(f/self.r))
-        
-    def bin(self, p):
-        return (self.round(p[0]), self.round(p[1]))
-
-    def test(self, p, q):
-        return abs(self.round(p[0] - q[0])) <= 1 and abs(self.round(p[1] - q[1])) <= 1
-
-    def search(self, p):
-        b = self.bin(p)
-        for i in range(b[0]-1, b[0]+2):
-            for j in range(b[1]-1, b[1]+2):
-                for q in self.seen[(i, j)]:
-                    if self.test(p, q):
-                        return q
-        return None
-
-    def add(self, p):
-        self.seen[self.bin(p)].append(p)
-
-    def get_or_add(self, p):
-        result = self.search(p)
-        if result == None:
-            self.add(p)
-            return p
-        return result
+from fixed_radius_search import FixedRadiusSearch
 
 class PurgeDuplicatePathSegments(inkex.EffectExtension):
 
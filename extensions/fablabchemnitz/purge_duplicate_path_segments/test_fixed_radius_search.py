@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import random
+import pytest
+from fixed_radius_search import FixedRadiusSearch, euclidean, manhattan
+
+def brute_force_radius(points, p, radius, metric=euclidean):
+    found = [(metric(q[0] - p[0], q[1] - p[1]), n, q, n) for n, q in enumerate(points)]
+    return [(d, q, item) for d, n, q, item in sorted(e for e in found if e[0] <= radius)]
+
+def brute_force_nearest(points, p, k, metric=euclidean):
+    found = sorted((metric(q[0] - p[0], q[1] - p[1]), n, q, n) for n, q in enumerate(points))
+    return [(d, q, item) for d, n, q, item in found[:k]]
+
+def build(points, r):
+    search = FixedRadiusSearch(r)
+    search.add_all(points, range(len(points)))
+    return search
+
+@pytest.mark.parametrize("metric", [euclidean, manhattan])
+@pytest.mark.parametrize("r", [0.1, 1.0, 7.5])
+def test_radius_matches_brute_force(metric, r):
+    rng = random.Random(42)
+    points = [(rng.uniform(-20, 20), rng.uniform(-20, 20)) for _ in range(300)]
+    points += points[:10] #duplicates
+    search = build(points, r)
+    for _ in range(100):
+        p = (rng.uniform(-25, 25), rng.uniform(-25, 25))
+        radius = rng.choice([0.0, 0.05, 0.5, 3.0, 12.0, 100.0])
+        assert search.radius(p, radius, metric) == brute_force_radius(points, p, radius, metric)
+
+def test_radius_includes_points_exactly_at_the_radius():
+    #integer coordinates with exact distances 5 (3-4-5 triangles) and 7
+    points = [(3, 4), (-4, 3), (0, -5), (5, 0), (7, 0), (0, 7), (3, 5), (1, 1)]
+    for r in (0.5, 1.0, 2.5, 5.0):
+        search = build(points, r)
+        for radius in (5.0, 7.0):
+            expected = brute_force_radius(points, (0, 0), radius)
+            assert search.radius((0, 0), radius) == expected
+        assert [q for d, q, item in search.radius((0, 0), 5.0)] == [(1, 1), (3, 4), (-4, 3), (0, -5), (5, 0)]
+        assert [q for d, q, item in search.radius((0, 0), 7.0, manhattan)] == [(1, 1), (0, -5), (5, 0), (3, 4), (-4, 3), (7, 0), (0, 7)]
+
+@pytest.mark.parametrize("r", [0.1, 1.0, 7.5])
+def test_nearest_matches_brute_force(r):
+    rng = random.Random(7)
+    points = [(rng.uniform(-20, 20), rng.uniform(-20, 20)) for _ in range(200)]
+    search = build(points, r)
+    for _ in range(100):
+        p = (rng.uniform(-40, 40), rng.uniform(-40, 40))
+        k = rng.choice([1, 2, 5, 50, 500])
+        assert search.nearest(p, k) == brute_force_nearest(points, p, k)
+
+def test_empty():
+    search = FixedRadiusSearch(1.0)
+    assert len(search) == 0
+    assert search.radius((0, 0), 10.0) == []
+    assert search.nearest((0, 0), 3) == []
+    assert search.search((0, 0)) is None
+    search.add_all([])
+    assert search.radius((0, 0), 10.0) == []
+
+def test_removed_points_are_not_found():
+    points = [(0, 0), (1, 0), (0, 1)]
+    search = build(points, 1.0)
+    assert search.remove((1, 0), 1)
+    assert not search.remove((1, 0), 1)
+    assert len(search) == 2
+    assert search.radius((0, 0), 2.0) == [(0.0, (0, 0), 0), (1.0, (0, 1), 2)]
@@ -1,2 +1,3 @@
 from .cubic_bezier import CubicBezier
 from .geometric_object import GeometricObject, CompoundGeometricObject, AABBox
+from .bvh import BoundingVolumeHierarchy
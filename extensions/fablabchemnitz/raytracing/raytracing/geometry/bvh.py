@@ -0,0 +1,250 @@
+"""
+Module for accelerating the search of the first collision of rays with many
+geometric objects
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy
+
+from .cubic_bezier import CubicBezier
+from .geometric_object import CompoundGeometricObject, GeometricObject, aabboxes_entries
+from ..ray import Ray
+from ..shade import ShadeRec
+
+
+@dataclass(frozen=True)
+class Leaf:
+    """Elementary piece of an indexed object"""
+
+    geometry: GeometricObject
+    # index of the object the piece belongs to
+    owner: int
+    # position of the piece in the order of the objects and their pieces
+    order: int
+
+
+class _Node:
+    __slots__ = ("box", "left", "right", "leaves")
+
+    def __init__(self, box, left=None, right=None, leaves=()):
+        self.box = box
+        self.left = left
+        self.right = right
+        self.leaves = leaves
+
+
+class BoundingVolumeHierarchy:
+    """
+    Bounding volume hierarchy over the elementary pieces (e.g. bezier segments)
+    of a list of geometric objects.
+
+    Compound objects are split into their pieces so that a ray only has to be
+    tested against the few pieces lying along its way instead of every piece
+    of every object. The result of a query is the same as testing all objects
+    one after the other.
+    """
+
+    # maximal number of pieces stored in a leaf node
+    leaf_size = 4
+    # maximal number of ray/box pairs tested at once in batched queries
+    batch_size = 1 << 20
+
+    def __init__(self, geometries: Iterable[GeometricObject]):
+        self.geometries: list[GeometricObject] = list(geometries)
+        pieces = (
+            (owner, piece)
+            for owner, geometry in enumerate(self.geometries)
+            for piece in iter_pieces(geometry)
+        )
+        self.leaves: list[Leaf] = [
+            Leaf(piece, owner, order) for order, (owner, piece) in enumerate(pieces)
+        ]
+        boxes = [leaf.geometry.aabbox for leaf in self.leaves]
+        self.lower_left = numpy.array(
+            [[box.lower_left.x, box.lower_left.y] for box in boxes]
+        ).reshape(-1, 2)
+        self.upper_right = numpy.array(
+            [[box.upper_right.x, box.upper_right.y] for box in boxes]
+        ).reshape(-1, 2)
+        self.root: Optional[_Node] = None
+        if self.leaves:
+            self.root = self._build(numpy.arange(len(self.leaves)))
+
+    def _build(self, indices: numpy.ndarray) -> _Node:
+        lower_left = self.lower_left[indices].min(axis=0)
+        upper_right = self.upper_right[indices].max(axis=0)
+        box = (*lower_left.tolist(), *upper_right.tolist())
+        if len(indices) <= self.leaf_size:
+            return _Node(box, leaves=tuple(self.leaves[i] for i in indices))
+        # median split along the largest extent of the box centers
+        centers = self.lower_left[indices] + self.upper_right[indices]
+        axis = numpy.argmax(centers.max(axis=0) - centers.min(axis=0))
+        order = numpy.argsort(centers[:, axis], kind="stable")
+        half = len(indices) // 2
+        return _Node(
+            box,
+            left=self._build(indices[order[:half]]),
+            right=self._build(indices[order[half:]]),
+        )
+
+    def first_hit(self, ray: Ray) -> tuple[ShadeRec, int]:
+        """
+        Returns the shade of the first collision of the ray and the index of
+        the object hit, or a default shade and -1 if nothing is hit.
+        """
+
+        result, result_leaf = ShadeRec(), None
+        if self.root is None:
+            return result, -1
+        ox, oy = ray.origin.x, ray.origin.y
+        inv_x = 1 / ray.direction.x if ray.direction.x != 0 else None
+        inv_y = 1 / ray.direction.y if ray.direction.y != 0 else None
+
+        def entry(node: _Node) -> float:
+            x0, x1 = _slab(node.box[0], node.box[2], ox, inv_x)
+            y0, y1 = _slab(node.box[1], node.box[3], oy, inv_y)
+            t0, t1 = max(x0, y0), min(x1, y1)
+            if t0 > t1 or t1 < Ray.min_travel:
+                return math.inf
+            return t0
+
+        stack = [(entry(self.root), self.root)]
+        while stack:
+            t0, node = stack.pop()
+            # hits inside the box can't be closer than its entry point
+            if t0 == math.inf or t0 > result.travel_dist:
+                continue
+            if node.leaves:
+                for leaf in node.leaves:
+                    shade = leaf.geometry.hit(ray)
+                    if self._closer(shade, leaf, result, result_leaf):
+                        result, result_leaf = shade, leaf
+            else:
+                near, far = (entry(node.left), node.left), (entry(node.right), node.right)
+                if near[0] > far[0]:
+                    near, far = far, near
+                stack.append(far)
+                stack.append(near)
+        return self._finish(result, result_leaf)
+
+    def first_hits(self, rays: Sequence[Ray]) -> list[tuple[ShadeRec, int]]:
+        """
+        Same as first_hit for many rays at once. The bounding boxes of all
+        pieces are tested against all rays with array operations, then each
+        bezier piece is intersected with all the rays reaching its box at once.
+        """
+
+        if not rays or not self.leaves:
+            return [(ShadeRec(), -1) for __ in rays]
+        origins = numpy.array([[ray.origin.x, ray.origin.y] for ray in rays])
+        directions = numpy.array([[ray.direction.x, ray.direction.y] for ray in rays])
+        step = max(1, self.batch_size // len(self.leaves))
+        results = list()
+        for start in range(0, len(rays), step):
+            stop = start + step
+            results.extend(
+                self._first_hits_chunk(
+                    rays[start:stop], origins[start:stop], directions[start:stop]
+                )
+            )
+        return results
+
+    def _first_hits_chunk(
+        self, rays: Sequence[Ray], origins: numpy.ndarray, directions: numpy.ndarray
+    ) -> list[tuple[ShadeRec, int]]:
+        entries = aabboxes_entries(
+            self.lower_left, self.upper_right, origins, directions
+        )
+        travel = numpy.full(len(rays), numpy.inf)
+        params = numpy.full(len(rays), numpy.nan)
+        first = numpy.full(len(rays), -1)
+        # shades of the pieces intersected one ray at a time
+        shades = dict()
+        # pieces are visited in order, so on a tie the piece listed first wins
+        # like in a linear search
+        for index in numpy.flatnonzero((entries < numpy.inf).any(axis=0)).tolist():
+            geometry = self.leaves[index].geometry
+            rows = numpy.flatnonzero(entries[:, index] < numpy.inf)
+            # hits inside the box can't be closer than its entry point
+            rows = rows[entries[rows, index] <= travel[rows]]
+            if not len(rows):
+                continue
+            if isinstance(geometry, CubicBezier):
+                s, t = geometry.first_hits(origins[rows], directions[rows])
+            else:
+                s = numpy.full(len(rows), numpy.nan)
+                t = numpy.full(len(rows), numpy.inf)
+                for k, row in enumerate(rows.tolist()):
+                    shade = geometry.hit(rays[row])
+                    if Ray.min_travel < shade.travel_dist:
+                        shades[row, index] = shade
+                        t[k] = shade.travel_dist
+            closer = t < travel[rows]
+            rows = rows[closer]
+            travel[rows] = t[closer]
+            params[rows] = s[closer]
+            first[rows] = index
+
+        results = list()
+        for row, (ray, index) in enumerate(zip(rays, first.tolist())):
+            if index < 0:
+                results.append((ShadeRec(), -1))
+                continue
+            leaf = self.leaves[index]
+            shade = shades.get((row, index))
+            if shade is None:
+                shade = leaf.geometry.shade(ray, float(params[row]), float(travel[row]))
+            results.append(self._finish(shade, leaf))
+        return results
+
+    @staticmethod
+    def _closer(
+        shade: ShadeRec, leaf: Leaf, result: ShadeRec, result_leaf: Optional[Leaf]
+    ) -> bool:
+        if not Ray.min_travel < shade.travel_dist:
+            return False
+        if shade.travel_dist < result.travel_dist:
+            return True
+        # on a tie, the piece listed first wins like in a linear search
+        return (
+            shade.travel_dist == result.travel_dist
+            and result_leaf is not None
+            and leaf.order < result_leaf.order
+        )
+
+    def _finish(
+        self, result: ShadeRec, result_leaf: Optional[Leaf]
+    ) -> tuple[ShadeRec, int]:
+        if result_leaf is None:
+            return result, -1
+        geometry = self.geometries[result_leaf.owner]
+        # the shade refers to the whole object like CompoundGeometricObject.hit
+        if isinstance(geometry, CompoundGeometricObject):
+            result.hit_geometry = geometry
+        return result, result_leaf.owner
+
+
+def iter_pieces(geometry: GeometricObject) -> Iterator[GeometricObject]:
+    """Yields the elementary pieces of a possibly nested compound object"""
+
+    stack = [geometry]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, CompoundGeometricObject):
+            stack.extend(reversed(obj.sub_objects))
+        else:
+            yield obj
+
+
+def _slab(lower: float, upper: float, origin: float, inv: Optional[float]):
+    if inv is None:  # ray parallel to the slab
+        if lower <= origin <= upper:
+            return -math.inf, math.inf
+        return math.inf, -math.inf
+    t_lower, t_upper = (lower - origin) * inv, (upper - origin) * inv
+    return (t_lower, t_upper) if inv >= 0 else (t_upper, t_lower)
@@ -7,10 +7,11 @@ from __future__ import annotations
 import math
 from dataclasses import dataclass
 from functools import cached_property
+from typing import ClassVar
 
 import numpy
 
-from .geometric_object import AABBox, GeometricObject, GeometryError
+from .geometric_object import AABBox, GeometricObject, GeometryError, aabboxes_entries
 from ..ray import Ray
 from ..shade import ShadeRec
 from ..vector import Vector, UnitVector
@@ -33,6 +34,9 @@ class CubicBezier:
     p2: Vector
     p3: Vector
 
+    # number of times the curve is halved for subdivided_aabboxes
+    subdivision_depth: ClassVar[int] = 3
+
     def eval(self, s) -> Vector:
         return (
             (1 - s) ** 3 * self.p0
@@ -56,26 +60,56 @@ class CubicBezier:
         )
         return AABBox(lower_left, upper_right)
 
+    @cached_property
+    def control_points(self) -> numpy.ndarray:
+        """Control points as array (4, 2)"""
+        return numpy.array(
+            [[p.x, p.y] for p in (self.p0, self.p1, self.p2, self.p3)], dtype=float
+        )
+
+    @cached_property
+    def subdivided_aabboxes(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Lower left and upper right corners (n, 2) of the bounding boxes of
+        the curve split in n = 2**subdivision_depth pieces of equal parameter
+        range. Together they enclose the curve much tighter than aabbox.
+        """
+        pieces = self.control_points[None, :, :]
+        for __ in range(self.subdivision_depth):
+            pieces = numpy.concatenate(split_control_points(pieces))
+        # Same margin as aabbox to keep a non zero size
+        return pieces.min(axis=1) - 1e-6, pieces.max(axis=1) + 1e-6
+
+    @cached_property
+    def derivative_coefficients(self) -> tuple[tuple[float, float], ...]:
+        """
+        Coordinates of p0 - 3 p1 + 3 p2 - p3, p0 - 2 p1 + p2 and p0 - p1,
+        the vectors the derivatives of the curve are built from
+        """
+        c3 = self.p0 - 3 * self.p1 + 3 * self.p2 - self.p3
+        c2 = self.p0 - 2 * self.p1 + self.p2
+        c1 = self.p0 - self.p1
+        return (c3.x, c3.y), (c2.x, c2.y), (c1.x, c1.y)
+
     def tangent(self, s: float) -> UnitVector:
         """Returns the tangent at the curve at curvilinear coordinate s"""
 
-        diff_1 = (
-            -3 * (self.p0 - 3 * self.p1 + 3 * self.p2 - self.p3) * s ** 2
-            + 6 * (self.p0 - 2 * self.p1 + self.p2) * s
-            - 3 * (self.p0 - self.p1)
+        # Computed on the coordinates, as this is called for every hit
+        (c3x, c3y), (c2x, c2y), (c1x, c1y) = self.derivative_coefficients
+        diff_1 = Vector(
+            -3 * c3x * s ** 2 + 6 * c2x * s - 3 * c1x,
+            -3 * c3y * s ** 2 + 6 * c2y * s - 3 * c1y,
         )
         # If the first derivative is not zero, it is parallel to the tangent
         if diff_1.norm() > 1e-8:
             return diff_1.normalize()
         # but is the first derivative is zero, we need to get the second order
         else:
-            diff_2 = -6 * (self.p0 - 3 * self.p1 + 3 * self.p2 - self.p3) * s + 6 * (
-                self.p0 - 2 * self.p1 + self.p2
-            )
+            diff_2 = Vector(-6 * c3x * s + 6 * c2x, -6 * c3y * s + 6 * c2y)
             if diff_2.norm() > 1e-8:
                 return diff_2.normalize()
             else:  # and even to the 3rd derivative if necessary
-                diff_3 = -6 * (self.p0 - 3 * self.p1 + 3 * self.p2 - self.p3)
+                diff_3 = Vector(-6 * c3x, -6 * c3y)
                 return diff_3.normalize()
 
     def normal(self, s: float) -> UnitVector:
@@ -97,20 +131,92 @@ class CubicBezier:
         with :math:`0 \lq s \lq 1` and :math:`t >= 0`
         """
 
+        # Computed on the coordinates, as this is called for every ray
         a = ray.direction.orthogonal()
-        a0 = a * (self.p0 - ray.origin)
-        a1 = -3 * a * (self.p0 - self.p1)
-        a2 = 3 * a * (self.p0 - 2 * self.p1 + self.p2)
-        a3 = a * (-self.p0 + 3 * self.p1 - 3 * self.p2 + self.p3)
+        (c3x, c3y), (c2x, c2y), (c1x, c1y) = self.derivative_coefficients
+        ox, oy = ray.origin.x, ray.origin.y
+        a0 = a.x * (self.p0.x - ox) + a.y * (self.p0.y - oy)
+        a1 = -3 * a.x * c1x + -3 * a.y * c1y
+        a2 = 3 * a.x * c2x + 3 * a.y * c2y
+        a3 = a.x * -c3x + a.y * -c3y
         roots = cubic_real_roots(a0, a1, a2, a3)
-        intersection_points = [self.eval(s) for s in roots]
-        travel = [(X - ray.origin) * ray.direction for X in intersection_points]
+        travel = list()
+        for s in roots:
+            b0, b1, b2, b3 = (1 - s) ** 3, 3 * s * (1 - s) ** 2, 3 * s ** 2 * (1 - s), s ** 3
+            x = b0 * self.p0.x + b1 * self.p1.x + b2 * self.p2.x + b3 * self.p3.x
+            y = b0 * self.p0.y + b1 * self.p1.y + b2 * self.p2.y + b3 * self.p3.y
+            travel.append((x - ox) * ray.direction.x + (y - oy) * ray.direction.y)
 
         def valid_domain(s, t):
             return 0 <= s <= 1 and t > Ray.min_travel
 
         return [(s, t) for (s, t) in zip(roots, travel) if valid_domain(s, t)]
 
+    def intersection_beams(
+        self, origins: numpy.ndarray, directions: numpy.ndarray
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Array version of intersection_beam for n rays given by their origins
+        and directions (n, 2).
+
+        :return: The arrays s and t (n, 3) of the up to three intersections of
+            each ray, with nan where there is no valid intersection.
+        """
+
+        p0, p1, p2, p3 = self.control_points
+        a = numpy.stack((-directions[:, 1], directions[:, 0]), axis=1)
+        a /= numpy.sqrt(a[:, 0] ** 2 + a[:, 1] ** 2)[:, None]
+        a0 = numpy.einsum("ij,ij->i", a, p0 - origins)
+        a1 = -3 * a @ (p0 - p1)
+        a2 = 3 * a @ (p0 - 2 * p1 + p2)
+        a3 = a @ (-p0 + 3 * p1 - 3 * p2 + p3)
+        roots = cubic_real_roots_array(a0, a1, a2, a3)
+        with numpy.errstate(invalid="ignore"):
+            s = roots[:, :, None]
+            points = (
+                (1 - s) ** 3 * p0
+                + 3 * s * (1 - s) ** 2 * p1
+                + 3 * s ** 2 * (1 - s) * p2
+                + s ** 3 * p3
+            )
+            travel = numpy.einsum(
+                "ijk,ik->ij", points - origins[:, None, :], directions
+            )
+            valid = (0 <= roots) & (roots <= 1) & (travel > Ray.min_travel)
+        return numpy.where(valid, roots, numpy.nan), numpy.where(valid, travel, numpy.nan)
+
+    def first_hits(
+        self, origins: numpy.ndarray, directions: numpy.ndarray, subdivide: bool = True
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Finds the first intersection of n rays (origins and directions (n, 2))
+        with the curve.
+
+        Rays missing all the subdivided bounding boxes are rejected before
+        solving the cubic equations if subdivide is set.
+
+        :return: The arrays s and t (n,) of the first intersection of each
+            ray, with t set to inf where the ray doesn't hit the curve.
+        """
+
+        s = numpy.full(len(origins), numpy.nan)
+        t = numpy.full(len(origins), numpy.inf)
+        candidates = numpy.arange(len(origins))
+        if subdivide:
+            lower_left, upper_right = self.subdivided_aabboxes
+            entries = aabboxes_entries(lower_left, upper_right, origins, directions)
+            candidates = candidates[(entries < numpy.inf).any(axis=1)]
+        if len(candidates):
+            roots, travel = self.intersection_beams(
+                origins[candidates], directions[candidates]
+            )
+            travel = numpy.where(numpy.isnan(travel), numpy.inf, travel)
+            first = numpy.argmin(travel, axis=1)
+            rows = numpy.arange(len(candidates))
+            s[candidates] = roots[rows, first]
+            t[candidates] = travel[rows, first]
+        return s, t
+
     def num_hits(self, ray: Ray) -> int:
         if self.aabbox.hit(ray):
             return len(self.intersection_beam(ray))
@@ -128,12 +234,21 @@ class CubicBezier:
             intersect_params = self.intersection_beam(ray)
             travel_dist = [t for (__, t) in intersect_params]
             if len(travel_dist) > 0:  # otherwise error with np.argmin
-                shade.normal = True
                 first_hit = numpy.argmin(travel_dist)
-                shade.travel_dist = travel_dist[first_hit]
-                shade.local_hit_point = ray.origin + shade.travel_dist * ray.direction
-                shade.normal = self.normal(intersect_params[first_hit][0])
-                shade.set_normal_same_side(ray.origin)
+                shade = self.shade(ray, *intersect_params[first_hit])
+        return shade
+
+    def shade(self, ray: Ray, s: float, t: float) -> ShadeRec:
+        """
+        Returns a shade for the intersection of a beam with the curve at
+        curvilinear coordinate s and travel distance t
+        """
+
+        shade = ShadeRec()
+        shade.travel_dist = t
+        shade.local_hit_point = ray.origin + shade.travel_dist * ray.direction
+        shade.normal = self.normal(s)
+        shade.set_normal_same_side(ray.origin)
         return shade
 
     def is_inside(self, ray: Ray) -> bool:
@@ -183,6 +298,86 @@ def cubic_real_roots(d: float, c: float, b: float, a: float) -> list[float]:
         return quadratic_roots(b, c, d)
 
 
+def cubic_real_roots_array(
+    d: numpy.ndarray, c: numpy.ndarray, b: numpy.ndarray, a: numpy.ndarray
+) -> numpy.ndarray:
+    """
+    Array version of cubic_real_roots for n polynomials at once
+
+    :return: Array (n, 3) with the roots of each polynomial in the same order
+        as cubic_real_roots, padded with nan.
+    """
+
+    n = len(a)
+    roots = numpy.full((n, 3), numpy.nan)
+    with numpy.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        # true cubic equation
+        p = (3 * a * c - b ** 2) / 3 / a ** 2
+        q = (2 * b ** 3 - 9 * a * b * c + 27 * a ** 2 * d) / 27 / a ** 3
+        discr = -(4 * p ** 3 + 27 * q ** 2)
+        cubic = ~is_almost_zero_array(a)
+        no_p = cubic & is_almost_zero_array(p)
+        double = cubic & ~no_p & is_almost_zero_array(discr)
+        triple = double & is_almost_zero_array(q)
+        double &= ~triple
+        single = cubic & ~no_p & ~double & ~triple & (discr < 0)
+        three = cubic & ~no_p & ~double & ~triple & ~single
+        t = roots.copy()
+        t[no_p, 0] = numpy.cbrt(-q[no_p])
+        t[triple, 0] = 0
+        t[double, 0] = 3 * q[double] / p[double]
+        t[double, 1] = -3 * q[double] / 2 / p[double]
+        sqrt_discr = numpy.sqrt(-discr[single] / 108)
+        t[single, 0] = numpy.cbrt(-q[single] / 2 + sqrt_discr) + numpy.cbrt(
+            -q[single] / 2 - sqrt_discr
+        )
+        angle = (
+            1
+            / 3
+            * numpy.arccos(
+                3 * q[three] / 2 / p[three] * numpy.sqrt(-3 / p[three])
+            )
+        )
+        for k in range(3):
+            t[three, k] = (
+                2 * numpy.sqrt(-p[three] / 3) * numpy.cos(angle - 2 * numpy.pi * k / 3)
+            )
+        roots[cubic] = t[cubic] - (b[cubic] / 3 / a[cubic])[:, None]
+
+        # quadratic equation
+        quadratic = ~cubic & ~is_almost_zero_array(b)
+        discr = c ** 2 - 4 * b * d
+        two = quadratic & (discr > 0)
+        one = quadratic & ~two & is_almost_zero_array(discr)
+        sqrt_discr = numpy.sqrt(discr[two])
+        roots[two, 0] = (-c[two] + sqrt_discr) / 2 / b[two]
+        roots[two, 1] = (-c[two] - sqrt_discr) / 2 / b[two]
+        roots[one, 0] = -c[one] / 2 / b[one]
+
+        # linear equation
+        linear = ~cubic & ~quadratic & ~is_almost_zero_array(c)
+        roots[linear, 0] = -d[linear] / c[linear]
+    return roots
+
+
+def split_control_points(
+    points: numpy.ndarray,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Splits cubic bezier curves given by their control points (n, 4, 2) at
+    s = 0.5 with de Casteljau's algorithm
+    """
+
+    p0, p1, p2, p3 = (points[:, i] for i in range(4))
+    p01, p12, p23 = (p0 + p1) / 2, (p1 + p2) / 2, (p2 + p3) / 2
+    p012, p123 = (p01 + p12) / 2, (p12 + p23) / 2
+    middle = (p012 + p123) / 2
+    return (
+        numpy.stack((p0, p01, p012, middle), axis=1),
+        numpy.stack((middle, p123, p23, p3), axis=1),
+    )
+
+
 def quadratic_roots(a: float, b: float, c: float) -> list[float]:
     if not is_almost_zero(a):
         discr = b ** 2 - 4 * a * c
@@ -208,3 +403,7 @@ def linear_root(a: float, b: float) -> list[float]:
 
 def is_almost_zero(x: float) -> bool:
     return math.isclose(x, 0, abs_tol=1e-8)
+
+
+def is_almost_zero_array(x: numpy.ndarray) -> numpy.ndarray:
+    return numpy.abs(x) <= 1e-8
@@ -149,3 +149,27 @@ class AABBox:
         t0 = numpy.max(t_min)
         t1 = numpy.min(t_max)
         return (t0 < t1) and (t1 > Ray.min_travel)
+
+
+def aabboxes_entries(
+    lower_left: numpy.ndarray,
+    upper_right: numpy.ndarray,
+    origins: numpy.ndarray,
+    directions: numpy.ndarray,
+) -> numpy.ndarray:
+    """
+    Array version of AABBox.hit for n rays (origins and directions (n, 2))
+    and m boxes (corners (m, 2)).
+
+    :return: Array (n, m) with the distance at which each ray enters each box,
+        or inf if the ray misses the box.
+    """
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        a = 1 / directions[:, None, :]
+        o = origins[:, None, :]
+        t_min = (numpy.where(a >= 0, lower_left, upper_right) - o) * a
+        t_max = (numpy.where(a >= 0, upper_right, lower_left) - o) * a
+    t0 = numpy.max(t_min, axis=2)
+    t1 = numpy.min(t_max, axis=2)
+    return numpy.where((t0 < t1) & (t1 > Ray.min_travel), t0, numpy.inf)
@@ -6,9 +6,9 @@ from __future__ import annotations
 
 import warnings
 from dataclasses import dataclass, field
-from typing import Optional, List, NamedTuple, Iterable, Tuple
+from typing import Optional, List, NamedTuple, Iterable, Sequence, Tuple
 
-from .geometry import GeometricObject
+from .geometry import BoundingVolumeHierarchy, GeometricObject
 from .material import OpticMaterial, BeamDump
 from .ray import Ray
 from .shade import ShadeRec
@@ -19,17 +19,32 @@ class OpticalObject(NamedTuple):
     material: OpticMaterial
 
 
+@dataclass
+class _BeamNode:
+    """Ray of a propagation tree, linked to the rays it generated"""
+
+    ray: Ray
+    depth: int = 0
+    children: List[_BeamNode] = field(default_factory=list)
+    # rays that already traveled are not propagated and don't give a beam
+    dropped: bool = False
+
+
 @dataclass
 class World:
     """Stores a scene and computes the interaction with a ray"""
 
     objects: Optional[list[OpticalObject]] = field(default_factory=list)
-    # default recursion depth can be changed, but should not exceed
-    # system recursion limit.
+    # maximal number of successive interactions of a beam, the generated
+    # beams are not propagated further
     max_recursion_depth: Optional[int] = 500
+    _bvh: Optional[BoundingVolumeHierarchy] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def add(self, obj: OpticalObject):
         self.objects.append(obj)
+        self._bvh = None
 
     def __iter__(self) -> Iterable[OpticalObject]:
         return iter(self.objects)
@@ -38,6 +53,13 @@ class World:
     def num_objects(self) -> int:
         return len(self.objects)
 
+    @property
+    def bvh(self) -> BoundingVolumeHierarchy:
+        """Spatial index over the geometry of the objects, built on demand"""
+        if self._bvh is None or len(self._bvh.geometries) != self.num_objects:
+            self._bvh = BoundingVolumeHierarchy(obj.geometry for obj in self)
+        return self._bvh
+
     def first_hit(self, ray: Ray) -> Tuple[ShadeRec, OpticMaterial]:
         """
         Returns the information about the first collision of the beam
@@ -46,48 +68,95 @@ class World:
         :return: A shade for the collision geometric information and the
         material of the object hit.
         """
-        result = ShadeRec()
-        material = BeamDump()
-        for obj in self:
-            shade = obj.geometry.hit(ray)
-            if Ray.min_travel < shade.travel_dist < result.travel_dist:
-                result = shade
-                material = obj.material
-        return result, material
-
-    def propagate_beams(self, seed):
-        return self._propagate_beams([[seed]], 0)
-
-    def _propagate_beams(self, beams: List[List[Ray]], depth) -> List[List[Ray]]:
+        shade, index = self.bvh.first_hit(ray)
+        return shade, self._material(index)
+
+    def first_hits(self, rays: Sequence[Ray]) -> List[Tuple[ShadeRec, OpticMaterial]]:
+        """Same as first_hit for many rays at once"""
+        return [
+            (shade, self._material(index)) for shade, index in self.bvh.first_hits(rays)
+        ]
+
+    def _material(self, index: int) -> OpticMaterial:
+        if index < 0:
+            return BeamDump()
+        return self.objects[index].material
+
+    def propagate_beams(self, seed: Ray) -> List[List[Ray]]:
         """Computes the propagation of beams in the system
 
-        :return: List of all the beam paths generated by these seeds.
+        :return: List of all the beam paths generated by this seed.
             It is stored as
             [path0[Ray0, Ray1, ...], path1[...], ...].
             Each path is a list of successive rays having each traveled a
             given distance.
-        :raise: warning if recursion depth hits a limit.
+        :raise: warning if the depth of the propagation hits a limit.
+        """
+
+        root = _BeamNode(seed)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if self._can_propagate(node):
+                shade, material = self.first_hit(node.ray)
+                self._interact(node, shade, material)
+                stack.extend(reversed(node.children))
+        return self._beam_paths(root)
+
+    def propagate_beams_batch(self, seeds: Sequence[Ray]) -> List[List[List[Ray]]]:
+        """
+        Same as propagate_beams for many seeds at once. All the rays
+        generated at the same depth are traced together.
+
+        :return: The list of beam paths of each seed.
         """
 
-        if depth >= self.max_recursion_depth:
+        roots = [_BeamNode(seed) for seed in seeds]
+        frontier = roots
+        while frontier:
+            nodes = [node for node in frontier if self._can_propagate(node)]
+            frontier = list()
+            for node, (shade, material) in zip(
+                nodes, self.first_hits([node.ray for node in nodes])
+            ):
+                self._interact(node, shade, material)
+                frontier.extend(node.children)
+        return [self._beam_paths(root) for root in roots]
+
+    def _can_propagate(self, node: _BeamNode) -> bool:
+        if node.ray.travel > 0:
+            node.dropped = True
+            return False
+        if node.depth >= self.max_recursion_depth:
             err_msg = (
                 f"Maximal recursion depth exceeded ({self.max_recursion_depth})."
                 "It is  likely that not all beams have been rendered."
             )
             warnings.warn(err_msg)
-            return beams
-        else:
-            new_beams = list()
-            for index, beam in enumerate(beams):
-                ray = beam[-1]
-                if ray.travel <= 0:
-                    shade, material = self.first_hit(ray)
-                    new_seeds = material.generated_beams(ray, shade)
-                    beams[index][-1] = Ray(ray.origin, ray.direction, shade.travel_dist)
-                    if len(new_seeds) == 0:
-                        new_beams.append(beams[index])
-                    for seed in new_seeds:
-                        generated_beams = self._propagate_beams([[seed]], depth + 1)
-                        for new_beam in generated_beams:
-                            new_beams.append(beams[index] + new_beam)
-            return new_beams
+            return False
+        return True
+
+    @staticmethod
+    def _interact(node: _BeamNode, shade: ShadeRec, material: OpticMaterial):
+        ray = node.ray
+        new_seeds = material.generated_beams(ray, shade)
+        node.ray = Ray(ray.origin, ray.direction, shade.travel_dist)
+        node.children = [_BeamNode(seed, node.depth + 1) for seed in new_seeds]
+
+    @staticmethod
+    def _beam_paths(root: _BeamNode) -> List[List[Ray]]:
+        """Lists the paths from the root to each end of the propagation tree"""
+        paths = list()
+        path = list()
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            del path[node.depth - root.depth :]
+            if node.dropped:
+                continue
+            path.append(node.ray)
+            if node.children:
+                stack.extend(reversed(node.children))
+            else:
+                paths.append(list(path))
+        return paths
@@ -85,17 +85,17 @@ class Raytracing(inkex.EffectExtension):
             self.add(obj)
 
         if self.beam_seeds:
-            for seed in self.beam_seeds:
-                if self.is_inside_document(seed.ray):
-                    generated = self.world.propagate_beams(seed.ray)
-                    for beam in generated:
-                        try:
-                            new_layer = get_or_create_beam_layer(
-                                get_containing_layer(seed.parent)
-                            )
-                            plot_beam(beam, seed.parent, new_layer)
-                        except LayerError as e:
-                            inkex.utils.errormsg(f"{e} It will be ignored.")
+            seeds = [seed for seed in self.beam_seeds if self.is_inside_document(seed.ray)]
+            generated_beams = self.world.propagate_beams_batch([seed.ray for seed in seeds])
+            for seed, generated in zip(seeds, generated_beams):
+                for beam in generated:
+                    try:
+                        new_layer = get_or_create_beam_layer(
+                            get_containing_layer(seed.parent)
+                        )
+                        plot_beam(beam, seed.parent, new_layer)
+                    except LayerError as e:
+                        inkex.utils.errormsg(f"{e} It will be ignored.")
 
     @singledispatchmethod
     def add(self, obj):
@@ -27,6 +27,57 @@ from inkex import bezier, PathElement, CubicSuperPath, Transform
 import numpy as np
 from tkinter import messagebox
 
+def segmentCoordinates(subs):
+    """
+    Extract the segments of all cubic super paths in subs into one array with rows
+    p1x p1y c1x c1y c2x c2y p2x p2y. Returns the array and the start row of each
+    subpath (plus the total number of rows).
+    """
+    counts=[len(sub)-1 for sub in subs]
+    starts=np.concatenate(([0], np.cumsum(counts))).astype(int)
+    allCoords=np.zeros((starts[-1],8))
+    for sub, start, count in zip(subs, starts, counts):
+        if count > 0:
+            nodes=np.array(sub, dtype=float)#node x (control point 1, point, control point 2) x (x, y)
+            allCoords[start:start+count,0:2]=nodes[:-1,1]
+            allCoords[start:start+count,2:4]=nodes[:-1,2]
+            allCoords[start:start+count,4:6]=nodes[1:,0]
+            allCoords[start:start+count,6:8]=nodes[1:,1]
+    return allCoords, starts
+
+def segmentsMatch(candidates, segmentCoords, tolerance):
+    """
+    Boolean mask of the candidate segments whose 4 points all are closer than tolerance
+    to the points of segmentCoords. Without tolerance the points have to be equal.
+    """
+    subtr=np.abs(candidates-segmentCoords)
+    dists=np.sqrt(subtr[:,0::2]**2+subtr[:,1::2]**2)
+    if tolerance > 0:
+        return (subtr.max(1) < tolerance) & (dists.max(1) < tolerance)
+    return dists.max(1) == 0
+
+class SegmentBuckets:
+    """
+    Hash of the segment start points, quantized to cells of the tolerance size.
+    All points closer than the tolerance to a query point are in the 3x3 cells around it.
+    """
+    def __init__(self, points, tolerance):
+        self.cellSize=tolerance if tolerance > 0 else 1.0
+        self.buckets={}
+        if len(points) == 0:
+            return
+        cells=np.floor(points/self.cellSize).astype(np.int64)
+        order=np.lexsort((cells[:,1], cells[:,0]))
+        cells=cells[order]
+        bounds=np.flatnonzero(np.any(cells[1:]!=cells[:-1], axis=1))+1
+        for chunk, first in zip(np.split(order, bounds), np.concatenate(([0], bounds))):
+            self.buckets[(cells[first,0], cells[first,1])]=chunk
+
+    def near(self, point):
+        cx, cy=np.floor(point/self.cellSize).astype(np.int64)
+        found=[self.buckets[(x, y)] for x in (cx-1, cx, cx+1) for y in (cy-1, cy, cy+1) if (x, y) in self.buckets]
+        return np.concatenate(found) if found else np.zeros(0, dtype=int)
+
 class removeDuplicateLineSegments(inkex.EffectExtension):
 
     def add_arguments(self, pars):
@@ -42,7 +93,7 @@ class removeDuplicateLineSegments(inkex.EffectExtension):
         if self.options.minUse == False:
             tolerance=0
         
-        coords=[]#one segmentx8 subarray for each path and subpath (paths and subpaths treated equally)
+        subs=[]
         pathNo=[]
         subPathNo=[]
         cPathNo=[]#counting alle paths and subpaths equally
@@ -84,30 +135,20 @@ class removeDuplicateLineSegments(inkex.EffectExtension):
                 pp=elem.path
                     
                 s=0
-                #create matrix with segment coordinates p1x p1y c1x c1y c2x c2y p2x p2y
-                for sub in pp.to_superpath():                   
-                    coordsThis=np.zeros((len(sub)-1,8))
-                    
-                    i=0
-                    while i <= len(sub) - 2:
-                        coordsThis[i][0]=sub[i][1][0]
-                        coordsThis[i][1]=sub[i][1][1]
-                        coordsThis[i][2]=sub[i][2][0]
-                        coordsThis[i][3]=sub[i][2][1]
-                        coordsThis[i][4]=sub[i+1][0][0]
-                        coordsThis[i][5]=sub[i+1][0][1]
-                        coordsThis[i][6]=sub[i+1][1][0]
-                        coordsThis[i][7]=sub[i+1][1][1]                   
-                                
-                        i+=1
-                    
-                    coords.append(coordsThis)
+                #collect the subpaths, the segment coordinates are extracted in one pass below
+                for sub in pp.to_superpath():
+                    subs.append(sub)
                     pathNo.append(p)
                     subPathNo.append(s)
                     cPathNo.append(c)
                     c+=1
                     s+=1
                 p+=1
+
+        #create matrix with segment coordinates p1x p1y c1x c1y c2x c2y p2x p2y for all segments of all subpaths
+        #coords[c] is the view on the rows of path or subpath c
+        allCoords, starts = segmentCoordinates(subs)
+        coords=[allCoords[starts[c]:starts[c+1]] for c in range(len(subs))]
         if nFailed > 0:
             messagebox.showwarning('Warning',str(nFailed)+' selected elements did not have a path. Groups, shapeelements and text will be ignored.')
 
@@ -117,80 +158,48 @@ class removeDuplicateLineSegments(inkex.EffectExtension):
         origCoords=[]
         for item in coords: origCoords.append(np.copy(item))#make a real copy (not a reference that changes with the original
         #search for overlapping or close segments
-        #for each segment find if difference of any x or y is less than tolerance - if so - calculate 2d-distance and find if all 4 less than tolerance
-        #repeat with reversed segment
-        #if match found set match coordinates to -1000 to mark this to be removed and being ignored later on
-        i=0
-        while i <= len(coords)-1:#each path or subpath
-            j=0
-            while j<=len(coords[i][:,0])-1:#each segment j of path i
-                k=0
-                while k<=len(coords)-1:#search all other subpaths
-                    evalPath=True
-                    if k == i and self.options.selfPath == False:#do not test path against itself
-                        evalPath=False
-                    if evalPath:
-                        segmentCoords=np.array(coords[i][j,:])
-                        if segmentCoords[0] != -1000 and segmentCoords[1] != -1000:
-                            searchCoords=np.array(coords[k])
-                            if k==i:
-                                searchCoords[j,:]=-2000#avoid comparing segment with itself
-                            subtr=np.abs(searchCoords-segmentCoords)
-                            maxval=subtr.max(1)
-                            lessTol=np.argwhere(maxval<tolerance)        
-                            matchThis=False
-                            matchThisRev=False
-                            finalK=0
-                            lesstolc=0
-                            if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
-                                c=0
-                                while c < len(lessTol):
-                                    dists=np.zeros(4)
-                                    dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
-                                    dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
-                                    dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
-                                    dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
-                                    if dists.max() < tolerance:
-                                        matchThis=True
-                                        finalK=k
-                                        lesstolc=lessTol[c]
-                                    c+=1
-                            if matchThis == False:#try reversed
-                                segmentCoordsRev=[segmentCoords[6], segmentCoords[7],segmentCoords[4],segmentCoords[5],segmentCoords[2],segmentCoords[3],segmentCoords[0],segmentCoords[1]]
-                                subtr=np.abs(searchCoords-segmentCoordsRev)
-                                maxval=subtr.max(1)
-                                lessTol=np.argwhere(maxval<tolerance)   
-                                if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
-                                    c=0
-                                    while c < len(lessTol):
-                                        dists=np.zeros(4)
-                                        dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
-                                        dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
-                                        dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
-                                        dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
-                                        if dists.max() < tolerance:
-                                            matchThis=True
-                                            matchThisRev=True
-                                            finalK=k
-                                            lesstolc=lessTol[c]
-                                        c+=1
-                            
-                            if matchThis:
-                                coords[finalK][lesstolc,:]=-1000
-                                removeSegmentPath.append(pathNo[finalK])
-                                removeSegmentSubPath.append(subPathNo[finalK])
-                                removeSegment_cPath.append(cPathNo[finalK])
-                                removeSegment.append(lesstolc)
-                                matchSegmentPath.append(pathNo[i])
-                                matchSegmentSubPath.append(subPathNo[i])
-                                matchSegment_cPath.append(cPathNo[i])
-                                matchSegment.append(j)
-                                matchSegmentRev.append(matchThisRev)        
-                                        
-                    k+=1
-                j+=1
-            i+=1
-                
+        #candidates are taken from a hash of the segment start points quantized to the tolerance (sorted-axis buckets),
+        #for each segment find if the 2d-distance of all 4 points is less than tolerance (or zero if no tolerance is used)
+        #repeat with reversed segment, for which the start points close to the end point of the segment are candidates
+        #per other path, the last matching segment is marked to be removed and being ignored later on
+        segPath=np.repeat(np.arange(len(coords)), np.diff(starts))
+        segLocal=np.arange(len(allCoords))-starts[segPath]
+        removed=np.zeros(len(allCoords), dtype=bool)
+        buckets=SegmentBuckets(allCoords[:,0:2], tolerance)
+        for g in range(len(allCoords)):
+            if removed[g]:
+                continue
+            i=segPath[g]
+            segmentCoords=allCoords[g]
+            segmentCoordsRev=segmentCoords[[6,7,4,5,2,3,0,1]]
+            fwd=buckets.near(segmentCoords[0:2])
+            rev=buckets.near(segmentCoords[6:8])
+            fwd=fwd[(fwd!=g) & ~removed[fwd]]
+            rev=rev[(rev!=g) & ~removed[rev]]
+            if self.options.selfPath == False:#do not test path against itself
+                fwd=fwd[segPath[fwd]!=i]
+                rev=rev[segPath[rev]!=i]
+            fwd=fwd[segmentsMatch(allCoords[fwd], segmentCoords, tolerance)]
+            rev=rev[segmentsMatch(allCoords[rev], segmentCoordsRev, tolerance)]
+            for k in np.union1d(segPath[fwd], segPath[rev]):#each other path with a match, in order
+                matchThisRev=False
+                candidates=fwd[segPath[fwd]==k]
+                if len(candidates) == 0:#try reversed
+                    candidates=rev[segPath[rev]==k]
+                    matchThisRev=True
+                finalK=k
+                lesstolc=segLocal[candidates.max()]
+                removed[candidates.max()]=True
+                removeSegmentPath.append(pathNo[finalK])
+                removeSegmentSubPath.append(subPathNo[finalK])
+                removeSegment_cPath.append(cPathNo[finalK])
+                removeSegment.append(lesstolc)
+                matchSegmentPath.append(pathNo[i])
+                matchSegmentSubPath.append(subPathNo[i])
+                matchSegment_cPath.append(cPathNo[i])
+                matchSegment.append(segLocal[g])
+                matchSegmentRev.append(matchThisRev)
+
         #(interpolate remaining and) remove segments with a match
         if len(removeSegmentPath) > 0:          
             removeSegmentPath=np.array(removeSegmentPath)